@@ -712,7 +712,7 @@ class AssocTextListViewport(display_utilities.ViewportBaseClass):
 		if MessageReceived is None:
 			assert isinstance(MessageAsXMLTree, ElementTree.Element)
 			XMLRoot = MessageAsXMLTree
-		else: XMLRoot = ElementTree.fromstring(MessageReceived)
+		else: XMLRoot = vizop_misc.DecodeMessage(MessageReceived)
 		Proj = Args['Proj'] # get ProjectItem object to which the current FT belongs
 		# get the command - it's the tag of the root element
 		Command = XMLRoot.tag
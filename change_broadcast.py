@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# Module: change_broadcast. This file is part of Vizop. Copyright xSeriCon, 2020
+
+# standard modules needed:
+import time, zmq
+
+# vizop modules needed:
+import info, message_codec
+
+"""
+The change_broadcast module contains a publish/subscribe channel for telling displays about changes to PHA objects.
+The datacore publishes one message per PHA object and redraw revision on a ChangePublisher (a zmq PUB socket); each
+display (local control frame, subscriber process or collaborator) has a ChangeSubscriber (a SUB socket), subscribed to
+the IDs of the PHA objects it's showing. The message is encoded once, however many subscribers receive it, and zmq
+fans it out without copying, so the cost of publishing doesn't depend on the number of subscribers or the size of the
+message. Messages are sent as two frames: the topic (the PHA object's ID, terminated so that e.g. ID 1 doesn't match
+ID 12) and the encoded message.
+The publisher binds to an inproc address for subscribers in the same process, and to a loopback TCP port for
+subscribers in other processes.
+It doesn't import wx. A benchmark with subscribers in other processes is in change_broadcast_benchmark.py.
+"""
+
+def TopicOfPHAObj(PHAObjID):
+	# return topic (bytes) of messages about the PHA object with PHAObjID (str)
+	return PHAObjID.encode('UTF-8') + b'\x00'
+
+class ChangePublisher(object): # datacore end of the change broadcast channel
+
+	def __init__(self, Context=None, Address=info.ChangeBroadcastAddress, Codec=info.ChangeBroadcastCodec):
+		# Context: zmq context to use; if None, the process's global context is used. Subscribers in the same process
+		# must use the same context, to connect to the inproc address
+		# Address (str): inproc address to bind. Codec (str): codec for messages (a key in message_codec.Codecs). As the
+		# publisher is also bound to a TCP address for subscribers in other processes, codecs accepted only in-process
+		# can't be used
+		assert isinstance(Address, str)
+		assert Codec in message_codec.Codecs
+		assert Codec not in message_codec.InprocOnlyCodecs, "CB37 codec %s can't be used for broadcasts" % Codec
+		object.__init__(self)
+		self.Socket = (Context or zmq.Context.instance()).socket(zmq.PUB)
+		self.Socket.bind(Address)
+		self.Address = Address
+		self.ExternalAddress = 'tcp://127.0.0.1:%d' % self.Socket.bind_to_random_port('tcp://127.0.0.1')
+		self.Codec = Codec
+		# performance counters: number of messages published, total bytes published, time spent encoding and sending (s)
+		self.Stats = {'Published': 0, 'Bytes': 0, 'EncodeTime': 0.0, 'SendTime': 0.0}
+
+	def Publish(self, PHAObjID, XMLRoot):
+		# publish XML tree with root element XMLRoot to subscribers to the PHA object with PHAObjID (str).
+		# Return size of the encoded message (int; bytes)
+		StartTime = time.perf_counter()
+		Message = message_codec.EncodeMessage(XMLRoot, Codec=self.Codec)
+		EncodeEndTime = time.perf_counter()
+		self.Socket.send_multipart([TopicOfPHAObj(PHAObjID), Message], copy=(len(Message) < info.ZeroCopyMinSize))
+		self.Stats['Published'] += 1
+		self.Stats['Bytes'] += len(Message)
+		self.Stats['EncodeTime'] += EncodeEndTime - StartTime
+		self.Stats['SendTime'] += time.perf_counter() - EncodeEndTime
+		return len(Message)
+
+	def close(self, linger=0):
+		self.Socket.close(linger=linger)
+
+class ChangeSubscriber(object): # display end of the change broadcast channel. It stands in for a zmq socket in the
+	# message pump, supporting recv() as used elsewhere in Vizop
+
+	def __init__(self, Context=None, Address=info.ChangeBroadcastAddress):
+		# Context: zmq context to use; if None, the process's global context is used
+		# Address (str): address of the ChangePublisher: its Address if in the same process, else its ExternalAddress
+		assert isinstance(Address, str)
+		object.__init__(self)
+		self.Socket = (Context or zmq.Context.instance()).socket(zmq.SUB)
+		self.Socket.connect(Address)
+		self.Address = Address
+		self.PHAObjIDs = set() # IDs (str) of PHA objects currently subscribed to
+		self.Stats = {'Received': 0, 'Bytes': 0}
+
+	def Subscribe(self, PHAObjID):
+		# receive messages about the PHA object with PHAObjID (str)
+		if PHAObjID not in self.PHAObjIDs:
+			self.Socket.setsockopt(zmq.SUBSCRIBE, TopicOfPHAObj(PHAObjID))
+			self.PHAObjIDs.add(PHAObjID)
+
+	def Unsubscribe(self, PHAObjID):
+		# stop receiving messages about the PHA object with PHAObjID (str)
+		if PHAObjID in self.PHAObjIDs:
+			self.Socket.setsockopt(zmq.UNSUBSCRIBE, TopicOfPHAObj(PHAObjID))
+			self.PHAObjIDs.discard(PHAObjID)
+
+	def SubscribeOnly(self, PHAObjIDs):
+		# receive messages about the PHA objects with IDs in PHAObjIDs (iterable of str), and no others
+		PHAObjIDs = set(PHAObjIDs)
+		for ThisID in self.PHAObjIDs - PHAObjIDs: self.Unsubscribe(ThisID)
+		for ThisID in PHAObjIDs - self.PHAObjIDs: self.Subscribe(ThisID)
+
+	def recv(self):
+		# return the next message received (bytes), without its topic, waiting for one if none is available yet
+		Topic, Message = self.Socket.recv_multipart()
+		self.Stats['Received'] += 1
+		self.Stats['Bytes'] += len(Message)
+		return Message
+
+	@property
+	def closed(self): return self.Socket.closed # named as in zmq sockets
+
+	def close(self, linger=0):
+		self.Socket.close(linger=linger)
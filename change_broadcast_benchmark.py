@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# Module: change_broadcast_benchmark. This file is part of Vizop. Copyright xSeriCon, 2020
+
+# standard modules needed:
+import sys, time, subprocess
+import xml.etree.ElementTree as ElementTree
+
+# vizop modules needed:
+import info, message_codec, change_broadcast
+
+"""
+The change_broadcast_benchmark module measures the change broadcast channel (see change_broadcast module) with
+subscribers in separate processes: how long publishing takes for messages of various sizes, and whether each subscriber
+receives all the messages for the PHA object it subscribed to, and none for other PHA objects.
+It isn't used by Vizop itself. Run from the command line:
+	python change_broadcast_benchmark.py test [<number of subscriber processes>]
+It starts copies of itself as the subscriber processes:
+	python change_broadcast_benchmark.py <publisher's TCP address> <PHA object ID> <number of messages to receive>
+"""
+
+def RunSubscriberProcess(Address, PHAObjID, MessagesExpected):
+	# subscribe to the PHA object with PHAObjID (str) at Address (str), and receive MessagesExpected (int) messages,
+	# announcing readiness by printing 'Ready' and then each message's size. Runs in a separate process
+	Subscriber = change_broadcast.ChangeSubscriber(Address=Address)
+	Subscriber.Subscribe(PHAObjID)
+	print('Ready', flush=True) # the test waits for this, as messages published before subscribing would be lost
+	for i in range(MessagesExpected):
+		Root = message_codec.DecodeMessage(Subscriber.recv())
+		print(Root.get(info.RedrawRevisionAttribName), Subscriber.Stats['Bytes'], flush=True)
+	Subscriber.close()
+
+def TestWithSubscriberProcesses(Subscribers=4, Messages=20, PayloadSizes=(1000, 100000, 1000000)):
+	# publish Messages (int) messages of each size in PayloadSizes (bytes) to Subscribers (int) subscriber processes,
+	# and to one subscriber to another PHA object, which should receive nothing.
+	# Return dict: keys are payload sizes, values are (mean time to encode one message, mean time to send it) (s)
+	Publisher = change_broadcast.ChangePublisher(Address='inproc://change_broadcast_test')
+	MessagesExpected = Messages * len(PayloadSizes)
+	Processes = [subprocess.Popen([sys.executable, __file__, Publisher.ExternalAddress, 'FT1', str(MessagesExpected)],
+		stdout=subprocess.PIPE, universal_newlines=True) for i in range(Subscribers)]
+	Bystander = subprocess.Popen([sys.executable, __file__, Publisher.ExternalAddress, 'FT12', '1'],
+		stdout=subprocess.PIPE, universal_newlines=True)
+	for ThisProcess in Processes + [Bystander]: assert ThisProcess.stdout.readline().strip() == 'Ready'
+	time.sleep(0.5) # let the subscriptions reach the publisher
+	PublishTimes = {}
+	Revision = 0
+	for ThisSize in PayloadSizes:
+		OldStats = dict(Publisher.Stats)
+		for i in range(Messages):
+			Revision += 1
+			Root = ElementTree.Element('NO_RedrawPHAObj', attrib={info.RedrawRevisionAttribName: str(Revision)})
+			Root.text = 'x' * ThisSize
+			Publisher.Publish('FT1', Root)
+		PublishTimes[ThisSize] = ((Publisher.Stats['EncodeTime'] - OldStats['EncodeTime']) / Messages,
+			(Publisher.Stats['SendTime'] - OldStats['SendTime']) / Messages)
+	for ThisProcess in Processes:
+		Received = ThisProcess.stdout.read().split('\n')
+		ThisProcess.wait()
+		assert len([r for r in Received if r]) == MessagesExpected, 'Subscriber missed messages'
+	time.sleep(0.5)
+	assert Bystander.poll() is None, 'Subscriber received message for another PHA object'
+	Bystander.kill()
+	Publisher.close()
+	return PublishTimes
+
+if __name__ == '__main__':
+	# usage: python change_broadcast_benchmark.py <publisher's TCP address> <PHA object ID> <number of messages to receive>
+	# or, to run the test: python change_broadcast_benchmark.py test [<number of subscriber processes>]
+	if sys.argv[1] == 'test':
+		for (ThisSize, (EncodeTime, SendTime)) in sorted(TestWithSubscriberProcesses(
+				Subscribers=int(sys.argv[2]) if len(sys.argv) > 2 else 4).items()):
+			print('%d byte messages: %.3f ms to encode, %.3f ms to send' % (ThisSize, EncodeTime * 1e3, SendTime * 1e3))
+	else: RunSubscriberProcess(Address=sys.argv[1], PHAObjID=sys.argv[2], MessagesExpected=int(sys.argv[3]))
@@ -8,20 +8,20 @@ The controlframe module contains code for the main Vizop control and navigation
 """
 
 # standard modules needed:
-import wx, wx.aui, random, copy
+import wx, wx.aui, random, copy, time
 from wx.lib.agw import supertooltip as ToolTip
 import xml.etree.ElementTree as ElementTree
 from platform import system
 # vizop modules needed:
 import settings, text, vizop_misc, art, display_utilities, info, utilities, core_classes, projects, project_display
-import undo
+import undo, datacore_worker, datacore_process, message_stats
 # modules containing Viewport and PHA model definitions
 import faulttree, ft_full_report, assoc_text_view, assoc_text_report
 from display_utilities import UIWidgetItem, UIWidgetPlaceholderItem
 
 # ColourSwatchButtonSize = (60,20) # size for 'change colour' buttons. Not applied in all cases, yet
-KeyPressHash = [] # list of tuples: (keystroke code, handling routines when those keystrokes are detected,
-# dict of args to supply to handler)
+KeyPressHash = {} # keys are key chords (see vizop_misc.KeyChord()), values are tuples: (handling routine when the
+# chord is pressed, dict of args to supply to handler)
 AllControlFrameShadows = [] # all shadow objects comprising datacore's representation of currently active control
 	# frames, both local and remote
 UndoChainWaiting = RedoChainWaiting = False # whether un/redo paused in the middle of a chain
@@ -108,7 +108,7 @@ class VizopTalksMessage(object): # defines a message that can be shown in VizopT
 # make function to get priority index (int) of any priority. Low index = low priority
 PriorityIndex = lambda p: VizopTalksPriority.PriorityList.index[p]
 
-class ControlFrame(wx.Frame):
+class ControlFrame(wx.Frame, datacore_process.DatacoreDispatcher):
 	# Define the main control frame, with panels: Edit, Control View, VizopTalks
 
 	class VTPanel(wx.Window):
@@ -1428,7 +1428,7 @@ class ControlFrame(wx.Frame):
 
 		def PrefillWidgetsForFaultTreeAspect(self, **Args):
 			Proj = self.TopLevelFrame.CurrentProj
-			AllFTsInProj = [p for p in Proj.PHAObjShadows if type(p) is faulttree.FTObjectInCore]
+			AllFTsInProj = [p for p in Proj.PHAObjShadows if projects.PHAModelClassOf(p) is faulttree.FTObjectInCore]
 			CurrentViewport = self.TopLevelFrame.CurrentViewport
 			# keep a record of which FT is on display
 			CurrentFT = self.TopLevelFrame.PHAObjInControlPanel = Args['PHAObjInControlPanel']
@@ -1489,7 +1489,8 @@ class ControlFrame(wx.Frame):
 			# first, find out which FT was requested
 			FTIndex = Event.GetEventObject().GetSelection()
 			if FTIndex != wx.NOT_FOUND: # is any item selected?
-				FTRequestedID = [p for p in Proj.PHAObjShadows if type(p) is faulttree.FTObjectInCore][FTIndex].ID
+				FTRequestedID = [p for p in Proj.PHAObjShadows
+					if projects.PHAModelClassOf(p) is faulttree.FTObjectInCore][FTIndex].ID
 				# requested different FT from the one on display?
 				if FTRequestedID != self.TopLevelFrame.CurrentViewport.PHAObjID:
 					self.TopLevelFrame.SwitchToPHAObj(Proj=Proj, TargetPHAObjID=FTRequestedID)
@@ -2130,7 +2131,12 @@ class ControlFrame(wx.Frame):
 		def Redraw(self, FullRefresh=True):
 			# full redraw of Viewport. FullRefresh (bool): whether to request redraw from scratch
 			assert isinstance(FullRefresh, bool)
-			if self.ViewportOwner.CurrentViewport:
+			if getattr(self.ViewportOwner.CurrentViewport, 'CanRepaintDirtyRegions', False):
+				# Viewport transfers only the regions changed since its last redraw, so draw straight into the panel,
+				# without clearing it first
+				self.ViewportOwner.CurrentViewport.RenderInDC(wx.ClientDC(self), FullRefresh=FullRefresh,
+					BitmapMinSize=self.GetSize(), DrawZoomTool=True, DirtyOnly=True, debug=2135)
+			elif self.ViewportOwner.CurrentViewport:
 				DC = wx.BufferedDC(wx.ClientDC(self))
 				self.DoRedraw(DC, FullRefresh=FullRefresh, debug=2135)
 
@@ -2342,6 +2348,8 @@ class ControlFrame(wx.Frame):
 		self.FileMenuSeparatorAfterViewportCommands = FileMenu.AppendSeparator()
 		# InsertBeforeMe: list of menu items to insert above this location
 		self.FileMenuSeparatorAfterViewportCommands.InsertBeforeMe = [self.FTFullReportmitem]
+		MessageStatsmitem = FileMenu.Append(-1, _('Message statistics...'), '')
+		self.Bind(wx.EVT_MENU, self.OnMessageStatsRequest, MessageStatsmitem)
 		Aboutmitem = FileMenu.Append(-1, _('About &Vizop...'), '')
 		self.Bind(wx.EVT_MENU, vizop_misc.OnAboutRequest, Aboutmitem) # OnAboutRequest is shared with welcome frame
 		Quitmitem = FileMenu.Append(-1, _('E&xit Vizop'), '')
@@ -2396,21 +2404,27 @@ class ControlFrame(wx.Frame):
 		# Items that should be enabled only if a Viewport is currently on display
 		self.MenuBar.Enable(self.ActionItemsReportmitemID, bool(self.CurrentViewport))
 		self.MenuBar.Enable(self.ParkingLotReportmitemID, bool(self.CurrentViewport))
-		# Undo menu item
-		if Proj.UndoList:
-			# find record that will be undone 'up to' (skipping over any chained records)
-			LastRecordToUndo = Proj.UndoList[undo.FindLastRecordToUndo(Proj.UndoList)]
-			UndoText = _(LastRecordToUndo.HumanText)
+		# Undo menu item. If the datacore is in another process, the undo and redo lists are there, so we use the texts
+		# it sent in its last message (see TrackDatacoreStatus())
+		ProjStatus = self.DatacoreStatus.get(Proj.ID, {})
+		if (info.UndoTextAttribName in ProjStatus) if self.DatacoreProcess else Proj.UndoList:
+			if self.DatacoreProcess: UndoText = _(ProjStatus[info.UndoTextAttribName])
+			else:
+				# find record that will be undone 'up to' (skipping over any chained records)
+				LastRecordToUndo = Proj.UndoList[undo.FindLastRecordToUndo(Proj.UndoList)]
+				UndoText = _(LastRecordToUndo.HumanText)
 			self.UndoMenuItem.SetItemLabel((_('&Undo %s')) % UndoText)
 			self.MenuBar.Enable(self.UndoMenuItemID, True)
 		else: # nothing to undo
 			self.UndoMenuItem.SetItemLabel(_('(Nothing to undo)'))
 			self.MenuBar.Enable(self.UndoMenuItemID, False)
 		# Redo menu item
-		if Proj.RedoList:
-			# find record that will be undone 'up to' (skipping over any chained records)
-			LastRecordToRedo = Proj.RedoList[undo.FindLastRecordToUndo(Proj.RedoList)]
-			RedoText = _(LastRecordToRedo.HumanText)
+		if (info.RedoTextAttribName in ProjStatus) if self.DatacoreProcess else Proj.RedoList:
+			if self.DatacoreProcess: RedoText = _(ProjStatus[info.RedoTextAttribName])
+			else:
+				# find record that will be undone 'up to' (skipping over any chained records)
+				LastRecordToRedo = Proj.RedoList[undo.FindLastRecordToUndo(Proj.RedoList)]
+				RedoText = _(LastRecordToRedo.HumanText)
 			self.RedoMenuItem.SetItemLabel((_('&Redo %s')) % RedoText)
 			self.MenuBar.Enable(self.RedoMenuItemID, True)
 		else: # nothing to redo
@@ -2437,8 +2451,15 @@ class ControlFrame(wx.Frame):
 	def OnUndoRequest(self, Event): # handle Undo request from user
 		# first, clear UndoChainWaiting flag possibly left over from last undo action
 		global UndoChainWaiting
+		if self.AwaitingUndoReply: return # the datacore process hasn't finished the last undo or redo yet
 		ContinuePausedChain = UndoChainWaiting # store this; it means whether we are continuing an undo chain started before
 		UndoChainWaiting = False
+		if self.DatacoreProcess: # ask the datacore process to undo; the reply is handled in PostProcessUndo()
+			self.AwaitingUndoReply = True
+			vizop_misc.SendRequest(self.zmqOutwardSocket, Command='RQ_Undo', FetchReply=False,
+				**{info.ProjIDTag: self.CurrentProj.ID, 'ControlFrame': self.ID,
+				info.ChainWaitingTag: utilities.Bool2Str(ContinuePausedChain)})
+			return
 		ReturnArgs = undo.HandleUndoRequest(self.CurrentProj, SocketFromDatacoreName=self.SocketFromDatacoreName,
 			ContinuingPausedChain=ContinuePausedChain)
 		if not ReturnArgs['SkipRefresh']:
@@ -2447,65 +2468,100 @@ class ControlFrame(wx.Frame):
 	def OnRedoRequest(self, Event): # handle Redo request from user
 		# first, clear RedoChainWaiting flag possibly left over from last redo action
 		global RedoChainWaiting
+		if self.AwaitingUndoReply: return # the datacore process hasn't finished the last undo or redo yet
 		RedoChainWaiting = False
+		if self.DatacoreProcess: # ask the datacore process to redo; the reply is handled in PostProcessRedo()
+			self.AwaitingUndoReply = True
+			vizop_misc.SendRequest(self.zmqOutwardSocket, Command='RQ_Redo', FetchReply=False,
+				**{info.ProjIDTag: self.CurrentProj.ID, 'ControlFrame': self.ID})
+			return
 		ReturnArgs = undo.HandleRedoRequest(self.CurrentProj, RequestingControlFrameID=self.ID,
 			SocketFromDatacoreName=self.SocketFromDatacoreName)
 		if not ReturnArgs['SkipRefresh']: # update GUI
 			self.UpdateMenuStatus() # update menu status to show next un/redoable action
 			self.MyControlPanel.UpdateNavigationButtonStatus(Proj=self.CurrentProj)
 
+	def PostProcessUndo(self, XMLRoot=None):
+		# handle reply from the datacore process to RQ_Undo. Any changes to Viewports are notified separately
+		self.AwaitingUndoReply = False
+		return vizop_misc.MakeXMLMessage('Null', 'Null')
+
+	def PostProcessRedo(self, XMLRoot=None):
+		# handle reply from the datacore process to RQ_Redo, and note whether there is more of a redo chain to do
+		global RedoChainWaiting
+		self.AwaitingUndoReply = False
+		RedoChainWaiting = RedoChainWaiting or utilities.Bool2Str(XMLRoot.findtext(info.ChainWaitingTag, default='n'))
+		if not utilities.Bool2Str(XMLRoot.findtext(info.SkipRefreshTag, default='n')): # update GUI
+			self.UpdateMenuStatus() # update menu status to show next un/redoable action
+			self.MyControlPanel.UpdateNavigationButtonStatus(Proj=self.CurrentProj)
+		return vizop_misc.MakeXMLMessage('Null', 'Null')
+
 	def OnSaveEntireProjectRequest(self, Event=None):
 		# save entire project
 		# variables and methods for testing purpose
 		print('CF2403 saving project file')
 		test_OutputPath = '/Users/peter/Downloads/'
 		test_OutputFileName = 'VizopProject1.vip'
+		if self.DatacoreProcess: # the project is saved by the datacore process; see PostProcessSaveEntireProject()
+			vizop_misc.SendRequest(self.zmqOutwardSocket, Command='RQ_SaveEntireProject', FetchReply=False,
+				**{info.ProjIDTag: self.CurrentProj.ID, 'OutputFilename': test_OutputPath + test_OutputFileName})
+			return
 		projects.SaveEntireProject(Proj=self.CurrentProj, OutputFilename=test_OutputPath + test_OutputFileName, Close=True)
 
+	def PostProcessSaveEntireProject(self, XMLRoot=None):
+		# handle reply from the datacore process to RQ_SaveEntireProject
+		if not utilities.Bool2Str(XMLRoot.findtext('WriteOK', default='n')):
+			print('CF2429 datacore process could not save project: ', XMLRoot.findtext('ProblemReport', default=''))
+		return vizop_misc.MakeXMLMessage('Null', 'Null')
+
 	def OnClose(self, event):
 		# do cleanup tasks when Control frame is closed. Called when EVT_CLOSE is raised
 #		sm = settings.SettingsManager()
 #		sm.set_value('main_frame_layout', self.layout_manager.SavePerspective())
 #		# deinitialize the frame manager
 #		self.layout_manager.UnInit()
+		# let any saves still queued for writing finish, so that project files aren't left half written
+		for ThisProj in self.Projects:
+			ThisProj.SaveQueue.WaitUntilIdle()
+			projects.EndRecoverySession(ThisProj) # the project was closed cleanly, so it won't need recovery
+		# if the datacore is in another process, it does the same for its projects, then exits
+		if self.DatacoreProcess: self.DatacoreProcess.Stop()
+		datacore_worker.StopWorker()
 		# delete the frame, returns control to main program in module heart for cleaning up
 		self.Destroy()
 
-	def OnIdle(self, Event): # during idle time, handle keystrokes for shortcuts, and listen to sockets.
+	def OnCharHook(self, Event): # handle keystrokes for shortcuts registered in KeyPressHash.
 		# Part of this procedure is repeated in module startup_vizop
-		global KeyPressHash, UndoChainWaiting, RedoChainWaiting
-		# initialise storage object used to remember keys pressed last time, for chord detection in correct order
-		if not hasattr(self, 'PrevChordKeys'): self.PrevChordKeys = []
-		KeysDownThisTime = [] # prepare list of key codes that are 'hit' and match any keys in KeyPressHash
-		KeyPressIndexHit = None # which item (index in KeyPressHash) is to be invoked
-		if self.KeyPressEnabled: # are we detecting keypresses?
-			for (HashIndex, (KeyStroke, Handler, Args)) in enumerate(KeyPressHash): # check each keystroke registered in KeyPressHash
-				if type(KeyStroke) is int:
-					if wx.GetKeyState(KeyStroke):
-						KeysDownThisTime.append(KeyStroke)
-						if not (KeyStroke in self.PrevChordKeys):
-							KeyPressIndexHit = HashIndex # KeyStroke has been detected this time, but not last time
-				elif type(KeyStroke) is list: # key chord handling
-					ChordFulfilled = True
-					for k in KeyStroke: # check each key in KeyStroke
-						if wx.GetKeyState(k): KeysDownThisTime.append(k)
-						else: ChordFulfilled = False
-					# check that (1) all keys in KeyStroke are pressed, AND
-					# (2) not all of them were pressed last time (i.e. >=1 of them is newly pressed)
-					if ChordFulfilled and not set(KeyStroke).issubset(set(self.PrevChordKeys)):
-						KeyPressIndexHit = HashIndex # invoke handler if keystroke detected
-		self.PrevChordKeys = KeysDownThisTime # store currently-pressed keys for comparison next time
-		# Must do the line above BEFORE invoking Handler - else KeyStrokes newly defined in Handler may falsely activate
-		if (KeyPressIndexHit is not None):
-			(KeyStroke, Handler, Args) = KeyPressHash[KeyPressIndexHit]
-			# add current project to Args, if not already there; then remove it again afterwards, so that it gets refreshed next time
-			AddProjArg = ('Proj' not in Args)
-			if AddProjArg: Args['Proj'] = self.CurrentProj
-			Handler(**Args) # invoke handler
-			if AddProjArg: del Args['Proj']
-		# check for incoming messages
+		global KeyPressHash
+		HandlerAndArgs = vizop_misc.KeyPressHandlerForEvent(KeyPressHash, Event) if self.KeyPressEnabled else None
+		if HandlerAndArgs is None: # not a shortcut; let the key be handled normally
+			Event.Skip()
+			return
+		(Handler, Args) = HandlerAndArgs
+		# add current project to Args, if not already there; then remove it again afterwards, so that it gets refreshed next time
+		AddProjArg = ('Proj' not in Args)
+		if AddProjArg: Args['Proj'] = self.CurrentProj
+		Handler(**Args) # invoke handler
+		if AddProjArg: del Args['Proj']
+
+	def OnIdle(self, Event): # during idle time, listen to sockets and redraw Viewports waiting for update
+		global UndoChainWaiting, RedoChainWaiting
+		if message_stats.Enabled: StartTime = time.perf_counter()
+		# check for incoming messages. If any were handled, ask for another idle event straight away, so that any
+		# follow-on messages are handled without waiting for the next user event
 		MessageReceived = self.CheckForIncomingMessages()
-		if not MessageReceived: # don't do the following if a message was received; leave 1 cycle to let it get processed
+		# collect replies from the datacore worker process, if running, and restart it if it has died
+		if datacore_worker.TheSupervisor and datacore_worker.TheSupervisor.Service(): MessageReceived = True
+		# restart the datacore process, if the datacore is in another process and it has died
+		if self.DatacoreProcess and self.DatacoreProcess.HasDied(): self.RestartDatacore()
+		if MessageReceived: Event.RequestMore()
+		# redraw Viewports waiting for update, once the burst of messages (including any undo/redo chain) is over, or
+		# when the frame budget has elapsed. While any are waiting, keep idle events coming so they aren't left stale
+		self.DatacoreFlushViewportUpdates(Quiet=not (MessageReceived or UndoChainWaiting or RedoChainWaiting))
+		if self.ViewportUpdates: Event.RequestMore()
+		# don't do the following if a message was received (leave 1 cycle to let it get processed), or while the
+		# datacore process is busy with an undo or redo
+		if not (MessageReceived or self.AwaitingUndoReply):
 			# check if any undo/redo records are waiting
 			if UndoChainWaiting: self.OnUndoRequest(Event=None)
 			if RedoChainWaiting: self.OnRedoRequest(Event=None)
@@ -2514,6 +2570,7 @@ class ControlFrame(wx.Frame):
 #			if hasattr(Viewport, 'CheckTextCtrlFocus'): Viewport.CheckTextCtrlFocus()
 			display_utilities.CheckTextCtrlFocus(HostPanel=self.MyEditPanel)
 			display_utilities.CheckTextCtrlFocus(HostPanel=self.MyControlPanel)
+		if message_stats.Enabled: message_stats.Record('IdleTime', 'ControlFrame', time.perf_counter() - StartTime)
 
 	def ButtonBitmap(self, ImageName): # returns bitmap for button
 		# ImageName can be the filename stub of an icon file in the runtime icons folder, or wx.ART_something
@@ -2562,66 +2619,54 @@ class ControlFrame(wx.Frame):
 		else: Proj.ForwardHistory.append(NewMS)
 
 	def CheckForIncomingMessages(self):
-		# check datacore and control frame sockets for incoming messages, and send to appropriate processing routines
+		# check datacore and control frame sockets for incoming messages, and send to appropriate processing routines.
+		# All sockets are polled once per call; waiting messages are dispatched via the message pump's handler table
 		# return MessageReceived (bool); whether any message was received
-		MessageReceived = False
-		# 1. check sockets belonging to datacore: first, sockets bringing messages from control frames
-		# find incoming sockets from control frames
-		IncomingCFSocketObjs = [s for s in vizop_misc.RegisterSocket.Register
-			if s.SocketLabel.startswith(info.ControlFrameInSocketLabel)]
-		# check corresponding inward and outward sockets; Outward Socket is the socket whose label has the same suffix as Inward Socket
-		for ThisSocketObj in IncomingCFSocketObjs:
-			MessageReceived |= bool(vizop_misc.ListenToSocket(Socket=ThisSocketObj.Socket, Handler=self.DatacoreHandleRequestFromControlFrame))
-			MessageReceived |= bool(vizop_misc.ListenToSocket(Socket=[s.Socket for s in vizop_misc.RegisterSocket.Register
-				if s.SocketLabel == info.ControlFrameOutSocketLabel + '_' + ThisSocketObj.SocketLabel.split('_')[1]][0],
-				Handler=None, SendReply2=False))
-		# 2. check datacore sockets bringing messages from Viewports
-		IncomingViewportSocketObjs = [s for s in vizop_misc.RegisterSocket.Register
-			if s.BelongsToDatacore if s.Viewport is not None if 'REP' in s.SocketLabel]
-		# check which Viewports sent messages, and send the message to the corresponding PHA model object
-		ViewportMessageReceived = False
-		for ThisSocketObj in IncomingViewportSocketObjs:
-			# pass request to PHA model associated with the Viewport (we do this via datacore, not directly,
-			# so that local and remote Viewports are treated the same)
-#			if ThisSocketObj.Viewport.PHAObj: # proceed only if Viewport has been assigned to a PHA object
-			if True:
-				# pass any message to message handler for Viewport's PHA object, if any, else to the Viewport class itself
-				ViewportMessageReceivedThisTime = vizop_misc.ListenToSocket(Proj=self.CurrentProj,
-					Socket=ThisSocketObj.Socket,
-					Handler=ThisSocketObj.Viewport.PHAObj.HandleIncomingRequest if ThisSocketObj.Viewport.PHAObj \
-						else ThisSocketObj.Viewport.MyClass.HandleIncomingRequest)
-#				if ViewportMessageReceivedThisTime: print('CF1459 incoming viewport message received')
-				# if any message was received from this Viewport, store it for sending to UpdateAllViewports
-				if ViewportMessageReceivedThisTime:
-					ViewportMessageReceived = True
-					MessageToApply = ViewportMessageReceivedThisTime.decode("utf-8") # convert bytes to str
-				MessageReceived |= bool(vizop_misc.ListenToSocket(Socket=[s.Socket for s in vizop_misc.RegisterSocket.Register
-						if s.SocketLabel == info.ViewportOutSocketLabel + '_' + ThisSocketObj.SocketLabel.split('_')[1]][0],
-						Handler=None, SendReply2=False))
-		MessageReceived |= ViewportMessageReceived
-		# update applicable Viewports, if any messages were received
-		if ViewportMessageReceived:
-			# check MessageToApply doesn't begin with a command that doesn't need to refresh Viewports [3gd]
-			if not any(MessageToApply.startswith(m, 1) for m in ['RQ_PR_UpdateAssocTextFullViewAttribs']):
-				self.UpdateAllViewports(MessageAsStr=MessageToApply)
-		# 3. check sockets for any messages coming into the control frame, and process
-		MessageReceived |= bool(vizop_misc.ListenToSocket(Socket=self.zmqInwardSocket, Handler=self.HandleIncomingMessageToControlFrame))
-		MessageReceived |= bool(vizop_misc.ListenToSocket(Socket=self.zmqOutwardSocket, Handler=self.HandleIncomingReplyToControlFrame,
-			SendReply2=False))
-		# 4. likewise for control frame's current Viewport, if any
+		self.UpdateMessagePumpHandlers()
+		# if messages were handled last time, wait briefly for follow-on messages, such as replies to messages sent by
+		# the handlers; otherwise, don't wait at all
+		MessagesHandled = self.MessagePump.Pump(Timeout=info.MessagePumpFollowOnTimeout if self.MessagePumpBusy else 0)
+		self.MessagePumpBusy = bool(MessagesHandled)
+		# update applicable Viewports, if any messages were received from Viewports
+		self.DatacoreUpdateViewportsAfterMessages(MessagesHandled)
+		return bool(MessagesHandled)
+
+	def UpdateMessagePumpHandlers(self):
+		# rebuild the message pump's table of socket handlers, if sockets have been added to the register or the current
+		# Viewport has changed since it was last built. Handlers are set in order of priority
+		# The handlers are found via the socket register's indexes, so the time taken doesn't depend on the number of
+		# sockets in the register
+		Register = vizop_misc.SocketRegister
+		Signature = (Register.ChangeCount, self.CurrentViewport)
+		if Signature == self.MessagePumpSignature: return
+		self.MessagePumpSignature = Signature
+		Pump = self.MessagePump
+		Pump.ClearHandlers()
+		# 1-3. sockets belonging to datacore, if any (see datacore_process.DatacoreDispatcher)
+		self.SetDatacorePumpHandlers(Pump)
+		# 4. sockets bringing messages into the control frame
+		Pump.SetHandler(self.zmqInwardSocket, Handler=self.HandleIncomingMessageToControlFrame)
+		Pump.SetHandler(self.zmqOutwardSocket, Handler=self.HandleIncomingReplyToControlFrame, SendReply2=False)
+		# 5. likewise for control frame's current Viewport, if any
 		if self.CurrentViewport:
-			MessageReceived |= bool(vizop_misc.ListenToSocket(Socket=self.CurrentViewport.C2DSocketREQ,
-				Handler=self.HandleMessageToLocalViewport, SendReply2=False, OriginCode=11))
-			# check messages from datacore's Viewport shadow to our local Viewports
-			MessageReceived |= bool(vizop_misc.ListenToSocket(Socket=self.CurrentViewport.D2CSocketREP,
-				Handler=self.HandleMessageToLocalViewport, SendReply2=True, OriginCode=12))
+			Pump.SetHandler(self.CurrentViewport.C2DSocketREQ, Handler=self.HandleMessageToLocalViewport,
+				SendReply2=False, OriginCode=11)
+			# messages from datacore's Viewport shadow to our local Viewports
+			Pump.SetHandler(self.CurrentViewport.D2CSocketREP, Handler=self.HandleMessageToLocalViewport,
+				SendReply2=True, OriginCode=12)
 		# TODO should we discard incoming REQ messages to other Viewports that aren't currently on display?
-		return MessageReceived
+		# 6. redraw data published for the PHA object shown in the current Viewport, if Viewports are updated by broadcast
+		if info.BroadcastViewportUpdates:
+			Subscriber = vizop_misc.ChangeBroadcastEnd(BelongsToDatacore=False)
+			Subscriber.SubscribeOnly([self.CurrentViewport.PHAObjID] if getattr(self.CurrentViewport, 'PHAObjID', None)
+				else [])
+			Pump.SetHandler(Subscriber, Handler=self.HandleChangeBroadcast, SendReply2=False)
 
 	def HandleIncomingMessageToControlFrame(self, MessageReceived=''):
 		# handle incoming messages from datacore to control frame. Called from ListenToSockets() in module vizop_misc
 		# parse incoming message to XML tree
-		XMLRoot = ElementTree.fromstring(MessageReceived)
+		XMLRoot = vizop_misc.DecodeMessage(MessageReceived)
+		self.TrackDatacoreStatus(XMLRoot)
 		# handlers for all possible notifications to Control Frame. Handler must send a reply
 		# NO_ShowViewport not currently used
 		Handler = {
@@ -2631,7 +2676,8 @@ class ControlFrame(wx.Frame):
 			'NO_NewViewport_Redo': self.PostProcessNewViewport_Redo,
 			'NO_FT_ChangeText_Undo': self.UpdateAllViewportsAfterUndo,
 			info.NO_ShowViewport: self.ProcessSwitchToViewport,
-			info.NO_RedrawAfterUndo: self.UpdateAllViewports
+			info.NO_RedrawAfterUndo: self.PassRedrawAfterUndoToDatacore if self.DatacoreProcess \
+				else self.UpdateAllViewports
 			}[XMLRoot.tag.strip()]
 #		if XMLRoot.tag.strip() == info.NO_ShowViewport:
 #			print('CF2301 handling message with XMLRoot: ', ElementTree.tostring(XMLRoot))
@@ -2643,38 +2689,44 @@ class ControlFrame(wx.Frame):
 	def HandleIncomingReplyToControlFrame(self, MessageReceived='', **Args):
 		# handle incoming reply messages from datacore to control frame. Called from ListenToSockets() in module vizop_misc
 		# parse incoming message to XML tree
-		XMLRoot = ElementTree.fromstring(MessageReceived)
+		XMLRoot = vizop_misc.DecodeMessage(MessageReceived)
+		self.TrackDatacoreStatus(XMLRoot)
+		# if it's the reply to a request sent with vizop_misc.SendRequestAsync(), pass it to the request's future
+		if vizop_misc.ResolveReply(XMLRoot): return vizop_misc.MakeXMLMessage('Null', 'Null')
 		# handlers for all possible replies to Control Frame
 		Handler = {'RP_NewViewport': self.PostProcessNewViewport,
 			'RP_SwitchToViewport': self.PostProcessSwitchToViewport,
 			'RP_NewPHAModel': self.PostProcessNewPHAModel,
 			'RP_StopDisplayingViewport': self.PostProcessNoActionRequired,
-			'RP_SetViewportAsNotInUse': self.PostProcessNoActionRequired
+			'RP_SetViewportAsNotInUse': self.PostProcessNoActionRequired,
+			'RP_RedrawViewportInFull': self.PostProcessNoActionRequired,
+			'RP_Undo': self.PostProcessUndo,
+			'RP_Redo': self.PostProcessRedo,
+			'RP_SaveEntireProject': self.PostProcessSaveEntireProject
 			}[XMLRoot.tag.strip()]
 		# call handler, and return its reply
 		Reply = Handler(XMLRoot)
 		assert Reply is not None, Handler.__name__
 		return Reply
 
-	def DatacoreHandleRequestFromControlFrame(self, MessageReceived, **Args):
-		# process a message from Control Frame to Datacore, e.g. to create a new Viewport
-		# MessageReceived (bytes): XML message from control frame
-		assert isinstance(MessageReceived, bytes)
-		ParsedMsgRoot = ElementTree.XML(MessageReceived)
-		# get project ID from message received
-		ProjIDTagInXML = ParsedMsgRoot.find(info.ProjIDTag)
-		# find the project with the ID provided
-		Proj = self.Projects[ [p.ID for p in self.Projects].index(ProjIDTagInXML.text) ]
-		# handlers for all possible requests from Control Frame. Handlers must return an XML reply message
-		Handler = {'RQ_NewViewport': projects.DatacoreDoNewViewport,
-			'RQ_SwitchToViewport': self.DatacoreSwitchToViewport,
-			'RQ_NewFTEventNotIPL': self.DatacoreDoNewFTEventNotIPL,
-			'RQ_NewPHAObject': DatacoreDoNewPHAObj,
-			'RQ_StopDisplayingViewport': DatacoreStopDisplayingViewport}[
-			ParsedMsgRoot.tag.strip()]
-		# call handler and collect reply XML tree to send back to Control Frame
-		ReplyXML = Handler(Proj=Proj, XMLRoot=ParsedMsgRoot)
-		return ReplyXML
+	def PassRedrawAfterUndoToDatacore(self, XMLRoot=None):
+		# handle NO_RedrawAfterUndo when the datacore is in another process. The Viewports are redrawn by the datacore,
+		# so the notification is sent back to it in the reply, as a request (see
+		# datacore_process.DatacoreDispatcher.DatacoreHandleReplyFromControlFrame())
+		XMLRoot.tag = info.RQ_RedrawAfterUndo
+		return XMLRoot
+
+	def TrackDatacoreStatus(self, XMLRoot):
+		# if the datacore is in another process, note the project status stamped on XMLRoot (XML root element of a
+		# message from the datacore; see datacore_process.DatacoreDispatcher.DatacoreStampStatus()): the texts of the
+		# next actions to undo and redo, shown in the menus, and the highest ID issued. Our copy of the project is kept
+		# from issuing IDs below that, so that objects it makes (such as Viewports) don't clash with the datacore's
+		ThisProjID = XMLRoot.get(info.ProjIDTag)
+		if (not self.DatacoreProcess) or (ThisProjID is None): return
+		self.DatacoreStatus[ThisProjID] = dict([(k, v) for (k, v) in XMLRoot.attrib.items()
+			if k in (info.UndoTextAttribName, info.RedoTextAttribName)])
+		ThisProj = utilities.ObjectWithID(self.Projects, ThisProjID)
+		ThisProj.MaxIDInProj = max(ThisProj.MaxIDInProj, int(XMLRoot.get(info.MaxIDAttribName, '0')))
 
 	def DoNewViewportCommand(self, Proj, Redoing=False, ViewportArgs={}, **Args):
 		# handle request for new Viewport in project Proj
@@ -2760,11 +2812,15 @@ class ControlFrame(wx.Frame):
 		NewPHAObjType = core_classes.PHAModelMetaClass.PHAModelClasses[
 			[c.InternalName for c in core_classes.PHAModelMetaClass.PHAModelClasses].index(
 				XMLRoot.find(info.PHAModelTypeTag).text)]
+		# if the datacore is in another process, make a matching PHA object in our copy of the project, for the
+		# Viewport to refer to
+		NewPHAObjID = utilities.TextAsString(XMLRoot.find(info.PHAModelIDTag))
+		if self.DatacoreProcess and (NewPHAObjID not in [p.ID for p in Proj.PHAObjShadows]):
+			Proj.CreatePHAObj(PHAModelClass=NewPHAObjType, ID=NewPHAObjID)
 		# make initial Viewport for the PHA model
 		ViewportType = NewPHAObjType.DefaultViewportType
 		self.DoNewViewportCommand(Proj, ViewportClass=ViewportType, Chain=True,
-			PHAModel=utilities.ObjectWithID(Proj.PHAObjShadows,
-			TargetID=utilities.TextAsString(XMLRoot.find(info.PHAModelIDTag))))
+			PHAModel=utilities.ObjectWithID(Proj.PHAObjShadows, TargetID=NewPHAObjID))
 		return vizop_misc.MakeXMLMessage('Null', 'Null')
 
 	def PostProcessNewPHAModel_Undo(self, XMLRoot=None):
@@ -2813,7 +2869,7 @@ class ControlFrame(wx.Frame):
 		# Possible Args:
 		#	ViewportInRedoRecord (Viewport instance) if Redoing
 		assert isinstance(Proj, projects.ProjectItem)
-		assert isinstance(PHAObj, core_classes.PHAModelBaseClass) or (PHAObj is None)
+		assert projects.IsPHAObj(PHAObj) or (PHAObj is None)
 		assert isinstance(Viewport, display_utilities.ViewportBaseClass)
 		assert isinstance(Redoing, bool)
 		assert isinstance(Chain, bool)
@@ -2836,6 +2892,9 @@ class ControlFrame(wx.Frame):
 			vizop_misc.SendRequest(self.zmqOutwardSocket, Command=RequestToDatacore, **TargetViewportAttribs)
 		# if destroying old Viewport, get its persistent attribs for storage in datacore's Viewport archive
 		else:
+			# destroy the old Viewport once it's released from display (in ReleaseCurrentViewport()), or now if not shown
+			if ViewportToDestroy is self.CurrentViewport: self.DoomedViewport = ViewportToDestroy
+			else: self.DestroyClientViewport(Proj, ViewportToDestroy)
 			TargetViewportAttribs.update({info.DoomedViewportIDTag: ViewportToDestroy.ID})
 			PersistentAttribs = getattr(ViewportToDestroy, 'PersistentAttribs', [])
 			if PersistentAttribs:
@@ -2864,7 +2923,7 @@ class ControlFrame(wx.Frame):
 		if not Redoing:
 			VTMessage = getattr(PHAObj, 'HumanName', '') + '\n\n' + _('Use back button to go back') if KeepingOldViewport \
 				else getattr(PHAObj, 'HumanName', '')
-			VTTitle = '' if PHAObj is None else _('Now showing %s:') % type(PHAObj).HumanName
+			VTTitle = '' if PHAObj is None else _('Now showing %s:') % projects.PHAModelClassOf(PHAObj).HumanName
 			self.MyVTPanel.SubmitVizopTalksMessage(Title=VTTitle, MainText=VTMessage, Priority=ConfirmationPriority)
 		return vizop_misc.MakeXMLMessage('Null', 'Null')
 
@@ -2990,8 +3049,15 @@ class ControlFrame(wx.Frame):
 			# tell datacore the Viewport is no longer on display
 			ReplyReceived = vizop_misc.SendRequest(self.zmqOutwardSocket, Command='RQ_StopDisplayingViewport',
 				FetchReply=False, **AttribDict)
+			if self.CurrentViewport is self.DoomedViewport: self.DestroyClientViewport(Proj, self.CurrentViewport)
 			self.CurrentViewport = None
 
+	def DestroyClientViewport(self, Proj, Viewport):
+		# remove Viewport (actual Viewport, not a shadow) from Proj, and close its sockets. Client side method
+		if Viewport in Proj.ClientViewports: Proj.ClientViewports.remove(Viewport)
+		vizop_misc.SocketRegister.UnregisterViewport(Viewport)
+		if self.DoomedViewport is Viewport: self.DoomedViewport = None
+
 	def SwitchToViewport(self, TargetViewport=None, XMLRoot=None, debug=0):
 		# Client side method
 		# switch edit panel display (in local ControlFrame) to show TargetViewport
@@ -3010,8 +3076,10 @@ class ControlFrame(wx.Frame):
 #		if ViewportToShow not in Proj.ClientViewports: Proj.ClientViewports.append(ViewportToShow)
 		# set Viewport as current in Control Frame
 		self.CurrentViewport = ViewportToShow
-		# set current display device in Viewport
+		# set current display device in Viewport. If the Viewport has been shown before, any bitmaps kept from then
+		# may not match the display device or the data now, so they are discarded
 		ViewportToShow.DisplDevice = self.MyEditPanel
+		ViewportToShow.ResetComposition()
 #		# store Viewport as shown in edit panel
 #		if not (self.CurrentViewport in self.MyEditPanel.AllViewportsShown):
 #			self.MyEditPanel.AllViewportsShown.append(self.CurrentViewport)
@@ -3176,87 +3244,6 @@ class ControlFrame(wx.Frame):
 # 		# send the info back to control frame as a reply message (via ListenToSocket)
 # 		return Reply
 
-	def DatacoreSetViewportAsNotInUse(self, XMLRoot=None):
-		# set a Viewport shadow as not in use, i.e. not visible and not attached to any PHA object
-		# find the Viewport shadow to set
-		DoomedViewportID = XMLRoot.find(info.DoomedViewportIDTag).text
-		ThisProj = utilities.ObjectWithID(self.Projects, XMLRoot.find(info.ProjIDTag).text)
-		# find out which PHA object contains the doomed Viewport (or it might be in ThisProj.ViewportsWithoutPHAObjs)
-		ViewportListsToCheck = [p.Viewports for p in ThisProj.PHAObjs] + [ThisProj.ViewportsWithoutPHAObjs]
-		# find which Viewport list contains the Viewport with ID = DoomedViewportID
-		HostViewportList = ViewportListsToCheck[[DoomedViewportID in [v.ID for v in ThisList] \
-			for ThisList in ViewportListsToCheck].index(True)]
-		DoomedViewport = utilities.ObjectWithID(HostViewportList, DoomedViewportID)
-		DoomedViewport.IsOnDisplay = False # mark it as no longer visible
-		# remove the Viewport from its PHA object
-		HostViewportList.remove(DoomedViewport)
-#		# remove the Viewport from the project's master list, and store it in the Archived list in case it is re-created
-#		ThisProj.AllViewportShadows.remove(DoomedViewport)
-		# find any persistent attribs supplied in XMLRoot, and store them in DoomedViewport
-		PersistentAttribsTag = XMLRoot.find(info.PersistentAttribsTag)
-		if PersistentAttribsTag is None:
-			PersistentAttribs = {}
-		else:
-			PersistentAttribs = dict([(ThisPATag.tag, ThisPATag.text) for ThisPATag in PersistentAttribsTag])
-		DoomedViewport.PersistentAttribs = PersistentAttribs
-#		EjectedViewportShadow, ArchiveIndex = display_utilities.ArchiveDestroyedViewport(Proj=ThisProj,
-#			ViewportShadow=DoomedViewport, PersistentAttribs=PersistentAttribs)
-		Reply = vizop_misc.MakeXMLMessage(RootName='RP_SetViewportAsNotInUse', RootText=DoomedViewportID, Elements={})
-		return Reply
-
-	def DatacoreSwitchToViewport(self, XMLRoot=None, Proj=None, ViewportClass=None, ViewportID=None, HumanName='',
-			PHAObj=None, Chain='NoChain', MilestoneID=None):
-		# datacore function to handle request to switch to an existing Viewport from any Control Frame (local or remote)
-		# It assumes a Viewport shadow, i.e. an object that allows the datacore to know that a Viewport exists in
-		# one of the Control Frames (local or remote), already exists for this Viewport.
-		# Input data is supplied in XMLRoot, an XML ElementTree root element, or as separate attribs
-		# including Chain (str: 'NoChain' or 'Stepwise'): whether this call is chained from another event, e.g. new PHA model
-		# MilestoneID (str or None): if the Viewport should apply display attribs from a milestone, this is its ID
-		# return reply data (XML tree) to send back to respective Control Frame
-		# This function might be better placed outside Control Frame class, but currently we can't because it needs
-		# access to ControlFrame's self.Projects
-		# First, get the attribs needed to find the Viewport in the datacore
-		if XMLRoot is None: # this branch is not currently used
-			ThisProj = Proj
-			TargetViewportClass = ViewportClass
-			TargetViewportID = ViewportID
-			TargetViewportHumanName = HumanName
-			ExistingPHAObj = PHAObj
-		else:
-			ThisProj = utilities.ObjectWithID(self.Projects, XMLRoot.find(info.ProjIDTag).text)
-			ClassList = display_utilities.ViewportMetaClass.ViewportClasses # list of all user-requestable Viewport classes
-			TargetViewportID = XMLRoot.find(info.ViewportTag).text
-			ExistingPHAObjIDRequested = XMLRoot.find(info.PHAModelIDTag)
-			ExistingPHAObj = None if ExistingPHAObjIDRequested is None \
-				else utilities.ObjectWithID(ThisProj.PHAObjs, TargetID=ExistingPHAObjIDRequested.text)
-#		# Check if target Viewport is in the current lineup of Viewport shadows
-#		if TargetViewportID in [v.ID for v in ThisProj.AllViewportShadows]:
-		# set target Viewport as on display
-		TargetViewport = utilities.ObjectWithID(ThisProj.AllViewportShadows, TargetID=TargetViewportID)
-		TargetViewport.IsOnDisplay = True
-#		else: # it isn't in the current lineup; so it must be in the archived Viewports list, retrieve from there
-#			ViewportArgs = {'ViewportToRevertTo': self.CurrentViewport, 'OriginatingViewport': self.CurrentViewport}
-#			ArchivedViewportShadow = utilities.ObjectWithID(ThisProj.ArchivedViewportShadows, TargetID=TargetViewportID)
-#			# fetch persistent attribs from ArchivedViewportShadow (stored in ArchiveDestroyedViewport())
-#			#  and feed them to the new Viewport
-#			ViewportArgs.update(getattr(ArchivedViewportShadow, 'PersistentAttribs', {}))
-#			self.DoNewViewportCommand(Proj=ThisProj, ViewportClass=ArchivedViewportShadow.MyClass,
-#				Chain=True, PHAModel=ExistingPHAObj, ViewportArgs=ViewportArgs)
-#			# no need to set Viewport.IsOnDisplay here, as it is set in DatacoreDoNewViewport()
-#			# Next line is an ugly workaround. We need(?) to pass a Viewport shadow to MakeXMLMessageForDrawViewport(),
-#			# and this is the only one we have at this point, as the newly re-created Viewport shadow may not exist yet.
-#			# FIXME: see if we can remove the Viewport arg from the call to MakeXMLMessageForDrawViewport() - may not be used
-#			TargetViewport = ArchivedViewportShadow
-		# make reply message to send to control frame
-		Reply = projects.MakeXMLMessageForDrawViewport(Proj=ThisProj, MessageHead='RP_SwitchToViewport',
-			PHAObj=ExistingPHAObj,
-			Viewport=TargetViewport, ViewportID=TargetViewportID, MilestoneID=MilestoneID)
-		# check whether we should switch off an old Viewport, and switch it off if required
-		if XMLRoot.find(info.DoomedViewportIDTag) is not None:
-			self.DatacoreSetViewportAsNotInUse(XMLRoot=XMLRoot)
-		# send the info back to control frame as a reply message (via ListenToSocket)
-		return Reply
-
 	def UpdateAllViewportsAfterUndo(self, XMLRoot=None):
 		# handle request to update all Viewports after undo of a data change. Currently not used?
 		global UndoChainWaiting
@@ -3279,28 +3266,6 @@ class ControlFrame(wx.Frame):
 			TargetID=XMLRoot.findtext(info.ViewportTag)), XMLRoot=XMLRoot, debug=2869)
 		return vizop_misc.MakeXMLMessage('Null', 'Null')
 
-	def DatacoreDoNewFTEventNotIPL(self, Root): # handle request to datacore for new FT event that's not an IPL
-		# probably not currently used; redundant?
-		# find out which project to work in
-		ThisProj = utilities.ObjectWithID(OpenProjects, Root.find('Proj').text)
-		if ThisProj.EditAllowed:
-			# find out which PHA model to work in
-			ThisPHAObj = utilities.ObjectWithID(ThisProj.PHAObjs, Root.find('PHAObj').text)
-			# find applicable PHA object
-			ThisPHAObj = WithID(Root.find('PHAObj').text)
-			# ask PHA object to add new event
-			Reply = ThisPHAObj.HandleIncomingRequest(self, Proj=self.CurrentProj, MessageAsXMLTree=Root)
-		else: # couldn't make new event because editing is blocked
-			Reply = vizop_misc.MakeXMLMessage(RootName='RP_NewFTEventNotIPL', RootText="Null",
-				Elements={'CantComply': 'EditingBlocked'})
-		# send the info back to control frame as a reply message (via ListenToSockets)
-		return Reply
-
-		# send reply for routing back to control frame
-		Reply = vizop_misc.MakeXMLMessage(RootName='RP_NewFTEventNotIPL', RootText=NewViewportID,
-			Elements={info.IDTag: ThisPHAObj.ID})
-		return Reply
-
 	def HandleMessageToLocalViewport(self, MessageReceived=None, MessageAsXMLTree=None, **Args):
 		# Client side method
 		# process message received on socket requiring attention by local Viewport
@@ -3310,23 +3275,54 @@ class ControlFrame(wx.Frame):
 			XMLTreeToSend = MessageAsXMLTree
 		else:
 			assert isinstance(MessageReceived, bytes)
-			XMLTreeToSend = ElementTree.fromstring(MessageReceived)
+			XMLTreeToSend = vizop_misc.DecodeMessage(MessageReceived)
+		self.TrackDatacoreStatus(XMLTreeToSend)
+		# if it's the reply to a request sent with vizop_misc.SendRequestAsync(), pass it to the request's future
+		if vizop_misc.ResolveReply(XMLTreeToSend): return vizop_misc.MakeXMLMessage(RootName='OK', RootText='OK')
 		# get message root
 		MessageRoot = XMLTreeToSend.tag
 		# if message is 'OK', it's just an acknowledgement with no action required
 		if MessageRoot == 'OK':
+			self.ShowRequestOutcome(ReplyXML=XMLTreeToSend)
+			return vizop_misc.MakeXMLMessage(RootName='OK', RootText='OK')
+		else:
+			# draw complete Viewport (this branch handles message RQ_RedrawViewport)
+			# pass the tree already decoded, rather than MessageReceived, so that it isn't decoded again
+			ReplyXML = self.ShowViewport(MessageReceived=None, MessageAsXMLTree=XMLTreeToSend, **Args)
+			self.RefreshGUIAfterDataChange(Proj=self.CurrentProj)
+			return ReplyXML
+
+	def ShowRequestOutcome(self, ReplyXML):
+		# Client side method
+		# show the user the outcome of a Viewport's request to datacore, from ReplyXML (XML root element of the reply).
+		# Also used as the callback for requests sent by Viewports with vizop_misc.SendRequestAsync()
+		if ReplyXML.tag == 'OK':
 			# check whether the incoming message includes information requiring a VizopTalks message
-			if XMLTreeToSend.text == info.ValueOutOfRangeMsg:
+			if ReplyXML.text == info.ValueOutOfRangeMsg:
 				self.MyVTPanel.SubmitVizopTalksMessage(Title=_('Sorry'), MainText=_('That value is out of range'),
 					Buttons=[], Priority=InstructionPriority)
 			else: # clear any existing VizopTalks message
 				self.MyVTPanel.FinishedWithCurrentMessage()
-			return vizop_misc.MakeXMLMessage(RootName='OK', RootText='OK')
-		else:
-			# draw complete Viewport (this branch handles message RQ_RedrawViewport)
-			ReplyXML = self.ShowViewport(MessageReceived=MessageReceived, MessageAsXMLTree=XMLTreeToSend, **Args)
+		elif ReplyXML.tag == 'Problem': # the request couldn't be fully carried out; text of ReplyXML says why
+			self.MyVTPanel.SubmitVizopTalksMessage(Title=_('Sorry'), MainText=ReplyXML.text or '', Buttons=[],
+				Priority=WarningPriority)
+		elif ReplyXML.tag == 'Fail': print('CF3412 request from Viewport failed: ', ReplyXML.text)
+
+	def HandleChangeBroadcast(self, MessageReceived=None, **Args):
+		# Client side method
+		# handle redraw data published on the change broadcast channel for the PHA object shown in the current Viewport.
+		# The data is applied only if it's meant for the current Viewport. If the Viewport couldn't apply it (e.g. it
+		# missed an earlier message), ask datacore for full redraw data. Return a 'Null' XML element; no reply is sent
+		XMLRoot = vizop_misc.DecodeMessage(MessageReceived)
+		self.TrackDatacoreStatus(XMLRoot)
+		if self.CurrentViewport and \
+				(self.CurrentViewport.ID in XMLRoot.findtext(info.ViewportIDsTag, default='').split(',')):
+			self.ShowViewport(MessageReceived=None, MessageAsXMLTree=XMLRoot)
 			self.RefreshGUIAfterDataChange(Proj=self.CurrentProj)
-			return ReplyXML
+			if getattr(self.CurrentViewport, 'FullRedrawNeeded', False):
+				vizop_misc.SendRequest(self.zmqOutwardSocket, Command='RQ_RedrawViewportInFull', FetchReply=False,
+					**{info.ProjIDTag: self.CurrentProj.ID, info.ViewportTag: self.CurrentViewport.ID})
+		return vizop_misc.MakeXMLMessage('Null', 'Null')
 
 	def RefreshGUIAfterDataChange(self, Proj):
 		# perform specific refreshes (e.g. control panel, control frame menus) after a change to the data on display
@@ -3344,12 +3340,19 @@ class ControlFrame(wx.Frame):
 			XMLTree = MessageAsXMLTree
 		else:
 			assert isinstance(MessageReceived, bytes)
-			XMLTree = ElementTree.fromstring(MessageReceived)
+			XMLTree = vizop_misc.DecodeMessage(MessageReceived)
 		# First, tell Viewport to prepare for display, with data from PHA model
+		if message_stats.Enabled: StartTime = time.perf_counter()
 		self.CurrentViewport.PrepareFullDisplay(XMLTree)
+		if message_stats.Enabled:
+			message_stats.Record('RenderTime', type(self.CurrentViewport).InternalName, time.perf_counter() - StartTime)
 		self.MyEditPanel.EditPanelMode(self.CurrentViewport, NewMode=self.CurrentViewport.InitialEditPanelMode)
 			# set up initial mouse pointer and mouse bindings
 		self.Refresh() # trigger OnPaint() so that the panel rendering is refreshed
+		# if the Viewport got delta redraw data that it couldn't apply, ask datacore for full redraw data
+		if getattr(self.CurrentViewport, 'FullRedrawNeeded', False):
+			return vizop_misc.MakeXMLMessage(RootName='RP_ShowViewport', RootText='Null',
+				Elements={info.FullRedrawNeededTag: utilities.Bool2Str(True)})
 		return vizop_misc.MakeXMLMessage(RootName='RP_ShowViewport', RootText='Null')
 
 	def CloseViewportAndGotoViewport(self, Proj=None,
@@ -3418,6 +3421,9 @@ class ControlFrame(wx.Frame):
 			Chain=True, PHAModel=self.CurrentViewport.PHAObj, ViewportArgs={'ViewportToRevertTo': self.CurrentViewport,
 			'OriginatingViewport': self.CurrentViewport})
 
+	def OnMessageStatsRequest(self, Event): # handle menu request to show message latency and throughput statistics
+		MessageStatsDialogue(self).ShowModal()
+
 	def OnShowAssociatedTextsRequest(self, Event, ATKind):
 		# handle request to show all action items or parking lot items in the project
 		assert ATKind in (info.ActionItemLabel, info.ParkingLotItemLabel)
@@ -3469,7 +3475,7 @@ class ControlFrame(wx.Frame):
 	def DoNewComment(self, Proj, PHAObj, Viewport, PHAElement, Component, NewCommentText, Redoing=False):
 		# handle new comment creation in a Component of a PHAElement that supports comments
 		assert isinstance(Proj, projects.ProjectItem)
-		assert isinstance(PHAObj, core_classes.PHAModelBaseClass)
+		assert projects.IsPHAObj(PHAObj)
 		assert isinstance(NewCommentText, str)
 		assert isinstance(Redoing, bool)
 		# request Viewport to update the PHAObj with the new comment
@@ -3478,7 +3484,7 @@ class ControlFrame(wx.Frame):
 	def DoChangeComment(self, Proj, PHAObj, Viewport, PHAElement, Component, CommentIndex, NewCommentText, Redoing=False):
 		# handle change of existing comment in a Component of a PHAElement that supports comments
 		assert isinstance(Proj, projects.ProjectItem)
-		assert isinstance(PHAObj, core_classes.PHAModelBaseClass)
+		assert projects.IsPHAObj(PHAObj)
 		assert isinstance(CommentIndex, int)
 		assert isinstance(NewCommentText, str)
 		assert isinstance(Redoing, bool)
@@ -3489,7 +3495,7 @@ class ControlFrame(wx.Frame):
 	def DoDeleteComment(self, Proj, PHAObj, Viewport, PHAElement, Component, DoomedCommentIndex, Redoing=False):
 		# handle comment deletion in a Component of a PHAElement that supports comments
 		assert isinstance(Proj, projects.ProjectItem)
-		assert isinstance(PHAObj, core_classes.PHAModelBaseClass)
+		assert projects.IsPHAObj(PHAObj)
 		assert isinstance(DoomedCommentIndex, int)
 		assert isinstance(Redoing, bool)
 		# request Viewport to update the PHAObj with the new comment
@@ -3510,7 +3516,7 @@ class ControlFrame(wx.Frame):
 			AssociatedTextContent, AssociatedTextKind, Redoing=False):
 		# handle change of existing associated text (action item/parking lot item) in a Component of a PHAElement
 		assert isinstance(Proj, projects.ProjectItem)
-		assert isinstance(PHAObj, core_classes.PHAModelBaseClass)
+		assert projects.IsPHAObj(PHAObj)
 		assert isinstance(AssociatedTextIndex, int)
 		assert isinstance(AssociatedTextContent, str)
 		assert AssociatedTextKind in (info.ActionItemLabel, info.ParkingLotItemLabel)
@@ -3533,16 +3539,20 @@ class ControlFrame(wx.Frame):
 
 	# ControlFrame main body
 	def __init__(self, parent=None, ID=None, title='', Projects=[], FirstProject=None, Viewport=None,
-				 ColScheme=None, zmqContext=None, DatacoreIsLocal=True):
+				 ColScheme=None, zmqContext=None, DatacoreIsLocal=True, DatacoreProcess=None):
 		# ID (str): ID of this control frame (for datacore's addressing purposes; not the wx ID of the window)
 		# FirstProject (ProjectItem instance): the project (among those listed in Projects) that should be focused first
 		# zmqContext: context for communications sockets (not used)
 		# DatacoreIsLocal (bool): whether this control frame instance is running in the same Vizop instance as the datacore
+		# DatacoreProcess (DatacoreProcess instance or None): if the datacore is in a local datacore process (see module
+		#	datacore_process), its handle; Projects are then copies of the projects open there, used for display
 		assert isinstance(ID, str)
 		assert isinstance(FirstProject, projects.ProjectItem)
 		assert FirstProject in Projects
 		assert isinstance(ColScheme, display_utilities.ColourSchemeItem)
 		assert isinstance(DatacoreIsLocal, bool)
+		assert (DatacoreProcess is None) or isinstance(DatacoreProcess, datacore_process.DatacoreProcess)
+		assert not (DatacoreIsLocal and DatacoreProcess)
 		global KeyPressHash, ControlFrameData, AllControlFrameShadows, NormalWidgetFont, BoldWidgetFont
 		sm = settings.SettingsManager()
 		self.MyArtProvider = art.ArtProvider() # system for providing button images
@@ -3551,7 +3561,11 @@ class ControlFrame(wx.Frame):
 		self.ID = ID
 		self.KeyPressEnabled = True # whether we are detecting keypresses for shortcuts
 		self.DatacoreIsLocal = DatacoreIsLocal
-		self.EditAllowed = DatacoreIsLocal
+		self.DatacoreProcess = DatacoreProcess
+		self.EditAllowed = DatacoreIsLocal or (DatacoreProcess is not None)
+		self.DatacoreStatus = {} # if DatacoreProcess, keys are project IDs, values are dicts of the undo and redo texts
+			# last stamped on messages from the datacore process; see TrackDatacoreStatus()
+		self.AwaitingUndoReply = False # whether an undo or redo request to the datacore process is awaiting reply
 		self.Projects = Projects
 		self.DisplayDevices = [] # wx.Panel instances; devices that can show Viewports
 		self.TryHandshake = False # flag to OnIdle to try handshake with remote datacore
@@ -3585,9 +3599,12 @@ class ControlFrame(wx.Frame):
 			self.Viewports = []
 			self.CurrentViewport = None
 		self.TrialViewport = None # used during creation of Viewports
+		self.DoomedViewport = None # Viewport to destroy when it is next released from the edit panel
 		KeyPressHash = vizop_misc.ClearKeyPressRegister(KeyPressHash)
 		# set up sockets for communication with datacore (no matter whether datacore is local or remote)
-		F2CREPSocket, C2FREQSocket = self.SetupSockets(vizop_misc.RegisterSocket.Register)
+		F2CREPSocket, C2FREQSocket = self.SetupSockets(vizop_misc.SocketRegister, DatacoreIsLocal=DatacoreIsLocal,
+			F2CSocketNumber=DatacoreProcess.Connection['F2CSocketNo'] if DatacoreProcess else None,
+			C2FSocketNumber=DatacoreProcess.Connection['C2FSocketNo'] if DatacoreProcess else None)
 		# if datacore is local (i.e. on the same machine as control frame), register this control frame with the datacore
 		# (for remote control frames, the datacore has to do this by itself)
 		if DatacoreIsLocal:
@@ -3597,7 +3614,11 @@ class ControlFrame(wx.Frame):
 			AllControlFrameShadows.append(ThisControlFrameShadow)
 			# get name of datacore socket to send messages to this control frame
 			self.SocketFromDatacoreName = info.ControlFrameOutSocketLabel + info.LocalSuffix
+		elif DatacoreProcess: # datacore process: it has registered this control frame already, and does the undo and
+			# redo that need the socket name
+			self.SocketFromDatacoreName = None
 		else: # remote datacore
+			self.SocketFromDatacoreName = None
 			self.TryHandshake = True # inform OnIdle() to handshake with remote datacore
 			print('CF1978 need to set up self.SocketFromDatacoreName')
 		screenx1, screeny1, screenx2, screeny2 = wx.Display().GetGeometry() # get max size of primary display device
@@ -3679,7 +3700,14 @@ class ControlFrame(wx.Frame):
 #			self.layout_manager.Update()
 		self.MyControlPanel.SetFocus() # enable ControlPanel to handle Tab, Space, Enter keys
 		self.Bind(wx.EVT_CLOSE, self.OnClose)
+		self.MessagePump = vizop_misc.MessagePump() # polls sockets for incoming messages; see CheckForIncomingMessages()
+		self.MessagePumpSignature = None # state of socket register when message pump's handler table was last built
+		self.MessagePumpBusy = False # whether the message pump handled any messages in its last cycle
+		self.ViewportUpdates = vizop_misc.ViewportUpdateScheduler() # Viewports waiting for update after data changes;
+			# see UpdateAllViewports()
+		self.ViewportREPSockets = set() # datacore sockets bringing requests from Viewports
 		self.Bind(wx.EVT_IDLE, self.OnIdle)
+		self.Bind(wx.EVT_CHAR_HOOK, self.OnCharHook)
 
 		self.SetupMenus()
 		self.Show(True)
@@ -3687,7 +3715,7 @@ class ControlFrame(wx.Frame):
 
 	def SetupSockets(self, SktRegister, DatacoreIsLocal=True, F2CSocketNumber=None, C2FSocketNumber=None):
 		# set up zmq sockets for communication between control frame and datacore.
-		# SktRegister is list of Vizop's socket instances
+		# SktRegister is Vizop's socket register (vizop_misc.SocketRegistry instance)
 		# DatacoreIsLocal (bool): whether datacore is running in same instance of Vizop
 		# F2CSocketNumber (int): if not DatacoreIsLocal, the controlframe-to-datacore socket number provided by remote
 		# datacore; else ignored
@@ -3696,22 +3724,20 @@ class ControlFrame(wx.Frame):
 		assert isinstance(DatacoreIsLocal, bool)
 		# if datacore is local, find the socket numbers already created by datacore
 		if DatacoreIsLocal:
-			F2CSkts = [SktObj for SktObj in SktRegister
-				if getattr(SktObj, 'SocketLabel', '') == info.ControlFrameInSocketLabel + info.LocalSuffix]
-			C2FSkts = [SktObj for SktObj in SktRegister
-				if getattr(SktObj, 'SocketLabel', '') == info.ControlFrameOutSocketLabel + info.LocalSuffix]
+			F2CSkts = SktRegister.WithLabel(info.ControlFrameInSocketLabel + info.LocalSuffix)
+			C2FSkts = SktRegister.WithLabel(info.ControlFrameOutSocketLabel + info.LocalSuffix)
 			assert len(F2CSkts) == 1 # must be exactly 1 socket in each direction
 			assert len(C2FSkts) == 1
 			F2CREPSocket = F2CSkts[0]
 			C2FREQSocket = C2FSkts[0]
 			F2CSocketNoToUse = F2CREPSocket.SocketNo
 			C2FSocketNoToUse = C2FREQSocket.SocketNo
-		else: # remote datacore: need to get socket numbers via handshake code entered by user
-			assert isinstance(F2CSocketNoToUse, int)
-			assert isinstance(C2FSocketNoToUse, int)
+		else: # remote datacore: need to get socket numbers via handshake code entered by user, or from datacore process
 			F2CREPSocket = C2FREQSocket = None # cannot identify datacore's sockets
 			F2CSocketNoToUse = F2CSocketNumber
 			C2FSocketNoToUse = C2FSocketNumber
+			assert isinstance(F2CSocketNoToUse, int)
+			assert isinstance(C2FSocketNoToUse, int)
 		# create and connect to sockets on control frame side
 		self.zmqOutwardSocket, self.zmqOutwardSocketObj, OutwardSocketNumber = vizop_misc.SetupNewSocket(SocketType='REQ',
 			SocketLabel='F2CREQ', SocketNo=F2CSocketNoToUse, BelongsToDatacore=False, AddToRegister=True)
@@ -3719,6 +3745,42 @@ class ControlFrame(wx.Frame):
 			SocketLabel='C2FREP', SocketNo=C2FSocketNoToUse, BelongsToDatacore=False, AddToRegister=True)
 		return F2CREPSocket, C2FREQSocket
 
+	def RestartDatacore(self):
+		# handle death of the datacore process: restart it, if allowed, reopening the projects it had open (recovering
+		# any changes saved on the fly; see datacore_process.DatacoreProcess.RestartArgs()), and show them afresh. The
+		# Viewports are reset, as their Viewport shadows have gone with the old process
+		global UndoChainWaiting, RedoChainWaiting
+		UndoChainWaiting = RedoChainWaiting = False
+		self.AwaitingUndoReply = False
+		if self.CurrentViewport: self.MyEditPanel.ReleaseViewportFromDisplDevice()
+		self.CurrentViewport = self.DoomedViewport = None
+		for ThisProj in self.Projects:
+			for ThisViewport in ThisProj.ClientViewports: vizop_misc.SocketRegister.UnregisterViewport(ThisViewport)
+		for ThisSocketObj in (self.zmqOutwardSocketObj, self.zmqInwardSocketObj):
+			vizop_misc.SocketRegister.Unregister(ThisSocketObj)
+		NewProjects = []
+		if self.DatacoreProcess.CanRestart():
+			wx.BeginBusyCursor()
+			NewProjects, SuccessReport = datacore_process.OpenProjectsInDatacoreProcess(self.DatacoreProcess,
+				ControlFrameID=self.ID, WhileWaiting=wx.YieldIfNeeded,
+				**self.DatacoreProcess.RestartArgs(WhileWaiting=wx.YieldIfNeeded))
+			wx.EndBusyCursor()
+		if not NewProjects: # stop the user editing the projects shown, as the changes can't be made
+			self.EditAllowed = False
+			self.MyVTPanel.SubmitVizopTalksMessage(Title=_('Vizop has a problem'),
+				MainText=_('The projects can no longer be edited. Please close Vizop and reopen the projects'),
+				Priority=CriticalPriority)
+			return
+		self.SetupSockets(vizop_misc.SocketRegister, DatacoreIsLocal=False,
+			F2CSocketNumber=self.DatacoreProcess.Connection['F2CSocketNo'],
+			C2FSocketNumber=self.DatacoreProcess.Connection['C2FSocketNo'])
+		self.MessagePumpSignature = None # so that the message pump's handler table is rebuilt
+		self.DatacoreStatus = {}
+		self.Projects = NewProjects
+		self.SetProject(NewProjects[0])
+		self.MyVTPanel.SubmitVizopTalksMessage(Title=_('Vizop has recovered from a problem'),
+			MainText=_('Please check your latest changes'), Priority=WarningPriority)
+
 	def SetProject(self, ThisProj):
 		# handle change of project displayed
 		# set control frame title
@@ -3762,60 +3824,61 @@ class ControlFrame(wx.Frame):
 		assert isinstance(NewDisplayDevice, wx.Panel)
 		self.DisplayDevices.append(NewDisplayDevice)
 
-	def UpdateAllViewports(self, MessageAsStr='', XMLRoot=None, **Args):
-		# this is a Datacore method
-		# Refresh Viewports after change to data in datacore. For now, we just redraw all Viewports currently shown
-		# in a display device.
-		# MessageAsStr (str): str containing XML message received requesting update to Viewports (currently not used)
-		# XMLRoot (ElementTree element or None): any instruction to update display parameters (zoom, pan) of a Viewport
-		#	(used during redraw after undo); also can contain MilestoneIDTag with display attribs to apply
-		# Note: When datacore auto-updates Viewports after receiving a command, it can end up causing a double redraw.
-		# If this causes problems, the auto-call to UpdateAllViewports can be suppressed by adding the command to the
-		# list found by searching for [3gd].
-		# First, retrieve any data about a specific Viewport that needs display parameters updated
-		ViewportIDToUpdate = MilestoneID = None
-		if XMLRoot is not None:
-			ViewportToUpdateTag = XMLRoot.find(info.ViewportTag)
-			if ViewportToUpdateTag is not None:
-				ViewportIDToUpdate = ViewportToUpdateTag.text
-			# fetch milestone ID, if milestone is to be applied when redrawing the Viewport
-			MilestoneTag = XMLRoot.find(info.MilestoneIDTag)
-			if MilestoneTag is not None:
-				MilestoneID = MilestoneTag.text
-		# if a Viewport was specified, and it's not on display, we need to display it (e.g. to show after undo)
-		# TODO: handle applying a milestone after undo when the original Viewport is still on display
-		ViewportToSkip = None
-		if ViewportIDToUpdate is not None:
-			ViewportShadowToUpdate = utilities.ObjectWithID(self.CurrentProj.AllViewportShadows, ViewportIDToUpdate)
-			if not ViewportShadowToUpdate.IsOnDisplay:
-				self.DatacoreSwitchToViewport(XMLRoot=XMLRoot, MilestoneID=MilestoneID, Chain='NoChain')
-				# mark this Viewport as "skip", i.e. no need to redraw it again here
-				ViewportToSkip = ViewportShadowToUpdate
-		# Check with all Viewports that datacore knows about
-		for ThisViewportShadow in self.CurrentProj.AllViewportShadows:
-			# check if ThisViewportShadow is displayed in any display device, local or remote
-			if ThisViewportShadow.IsOnDisplay and (ThisViewportShadow != ViewportToSkip):
-				# get refresh data from corresponding PHA object (now done below: entire DisplayAttribTag is appended)
-				if ThisViewportShadow.PHAObj:
-					RedrawXMLData = ThisViewportShadow.PHAObj.GetFullRedrawData(Viewport=ThisViewportShadow,
-						ViewportClass=ThisViewportShadow.MyClass)
-				else: # handling a Viewport shadow with no associated PHA object; get redraw data from Viewport class
-					RedrawXMLData = ThisViewportShadow.MyClass.GetFullRedrawData(Proj=self.CurrentProj,
-						Viewport=ThisViewportShadow,
-						ViewportClass=ThisViewportShadow.MyClass)
-				# make XML message with ID of PHA object, followed by full redraw data
-				# TODO ensure data always includes EditNumber - this needs to be sent to client side after every edit
-				FullXMLData = vizop_misc.MakeXMLMessage(RootName='RQ_RedrawViewport', RootText=ThisViewportShadow.ID,
-					Elements={info.IDTag: ThisViewportShadow.PHAObjID})
-				FullXMLData.append(RedrawXMLData)
-				# append display parameter update data, if provided
-				if ViewportIDToUpdate == ThisViewportShadow.ID:
-					if ViewportToUpdateTag is not None:
-						FullXMLData.append(ViewportToUpdateTag.find(info.DisplayAttribTag))
-				# send all XML data to Viewport
-				vizop_misc.SendRequest(Socket=ThisViewportShadow.D2CSocketREQObj.Socket, Command='RQ_RedrawViewport',
-					XMLRoot=FullXMLData)
-		return vizop_misc.MakeXMLMessage('Null', 'Null')
+class MessageStatsDialogue(wx.Dialog):
+	# diagnostics dialogue showing the message latency and throughput statistics collected by module message_stats,
+	# with buttons to start/stop collecting them, discard them, and save them to a JSON file
+
+	def __init__(self, Parent):
+		wx.Dialog.__init__(self, Parent, wx.ID_ANY, _('Message statistics'), size=(900, 500),
+			style=wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER)
+		# make widgets to appear in dialogue
+		self.StatsList = wx.ListCtrl(self, -1, style=wx.LC_REPORT | wx.LC_SINGLE_SEL)
+		for (ColNo, (ColTitle, ColWidth)) in enumerate([(_('Metric'), 120), (_('Command'), 200), (_('Count'), 70),
+				(_('Mean'), 100), (_('p50'), 100), (_('p95'), 100), (_('Max'), 100)]):
+			self.StatsList.InsertColumn(ColNo, ColTitle, width=ColWidth)
+		self.EnableButton = wx.Button(self, -1, '')
+		self.RefreshButton = wx.Button(self, -1, _('Refresh'))
+		self.ResetButton = wx.Button(self, -1, _('Reset'))
+		self.SaveButton = wx.Button(self, -1, _('Save as JSON...'))
+		self.CloseButton = wx.Button(self, wx.ID_CANCEL, _('Close'))
+		# put widgets in sizers
+		ButtonSizer = wx.BoxSizer(wx.HORIZONTAL)
+		for ThisButton in [self.EnableButton, self.RefreshButton, self.ResetButton, self.SaveButton, self.CloseButton]:
+			ButtonSizer.Add(ThisButton, 0, wx.ALL, 5)
+		MainSizer = wx.BoxSizer(wx.VERTICAL)
+		MainSizer.Add(self.StatsList, 1, wx.EXPAND | wx.ALL, 5)
+		MainSizer.Add(ButtonSizer, 0, wx.ALIGN_RIGHT)
+		self.SetSizer(MainSizer)
+		# make bindings
+		self.EnableButton.Bind(wx.EVT_BUTTON, self.OnEnableButton)
+		self.RefreshButton.Bind(wx.EVT_BUTTON, lambda Event: self.PopulateStatsList())
+		self.ResetButton.Bind(wx.EVT_BUTTON, self.OnResetButton)
+		self.SaveButton.Bind(wx.EVT_BUTTON, self.OnSaveButton)
+		self.PopulateStatsList()
+
+	def PopulateStatsList(self):
+		# show the statistics collected so far, one row per metric and command. Times are shown in ms
+		self.EnableButton.SetLabel(_('Stop collecting') if message_stats.Enabled else _('Start collecting'))
+		self.StatsList.DeleteAllItems()
+		for ThisRow in message_stats.Summary():
+			Format = '%.0f' if ThisRow['Metric'] == 'MessageSize' else '%.3f'
+			Scale = 1 if ThisRow['Metric'] == 'MessageSize' else 1e3
+			self.StatsList.Append([ThisRow['Metric'], ThisRow['Command'], str(ThisRow['Count'])] +
+				[Format % (ThisRow[k] * Scale) for k in ['Mean', 'P50', 'P95', 'Max']])
+
+	def OnEnableButton(self, Event):
+		message_stats.Enable(not message_stats.Enabled)
+		self.PopulateStatsList()
+
+	def OnResetButton(self, Event):
+		message_stats.Reset()
+		self.PopulateStatsList()
+
+	def OnSaveButton(self, Event):
+		ProceedToSave, Filename = vizop_misc.GetFilenameForSave(self, DialogueTitle=_('Save message statistics'),
+			DefaultFile='vizop_message_stats.json', Wildcard='JSON files (*.json)|*.json', DefaultExtension='json')
+		if ProceedToSave and not message_stats.DumpJSON(Filename):
+			wx.MessageBox(_("Couldn't write file %s") % Filename, _('Message statistics'), style=wx.OK)
 
 class ControlFramePersistent(object):
 	# a persistent object used for returning data from control frame after it is Destroy()ed.
@@ -1290,6 +1290,7 @@ class PHAModelBaseClass(object, metaclass=PHAModelMetaClass):
 	AllPHAModelObjects = [] # register of all PHA object instances defined
 	CanBeCreatedManually = True # whether user can be invited to create a PHAModel of this class.
 	IsBaseClass = True # needed by metaclass. Subclasses should set this to False
+	EditCommands = () # commands handled by HandleIncomingRequest() that change the PHA object's data
 
 	def __init__(self, Proj, **Args):
 		# if ID is supplied as an arg, reapply it as existing ID, else fetch a new ID
@@ -1303,9 +1304,19 @@ class PHAModelBaseClass(object, metaclass=PHAModelMetaClass):
 		self.Proj = Proj
 		self.Viewports = [] # list of Viewport shadow instances for this PHA model instance
 		self.EditAllowed = True
+		self.Revision = 0 # incremented whenever the PHA object's data changes
+		self.SavedRevision = None # value of Revision when the PHA object was last written to the project file, or None
 		# capture any attribs provided in Args (risky, no checks performed)
 		self.__dict__.update(Args)
 
+	def MarkChanged(self):
+		# record that this PHA object's data has changed, so that it will be written at the next save
+		self.Revision += 1
+
+	def NeedsSaving(self):
+		# return bool: whether this PHA object has changed since it was last written to the project file
+		return self.SavedRevision != self.Revision
+
 class MilestoneItem(object): # item storing info required for navigation back/forwards, and for reverting display on undo
 	def __init__(self, Proj, **Args):
 		AttribInfo = [ ('Displayable', bool), ('Zoom', (int, float)), ('PanX', (int, float)), ('PanY', (int, float)) ]
@@ -1355,6 +1366,12 @@ class NumberingItem(object):
 		self.ShowInDisplay = True # whether number is displayed in Viewport
 		self.ShowInOutput = True # whether number is displayed in PHA model export
 
+	def Copy(self):
+		# return a copy of self that doesn't share its chunks, so that it's unaffected by later changes to self
+		NewNumbering = copy.copy(self)
+		NewNumbering.NumberStructure = [copy.copy(ThisChunk) for ThisChunk in self.NumberStructure]
+		return NewNumbering
+
 	def __eq__(self, other): # returns True if self and other (a NumberingItem instance) are considered identical
 		# this method allows comparison of NumberingItem instances simply by (Instance1 == Instance2)
 		assert isinstance(other, NumberingItem)
@@ -0,0 +1,725 @@
+# -*- coding: utf-8 -*-
+# Module: datacore_process. This file is part of Vizop. Copyright xSeriCon, 2020
+
+# standard modules needed:
+import os, sys, subprocess, time, zmq
+import xml.etree.ElementTree as ElementTree
+
+# vizop modules needed:
+import startup_vizop # installs _(), needed by the following modules when they're imported
+import info, utilities, vizop_misc, message_codec, message_stats, projects, display_utilities, undo, datacore_worker
+import project_recovery
+
+"""
+The datacore_process module lets the datacore run in a separate local process, so that CPU-bound work (redraw data,
+FT calculations, loading and saving projects) doesn't compete with the GUI for the GIL, and so that the datacore can be
+restarted if it crashes, without taking the display down with it. It is used if info.DatacoreInSeparateProcess is True.
+The datacore's side of Vizop's messaging (handling requests from control frames and Viewports, and sending redraw data
+to Viewports) is in DatacoreDispatcher, shared by controlframe.ControlFrame (when the datacore is in the same process)
+and DatacoreHost (the datacore process's main object). In the datacore process, DatacoreHost holds the open projects
+(projects.ProjectItem and their PHA objects), and talks to the control frame over the usual F2C/C2F socket pair, and
+to Viewports over the Viewport channel (see vizop_misc.ViewportChannel), both on the loopback interface.
+In the Vizop process, DatacoreProcess starts the datacore process and tells it which projects to open, over a zmq
+DEALER socket pair, as in module datacore_worker. The control frame shows a copy of each project, opened from the same
+file; its Viewports are connected to the Viewport shadows in the datacore process. The copies are used only for
+display: their IDs are kept in step with the datacore's from the status stamped on the datacore's messages, and undo
+and redo are done in the datacore (requests RQ_Undo and RQ_Redo).
+If the datacore process dies, the control frame restarts it (up to info.DatacoreProcessMaxRestarts times), reopening
+the projects; changes saved on the fly are recovered first (see DatacoreProcess.RestartArgs()).
+The datacore process is started as:
+	python datacore_process.py <zmq address of DatacoreProcess's socket> <Vizop's process ID>
+"""
+
+ProcessReadyTag = 'NO_DP_Ready' # sent by the datacore process when it has connected and is ready for requests
+OpenProjectsTag = 'RQ_DP_OpenProjects' # asks the datacore process to open projects
+OpenProjectsReplyTag = 'RP_DP_OpenProjects'
+StopTag = 'RQ_DP_Stop' # asks the datacore process to finish its saves and exit
+StopReplyTag = 'RP_DP_Stop'
+ProjFileTag = 'ProjFile' # in RQ_DP_OpenProjects: a file to open
+FileToCreateTag = 'FileToCreate' # in RQ_DP_OpenProjects: a project file to save the project opened from a template to
+
+class DatacoreDispatcher(object): # mixin with the datacore's message handling, shared by controlframe.ControlFrame
+	# and DatacoreHost. Classes using it need attribs Projects (list of ProjectItem instances), CurrentProj,
+	# ViewportUpdates (vizop_misc.ViewportUpdateScheduler instance) and ViewportREPSockets (set)
+	ControlFrameIsRemote = False # whether the control frames are in another process, so that they can't see the
+		# datacore's projects directly; DatacoreHost sets this
+
+	def SetDatacorePumpHandlers(self, Pump):
+		# this is a Datacore method
+		# set handlers in Pump (vizop_misc.MessagePump instance) for the datacore's sockets, in order of priority
+		Register = vizop_misc.SocketRegister
+		# 1. sockets belonging to datacore: first, sockets bringing messages from control frames, and corresponding
+		# outward sockets (whose label has the same suffix as the inward socket)
+		for ThisSocketObj in Register.WithDirection(info.ControlFrameInSocketLabel):
+			Pump.SetHandler(ThisSocketObj.Socket, Handler=self.DatacoreHandleRequestFromControlFrame)
+			Pump.SetHandler(Register.WithDirectionAndSuffix(info.ControlFrameOutSocketLabel,
+				vizop_misc.DirectionAndSuffix(ThisSocketObj.SocketLabel)[1]).Socket,
+				Handler=self.DatacoreHandleReplyFromControlFrame, SendReply2=False)
+		# 2. datacore sockets bringing messages from Viewports, and corresponding outward sockets
+		self.ViewportREPSockets = set()
+		for ThisSocketObj in [s for s in Register.WithDirection(info.ViewportInSocketLabel) if s.BelongsToDatacore
+				if s.Viewport is not None]:
+			Pump.SetHandler(ThisSocketObj.Socket, Handler=self.DatacoreHandleRequestFromViewport,
+				ViewportSocketObj=ThisSocketObj)
+			self.ViewportREPSockets.add(ThisSocketObj.Socket)
+			OutSocketObj = Register.WithDirectionAndSuffix(info.ViewportOutSocketLabel,
+				vizop_misc.DirectionAndSuffix(ThisSocketObj.SocketLabel)[1])
+			Pump.SetHandler(OutSocketObj.Socket, Handler=self.DatacoreHandleReplyFromViewport, SendReply2=False,
+				ViewportSocketObj=OutSocketObj)
+		# 3. sockets bringing reports from projects' writer threads (see projects.ProjectSaveQueue)
+		for ThisSocketObj in Register.WithDirection(info.SaveReportSocketLabel):
+			Pump.SetHandler(ThisSocketObj.Socket, Handler=self.DatacoreHandleSaveReport, SendReply2=False)
+
+	def DatacoreUpdateViewportsAfterMessages(self, MessagesHandled):
+		# this is a Datacore method
+		# update applicable Viewports, if any of MessagesHandled (list of (socket, message received), as returned by
+		# vizop_misc.MessagePump.Pump()) were received from Viewports
+		ViewportMessages = [m for (s, m) in MessagesHandled if s in self.ViewportREPSockets]
+		if ViewportMessages:
+			# messages may be binary encoded (see module message_codec), so decode the root to find the command
+			MessageToApply = vizop_misc.DecodeMessageRoot(ViewportMessages[-1])
+			# check MessageToApply isn't a command that doesn't need to refresh Viewports [3gd]
+			if MessageToApply.tag not in ['RQ_PR_UpdateAssocTextFullViewAttribs']:
+				self.UpdateAllViewports() # MessageAsStr arg not supplied, as it isn't used
+
+	def DatacoreFlushViewportUpdates(self, Quiet):
+		# this is a Datacore method
+		# redraw Viewports waiting for update, once the burst of messages causing the updates is over (Quiet (bool) is
+		# True if no messages are arriving), or when the frame budget has elapsed
+		if self.ViewportUpdates.Due(Quiet=Quiet):
+			self.ViewportUpdates.Flush(Redraw=self.DatacoreRedrawViewport,
+				Broadcast=self.DatacoreBroadcastViewportUpdates if info.BroadcastViewportUpdates else None)
+
+	def DatacoreHandleRequestFromViewport(self, MessageReceived='', ViewportSocketObj=None):
+		# datacore function to handle a request from the Viewport owning ViewportSocketObj (SocketInRegister instance).
+		# The request is passed to the message handler for the Viewport's PHA object, if any, else to the Viewport class
+		# itself (we do this via datacore, not directly, so that local and remote Viewports are treated the same)
+		# Return reply XML element from the handler
+		ThisViewport = ViewportSocketObj.Viewport
+		Handler = ThisViewport.PHAObj.HandleIncomingRequest if ThisViewport.PHAObj \
+			else ThisViewport.MyClass.HandleIncomingRequest
+		# Requests that change the PHA object mark it as changed, so that it's included in the next save (see
+		# PHAModelBaseClass.EditCommands)
+		Reply = Handler(MessageReceived=MessageReceived, Proj=self.CurrentProj)
+		if self.ControlFrameIsRemote and (Reply is not None): self.DatacoreStampStatus(Reply, self.CurrentProj)
+		return Reply
+
+	def DatacoreHandleSaveReport(self, MessageReceived=''):
+		# datacore function to handle RP_SaveComplete message from a project's writer thread
+		# MessageReceived (bytes): the message. Return a 'Null' XML element; no reply is sent
+		XMLRoot = vizop_misc.DecodeMessage(MessageReceived)
+		ThisProjID = XMLRoot.findtext(info.ProjIDTag)
+		Hits = [p for p in self.Projects if p.ID == ThisProjID]
+		if Hits: projects.HandleSaveReport(Proj=Hits[0], SaveReport=XMLRoot)
+		return vizop_misc.MakeXMLMessage('Null', 'Null')
+
+	def DatacoreHandleRequestFromControlFrame(self, MessageReceived, **Args):
+		# process a message from Control Frame to Datacore, e.g. to create a new Viewport
+		# MessageReceived (bytes): XML message from control frame
+		import controlframe # imported here, as controlframe imports this module
+		assert isinstance(MessageReceived, bytes)
+		ParsedMsgRoot = ElementTree.XML(MessageReceived)
+		# get project ID from message received
+		ProjIDTagInXML = ParsedMsgRoot.find(info.ProjIDTag)
+		# find the project with the ID provided
+		Proj = self.Projects[ [p.ID for p in self.Projects].index(ProjIDTagInXML.text) ]
+		if self.ControlFrameIsRemote:
+			self.CurrentProj = Proj # the control frame's current project isn't visible from here
+			self.DatacoreCatchUpIDs(Proj, ParsedMsgRoot)
+		# handlers for all possible requests from Control Frame. Handlers must return an XML reply message
+		Handler = {'RQ_NewViewport': projects.DatacoreDoNewViewport,
+			'RQ_SwitchToViewport': self.DatacoreSwitchToViewport,
+			'RQ_NewFTEventNotIPL': self.DatacoreDoNewFTEventNotIPL,
+			'RQ_NewPHAObject': controlframe.DatacoreDoNewPHAObj,
+			'RQ_StopDisplayingViewport': controlframe.DatacoreStopDisplayingViewport,
+			'RQ_RedrawViewportInFull': self.DatacoreRedrawViewportInFull,
+			'RQ_Undo': self.DatacoreUndo,
+			'RQ_Redo': self.DatacoreRedo,
+			'RQ_SaveEntireProject': self.DatacoreSaveEntireProject}[
+			ParsedMsgRoot.tag.strip()]
+		# call handler and collect reply XML tree to send back to Control Frame
+		ReplyXML = Handler(Proj=Proj, XMLRoot=ParsedMsgRoot)
+		if self.ControlFrameIsRemote: self.DatacoreStampStatus(ReplyXML, Proj)
+		return ReplyXML
+
+	def DatacoreSetViewportAsNotInUse(self, XMLRoot=None):
+		# set a Viewport shadow as not in use, i.e. not visible and not attached to any PHA object
+		# find the Viewport shadow to set
+		DoomedViewportID = XMLRoot.find(info.DoomedViewportIDTag).text
+		ThisProj = utilities.ObjectWithID(self.Projects, XMLRoot.find(info.ProjIDTag).text)
+		# find out which PHA object contains the doomed Viewport (or it might be in ThisProj.ViewportsWithoutPHAObjs)
+		ViewportListsToCheck = [p.Viewports for p in ThisProj.PHAObjs] + [ThisProj.ViewportsWithoutPHAObjs]
+		# find which Viewport list contains the Viewport with ID = DoomedViewportID
+		HostViewportList = ViewportListsToCheck[[DoomedViewportID in [v.ID for v in ThisList] \
+			for ThisList in ViewportListsToCheck].index(True)]
+		DoomedViewport = utilities.ObjectWithID(HostViewportList, DoomedViewportID)
+		DoomedViewport.IsOnDisplay = False # mark it as no longer visible
+		# remove the Viewport from its PHA object
+		HostViewportList.remove(DoomedViewport)
+		# remove its sockets from the socket register; the corresponding Viewport is destroyed, so they won't be used again
+		vizop_misc.SocketRegister.UnregisterViewport(DoomedViewport)
+#		# remove the Viewport from the project's master list, and store it in the Archived list in case it is re-created
+#		ThisProj.AllViewportShadows.remove(DoomedViewport)
+		# find any persistent attribs supplied in XMLRoot, and store them in DoomedViewport
+		PersistentAttribsTag = XMLRoot.find(info.PersistentAttribsTag)
+		if PersistentAttribsTag is None:
+			PersistentAttribs = {}
+		else:
+			PersistentAttribs = dict([(ThisPATag.tag, ThisPATag.text) for ThisPATag in PersistentAttribsTag])
+		DoomedViewport.PersistentAttribs = PersistentAttribs
+#		EjectedViewportShadow, ArchiveIndex = display_utilities.ArchiveDestroyedViewport(Proj=ThisProj,
+#			ViewportShadow=DoomedViewport, PersistentAttribs=PersistentAttribs)
+		Reply = vizop_misc.MakeXMLMessage(RootName='RP_SetViewportAsNotInUse', RootText=DoomedViewportID, Elements={})
+		return Reply
+
+	def DatacoreSwitchToViewport(self, XMLRoot=None, Proj=None, ViewportClass=None, ViewportID=None, HumanName='',
+			PHAObj=None, Chain='NoChain', MilestoneID=None):
+		# datacore function to handle request to switch to an existing Viewport from any Control Frame (local or remote)
+		# It assumes a Viewport shadow, i.e. an object that allows the datacore to know that a Viewport exists in
+		# one of the Control Frames (local or remote), already exists for this Viewport.
+		# Input data is supplied in XMLRoot, an XML ElementTree root element, or as separate attribs
+		# including Chain (str: 'NoChain' or 'Stepwise'): whether this call is chained from another event, e.g. new PHA model
+		# MilestoneID (str or None): if the Viewport should apply display attribs from a milestone, this is its ID
+		# return reply data (XML tree) to send back to respective Control Frame
+		# This function might be better placed outside Control Frame class, but currently we can't because it needs
+		# access to ControlFrame's self.Projects
+		# First, get the attribs needed to find the Viewport in the datacore
+		if XMLRoot is None: # this branch is not currently used
+			ThisProj = Proj
+			TargetViewportClass = ViewportClass
+			TargetViewportID = ViewportID
+			TargetViewportHumanName = HumanName
+			ExistingPHAObj = PHAObj
+		else:
+			ThisProj = utilities.ObjectWithID(self.Projects, XMLRoot.find(info.ProjIDTag).text)
+			ClassList = display_utilities.ViewportMetaClass.ViewportClasses # list of all user-requestable Viewport classes
+			TargetViewportID = XMLRoot.find(info.ViewportTag).text
+			ExistingPHAObjIDRequested = XMLRoot.find(info.PHAModelIDTag)
+			ExistingPHAObj = None if ExistingPHAObjIDRequested is None \
+				else utilities.ObjectWithID(ThisProj.PHAObjs, TargetID=ExistingPHAObjIDRequested.text)
+#		# Check if target Viewport is in the current lineup of Viewport shadows
+#		if TargetViewportID in [v.ID for v in ThisProj.AllViewportShadows]:
+		# set target Viewport as on display
+		TargetViewport = utilities.ObjectWithID(ThisProj.AllViewportShadows, TargetID=TargetViewportID)
+		TargetViewport.IsOnDisplay = True
+#		else: # it isn't in the current lineup; so it must be in the archived Viewports list, retrieve from there
+#			ViewportArgs = {'ViewportToRevertTo': self.CurrentViewport, 'OriginatingViewport': self.CurrentViewport}
+#			ArchivedViewportShadow = utilities.ObjectWithID(ThisProj.ArchivedViewportShadows, TargetID=TargetViewportID)
+#			# fetch persistent attribs from ArchivedViewportShadow (stored in ArchiveDestroyedViewport())
+#			#  and feed them to the new Viewport
+#			ViewportArgs.update(getattr(ArchivedViewportShadow, 'PersistentAttribs', {}))
+#			self.DoNewViewportCommand(Proj=ThisProj, ViewportClass=ArchivedViewportShadow.MyClass,
+#				Chain=True, PHAModel=ExistingPHAObj, ViewportArgs=ViewportArgs)
+#			# no need to set Viewport.IsOnDisplay here, as it is set in DatacoreDoNewViewport()
+#			# Next line is an ugly workaround. We need(?) to pass a Viewport shadow to MakeXMLMessageForDrawViewport(),
+#			# and this is the only one we have at this point, as the newly re-created Viewport shadow may not exist yet.
+#			# FIXME: see if we can remove the Viewport arg from the call to MakeXMLMessageForDrawViewport() - may not be used
+#			TargetViewport = ArchivedViewportShadow
+		# make reply message to send to control frame
+		Reply = projects.MakeXMLMessageForDrawViewport(Proj=ThisProj, MessageHead='RP_SwitchToViewport',
+			PHAObj=ExistingPHAObj,
+			Viewport=TargetViewport, ViewportID=TargetViewportID, MilestoneID=MilestoneID)
+		# check whether we should switch off an old Viewport, and switch it off if required
+		if XMLRoot.find(info.DoomedViewportIDTag) is not None:
+			self.DatacoreSetViewportAsNotInUse(XMLRoot=XMLRoot)
+		# send the info back to control frame as a reply message (via ListenToSocket)
+		return Reply
+
+	def DatacoreDoNewFTEventNotIPL(self, Root): # handle request to datacore for new FT event that's not an IPL
+		# probably not currently used; redundant?
+		# find out which project to work in
+		ThisProj = utilities.ObjectWithID(OpenProjects, Root.find('Proj').text)
+		if ThisProj.EditAllowed:
+			# find out which PHA model to work in
+			ThisPHAObj = utilities.ObjectWithID(ThisProj.PHAObjs, Root.find('PHAObj').text)
+			# find applicable PHA object
+			ThisPHAObj = WithID(Root.find('PHAObj').text)
+			# ask PHA object to add new event
+			Reply = ThisPHAObj.HandleIncomingRequest(self, Proj=self.CurrentProj, MessageAsXMLTree=Root)
+			ThisPHAObj.MarkChanged()
+		else: # couldn't make new event because editing is blocked
+			Reply = vizop_misc.MakeXMLMessage(RootName='RP_NewFTEventNotIPL', RootText="Null",
+				Elements={'CantComply': 'EditingBlocked'})
+		# send the info back to control frame as a reply message (via ListenToSockets)
+		return Reply
+
+		# send reply for routing back to control frame
+		Reply = vizop_misc.MakeXMLMessage(RootName='RP_NewFTEventNotIPL', RootText=NewViewportID,
+			Elements={info.IDTag: ThisPHAObj.ID})
+		return Reply
+
+	def UpdateAllViewports(self, MessageAsStr='', XMLRoot=None, **Args):
+		# this is a Datacore method
+		# Refresh Viewports after change to data in datacore. For now, we just redraw all Viewports currently shown
+		# in a display device. The redraws aren't done here: the Viewports are marked as stale in self.ViewportUpdates,
+		# and redrawn by OnIdle(), so that a burst of changes (e.g. an undo chain or fast typing) causes only one redraw.
+		# MessageAsStr (str): str containing XML message received requesting update to Viewports (currently not used)
+		# XMLRoot (ElementTree element or None): any instruction to update display parameters (zoom, pan) of a Viewport
+		#	(used during redraw after undo); also can contain MilestoneIDTag with display attribs to apply
+		# Note: When datacore auto-updates Viewports after receiving a command, it can end up causing a double redraw.
+		# If this causes problems, the auto-call to UpdateAllViewports can be suppressed by adding the command to the
+		# list found by searching for [3gd].
+		# First, retrieve any data about a specific Viewport that needs display parameters updated
+		ViewportIDToUpdate = MilestoneID = None
+		if XMLRoot is not None:
+			ViewportToUpdateTag = XMLRoot.find(info.ViewportTag)
+			if ViewportToUpdateTag is not None:
+				ViewportIDToUpdate = ViewportToUpdateTag.text
+			# fetch milestone ID, if milestone is to be applied when redrawing the Viewport
+			MilestoneTag = XMLRoot.find(info.MilestoneIDTag)
+			if MilestoneTag is not None:
+				MilestoneID = MilestoneTag.text
+		# if a Viewport was specified, and it's not on display, we need to display it (e.g. to show after undo)
+		# TODO: handle applying a milestone after undo when the original Viewport is still on display
+		ViewportToSkip = None
+		if ViewportIDToUpdate is not None:
+			ViewportShadowToUpdate = utilities.ObjectWithID(self.CurrentProj.AllViewportShadows, ViewportIDToUpdate)
+			if not ViewportShadowToUpdate.IsOnDisplay:
+				self.DatacoreSwitchToViewport(XMLRoot=XMLRoot, MilestoneID=MilestoneID, Chain='NoChain')
+				# mark this Viewport as "skip", i.e. no need to redraw it again here
+				ViewportToSkip = ViewportShadowToUpdate
+				self.ViewportUpdates.Discard(ViewportToSkip)
+		# Check with all Viewports that datacore knows about
+		for ThisViewportShadow in self.CurrentProj.AllViewportShadows:
+			# check if ThisViewportShadow is displayed in any display device, local or remote
+			if ThisViewportShadow.IsOnDisplay and (ThisViewportShadow != ViewportToSkip):
+				# append display parameter update data, if provided
+				if (ViewportIDToUpdate == ThisViewportShadow.ID) and (ViewportToUpdateTag is not None):
+					self.ViewportUpdates.MarkStale(ThisViewportShadow,
+						DisplayAttribTag=ViewportToUpdateTag.find(info.DisplayAttribTag))
+				else: self.ViewportUpdates.MarkStale(ThisViewportShadow)
+		return vizop_misc.MakeXMLMessage('Null', 'Null')
+
+	def DatacoreBroadcastViewportUpdates(self, ViewportShadows):
+		# this is a Datacore method
+		# update the Viewports in ViewportShadows (list of ViewportShadow instances) that show PHA objects able to send
+		# delta redraw data, by publishing the redraw data on the change broadcast channel (see module change_broadcast).
+		# Viewports of the same class, showing the same PHA object and last sent the same revision, share one message,
+		# so the redraw data is made and encoded once for all of them. Afterwards they share the same base revision, so
+		# they stay together for later updates.
+		# Return list of the Viewport shadows not updated, to be redrawn individually
+		Groups = {} # keys are (PHA object, Viewport class, base revision (str or None)), values are lists of Viewport shadows
+		NotBroadcast = []
+		for ThisViewportShadow in ViewportShadows:
+			if ThisViewportShadow.PHAObj and ThisViewportShadow.MyClass.AcceptsRedrawDelta:
+				BaseRevision = ThisViewportShadow.RedrawBase[0] if ThisViewportShadow.RedrawBase else None
+				Groups.setdefault((ThisViewportShadow.PHAObj, ThisViewportShadow.MyClass, BaseRevision),
+					[]).append(ThisViewportShadow)
+			else: NotBroadcast.append(ThisViewportShadow)
+		Publisher = vizop_misc.ChangeBroadcastEnd(BelongsToDatacore=True)
+		for ((ThisPHAObj, ThisViewportClass, BaseRevision), ThisGroup) in Groups.items():
+			if message_stats.Enabled: StartTime = time.perf_counter()
+			RedrawXMLData = ThisPHAObj.GetRedrawDelta(Viewport=ThisGroup[0], ViewportClass=ThisViewportClass)
+			if message_stats.Enabled:
+				message_stats.Record('RedrawDataTime', ThisViewportClass.InternalName, time.perf_counter() - StartTime)
+			for ThisViewportShadow in ThisGroup[1:]: ThisViewportShadow.RedrawBase = ThisGroup[0].RedrawBase
+			Message = vizop_misc.MakeXMLMessage(RootName='NO_RedrawPHAObj', RootText=ThisPHAObj.ID,
+				Elements={info.ViewportIDsTag: ','.join(v.ID for v in ThisGroup)})
+			Message.append(RedrawXMLData)
+			if self.ControlFrameIsRemote: self.DatacoreStampStatus(Message, self.CurrentProj)
+			Publisher.Publish(ThisPHAObj.ID, Message)
+		return NotBroadcast
+
+	def DatacoreRedrawViewportInFull(self, Proj, XMLRoot=None):
+		# this is a Datacore method
+		# handle request from control frame to send full redraw data to a Viewport that couldn't apply delta redraw data
+		# it received by broadcast. The data is sent to the Viewport alone
+		ThisViewportShadow = utilities.ObjectWithID(Proj.AllViewportShadows, XMLRoot.findtext(info.ViewportTag))
+		ThisViewportShadow.RedrawBase = None # so that GetRedrawDelta() returns full redraw data
+		if ThisViewportShadow.IsOnDisplay: self.DatacoreRedrawViewport(ThisViewportShadow)
+		return vizop_misc.MakeXMLMessage(RootName='RP_RedrawViewportInFull', RootText=ThisViewportShadow.ID)
+
+	def DatacoreRedrawViewport(self, ThisViewportShadow, DisplayAttribTag=None):
+		# this is a Datacore method
+		# send redraw data to the Viewport represented by ThisViewportShadow. If the Viewport accepts delta redraw data,
+		# only the changes since the last redraw data it was sent are included (see faulttree.FTObjectInCore.GetRedrawDelta())
+		# DisplayAttribTag (ElementTree element or None): display parameters to send to the Viewport, if any
+		# get refresh data from corresponding PHA object (now done below: entire DisplayAttribTag is appended)
+		if message_stats.Enabled: StartTime = time.perf_counter()
+		if ThisViewportShadow.PHAObj and ThisViewportShadow.MyClass.AcceptsRedrawDelta:
+			RedrawXMLData = ThisViewportShadow.PHAObj.GetRedrawDelta(Viewport=ThisViewportShadow,
+				ViewportClass=ThisViewportShadow.MyClass)
+		elif ThisViewportShadow.PHAObj:
+			RedrawXMLData = ThisViewportShadow.PHAObj.GetFullRedrawData(Viewport=ThisViewportShadow,
+				ViewportClass=ThisViewportShadow.MyClass)
+		else: # handling a Viewport shadow with no associated PHA object; get redraw data from Viewport class
+			RedrawXMLData = ThisViewportShadow.MyClass.GetFullRedrawData(Proj=self.CurrentProj,
+				Viewport=ThisViewportShadow,
+				ViewportClass=ThisViewportShadow.MyClass)
+		if message_stats.Enabled:
+			message_stats.Record('RedrawDataTime', ThisViewportShadow.MyClass.InternalName,
+				time.perf_counter() - StartTime)
+		# make XML message with ID of PHA object, followed by redraw data
+		# TODO ensure data always includes EditNumber - this needs to be sent to client side after every edit
+		FullXMLData = vizop_misc.MakeXMLMessage(RootName='RQ_RedrawViewport', RootText=ThisViewportShadow.ID,
+			Elements={info.IDTag: ThisViewportShadow.PHAObjID})
+		FullXMLData.append(RedrawXMLData)
+		if DisplayAttribTag is not None: FullXMLData.append(DisplayAttribTag)
+		if self.ControlFrameIsRemote: self.DatacoreStampStatus(FullXMLData, self.CurrentProj)
+		# send all XML data to Viewport
+		vizop_misc.SendRequest(Socket=ThisViewportShadow.D2CSocketREQObj.Socket, Command='RQ_RedrawViewport',
+			XMLRoot=FullXMLData)
+
+	def DatacoreHandleReplyFromViewport(self, MessageReceived='', ViewportSocketObj=None):
+		# datacore function to handle a reply from the Viewport owning ViewportSocketObj (SocketInRegister instance)
+		# to a message sent from datacore. If the Viewport couldn't apply delta redraw data, send it full redraw data
+		ReplyXML = vizop_misc.DecodeMessage(MessageReceived)
+		if utilities.Bool2Str(ReplyXML.findtext(info.FullRedrawNeededTag, default='False')):
+			ThisViewport = ViewportSocketObj.Viewport
+			ThisViewport.RedrawBase = None # so that GetRedrawDelta() returns full redraw data
+			if ThisViewport.IsOnDisplay: self.DatacoreRedrawViewport(ThisViewport)
+		return vizop_misc.MakeXMLMessage('Null', 'Null')
+
+	def DatacoreHandleReplyFromControlFrame(self, MessageReceived=''):
+		# datacore function to handle a control frame's reply to a message sent from datacore. A control frame in another
+		# process sends back notification NO_RedrawAfterUndo as a request to redraw Viewports, as the redraws are made by
+		# the datacore (see controlframe.ControlFrame.PassRedrawAfterUndoToDatacore()). Return a 'Null' XML element
+		ReplyXML = vizop_misc.DecodeMessage(MessageReceived)
+		if ReplyXML.tag == info.RQ_RedrawAfterUndo: self.UpdateAllViewports(XMLRoot=ReplyXML)
+		return vizop_misc.MakeXMLMessage('Null', 'Null')
+
+	def DatacoreUndo(self, Proj, XMLRoot=None):
+		# this is a Datacore method
+		# handle request from a control frame in another process to undo the last action in Proj. The undo handlers tell
+		# the control frame what was undone, as they do for a local control frame. Return reply XML
+		import controlframe # imported here, as controlframe imports this module
+		ReturnArgs = undo.HandleUndoRequest(Proj, SocketFromDatacoreName=controlframe.ControlFrameWithID(
+			XMLRoot.findtext('ControlFrame')).C2FREQSocket.SocketLabel,
+			ContinuingPausedChain=utilities.Bool2Str(XMLRoot.findtext(info.ChainWaitingTag, default='n')))
+		return vizop_misc.MakeXMLMessage(RootName='RP_Undo', RootText=Proj.ID,
+			Elements={info.SkipRefreshTag: utilities.Bool2Str(bool(ReturnArgs['SkipRefresh']))})
+
+	def DatacoreRedo(self, Proj, XMLRoot=None):
+		# this is a Datacore method
+		# handle request from a control frame in another process to redo the last action undone in Proj, as for
+		# DatacoreUndo(). Redo handlers set controlframe.RedoChainWaiting in this process if there is more of the chain
+		# to redo; it's passed back in the reply, so that the control frame can ask for the rest
+		import controlframe # imported here, as controlframe imports this module
+		ControlFrameID = XMLRoot.findtext('ControlFrame')
+		ReturnArgs = undo.HandleRedoRequest(Proj, RequestingControlFrameID=ControlFrameID,
+			SocketFromDatacoreName=controlframe.ControlFrameWithID(ControlFrameID).C2FREQSocket.SocketLabel)
+		ChainWaiting = bool(controlframe.RedoChainWaiting)
+		controlframe.RedoChainWaiting = False
+		return vizop_misc.MakeXMLMessage(RootName='RP_Redo', RootText=Proj.ID,
+			Elements={info.SkipRefreshTag: utilities.Bool2Str(bool(ReturnArgs['SkipRefresh'])),
+			info.ChainWaitingTag: utilities.Bool2Str(ChainWaiting)})
+
+	def DatacoreSaveEntireProject(self, Proj, XMLRoot=None):
+		# this is a Datacore method
+		# handle request from a control frame in another process to save all of Proj to the file named in XMLRoot
+		WriteOK, ProblemReport = projects.SaveEntireProject(Proj=Proj, OutputFilename=XMLRoot.findtext('OutputFilename'),
+			Close=True)
+		return vizop_misc.MakeXMLMessage(RootName='RP_SaveEntireProject', RootText=Proj.ID,
+			Elements={'WriteOK': utilities.Bool2Str(WriteOK), 'ProblemReport': ProblemReport})
+
+	def DatacoreCatchUpIDs(self, Proj, XMLRoot):
+		# this is a Datacore method
+		# make sure Proj (ProjectItem instance) doesn't issue IDs already given to objects made by a control frame in
+		# another process from its copy of the project, such as Viewports and milestones, whose IDs are in XMLRoot (a
+		# request from the control frame)
+		for ThisTag in (info.ViewportTag, info.MilestoneIDTag):
+			ThisID = XMLRoot.findtext(ThisTag, default='')
+			if ThisID.isdigit(): Proj.MaxIDInProj = max(Proj.MaxIDInProj, int(ThisID))
+
+	def DatacoreStampStatus(self, XMLRoot, Proj):
+		# this is a Datacore method
+		# add the state of Proj (ProjectItem instance) to XMLRoot (XML root element of a message to a control frame in
+		# another process) as attribs: the highest ID issued, and the human texts of the next actions to undo and redo,
+		# if any. The control frame keeps its copy of the project in step with them (see
+		# controlframe.ControlFrame.TrackDatacoreStatus())
+		XMLRoot.set(info.ProjIDTag, Proj.ID)
+		XMLRoot.set(info.MaxIDAttribName, str(Proj.MaxIDInProj))
+		for (ThisList, ThisAttribName) in [(Proj.UndoList, info.UndoTextAttribName),
+				(Proj.RedoList, info.RedoTextAttribName)]:
+			if ThisList: XMLRoot.set(ThisAttribName, ThisList[undo.FindLastRecordToUndo(ThisList)].HumanText or '')
+
+class DatacoreHost(DatacoreDispatcher): # the datacore in a datacore process. It holds the open projects, and handles
+	# requests from the control frame and Viewports in the Vizop process, and from DatacoreProcess
+	ControlFrameIsRemote = True
+
+	def __init__(self, Address, ParentProcessID):
+		# Address (str): zmq address of DatacoreProcess's socket. ParentProcessID (int): process ID of Vizop
+		assert isinstance(Address, str)
+		assert isinstance(ParentProcessID, int)
+		object.__init__(self)
+		self.ParentProcessID = ParentProcessID
+		self.Socket = vizop_misc.zmqContext.socket(zmq.DEALER)
+		self.Socket.connect(Address)
+		vizop_misc.SocketRegister.Poller.register(self.Socket, zmq.POLLIN)
+		self.Projects = [] # ProjectItem instances open in the datacore, in order of opening
+		self.CurrentProj = None # project that the control frame last sent a request about
+		self.ControlFrameID = None # ID (str) of the control frame in the Vizop process; None until projects are opened
+		self.F2CSocketNo = self.C2FSocketNo = None # numbers (int) of the control frame's sockets
+		self.MessagePump = vizop_misc.MessagePump()
+		self.MessagePumpSignature = None # state of socket register when message pump's handler table was last built
+		self.MessagePumpBusy = False # whether the message pump handled any messages in its last cycle
+		self.ViewportUpdates = vizop_misc.ViewportUpdateScheduler() # Viewports waiting for update after data changes
+		self.ViewportREPSockets = set() # datacore sockets bringing requests from Viewports
+		self.Stopping = False # whether DatacoreProcess has asked us to exit
+		self.Socket.send(message_codec.EncodeMessage(ElementTree.Element(ProcessReadyTag,
+			attrib={'ProcessID': str(os.getpid())})))
+
+	def SetupControlFrameSockets(self, ControlFrameID, FirstSocketNumber):
+		# make the datacore's ends of the control frame's socket pair, the Viewport channel and the change broadcast
+		# channel, all on the loopback interface so that the Vizop process can connect to them, and register the
+		# control frame with ControlFrameID (str). The control frame's sockets are numbered from FirstSocketNumber (int)
+		import controlframe # imported here, as controlframe imports this module
+		vizop_misc.GetNewSocketNumber.LastSocketNumber = FirstSocketNumber - 1
+		F2CREPSocket, F2CREPSocketObj, self.F2CSocketNo = vizop_misc.SetupNewSocket(SocketType='REP',
+			SocketLabel=info.ControlFrameInSocketLabel + info.LocalSuffix, BelongsToDatacore=True)
+		C2FREQSocket, C2FREQSocketObj, self.C2FSocketNo = vizop_misc.SetupNewSocket(SocketType='REQ',
+			SocketLabel=info.ControlFrameOutSocketLabel + info.LocalSuffix, BelongsToDatacore=True)
+		vizop_misc.ViewportChannelFor(BelongsToDatacore=True, Address=info.DatacoreProcessChannelAddress)
+		vizop_misc.ChangeBroadcastEnd(BelongsToDatacore=True)
+		ThisControlFrameShadow = controlframe.ControlFrameShadow(ID=ControlFrameID)
+		ThisControlFrameShadow.F2CREPSocket = F2CREPSocketObj
+		ThisControlFrameShadow.C2FREQSocket = C2FREQSocketObj
+		self.ControlFrameID = ControlFrameID
+
+	def OpenProjects(self, Request):
+		# open the projects requested in Request (XML root element of RQ_DP_OpenProjects), setting up the control frame's
+		# sockets first if needed. Return XML root element of the reply
+		if self.ControlFrameID is None:
+			self.SetupControlFrameSockets(ControlFrameID=Request.get('ControlFrame'),
+				FirstSocketNumber=int(Request.get('FirstSocketNumber')))
+		# number the routes of Viewports loaded from the files as the Vizop process will, so that they pair up
+		vizop_misc.GetNewRouteNumber.LastRouteNumber = int(Request.get('FirstRouteNumber'))
+		NewProjects, SuccessReport = projects.OpenProjectFiles([e.text for e in Request.findall(ProjFileTag)],
+			UsingTemplates=utilities.Bool2Str(Request.get('UsingTemplates')),
+			SaveOnFly=utilities.Bool2Str(Request.get('SaveOnFly')),
+			ProjectFilesToCreate=[e.text for e in Request.findall(FileToCreateTag)])
+		for ThisProj in NewProjects: # the actual Viewports are in the Vizop process; drop the ones made here
+			for ThisViewport in ThisProj.ClientViewports: vizop_misc.SocketRegister.UnregisterViewport(ThisViewport)
+			ThisProj.ClientViewports = []
+		self.Projects += NewProjects
+		if (self.CurrentProj is None) and NewProjects: self.CurrentProj = NewProjects[0]
+		Reply = ElementTree.Element(OpenProjectsReplyTag, attrib={'F2CSocketNo': str(self.F2CSocketNo),
+			'C2FSocketNo': str(self.C2FSocketNo),
+			'ViewportChannelAddress': vizop_misc.ViewportChannelFor(BelongsToDatacore=True).Address,
+			'ChangeBroadcastAddress': vizop_misc.ChangeBroadcastEnd(BelongsToDatacore=True).ExternalAddress,
+			'LastRouteNumber': str(vizop_misc.GetNewRouteNumber.LastRouteNumber)})
+		for ThisReport in SuccessReport:
+			ElementTree.SubElement(Reply, 'File', attrib={'OpenedOK': utilities.Bool2Str(ThisReport['OpenedOK']),
+				'ProblemReport': ThisReport.get('ProblemReport', '')})
+		for ThisProj in NewProjects:
+			ElementTree.SubElement(Reply, 'Project', attrib={'ID': ThisProj.ID,
+				'OutputFilename': ThisProj.OutputFilename if ThisProj.OutputFileMade else ''})
+		return Reply
+
+	def HandleRequestFromVizop(self, MessageReceived=b''):
+		# handle a request from DatacoreProcess in the Vizop process. Return XML root element of the reply
+		Request = vizop_misc.DecodeMessage(MessageReceived)
+		if Request.tag == OpenProjectsTag: return self.OpenProjects(Request)
+		if Request.tag == StopTag:
+			self.Stopping = True
+			return ElementTree.Element(StopReplyTag)
+		return vizop_misc.MakeXMLMessage(RootName='Fail', RootText='UnknownCommand')
+
+	def UpdateMessagePumpHandlers(self):
+		# rebuild the message pump's table of socket handlers, if sockets have been added to or removed from the register
+		# since it was last built. Requests from DatacoreProcess come first
+		if vizop_misc.SocketRegister.ChangeCount == self.MessagePumpSignature: return
+		self.MessagePumpSignature = vizop_misc.SocketRegister.ChangeCount
+		self.MessagePump.ClearHandlers()
+		self.MessagePump.SetHandler(self.Socket, Handler=self.HandleRequestFromVizop)
+		self.SetDatacorePumpHandlers(self.MessagePump)
+
+	def Run(self):
+		# main loop: handle messages until asked to stop, or until Vizop has gone. Then let any saves still queued
+		# finish, so that project files aren't left half written. If Vizop has gone, the projects' recovery sessions are
+		# left open, so that the changes saved on the fly can be recovered next time Vizop starts
+		while not self.Stopping:
+			if os.getppid() != self.ParentProcessID: break # Vizop has gone; don't outlive it
+			self.UpdateMessagePumpHandlers()
+			# if messages were handled last time, or Viewports are waiting for update, wait only briefly for more
+			MessagesHandled = self.MessagePump.Pump(Timeout=info.MessagePumpFollowOnTimeout
+				if (self.MessagePumpBusy or self.ViewportUpdates) else info.DatacoreProcessPollInterval)
+			self.MessagePumpBusy = bool(MessagesHandled)
+			self.DatacoreUpdateViewportsAfterMessages(MessagesHandled)
+			self.DatacoreFlushViewportUpdates(Quiet=not MessagesHandled)
+		for ThisProj in self.Projects:
+			ThisProj.SaveQueue.WaitUntilIdle()
+			if self.Stopping: projects.EndRecoverySession(ThisProj)
+
+def RunDatacoreHost(Address, ParentProcessID):
+	# main program of the datacore process: connect to DatacoreProcess at Address (str), and run the datacore until
+	# asked to stop, or until the Vizop process (with ParentProcessID, int) has gone
+	import wx
+	import controlframe, alarmrat # imported here, as controlframe imports this module. Importing them catalogues the
+		# Viewport and PHA model classes, as in module vizop
+	App = wx.App(False) # needed for fonts and other wx objects made in the datacore; no window is shown
+	DatacoreHost(Address=Address, ParentProcessID=ParentProcessID).Run()
+
+class DatacoreProcess(object): # handle in the Vizop process on a datacore process. It starts the process, asks it to
+	# open projects, tells whether it has died, and stops it. Modelled on datacore_worker.WorkerSupervisor
+
+	def __init__(self, Context=None, MaxRestarts=info.DatacoreProcessMaxRestarts):
+		# Context: zmq context to use; if None, the process's global context is used
+		assert isinstance(MaxRestarts, int)
+		object.__init__(self)
+		self.Context = Context
+		self.Socket = (Context or zmq.Context.instance()).socket(zmq.DEALER)
+		self.Address = 'tcp://127.0.0.1:%d' % self.Socket.bind_to_random_port('tcp://127.0.0.1')
+		self.MaxRestarts = MaxRestarts
+		self.Process = None # subprocess.Popen instance of the datacore process; None if not started
+		self.ProcessNumber = 0 # increments each time a datacore process is started
+		self.Ready = False # whether the current datacore process has connected and is ready for requests
+		self.Connection = {} # socket numbers (int) and addresses (str) of the current datacore process's ends of the
+			# control frame's sockets, Viewport channel and change broadcast channel
+		self.OpenArgs = {} # args of the last request to open projects, for OpenProjectsInDatacoreProcess()
+		self.ProjectsOpened = [] # for each project open in the current datacore process, dict with keys: ID (str),
+			# OutputFilename (str; '' if not saved on the fly)
+		self.Stats = {'ProcessesStarted': 0, 'Crashes': 0, 'LastExitCode': None}
+
+	def IsRunning(self):
+		# return bool: whether the datacore process is running
+		return (self.Process is not None) and (self.Process.poll() is None)
+
+	def Start(self):
+		# start a new datacore process
+		self.Process = subprocess.Popen([sys.executable, os.path.abspath(__file__), self.Address, str(os.getpid())],
+			cwd=os.path.dirname(os.path.abspath(__file__)))
+		self.ProcessNumber += 1
+		self.Ready = False
+		self.Connection = {}
+		self.ProjectsOpened = []
+		self.Stats['ProcessesStarted'] += 1
+
+	def WaitForMessage(self, Tag, WhileWaiting=None, Timeout=info.DatacoreProcessOpenTimeout):
+		# wait for a message with tag Tag (str) from the datacore process, calling WhileWaiting (None, or callable taking
+		# no args) at least every info.DatacoreProcessPollInterval ms. Other messages are discarded, after noting whether
+		# the process is ready. Return XML root element of the message, or None if the process exits, or Timeout (int or
+		# float; s) elapses, first
+		Deadline = time.perf_counter() + Timeout
+		while time.perf_counter() < Deadline:
+			if self.Socket.poll(timeout=info.DatacoreProcessPollInterval):
+				Message = message_codec.DecodeMessage(self.Socket.recv())
+				if Message.tag == ProcessReadyTag: self.Ready = True
+				if Message.tag == Tag: return Message
+			elif not self.IsRunning(): return None
+			if WhileWaiting: WhileWaiting()
+		print('DP305 timed out waiting for %s from the datacore process' % Tag)
+		return None
+
+	def OpenProjects(self, ProjectFiles, UsingTemplates, SaveOnFly, FilesToCreate, ControlFrameID, FirstRouteNumber,
+			WhileWaiting=None):
+		# ask the datacore process to open ProjectFiles, starting it if needed. UsingTemplates, SaveOnFly and
+		# FilesToCreate are as for projects.OpenProjectFiles(). ControlFrameID (str): ID of the control frame that will
+		# show the projects. FirstRouteNumber (int): last route number used in this process; the datacore process numbers
+		# the routes of Viewports loaded from the files from here. WhileWaiting: as for WaitForMessage()
+		# Return XML root element of the reply (RP_DP_OpenProjects), or None if the datacore process didn't reply
+		assert isinstance(ControlFrameID, str)
+		assert isinstance(FirstRouteNumber, int)
+		if not self.IsRunning(): self.Start()
+		if (not self.Ready) and (self.WaitForMessage(ProcessReadyTag, WhileWaiting=WhileWaiting) is None): return None
+		Request = ElementTree.Element(OpenProjectsTag, attrib={'UsingTemplates': utilities.Bool2Str(UsingTemplates),
+			'SaveOnFly': utilities.Bool2Str(SaveOnFly), 'ControlFrame': ControlFrameID,
+			'FirstSocketNumber': str(info.DatacoreProcessFirstSocketNumber +
+			info.DatacoreProcessSocketNumberStride * (self.ProcessNumber - 1)),
+			'FirstRouteNumber': str(FirstRouteNumber)})
+		for ThisFilename in ProjectFiles: ElementTree.SubElement(Request, ProjFileTag).text = ThisFilename
+		for ThisFilename in FilesToCreate: ElementTree.SubElement(Request, FileToCreateTag).text = ThisFilename
+		self.Socket.send(message_codec.EncodeMessage(Request))
+		Reply = self.WaitForMessage(OpenProjectsReplyTag, WhileWaiting=WhileWaiting)
+		if Reply is None: return None
+		self.OpenArgs = {'ProjectFiles': ProjectFiles, 'UsingTemplates': UsingTemplates, 'SaveOnFly': SaveOnFly,
+			'FilesToCreate': FilesToCreate}
+		self.Connection = {'F2CSocketNo': int(Reply.get('F2CSocketNo')), 'C2FSocketNo': int(Reply.get('C2FSocketNo')),
+			'ViewportChannelAddress': Reply.get('ViewportChannelAddress'),
+			'ChangeBroadcastAddress': Reply.get('ChangeBroadcastAddress')}
+		self.ProjectsOpened += [{'ID': e.get('ID'), 'OutputFilename': e.get('OutputFilename', '')}
+			for e in Reply.findall('Project')]
+		return Reply
+
+	def HasDied(self):
+		# return bool: whether the datacore process has exited without being asked to, since this was last called.
+		# Should be called regularly, e.g. in idle time
+		if (self.Process is None) or (self.Process.poll() is None): return False
+		self.Stats['Crashes'] += 1
+		self.Stats['LastExitCode'] = self.Process.returncode
+		print('DP352 datacore process exited with code %s' % self.Process.returncode)
+		self.Process = None
+		self.Ready = False
+		return True
+
+	def CanRestart(self):
+		# return bool: whether the datacore process may be restarted after dying
+		return self.Stats['ProcessesStarted'] <= self.MaxRestarts
+
+	def RestartArgs(self, WhileWaiting=None):
+		# return dict of args for OpenProjectsInDatacoreProcess() to reopen the projects the datacore process had open
+		# when it died. If they were all saved on the fly, the updates saved in each output file are replayed onto its
+		# last full image (see project_recovery module), and the recovered projects are saved on the fly to the same
+		# output files again. Otherwise, the files last opened are reopened without saving on the fly, and any changes
+		# made since are lost. WhileWaiting: as for datacore_worker.RunJob()
+		OutputFilenames = [p['OutputFilename'] for p in self.ProjectsOpened]
+		if OutputFilenames and all(OutputFilenames):
+			RecoveredFilenames = [project_recovery.RecoveredFilename(f) for f in OutputFilenames]
+			Recovered = True
+			for (ThisFilename, ThisRecoveredFilename) in zip(OutputFilenames, RecoveredFilenames):
+				Stats = datacore_worker.RunJob('RQ_WK_ReplayUpdates', WhileWaiting=WhileWaiting, Context=self.Context,
+					ProjFilename=ThisFilename, RecoveredProjFilename=ThisRecoveredFilename)
+				print('DP374 recovery stats after datacore process died: ', Stats)
+				Recovered = Recovered and Stats.get('WriteOK', False) # WriteOK is absent if the job failed
+			if Recovered:
+				return {'ProjectFiles': RecoveredFilenames, 'UsingTemplates': False, 'SaveOnFly': True,
+					'FilesToCreate': OutputFilenames}
+			# the output files are left with their recovery sessions open, so that Vizop offers to recover them next time
+			return {'ProjectFiles': OutputFilenames, 'UsingTemplates': False, 'SaveOnFly': False, 'FilesToCreate': []}
+		return dict(self.OpenArgs, SaveOnFly=False)
+
+	def Stop(self):
+		# ask the datacore process to finish its saves and exit, and wait for it; kill it if it doesn't exit in time
+		if self.IsRunning() and not self.Ready: self.Process.kill() # it can't be asked to stop until it's ready
+		elif self.IsRunning():
+			try:
+				self.Socket.send(message_codec.EncodeMessage(ElementTree.Element(StopTag)), flags=zmq.NOBLOCK)
+				self.Process.wait(timeout=info.DatacoreProcessStopTimeout)
+			except (zmq.Again, subprocess.TimeoutExpired): self.Process.kill()
+		self.Process = None
+		self.Ready = False
+		self.Socket.close(linger=0)
+
+def OpenProjectsInDatacoreProcess(Process, ProjectFiles, UsingTemplates, SaveOnFly, FilesToCreate, ControlFrameID,
+		ProgressCallback=None, WhileWaiting=None):
+	# open ProjectFiles (list of str) in the datacore process handled by Process (DatacoreProcess instance), starting it
+	# if needed, then open a copy of each project in this process for the control frame with ControlFrameID (str) to
+	# show, with its Viewports connected to the datacore process. UsingTemplates, SaveOnFly, FilesToCreate and
+	# ProgressCallback are as for projects.OpenProjectFiles(); the copies aren't saved on the fly, as the datacore
+	# process does the saving. WhileWaiting: as for DatacoreProcess.WaitForMessage()
+	# Return the copies (list of ProjectItem instances) and SuccessReport (list of dict, 1 per file, as returned by
+	# projects.OpenProjectFiles()). If the datacore process couldn't open the projects, the list of copies is empty
+	assert isinstance(Process, DatacoreProcess)
+	FirstRouteNumber = getattr(vizop_misc.GetNewRouteNumber, 'LastRouteNumber', 0)
+	Reply = Process.OpenProjects(ProjectFiles, UsingTemplates=UsingTemplates, SaveOnFly=SaveOnFly,
+		FilesToCreate=FilesToCreate, ControlFrameID=ControlFrameID, FirstRouteNumber=FirstRouteNumber,
+		WhileWaiting=WhileWaiting)
+	FailureReport = [{'OpenedOK': False, 'ProblemReport': _('The datacore process could not open the project')}
+		for f in ProjectFiles]
+	if Reply is None: return [], FailureReport
+	SuccessReport = [{'OpenedOK': utilities.Bool2Str(e.get('OpenedOK')), 'ProblemReport': e.get('ProblemReport')}
+		for e in Reply.findall('File')]
+	DatacoreProjIDs = [e.get('ID') for e in Reply.findall('Project')]
+	# connect the display ends of the Viewport channel and change broadcast channel to the datacore process
+	vizop_misc.ViewportChannelFor(BelongsToDatacore=False, Address=Process.Connection['ViewportChannelAddress'])
+	vizop_misc.ChangeBroadcastEnd(BelongsToDatacore=False, Address=Process.Connection['ChangeBroadcastAddress'])
+	# open the copies, numbering the routes of their Viewports as the datacore process did
+	vizop_misc.GetNewRouteNumber.LastRouteNumber = FirstRouteNumber
+	Copies, CopiesReport = projects.OpenProjectFiles(ProjectFiles, UsingTemplates=UsingTemplates, SaveOnFly=False,
+		ProjectFilesToCreate=FilesToCreate, ProgressCallback=ProgressCallback)
+	if (len(Copies) != len(DatacoreProjIDs)) or \
+			(vizop_misc.GetNewRouteNumber.LastRouteNumber != int(Reply.get('LastRouteNumber'))):
+		print('DP421 project files opened differently in this process and the datacore process')
+		return [], FailureReport
+	for (ThisCopy, ThisProjID) in zip(Copies, DatacoreProjIDs):
+		ThisCopy.ID = ThisProjID # so that requests about the project are understood by the datacore process
+		# the copy's Viewport shadows stand in for the datacore process's; detach them, so that the Viewports talk only
+		# to the datacore process
+		for ThisViewportShadow in ThisCopy.AllViewportShadows:
+			vizop_misc.SocketRegister.UnregisterViewport(ThisViewportShadow)
+	return Copies, SuccessReport
+
+if __name__ == '__main__':
+	# usage: python datacore_process.py <zmq address of DatacoreProcess's socket> <Vizop's process ID>
+	# normally started by DatacoreProcess, not by hand
+	RunDatacoreHost(Address=sys.argv[1], ParentProcessID=int(sys.argv[2]))
@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+# Module: datacore_worker. This file is part of Vizop. Copyright xSeriCon, 2020
+
+# standard modules needed:
+import os, sys, subprocess, traceback, itertools, collections, time, struct, zlib, zmq
+import xml.etree.ElementTree as ElementTree
+
+# vizop modules needed:
+import info, message_codec, project_recovery, project_check, project_diff
+
+"""
+The datacore_worker module runs headless datacore jobs in a separate local process, so that CPU-bound work doesn't
+compete with the GUI for the GIL and the display keeps repainting while it runs. The worker process is started and
+supervised by a WorkerSupervisor in the Vizop process, which talks to it over a zmq DEALER socket pair on the loopback
+interface, using the same XML messages as the rest of the datacore. Each request's tag is the job's command (a key in
+WorkerJobs), its children are the job's args, and it carries a RequestID attrib, copied into the reply.
+If the worker process dies, the supervisor restarts it (up to info.DatacoreWorkerMaxRestarts times) and resends any
+jobs in progress, so a crash partway through a job doesn't take Vizop down with it. Jobs that raise an exception are
+answered with RP_WK_JobFailed; the worker carries on.
+Whether jobs run in the worker process is set by info.DatacoreInWorkerProcess. RunJob() runs a job in the worker if
+so, else in this process, so callers don't need to know which; RunJobInBackground() does the same without waiting.
+Only jobs that work on files are run in the worker: project files, and image data written out by exports. The live
+project (projects.ProjectItem and its PHA objects) is in the Vizop process, unless the whole datacore runs in a
+datacore process (see module datacore_process), which also uses the worker for recovery after a crash.
+It doesn't import wx. The worker process is started as:
+	python datacore_worker.py <supervisor's zmq address> <supervisor's process ID>
+"""
+
+WorkerReadyTag = 'NO_WK_Ready' # sent by the worker when it has connected and is ready for jobs
+WorkerStopTag = 'RQ_WK_Stop' # asks the worker to exit
+JobFailedTag = 'RP_WK_JobFailed' # reply to a job that raised an exception, or whose command isn't recognised
+ValueKindAttribName = 'Kind' # in each element of a job's result: type of the value (a key in ValueKinds)
+# keys are value kinds; values are (Python type, function to convert text to value)
+ValueKinds = {'str': (str, str), 'int': (int, int), 'float': (float, float), 'bool': (bool, lambda t: t == 'y')}
+
+def ResultElement(Tag, Value):
+	# return XML element with tag Tag (str) containing Value (str, int, float or bool), with its kind as an attrib
+	Kind = [k for (k, (ThisType, Converter)) in ValueKinds.items() if type(Value) is ThisType][0]
+	ThisElement = ElementTree.Element(Tag, attrib={ValueKindAttribName: Kind})
+	ThisElement.text = {True: 'y', False: 'n'}[Value] if Kind == 'bool' else str(Value)
+	return ThisElement
+
+def ResultFromReply(Reply):
+	# return dict: the result of a job, built from its Reply (XML root element). Keys are the tags of Reply's children;
+	# values are their contents, converted back to their original types
+	return dict([(e.tag, ValueKinds[e.get(ValueKindAttribName, 'str')][1](e.text or '')) for e in Reply])
+
+def DoPing():
+	# job: return the worker's process ID, to check it's responding
+	return {'ProcessID': os.getpid()}
+
+def DoReplayUpdates(ProjFilename, RecoveredProjFilename):
+	# job: replay the updates in project file ProjFilename onto its last full image, writing the result to
+	# RecoveredProjFilename (both str). Return the stats from project_recovery.ReplayUpdates()
+	return project_recovery.ReplayUpdates(ProjFilename, RecoveredProjFilename)
+
+def DoCheckProjectFile(ProjFilename, RepairedFilename=''):
+	# job: check project file ProjFilename (str), and write a repaired copy to RepairedFilename (str) if supplied.
+	# Return dict: counts of problems found, and a description of each problem, one per line
+	Checker = project_check.CheckProjectFile(ProjFilename, RepairedFilename=RepairedFilename or None)
+	return {'Problems': len(Checker.Problems), 'FatalProblems': len([p for p in Checker.Problems if p.Fatal]),
+		'ElementsChecked': Checker.ElementsChecked, 'Duration': Checker.Duration,
+		'ProblemReport': '\n'.join(str(p) for p in Checker.Problems)}
+
+def DoDiffProjectFiles(OldProjFilename, NewProjFilename):
+	# job: compare project files OldProjFilename and NewProjFilename (str). Return the stats from
+	# project_diff.DiffProjectFiles(), the number of differences found and a description of each, one per line
+	Diffs, Stats = project_diff.DiffProjectFiles(OldProjFilename, NewProjFilename)
+	Stats.update({'Differences': len(Diffs), 'DiffReport': '\n'.join(str(d) for d in Diffs)})
+	return Stats
+
+def DoWritePNG(RawFilename, Width, Height, FilePath):
+	# job: write PNG image file FilePath (str) from raw RGB image data (3 bytes per pixel, rows top to bottom) in file
+	# RawFilename (str), with Width and Height (str; pixels). The raw data file is deleted. Return dict: size of the PNG
+	# file written (bytes)
+	ImageWidth, ImageHeight = int(Width), int(Height)
+	with open(RawFilename, 'rb') as RawFile: RGBData = RawFile.read()
+	os.remove(RawFilename)
+	assert len(RGBData) == ImageWidth * ImageHeight * 3, "Raw image data is the wrong size"
+	RowLength = ImageWidth * 3
+	# each row of the image starts with a filter type byte (0: no filter)
+	ImageData = b''.join([b'\x00' + RGBData[Start:Start + RowLength]
+		for Start in range(0, len(RGBData), RowLength)])
+
+	def Chunk(Tag, Data): # return PNG chunk with Tag (bytes) containing Data (bytes)
+		return struct.pack('>I', len(Data)) + Tag + Data + struct.pack('>I', zlib.crc32(Tag + Data) & 0xffffffff)
+
+	PNGData = b'\x89PNG\r\n\x1a\n' + Chunk(b'IHDR', struct.pack('>IIBBBBB', ImageWidth, ImageHeight, 8, 2, 0, 0, 0)) + \
+		Chunk(b'IDAT', zlib.compress(ImageData, info.ExportPNGCompressionLevel)) + Chunk(b'IEND', b'')
+	with open(FilePath, 'wb') as PNGFile: PNGFile.write(PNGData)
+	return {'Bytes': len(PNGData)}
+
+# jobs the worker can run. Keys are commands (request tags); values are functions taking the job's args as keyword args
+# (all str) and returning a dict of results (values str, int, float or bool)
+WorkerJobs = {'RQ_WK_Ping': DoPing, 'RQ_WK_ReplayUpdates': DoReplayUpdates,
+	'RQ_WK_CheckProjectFile': DoCheckProjectFile, 'RQ_WK_DiffProjectFiles': DoDiffProjectFiles,
+	'RQ_WK_WritePNG': DoWritePNG}
+
+def MakeRequest(Command, RequestID, Args):
+	# return XML root element of a request to run job Command (str) with Args (dict; values str)
+	Request = ElementTree.Element(Command, attrib={info.RequestIDAttribName: RequestID})
+	for (ThisArgName, ThisArgValue) in Args.items(): ElementTree.SubElement(Request, ThisArgName).text = ThisArgValue
+	return Request
+
+def HandleJobRequest(Request):
+	# run the job requested in Request (XML root element). Return XML root element of the reply
+	RequestID = Request.get(info.RequestIDAttribName, '')
+	try:
+		Result = WorkerJobs[Request.tag](**dict([(e.tag, e.text or '') for e in Request]))
+		Reply = ElementTree.Element('RP' + Request.tag[2:], attrib={info.RequestIDAttribName: RequestID})
+	except Exception: # the job failed; report it, and carry on with the next job
+		Result = {'JobFailed': True, 'ProblemReport': 'UnknownCommand' if Request.tag not in WorkerJobs else
+			traceback.format_exc()}
+		Reply = ElementTree.Element(JobFailedTag, attrib={info.RequestIDAttribName: RequestID})
+	Reply.extend([ResultElement(ThisTag, ThisValue) for (ThisTag, ThisValue) in Result.items()])
+	return Reply
+
+def RunWorker(Address, ParentProcessID):
+	# main loop of the worker process: connect to the supervisor at Address (str), and run jobs as they arrive until
+	# asked to stop, or until the parent process (with ParentProcessID, int) has gone
+	Context = zmq.Context()
+	Socket = Context.socket(zmq.DEALER)
+	Socket.connect(Address)
+	Socket.send(message_codec.EncodeMessage(ElementTree.Element(WorkerReadyTag,
+		attrib={'ProcessID': str(os.getpid())})))
+	while True:
+		if Socket.poll(timeout=info.DatacoreWorkerPollInterval):
+			Request = message_codec.DecodeMessage(Socket.recv())
+			if Request.tag == WorkerStopTag: break
+			Socket.send(message_codec.EncodeMessage(HandleJobRequest(Request)))
+		elif os.getppid() != ParentProcessID: break # parent has gone; don't outlive it
+	Socket.close(linger=0)
+	Context.term()
+
+class WorkerJob(object): # a job submitted to the worker process by WorkerSupervisor
+
+	def __init__(self, JobID, Command, Args, Callback=None):
+		# JobID (str): unique ID of the job; sent as the request's RequestID
+		# Command (str): a key in WorkerJobs. Args (dict; values str): args for the job
+		# Callback: None, or callable taking one arg (this job), called when the job is finished
+		assert isinstance(JobID, str)
+		assert Command in WorkerJobs
+		assert isinstance(Args, dict)
+		assert (Callback is None) or callable(Callback)
+		object.__init__(self)
+		self.JobID = JobID
+		self.Command = Command
+		self.Args = Args
+		self.Callback = Callback
+		self.Attempts = 0 # number of times the job has been sent to a worker process
+		self.SentToWorker = None # number of the worker process (WorkerSupervisor.WorkerNumber) it was last sent to
+		self.Result = None # dict of results when finished (see HandleJobRequest()); None if not finished yet
+
+	def Done(self):
+		# return bool: whether the job is finished (successfully or not)
+		return self.Result is not None
+
+	def Succeeded(self):
+		# return bool: whether the job is finished, and didn't fail
+		return self.Done() and not self.Result.get('JobFailed', False)
+
+class WorkerSupervisor(object): # starts the worker process, sends it jobs, and restarts it if it dies.
+	# Service() should be called regularly (e.g. in idle time) to collect replies and check the worker is still alive
+
+	def __init__(self, Context=None, MaxRestarts=info.DatacoreWorkerMaxRestarts):
+		# Context: zmq context to use; if None, the process's global context is used
+		assert isinstance(MaxRestarts, int)
+		object.__init__(self)
+		self.Socket = (Context or zmq.Context.instance()).socket(zmq.DEALER)
+		self.Address = 'tcp://127.0.0.1:%d' % self.Socket.bind_to_random_port('tcp://127.0.0.1')
+		self.MaxRestarts = MaxRestarts
+		self.Process = None # subprocess.Popen instance of the worker process; None if not started
+		self.WorkerNumber = 0 # increments each time a worker process is started
+		self.WorkerReady = False # whether the current worker process has connected and is ready for jobs
+		self.JobsPending = collections.OrderedDict() # keys are job IDs, values are WorkerJob instances not finished yet
+		self.JobIDs = itertools.count(1)
+		self.Stats = {'WorkersStarted': 0, 'Crashes': 0, 'JobsSubmitted': 0, 'JobsDone': 0, 'JobsFailed': 0,
+			'JobsResent': 0, 'LastExitCode': None}
+
+	def IsRunning(self):
+		# return bool: whether the worker process is running
+		return (self.Process is not None) and (self.Process.poll() is None)
+
+	def Start(self):
+		# start a new worker process. Any pending jobs are sent to it when it's ready
+		self.Process = subprocess.Popen([sys.executable, os.path.abspath(__file__), self.Address, str(os.getpid())],
+			cwd=os.path.dirname(os.path.abspath(__file__)))
+		self.WorkerNumber += 1
+		self.WorkerReady = False
+		self.Stats['WorkersStarted'] += 1
+
+	def SendJob(self, Job):
+		# send Job (WorkerJob instance) to the current worker process, without blocking. Return bool: whether it was
+		# sent. If not (e.g. the worker has died), the job stays pending, and Service() sends it to the next worker
+		assert isinstance(Job, WorkerJob)
+		if not self.IsRunning(): return False
+		try: self.Socket.send(message_codec.EncodeMessage(MakeRequest(Job.Command, Job.JobID, Job.Args)),
+			flags=zmq.NOBLOCK)
+		except zmq.Again: # worker isn't connected, or isn't taking messages
+			print('DW180 datacore worker not accepting jobs; job %s held back' % Job.JobID)
+			return False
+		if Job.Attempts: self.Stats['JobsResent'] += 1
+		Job.Attempts += 1
+		Job.SentToWorker = self.WorkerNumber
+		return True
+
+	def Submit(self, Command, Callback=None, **Args):
+		# submit job Command (str; a key in WorkerJobs) with Args (values str) to the worker process, starting it if
+		# needed. Callback: None, or callable taking one arg (the job), called from Service() when the job is finished.
+		# Return the WorkerJob instance
+		Job = WorkerJob(JobID=str(next(self.JobIDs)), Command=Command, Args=Args, Callback=Callback)
+		self.JobsPending[Job.JobID] = Job
+		self.Stats['JobsSubmitted'] += 1
+		if self.IsRunning():
+			if self.WorkerReady: self.SendJob(Job)
+		elif self.Process is not None: self.Service() # worker has died; restart it, or fail the job if we can't
+		else: self.Start()
+		return Job
+
+	def FinishJob(self, Job, Result):
+		# record Result (dict) of Job (WorkerJob instance), and call its callback
+		self.JobsPending.pop(Job.JobID, None)
+		Job.Result = Result
+		self.Stats['JobsFailed' if Result.get('JobFailed', False) else 'JobsDone'] += 1
+		if Job.Callback: Job.Callback(Job)
+
+	def Service(self):
+		# handle replies from the worker, and restart it if it has died. Return number of replies handled (int)
+		RepliesHandled = 0
+		while self.Socket.poll(timeout=0):
+			Reply = message_codec.DecodeMessage(self.Socket.recv())
+			RepliesHandled += 1
+			if Reply.tag == WorkerReadyTag: self.WorkerReady = True
+			elif Reply.get(info.RequestIDAttribName) in self.JobsPending:
+				self.FinishJob(self.JobsPending[Reply.get(info.RequestIDAttribName)], ResultFromReply(Reply))
+		if self.WorkerReady: # send the worker any jobs waiting, including any that couldn't be sent before
+			for ThisJob in [j for j in self.JobsPending.values() if j.SentToWorker != self.WorkerNumber]:
+				if not self.SendJob(ThisJob): break
+		if (self.Process is not None) and not self.IsRunning(): # worker has died
+			self.Stats['Crashes'] += 1
+			self.Stats['LastExitCode'] = self.Process.returncode
+			print('DW227 datacore worker process exited with code %s' % self.Process.returncode)
+			self.Process = None
+			self.WorkerReady = False
+			# jobs already tried too often are likely to be what's crashing the worker, so don't send them again
+			for ThisJob in list(self.JobsPending.values()):
+				if ThisJob.Attempts >= info.DatacoreWorkerMaxAttempts:
+					self.FinishJob(ThisJob, {'JobFailed': True, 'ProblemReport': 'WorkerCrashed'})
+			if self.JobsPending:
+				if self.Stats['WorkersStarted'] <= self.MaxRestarts: self.Start()
+				else:
+					for ThisJob in list(self.JobsPending.values()):
+						self.FinishJob(ThisJob, {'JobFailed': True, 'ProblemReport': 'WorkerUnavailable'})
+		return RepliesHandled
+
+	def WaitForJob(self, Job, WhileWaiting=None, Timeout=info.DatacoreWorkerJobTimeout):
+		# block until Job (WorkerJob instance) is finished, calling WhileWaiting (None, or callable taking no args)
+		# at least every info.DatacoreWorkerPollInterval ms, e.g. to keep the display responsive. Return the job's
+		# result. If the job isn't finished within Timeout (int or float; s), it fails with ProblemReport 'JobTimedOut',
+		# and the worker is killed if the job was sent to it (as it's likely stuck); Service() then restarts it
+		assert isinstance(Job, WorkerJob)
+		Deadline = time.perf_counter() + Timeout
+		while not Job.Done():
+			if time.perf_counter() > Deadline:
+				if (Job.SentToWorker == self.WorkerNumber) and self.IsRunning(): self.Process.kill()
+				self.FinishJob(Job, {'JobFailed': True, 'ProblemReport': 'JobTimedOut'})
+				break
+			if not self.Service(): self.Socket.poll(timeout=info.DatacoreWorkerPollInterval)
+			if WhileWaiting: WhileWaiting()
+		return Job.Result
+
+	def Stop(self):
+		# ask the worker process to exit, and wait for it; kill it if it doesn't exit in time. Pending jobs are abandoned
+		if self.IsRunning():
+			try: # if it isn't ready yet, it can't be asked to stop
+				if not self.WorkerReady: raise zmq.Again
+				self.Socket.send(message_codec.EncodeMessage(ElementTree.Element(WorkerStopTag)), flags=zmq.NOBLOCK)
+				self.Process.wait(timeout=info.DatacoreWorkerStopTimeout)
+			except (zmq.Again, subprocess.TimeoutExpired): self.Process.kill()
+		self.Process = None
+		self.WorkerReady = False
+		self.Socket.close(linger=0)
+
+TheSupervisor = None # WorkerSupervisor instance used by RunJob(); started when first needed
+
+def Supervisor(Context=None):
+	# return the WorkerSupervisor instance used by RunJob(), creating it if needed. Context: zmq context to use
+	global TheSupervisor
+	if TheSupervisor is None: TheSupervisor = WorkerSupervisor(Context=Context)
+	return TheSupervisor
+
+def RunJob(Command, WhileWaiting=None, Context=None, **Args):
+	# run job Command (str; a key in WorkerJobs) with Args (values str), in the worker process if
+	# info.DatacoreInWorkerProcess, else in this process. While waiting for the worker, call WhileWaiting (None, or
+	# callable taking no args). Context: zmq context for the worker's socket, if not started yet.
+	# Return dict of the job's results; if the job failed, it contains JobFailed (True) and ProblemReport (str)
+	if info.DatacoreInWorkerProcess:
+		ThisSupervisor = Supervisor(Context=Context)
+		return ThisSupervisor.WaitForJob(ThisSupervisor.Submit(Command, **Args), WhileWaiting=WhileWaiting)
+	return ResultFromReply(HandleJobRequest(MakeRequest(Command, '', Args)))
+
+def RunJobInBackground(Command, Callback, Context=None, **Args):
+	# run job Command (str; a key in WorkerJobs) with Args (values str), as for RunJob(), but without waiting for the
+	# worker: Callback (callable taking one arg, the dict of the job's results) is called when the job is finished,
+	# from the supervisor's Service() (called in idle time). If the worker isn't in use, the job is run and Callback
+	# called immediately
+	if info.DatacoreInWorkerProcess:
+		Supervisor(Context=Context).Submit(Command, Callback=lambda Job: Callback(Job.Result), **Args)
+	else: Callback(ResultFromReply(HandleJobRequest(MakeRequest(Command, '', Args))))
+
+def StopWorker():
+	# stop the worker process, if running, e.g. when Vizop is closing
+	global TheSupervisor
+	if TheSupervisor is not None: TheSupervisor.Stop()
+	TheSupervisor = None
+
+if __name__ == '__main__':
+	# usage: python datacore_worker.py <supervisor's zmq address> <supervisor's process ID>
+	# normally started by WorkerSupervisor, not by hand
+	RunWorker(Address=sys.argv[1], ParentProcessID=int(sys.argv[2]))
@@ -33,6 +33,7 @@ class ViewportMetaClass(type): # a class used to build a list of Viewport classe
 class ViewportBaseClass(object, metaclass=ViewportMetaClass): # base class for all Viewports
 	CanBeCreatedManually = True # whether user can be invited to create a Viewport of this class.
 	IsBaseClass = True # needed by metaclass
+	AcceptsRedrawDelta = False # whether the Viewport can apply delta redraw data (see faulttree.FTObjectInCore.GetRedrawDelta())
 
 	def __init__(self, **Args): # Args must include Proj, a ProjectItem instance. 'ID' is optional arg
 		object.__init__(self)
@@ -52,6 +53,12 @@ class ViewportBaseClass(object, metaclass=ViewportMetaClass): # base class for a
 #		self.GotoMilestoneOnUndoCreate = None # a milestone instance to revert to, if creation of this Viewport is undone
 		self.Exporting = False
 
+	def ResetComposition(self):
+		# discard any state kept from the last time the Viewport was drawn on a display device, so that the next redraw
+		# draws it in full. Called when the Viewport is assigned to a display device, and by subclasses when they
+		# receive full redraw data. Subclasses keeping such state (e.g. faulttree.FTForDisplay) override this
+		pass
+
 #	method StoreViewportCommonDataInXML() is in module projects
 
 def CreateViewport(Proj, ViewportClass, DisplDevice=None, PHAObj=None, DatacoreIsLocal=True, Fonts=[], ID=None, **Args):
@@ -79,15 +86,16 @@ def CreateViewport(Proj, ViewportClass, DisplDevice=None, PHAObj=None, DatacoreI
 	Proj.AssignDefaultNameToViewport(Viewport=NewViewport)
 	# set up sockets for communication with the new Viewport:
 	# D2C (Viewport to core) and C2D. Each socket has both REQ (send) and REP (reply) sides.
-	D2CSocketNo = vizop_misc.GetNewSocketNumber()
-	C2DSocketNo = vizop_misc.GetNewSocketNumber()
+	# The sockets are endpoints on the Viewport channel; the "socket numbers" are the routes they use on the channel
+	D2CSocketNo = vizop_misc.GetNewRouteNumber()
+	C2DSocketNo = vizop_misc.GetNewRouteNumber()
 	# Then we fetch the socket numbers and make the corresponding sockets on the Viewport side.
 	NewViewport.C2DSocketREQ, NewViewport.C2DSocketREQObj, C2DSocketNoReturned = vizop_misc.SetupNewSocket(SocketType='REQ',
 		SocketLabel='C2DREQ_' + NewViewport.ID, PHAObj=PHAObj, Viewport=NewViewport,
-		SocketNo=C2DSocketNo, BelongsToDatacore=False, AddToRegister=True)
+		SocketNo=C2DSocketNo, BelongsToDatacore=False, AddToRegister=True, Multiplexed=True)
 	NewViewport.D2CSocketREP, NewViewport.D2CSocketREPObj, D2CSocketNoReturned = vizop_misc.SetupNewSocket(SocketType='REP',
 		SocketLabel='D2CREP_' + NewViewport.ID, PHAObj=PHAObj, Viewport=NewViewport,
-		SocketNo=D2CSocketNo, BelongsToDatacore=False, AddToRegister=True)
+		SocketNo=D2CSocketNo, BelongsToDatacore=False, AddToRegister=True, Multiplexed=True)
 	# get args to send to SubmitVizopTalksMessage from Viewport, if available
 	VizopTalksArgs = getattr(NewViewport, 'NewViewportVizopTalksArgs', {'MainText': '<No info provided by Viewport>'})
 	VizopTalksTips = getattr(NewViewport, 'NewViewportVizopTalksTips', [])
@@ -562,6 +562,10 @@ class FTHeader(object): # FT header object. Rendered by drawing text into bitmap
 
 class FTBoxyObject(object): # superclass of vaguely box-like FT components for use in FTForDisplay. Provides
 	# definitions of some common attributes and methods
+	# attribs that are set in the Viewport (not from redraw data) and affect the object's appearance; used by
+	# ElementRenderCache
+	DisplayFlagAttribs = ('ShowDescriptionComments', 'ShowValueComments', 'ShowActionItems', 'ShowParkingLotItems',
+		'DetailedView', 'Style')
 
 	def __init__(self, **Args):
 		object.__init__(self)
@@ -2364,7 +2368,7 @@ class FTBuilder(FTBoxyObject): # 'add' button object within an FTColumn.
 		AllElsInColumn = self.FT.Columns[self.ColNo].FTElements
 		IndexInCol = len([El for El in AllElsInColumn[:AllElsInColumn.index(self)] if not isinstance(El, FTBuilder)])
 		# request PHA object to add new element by sending message through zmq
-#		print('FT1494 FT sending request on socket: ',  [(s.SocketNo, s.SocketLabel) for s in vizop_misc.RegisterSocket.Register if s.Socket == self.FT.C2DSocketREQ])
+#		print('FT1494 FT sending request on socket: ',  [(s.SocketNo, s.SocketLabel) for s in vizop_misc.SocketRegister if s.Socket == self.FT.C2DSocketREQ])
 		vizop_misc.SendRequest(Socket=self.FT.C2DSocketREQ, Command='RQ_FT_NewElement',
 			Proj=self.FT.Proj.ID, PHAObj=self.FT.PHAObjID, Viewport=self.FT.ID, Zoom=str(self.FT.Zoom),
 			PanX=str(self.FT.PanX), PanY=str(self.FT.PanY),
@@ -2396,10 +2400,10 @@ class FTColumn(object): # object containing a column of FT objects for display,
 		self.FTElements = [] # list of FT objects in the column, including builder buttons
 
 	def RenderElementsInOwnBitmaps(self, Zoom):
-		# Get each element to calculate its own contents and draw itself in own individual bitmap
-		print('FT2336 starting RenderElementsInOwnBitmaps')
+		# Get each element to calculate its own contents and draw itself in own individual bitmap, unless the bitmap
+		# from the last render is still valid (see ElementRenderCache)
 		for ThisFTObject in self.FTElements:
-			ThisFTObject.RenderIntoBitmap(Zoom)
+			self.FT.RenderCache.Render(ThisFTObject, Zoom)
 
 	def RenderInDC(self, FT, DC, ColOffsetX, ColOffsetY):
 		# Copy all elements of the FTColumn from their own bitmaps into the DC.
@@ -2440,6 +2444,78 @@ class FTColumn(object): # object containing a column of FT objects for display,
 								  for ThisEl in self.FTElements
 								  if ((ThisEl.Selected or not SelectedOnly) and (ThisEl.Visible or not VisibleOnly))])
 
+class ElementRenderCache(object): # cache of the bitmaps of FT elements in an FTForDisplay, so that a full refresh only
+	# redraws the elements whose appearance has changed. Each element's bitmap and size are stored with a state key made
+	# from everything that affects its appearance: its content (the signature of its redraw data), zoom, selection and
+	# highlight state, display flags such as ShowActionItems, and whether the FT is being exported.
+	# An entry is only reused for the same element object, as the element's components hold the layout calculated when
+	# it was rendered (needed for mouse hits). All builder buttons of the same kind share one bitmap.
+	# Call StartPass() before rendering all the elements, and EndPass() afterwards to discard entries for elements
+	# no longer in the FT
+	ZoomSteps = 1000 # zoom values are rounded to 1/ZoomSteps in state keys, so rounding noise doesn't cause cache misses
+	SizeAttribs = ('SizeXInCU', 'SizeYInCU', 'SizeXInPx', 'SizeYInPx') # element attribs set when rendering
+
+	def __init__(self, FT):
+		object.__init__(self)
+		self.FT = FT
+		self.Entries = {} # keys are element IDs, values are (state key, element, bitmap, tuple of values of SizeAttribs)
+		self.BuilderEntries = {} # keys are state keys of builder buttons, values are (bitmap, SizeXInPx, SizeYInPx)
+		self.SelectedElements = set() # elements currently selected; set in StartPass()
+		self.IDsRendered = set() # IDs of elements rendered in the current pass
+		self.ElementsRedrawn = [] # elements (apart from builder buttons) actually redrawn in the current pass
+		# performance counters: elements taken from cache, elements redrawn, entries discarded in EndPass()
+		self.Stats = {'Hits': 0, 'Misses': 0, 'Discarded': 0}
+
+	def StartPass(self):
+		self.SelectedElements = set(self.FT.CurrentElements)
+		self.IDsRendered = set()
+		self.ElementsRedrawn = []
+
+	def EndPass(self):
+		for ThisID in set(self.Entries) - self.IDsRendered:
+			del self.Entries[ThisID]
+			self.Stats['Discarded'] += 1
+
+	def StateKey(self, FTElement, Zoom):
+		# return hashable key (tuple) describing everything that affects the appearance of FTElement at Zoom (float)
+		return (getattr(FTElement, 'RedrawSignature', None), int(round(Zoom * self.ZoomSteps)),
+			FTElement in self.SelectedElements, self.FT.Exporting,
+			self.FT.ComponentNameToHighlight if self.FT.ElementIDContainingComponentToHighlight == FTElement.ID else '',
+			tuple([getattr(FTElement, a, None) for a in FTBoxyObject.DisplayFlagAttribs]))
+
+	def Render(self, FTElement, Zoom):
+		# make sure FTElement's Bitmap and size attribs are up to date for Zoom (float), redrawing it only if needed
+		if isinstance(FTElement, FTBuilder):
+			StateKey = (FTElement.ObjTypeRequested.InternalName, int(round(Zoom * self.ZoomSteps)), self.FT.Exporting)
+			if StateKey in self.BuilderEntries:
+				(FTElement.Bitmap, FTElement.SizeXInPx, FTElement.SizeYInPx) = self.BuilderEntries[StateKey]
+				self.Stats['Hits'] += 1
+			else:
+				FTElement.RenderIntoBitmap(Zoom)
+				self.BuilderEntries[StateKey] = (FTElement.Bitmap, FTElement.SizeXInPx, FTElement.SizeYInPx)
+				self.Stats['Misses'] += 1
+			return
+		self.IDsRendered.add(FTElement.ID)
+		# an element containing the text component being edited is always redrawn, as its text changes locally
+		Editing = getattr(self.FT.CurrentEditComponent, 'HostObject', None) is FTElement
+		StateKey = self.StateKey(FTElement, Zoom)
+		Entry = self.Entries.get(FTElement.ID)
+		if Entry and (Entry[0] == StateKey) and (Entry[1] is FTElement) and not Editing:
+			FTElement.Bitmap = Entry[2]
+			for (ThisAttrib, ThisValue) in zip(self.SizeAttribs, Entry[3]): setattr(FTElement, ThisAttrib, ThisValue)
+			self.Stats['Hits'] += 1
+		else:
+			FTElement.RenderIntoBitmap(Zoom)
+			self.Entries[FTElement.ID] = (StateKey, FTElement, FTElement.Bitmap,
+				tuple([getattr(FTElement, a) for a in self.SizeAttribs]))
+			self.Stats['Misses'] += 1
+			self.ElementsRedrawn.append(FTElement)
+
+	def Clear(self):
+		# discard all cached bitmaps
+		self.Entries = {}
+		self.BuilderEntries = {}
+
 def CalculateRowAndColumnDimensions(Elements, GapBetweenCols, GapBetweenRows, MinColWidth, BorderX, BorderY):
 	# for any kind of components in an FT element, calculate and return column and row sizes in canvas coords (lists),
 	# including GapBetweenRows
@@ -3554,7 +3630,7 @@ class FTConnectorItemInCore(FTElementInCore): # in- and out-connectors (CX's) to
 		# default value is a letter in sequence (A, B, C...). The line below counts all connectors in all FTs
 		# and assigns the letter for the next connector number
 		self.HumanName = core_classes.UpperCaseLetterNumberSystem.HumanValue(1 + len([El
-			for ThisFT in [p for p in FT.Proj.PHAObjs if isinstance(p, FTObjectInCore)] for El in WalkOverAllFTObjs(ThisFT)
+			for ThisFT in [p for p in FT.Proj.PHAObjs if projects.IsPHAObj(p, FTObjectInCore)] for El in WalkOverAllFTObjs(ThisFT)
 			if isinstance(El, FTConnectorItemInCore)]))
 		self.ConnectorDescription = '' # text shown in the CX, if it's an out-CX. Also shown in in-CX if RelatedCX is None.
 		self.ConnectorDescriptionComments = [] # list of AssociatedTextItem instances
@@ -3631,7 +3707,7 @@ class FTConnectorItemInCore(FTElementInCore): # in- and out-connectors (CX's) to
 		if self.Out: # make sure this is a Connector-Out
 			AvailableConnectorsIn = []
 			# search over all other FTs in the project
-			for ThisFT in [p for p in self.FT.Proj.PHAObjs if isinstance(p, FTObjectInCore) if not (p is self.FT)]:
+			for ThisFT in [p for p in self.FT.Proj.PHAObjs if projects.IsPHAObj(p, FTObjectInCore) if not (p is self.FT)]:
 				# search over all connectors-in in the FT
 				for ThisCXIn in [e for e in WalkOverAllFTObjs(ThisFT) if isinstance(e, FTConnectorItemInCore) if not e.Out
 					if (e.RelatedCX is None)]:
@@ -3685,7 +3761,7 @@ class FTConnectorItemInCore(FTElementInCore): # in- and out-connectors (CX's) to
 		if self.Out: # make sure this is a Connector-Out
 			AlreadyConnectorsIn = []
 			# search over all FTs in the project (other than this one, as connecting within same FT is not allowed)
-			for ThisFT in [p for p in self.FT.Proj.PHAObjs if isinstance(p, FTObjectInCore) if not (p is self.FT)]:
+			for ThisFT in [p for p in self.FT.Proj.PHAObjs if projects.IsPHAObj(p, FTObjectInCore) if not (p is self.FT)]:
 				# search over all connectors-in in the FT
 				for ThisCXIn in [e for e in WalkOverAllFTObjs(ThisFT) if isinstance(e, FTConnectorItemInCore)
 					if not e.Out]:
@@ -3827,6 +3903,18 @@ class FTObjectInCore(core_classes.PHAModelBaseClass):
 			# key 'Value' is used for elements other than the FT itself
 	# define which element classes have a number system, i.e. have a Numbering attrib. Must be tuple, not list
 	ElementsWithNumberSystem = (FTConnectorItemInCore, FTGateItemInCore, FTEventInCore)
+	# commands in HandleIncomingRequest() that change the FT's data, so that the FT must be included in the next save
+	EditCommands = ('RQ_FT_NewElement', 'RQ_FT_ChangeText', 'RQ_FT_ChangeChoice', 'RQ_FT_DescriptionCommentsVisible',
+		'RQ_FT_ValueCommentsVisible', 'RQ_FT_ActionItemsVisible', 'RQ_FT_ChangeConnection', 'RQ_FT_JoinConnectors',
+		'RQ_FT_DisconnectConnectors', 'RQ_FT_UpdateFullExportAttribs', 'RQ_FT_NewComment', 'RQ_FT_ChangeComment',
+		'RQ_FT_DeleteComment', 'RQ_FT_NewAssociatedText', 'RQ_FT_ChangeAssociatedText', 'RQ_FT_DeleteAssociatedText',
+		'RQ_FT_DeleteElement')
+	# edit commands that also change project-level data, such as the project's lists of associated texts
+	ProjectEditCommands = ('RQ_FT_UpdateFullExportAttribs', 'RQ_FT_NewAssociatedText', 'RQ_FT_ChangeAssociatedText',
+		'RQ_FT_DeleteAssociatedText')
+	# edit commands whose effect on redraw data is covered by the column layout and header, which are always checked
+	# when making delta redraw data, so they don't need to record changed elements (see NoteElementsChanged())
+	LayoutEditCommands = ('RQ_FT_NewElement', 'RQ_FT_UpdateFullExportAttribs')
 
 	def __init__(self, Proj, **Args):
 		core_classes.PHAModelBaseClass.__init__(self, Proj, **Args)
@@ -3867,6 +3955,9 @@ class FTObjectInCore(core_classes.PHAModelBaseClass):
 			'Severity': SeverityObjs}
 		self.ModelGate = None # (None or FTGateItemInCore instance in this FT) gate to use as model when creating a new gate
 		self.CollapseGroups = [] # list of instances of FTCollapseGroupInCore
+		self.RedrawRevision = 0 # serial number of the last redraw data made by GetFullRedrawData()
+		self.ElementChanges = {} # keys are values of self.Revision; values are sets of IDs of elements changed in that
+			# revision, or None if any element may have changed. Used by GetRedrawDelta()
 
 	def SetTolFreq(self): # set tolerable frequency for all risk receptors, by lookup in risk model according to severity
 		for RR in self.Severity.keys():
@@ -4068,10 +4159,12 @@ class FTObjectInCore(core_classes.PHAModelBaseClass):
 			return [ [r] for r in self.Severity.keys() ] # return RR's in individual groups
 		else: raise ValueError("Unknown GroupingOption '%s'" % GroupingOption)
 
-	def GetFullRedrawData(self, Viewport=None, ViewportClass=None, **Args):
+	def GetFullRedrawData(self, Viewport=None, ViewportClass=None, ElementIDsToInclude=None, **Args):
 		# return all data in FTObjectInCore as an XML tree, for sending to Viewport to fully draw the FT
 		# Viewport (instance of ViewportShadow): the Viewport to be displayed (not currently used)
 		# ViewportClass (subclass of ViewportBaseClass): the class of the displayable Viewport
+		# ElementIDsToInclude (set of str, or None): if supplied, only records of elements with these IDs are included
+		# in the columns (used by GetRedrawDelta())
 		# Args: can include ExtraXMLTagsAsDict (dict; keys: tags to be included in output XML data; values: tag texts)
 		# Args: can include ExtraXMLTagsAsTags (ElementTree XML element to append directly to XML tree)
 
@@ -4520,6 +4613,7 @@ class FTObjectInCore(core_classes.PHAModelBaseClass):
 			assert isinstance(FT, FTObjectInCore)
 			ColumnEl = ElementTree.SubElement(El, info.FTColumnTag)
 			for Obj in Col.FTElements: # work through all objects in Col
+				if (ElementIDsToInclude is not None) and (Obj.ID not in ElementIDsToInclude): continue
 				if isinstance(Obj, FTEventInCore):
 					assert isinstance(Obj.ID, str)
 					assert isinstance(Obj.IsIPL, bool)
@@ -4553,8 +4647,83 @@ class FTObjectInCore(core_classes.PHAModelBaseClass):
 		if 'ExtraXMLTagsAsTags' in Args:
 			assert isinstance(Args['ExtraXMLTagsAsTags'], ElementTree.Element)
 			RootElement.append(Args['ExtraXMLTagsAsTags'])
+		# stamp the data with a new revision number. If the Viewport can accept delta redraw data, store what it's being
+		# sent, as the base for the next delta (see GetRedrawDelta())
+		self.RedrawRevision += 1
+		RootElement.set(info.RedrawRevisionAttribName, str(self.RedrawRevision))
+		if (Viewport is not None) and getattr(ViewportClass, 'AcceptsRedrawDelta', False):
+			Viewport.RedrawBase = (self.RedrawRevision, [[El.ID for El in Col.FTElements] for Col in self.Columns],
+				self.Revision, self.ExternalRedrawDependencies())
 		return RootElement
 
+	def GetRedrawDelta(self, Viewport, ViewportClass=None, **Args):
+		# return XML tree for sending to Viewport (a ViewportShadow) to bring its display of the FT up to date.
+		# If Viewport has been sent redraw data before, only the FT elements added or changed since then are included
+		# in full, plus the column layout if it changed; removed elements are absent from the layout. Otherwise, full
+		# redraw data is returned. Overall FT data and header data are always included in full.
+		# Changed elements are found from self.ElementChanges, so records are only made for elements that may have
+		# changed: those recorded by NoteElementsChanged(), elements new to the layout, other elements in their columns
+		# (as numbering depends on neighbours), and elements downstream of them (as values are calculated from inputs).
+		# If any change since the last redraw data wasn't recorded, or linked PHA objects have changed, full redraw
+		# data is returned.
+		# The Viewport must check that the delta's base revision matches the revision it last received, and reply with
+		# FullRedrawNeededTag if not
+		# Args: as for GetFullRedrawData()
+		assert getattr(ViewportClass, 'AcceptsRedrawDelta', False)
+		OldBase = Viewport.RedrawBase
+		if OldBase is None: # nothing to make a delta from
+			return self.GetFullRedrawData(Viewport=Viewport, ViewportClass=ViewportClass, **Args)
+		OldRedrawRevision, OldLayout, OldRevision, OldDependencies = OldBase
+		ChangesSinceBase = [self.ElementChanges.get(r) for r in range(OldRevision + 1, self.Revision + 1)]
+		if (None in ChangesSinceBase) or (self.ExternalRedrawDependencies() != OldDependencies):
+			return self.GetFullRedrawData(Viewport=Viewport, ViewportClass=ViewportClass, **Args)
+		NewLayout = [[El.ID for El in Col.FTElements] for Col in self.Columns]
+		# find elements to send: recorded changes, plus elements new to the layout
+		ElementsByID = dict([(El.ID, El) for El in WalkOverAllFTObjs(self)])
+		OldIDs = set([ThisID for ThisColIDs in OldLayout for ThisID in ThisColIDs])
+		IDsToSend = set().union(*ChangesSinceBase).union([i for i in ElementsByID if i not in OldIDs])
+		IDsToSend &= set(ElementsByID) # ignore any elements since deleted
+		# add other elements in the same columns, then all elements downstream
+		for ThisCol in set([ElementsByID[i].Column for i in IDsToSend]):
+			IDsToSend.update([El.ID for El in ThisCol.FTElements])
+		ElementsToCheck = [ElementsByID[i] for i in IDsToSend]
+		while ElementsToCheck:
+			for ThisEl in ElementsToCheck.pop().ConnectTo:
+				if ThisEl.ID not in IDsToSend:
+					IDsToSend.add(ThisEl.ID)
+					ElementsToCheck.append(ThisEl)
+		RootElement = self.GetFullRedrawData(Viewport=Viewport, ViewportClass=ViewportClass,
+			ElementIDsToInclude=IDsToSend, **Args)
+		RootElement.set(info.RedrawKindAttribName, info.RedrawKindDelta)
+		RootElement.set(info.RedrawBaseRevisionAttribName, str(OldRedrawRevision))
+		# replace the column elements with records of elements added or changed, and the new layout if needed
+		ChangedEl = ElementTree.SubElement(RootElement, info.ChangedElementsTag)
+		for ThisColEl in RootElement.findall(info.FTColumnTag):
+			RootElement.remove(ThisColEl)
+			for ThisEl in ThisColEl: ChangedEl.append(ThisEl)
+		if NewLayout != OldLayout:
+			LayoutEl = ElementTree.SubElement(RootElement, info.ColumnLayoutTag)
+			for ThisColIDs in NewLayout:
+				ElementTree.SubElement(LayoutEl, info.FTColumnTag).text = ','.join(ThisColIDs)
+		return RootElement
+
+	def NoteElementsChanged(self, ElementIDs):
+		# record that the elements with IDs in ElementIDs (iterable of str, or None if any element may have changed)
+		# were changed in the current revision of the FT, for GetRedrawDelta(). Call after self.MarkChanged()
+		self.ElementChanges[self.Revision] = None if ElementIDs is None else set(ElementIDs)
+		# discard records too old to be used
+		for ThisRevision in [r for r in self.ElementChanges if r <= self.Revision - info.RedrawChangeHistoryLength]:
+			del self.ElementChanges[ThisRevision]
+
+	def ExternalRedrawDependencies(self):
+		# return tuple of (ID, Revision) of other PHA objects in the project whose data can appear in this FT's redraw
+		# data: through connectors, or through project-level associated text lists (whose numbering is project-wide).
+		# Empty if this FT has no such elements
+		if not [El for El in WalkOverAllFTObjs(self) if isinstance(El, FTConnectorItemInCore)
+				or getattr(El, 'ActionItems', None) or getattr(El, 'ParkingLot', None)]:
+			return ()
+		return tuple([(p.ID, getattr(p, 'Revision', None)) for p in self.Proj.PHAObjs if not (p is self)])
+
 	def AddNewElement(self, Proj, ColNo=None, IndexInCol=None, ObjKindRequested=None, **Args):
 		# insert a new non-IPL event of type ObjKindRequested (str; InternalName of an element type in FTObjectInCore for datacore)
 		# into column with index ColNo (str) at index IndexInCol (str)
@@ -5112,9 +5281,6 @@ class FTObjectInCore(core_classes.PHAModelBaseClass):
 			OldNumberObj=OldNumberObj, NewNumberObj=NewNumberObj,
 			HumanText=_('Change number basis for %s') % _(self.ComponentEnglishNames[ValueAttribName]),
 			Zoom=Zoom, PanX=PanX, PanY=PanY))
-		projects.SaveOnFly(self.Proj, UpdateData=vizop_misc.MakeXMLMessage(RootName=info.FTTag,
-			Elements={info.IDTag: self.ID}))
-		# TODO add data for the changed component to the Save On Fly data
 
 	def ChangeNumberKind_Undo(self, Proj, UndoRecord, **Args):
 		assert isinstance(Proj, projects.ProjectItem)
@@ -5161,7 +5327,7 @@ class FTObjectInCore(core_classes.PHAModelBaseClass):
 		ThisConnectorOut = [e for e in WalkOverAllFTObjs(self) if e.ID == ElementID][0]
 		assert isinstance(ThisConnectorOut, FTConnectorItemInCore)
 		# find the connector-in, in a different FT, by searching over all FTs in project other than this one
-		ThisConnectorIn = [e for ThisFT in Proj.PHAObjs if isinstance(ThisFT, FTObjectInCore)
+		ThisConnectorIn = [e for ThisFT in Proj.PHAObjs if projects.IsPHAObj(ThisFT, FTObjectInCore)
 						   if not (ThisFT is self)
 						   for e in WalkOverAllFTObjs(ThisFT) if e.ID == CXInID][0]
 		assert isinstance(ThisConnectorIn, FTConnectorItemInCore)
@@ -5192,7 +5358,7 @@ class FTObjectInCore(core_classes.PHAModelBaseClass):
 		SocketFromDatacore = vizop_misc.SocketWithName(TargetName=Args['SocketFromDatacoreName'])
 		# undo the change to the connection
 #		# find the connector-in (searching over all other FTs in the project)
-#		ThisConnectorIn = [e for ThisFT in Proj.PHAObjs if isinstance(ThisFT, FTObjectInCore)
+#		ThisConnectorIn = [e for ThisFT in Proj.PHAObjs if projects.IsPHAObj(ThisFT, FTObjectInCore)
 #						   if not (ThisFT is self)
 #						   for e in WalkOverAllFTObjs(ThisFT) if e.ID == UndoRecord.ConnectorInID][0]
 #		ThisConnectorOut = utilities.ObjectWithID(WalkOverAllFTObjs(self), TargetID=UndoRecord.ConnectorOutID)
@@ -5228,7 +5394,7 @@ class FTObjectInCore(core_classes.PHAModelBaseClass):
 		if MessageReceived is None:
 			assert isinstance(MessageAsXMLTree, ElementTree.Element)
 			XMLRoot = MessageAsXMLTree
-		else: XMLRoot = ElementTree.fromstring(MessageReceived)
+		else: XMLRoot = vizop_misc.DecodeMessage(MessageReceived)
 		Proj = Args['Proj'] # get ProjectItem object to which the current FT belongs
 		# get the command - it's the tag of the root element
 		Command = XMLRoot.tag
@@ -5291,11 +5457,12 @@ class FTObjectInCore(core_classes.PHAModelBaseClass):
 			# find the connector-out
 			ThisConnectorOut = [e for e in WalkOverAllFTObjs(self) if e.ID == TargetCXOutID][0]
 			# find the connector-in, in a different FT, by searching over all FTs in project other than this one
-			ThisConnectorIn = [e for ThisFT in self.Proj.PHAObjs if isinstance(ThisFT, FTObjectInCore)
+			ThisConnectorIn = [e for ThisFT in self.Proj.PHAObjs if projects.IsPHAObj(ThisFT, FTObjectInCore)
 				if not (ThisFT is self)
 				for e in WalkOverAllFTObjs(ThisFT) if e.ID == TargetCXInID][0]
 			# set the connection at the CX-in end
 			ThisConnectorIn.MakeConnectionWith(ConnectorOut=ThisConnectorOut, Viewport=SourceViewport)
+			ThisConnectorIn.FT.MarkChanged() # the other FT has changed too
 			Reply = vizop_misc.MakeXMLMessage(RootName='OK', RootText='OK')
 		elif Command == 'RQ_FT_DisconnectConnectors': # disconnect connector-in from its related connector-out
 			Reply = self.DisconnectConnector(Proj=Proj, ElementID=XMLRoot.findtext('ConnectorOut'),
@@ -5345,6 +5512,25 @@ class FTObjectInCore(core_classes.PHAModelBaseClass):
 		elif Command == 'OK': # dummy for 'OK' responses - received only to clear the sockets
 			Reply = vizop_misc.MakeXMLMessage(RootName='OK', RootText='OK')
 		if Reply.tag == 'Fail': print('FT4490 command not recognised: ', Command)
+		# include the FT in the next save, if the command changed it, and record the change in the project's output file
+		elif Command in FTObjectInCore.EditCommands:
+			self.MarkChanged()
+			# record which elements changed, for making delta redraw data
+			if Command in FTObjectInCore.LayoutEditCommands: self.NoteElementsChanged([])
+			elif (Command in FTObjectInCore.ProjectEditCommands) or (Command == 'RQ_FT_DeleteElement'):
+				self.NoteElementsChanged(None)
+			elif Command == 'RQ_FT_ChangeConnection':
+				self.NoteElementsChanged([ThisID for Tag in ['Connect', 'Disconnect']
+					for ThisPair in utilities.UnpackPairsList(XMLRoot.findtext(Tag)) for ThisID in ThisPair])
+			elif Command in ['RQ_FT_JoinConnectors', 'RQ_FT_DisconnectConnectors']:
+				self.NoteElementsChanged([XMLRoot.findtext('ConnectorOut')])
+			else:
+				ThisElementID = XMLRoot.findtext('Element') or XMLRoot.findtext('PHAElement')
+				self.NoteElementsChanged(None if ThisElementID in [None, self.ID] else [ThisElementID])
+			projects.SaveOnFly(Proj, UpdateData=vizop_misc.MakeXMLMessage(
+				RootName=info.ProjectRootTag if Command in FTObjectInCore.ProjectEditCommands else info.FTTag,
+				Elements={info.IDTag: self.ID,
+				info.ComponentHostIDTag: XMLRoot.findtext('Element') or XMLRoot.findtext('PHAElement') or self.ID}))
 		return Reply
 
 	def HandleChangeCommentRequest(self, XMLRoot, Viewport, Zoom, PanX, PanY):
@@ -5571,7 +5757,7 @@ class FTObjectInCore(core_classes.PHAModelBaseClass):
 		AssociatedTextListInProj.remove(DoomedAssociatedText)
 		# request Control Frame to switch to the Viewport that was visible when the original edit was made
 		self.RedrawAfterUndoOrRedo(UndoRecord, SocketFromDatacore)
-		projects.SaveOnFly(Proj, UpdateData=vizop_misc.MakeXMLMessage(RootName=info.FTTag,
+		projects.SaveOnFly(Proj, UpdateData=vizop_misc.MakeXMLMessage(RootName=info.AssociatedTextTag,
 			Elements={info.IDTag: self.ID, info.ComponentHostIDTag: UndoRecord.PHAElement.ID}))
 		# TODO add data for the changed component to the Save On Fly data
 		return {'Success': True}
@@ -5613,7 +5799,7 @@ class FTObjectInCore(core_classes.PHAModelBaseClass):
 		AssociatedTextList[UndoRecord.AssociatedTextIndex].Content = UndoRecord.OldAssociatedText
 		# request Control Frame to switch to the Viewport that was visible when the original edit was made
 		self.RedrawAfterUndoOrRedo(UndoRecord, SocketFromDatacore)
-		projects.SaveOnFly(Proj, UpdateData=vizop_misc.MakeXMLMessage(RootName=info.FTTag,
+		projects.SaveOnFly(Proj, UpdateData=vizop_misc.MakeXMLMessage(RootName=info.AssociatedTextTag,
 			Elements={info.IDTag: self.ID, info.ComponentHostIDTag: UndoRecord.PHAElement.ID}))
 		# TODO add data for the changed component to the Save On Fly data
 		return {'Success': True}
@@ -5674,7 +5860,7 @@ class FTObjectInCore(core_classes.PHAModelBaseClass):
 		# request Control Frame to switch to the Viewport that was visible when the original edit was made
 		if UndoRecord.Chain != 'Avalanche':
 			self.RedrawAfterUndoOrRedo(UndoRecord, SocketFromDatacore)
-		projects.SaveOnFly(Proj, UpdateData=vizop_misc.MakeXMLMessage(RootName=info.FTTag,
+		projects.SaveOnFly(Proj, UpdateData=vizop_misc.MakeXMLMessage(RootName=info.AssociatedTextTag,
 			Elements={info.IDTag: self.ID, info.ComponentHostIDTag: UndoRecord.PHAElement.ID}))
 		# TODO add data for the changed component to the Save On Fly data
 		return {'Success': True}
@@ -5946,6 +6132,7 @@ class FTForDisplay(display_utilities.ViewportBaseClass): # object containing all
 	IsBaseClass = False # should be done for every subclass of ViewportBaseClass
 	CanBeCreatedManually = True # whether the user should be able to create a Viewport of this class from scratch
 	InternalName = 'FTTreeView' # unique per class, used in messaging
+	AcceptsRedrawDelta = True
 	HumanName = _('Fault Tree full view')
 	PreferredKbdShortcut = 'F'
 	NewPHAObjRequired = FTObjectInCore # which datacore PHA object class this Viewport spawns on creation.
@@ -6036,7 +6223,7 @@ class FTForDisplay(display_utilities.ViewportBaseClass): # object containing all
 		self.CurrentElementIDsToSelectOnRefresh = [] # IDs of elements to be set as current when display is next refreshed.
 			# This is used so we can store the selection across a refresh - as datacore doesn't know which elements are
 			# "current" in our Viewport
-		self.ExistingElementIDsOnLastRefresh = [] # IDs of all elements existing in FT when it is redrawn.
+		self.ExistingElementIDsOnLastRefresh = set() # IDs of all elements existing in FT when it is redrawn.
 		self.LastElementSelected = None # last element selected; used to identify start of selection extension if user
 			# does shift + left click on an element
 			# This is used so we can detect which IDs are new, so they can be made "current" (highlighted)
@@ -6052,18 +6239,40 @@ class FTForDisplay(display_utilities.ViewportBaseClass): # object containing all
 		self.MilestoneForRedraw = None # instance of MilestoneItem, containing attribs needed to enable us to redraw
 			# the FT with same appearance as last time
 		self.XMLData = None # required for exporting feature
-
-	def Wipe(self): # preserve any attribs that need to be preserved. Then wipe all data in the FT and re-initialize
+		self.RedrawRevision = None # revision (str) of the last redraw data received from datacore
+		self.ColumnLayout = [] # list of lists of IDs of elements in each column, as in the last redraw data received
+		self.ElementsByID = {} # FT elements (not builder buttons) on display; keys are element IDs
+		self.ConnectFromIDs = {} # keys are element IDs, values are sets of IDs of elements that may connect to them;
+			# used to update ConnectTo attribs when elements are replaced by delta redraw data (see PopulateConnectTo())
+		self.FullRedrawNeeded = False # True if the last redraw data received was a delta that couldn't be applied
+		self.RenderCache = ElementRenderCache(FT=self) # bitmaps of FT elements, reused when their appearance is unchanged
+		self.ComposedLayoutKey = None # layout of the FT when the base layer bitmap was composed; see RenderInDC()
+		self.ComposedConnectButtonKeys = [] # (ObjID, ColIndex, IsLeft) of each connect button made when the base layer
+			# bitmap was composed; see ConnectButtonsHitTestable()
+		self.HeaderRedrawNeeded = True # whether header data has changed since the base layer bitmap was composed
+		self.DirtyRects = [] # wx.Rect instances: regions of the display device to update on next redraw
+		self.FloatLayerRectsShown = [] # wx.Rect instances: regions occupied by floating layers on last redraw
+		self.CompositeBuffer = None # wx.Bitmap: base layer with floating layers overlaid, as last shown on display device
+		self.CanRepaintDirtyRegions = True # whether RenderInDC() accepts DirtyOnly arg; read by display device
+
+	def Wipe(self, KeepColumns=False, ElementIDs=None): # preserve any attribs that need to be preserved. Then wipe all
+		# data in the FT and re-initialize. If KeepColumns (bool), the columns and their elements are kept, for
+		# updating from delta redraw data; then ElementIDs (set of str) are the IDs of the elements to be replaced, and
+		# only their attribs need preserving
 		# first, preserve display-related attribs. Check all elements in the "old" (previously displayed) FT
 		self.PreservedAttribs = {}
-		for ThisElement in WalkOverAllFTObjs(self):
+		if KeepColumns: ElementsToPreserve = [self.ElementsByID[i] for i in ElementIDs if i in self.ElementsByID]
+		else: ElementsToPreserve = WalkOverAllFTObjs(self)
+		for ThisElement in ElementsToPreserve:
 			# check if this type of element needs to preserve any attribs
 			if hasattr(ThisElement, 'AttribsToPreserve'):
 				self.PreservedAttribs[ThisElement.ID] = dict( [(ThisAttrib, getattr(ThisElement, ThisAttrib))
 					for ThisAttrib in ThisElement.AttribsToPreserve] )
 		self.Header.InitializeData()
-		self.Columns = []
-		self.ConnectButtons = []
+		# connect buttons are kept with the columns, as RenderInDC() reuses them if the layout is unchanged
+		if not KeepColumns:
+			self.Columns = []
+			self.ConnectButtons = []
 
 	def CreateContextMenu(self, **Args):
 		# create and return default context menu for FT (wx.Menu instance)
@@ -6212,14 +6421,50 @@ class FTForDisplay(display_utilities.ViewportBaseClass): # object containing all
 			# store component name to highlight
 			self.Header.ComponentNameToHighlight = ComponentNameToHighlight
 
-		def PopulateColumnData(ColumnEl, Column):
-			# get data from ColumnEl (an XML FTColumnTag tree element) and populate into new objects in Column (a FTColumn instance).
+		def PopulateFTElement(XMLObj, Column):
+			# create a new object in Column (a FTColumn instance) from XMLObj (the object's XML record), and return it
 			# ObjPopulator: keys are XML tags for objects, values are procedures to extract data from XML
 			ObjPopulator = {info.FTEventTag: PopulateFTEvent, info.FTConnectorTag: PopulateFTConnector,
 				info.FTGateTag: PopulateFTGate}
+			NewElement = ObjPopulator[XMLObj.tag](XMLObj=XMLObj, Column=Column)
+			NewElement.RedrawSignature = RedrawSignature(XMLObj) # used by ElementRenderCache to detect changed content
+			return NewElement
+
+		def PopulateColumnData(ColumnEl, Column):
+			# get data from ColumnEl (an XML FTColumnTag tree element) and populate into new objects in Column (a FTColumn instance).
 			for ObjElement in list(ColumnEl): # step through objects in column (list() iterates over children of ColumnEl)
-				NewObj = ObjPopulator[ObjElement.tag](XMLObj=ObjElement, Column=Column) # extract data for each object
-				Column.FTElements.append(NewObj) # put object in column
+				Column.FTElements.append(PopulateFTElement(ObjElement, Column)) # extract data for each object
+
+		def PopulateColumnsFromDelta(FTData, ChangedElements):
+			# update columns from delta redraw data in FTData. New objects are made only for elements whose records are
+			# in ChangedElements (dict: keys are element IDs, values are their records in FTData); the existing objects
+			# are reused for all other elements. If FTData contains a new column layout, the columns are rebuilt in that
+			# layout; otherwise, the changed elements are swapped into the existing columns (which still contain their
+			# builder buttons), so the time taken depends only on the number of elements changed.
+			# Return bool: whether the columns were rebuilt
+			LayoutEl = FTData.find(info.ColumnLayoutTag)
+			if LayoutEl is None:
+				for (ThisID, ThisRecord) in ChangedElements.items():
+					OldEl = self.ElementsByID[ThisID]
+					NewEl = PopulateFTElement(ThisRecord, OldEl.Column)
+					OldEl.Column.FTElements[OldEl.Column.FTElements.index(OldEl)] = NewEl
+					self.ElementsByID[ThisID] = NewEl
+				return False
+			self.ColumnLayout = [[i for i in (ColEl.text or '').split(',') if i] for ColEl in LayoutEl]
+			ExistingElements = self.ElementsByID
+			self.ElementsByID = {}
+			self.Columns = []
+			for ColNo, ColumnIDs in enumerate(self.ColumnLayout):
+				NewColumn = FTColumn(FT=self, ColNo=ColNo)
+				self.Columns.append(NewColumn)
+				for ThisID in ColumnIDs:
+					if ThisID in ChangedElements: ThisEl = PopulateFTElement(ChangedElements[ThisID], NewColumn)
+					else: # unchanged; move existing object into the new column
+						ThisEl = ExistingElements[ThisID]
+						ThisEl.Column = NewColumn
+					NewColumn.FTElements.append(ThisEl)
+					self.ElementsByID[ThisID] = ThisEl
+			return True
 
 		def SetValueProblemButtonStatus(FTElement, XMLObj):
 			# set the status (visible/invisible) of the value problem button in FTElement, using data from XMLObj
@@ -6458,15 +6703,28 @@ class FTForDisplay(display_utilities.ViewportBaseClass): # object containing all
 
 		# main procedure for PrepareFullDisplay()
 		self.Exporting = Export
-		# save reference to XMLData in case of export (requires a call to PrepareFullDisplay())
-		if XMLData is not None:
-			self.XMLData = XMLData
-		if Export: # use latest saved data
+		if Export and (XMLData is None): # use latest saved data
 			assert self.XMLData is not None
 			XMLData = self.XMLData
-		self.Wipe() # start with a blank FT
 		# find the outer tag containing the FT data
 		FTData = [t for t in XMLData.iter(info.PHAModelRedrawDataTag)][0]
+		IsDelta = (FTData.get(info.RedrawKindAttribName) == info.RedrawKindDelta)
+		# save reference to XMLData in case of export (requires a call to PrepareFullDisplay()). Delta redraw data isn't
+		# saved, as it's incomplete
+		if not IsDelta: self.XMLData = XMLData
+		# a delta can only be applied to the redraw data it was made from. If we don't have that data, keep the current
+		# display, and ask datacore for full redraw data (see controlframe.ShowViewport())
+		self.FullRedrawNeeded = IsDelta and (FTData.get(info.RedrawBaseRevisionAttribName) != self.RedrawRevision)
+		if self.FullRedrawNeeded: return
+		self.RedrawRevision = FTData.get(info.RedrawRevisionAttribName)
+		self.HeaderRedrawNeeded = True
+		# full redraw data replaces every element, so nothing composed from the previous data can be reused
+		if not IsDelta: self.ResetComposition()
+		# records of elements added or changed, if applying a delta; keys are element IDs
+		ChangedElements = dict([(ThisEl.findtext(info.IDTag), ThisEl)
+			for ThisEl in FTData.findall(info.ChangedElementsTag + '/*')]) if IsDelta else {}
+		# start with a blank FT, or with the existing elements if applying a delta
+		self.Wipe(KeepColumns=IsDelta, ElementIDs=set(ChangedElements))
 		# populate display-related attributes specific to this Viewport, such as zoom, pan, selection, collapse groups,
 		# and highlights
 		DisplayAttribData = FTData.find(info.DisplayAttribTag)
@@ -6481,37 +6739,51 @@ class FTForDisplay(display_utilities.ViewportBaseClass): # object containing all
 				self.ElementIDContainingComponentToHighlight == self.ID else ''
 			PopulateHeaderData(self, self.Header, XMLHeaderData, ComponentNameToHighlight=ComponentNameToHighlight)
 		# get column data
-		ColumnElements = FTData.findall(info.FTColumnTag)
-		for ColNo, ColumnEl in enumerate(ColumnElements):
-			NewColumn = FTColumn(FT=self, ColNo=ColNo)
-			self.Columns.append(NewColumn)
-			PopulateColumnData(ColumnEl, NewColumn)
-		# put builder button objects in all columns, and add a final column with just a builder button
-		self.AddBuilderButtons()
-		# populate elements' ConnectTo attribs (must be done AFTER populating all elements)
-		self.PopulateConnectTo()
+		if IsDelta: ColumnsRebuilt = PopulateColumnsFromDelta(FTData, ChangedElements)
+		else:
+			ColumnElements = FTData.findall(info.FTColumnTag)
+			for ColNo, ColumnEl in enumerate(ColumnElements):
+				NewColumn = FTColumn(FT=self, ColNo=ColNo)
+				self.Columns.append(NewColumn)
+				PopulateColumnData(ColumnEl, NewColumn)
+			self.ColumnLayout = RedrawColumnLayout(FTData)
+			self.ElementsByID = dict([(ThisEl.ID, ThisEl) for ThisEl in WalkOverAllFTObjs(self)])
+			ColumnsRebuilt = True
+		if ColumnsRebuilt:
+			# put builder button objects in all columns, and add a final column with just a builder button
+			self.AddBuilderButtons()
+			# populate elements' ConnectTo attribs (must be done AFTER populating all elements)
+			self.PopulateConnectTo()
+		else: self.PopulateConnectTo(ElementIDs=set(ChangedElements))
 		# populate which elements are currently selected: if any elements newly created since last refresh, only the
-		# new elements are selected; else, select elements stored from last time in CurrentElementIDsToSelectOnRefresh
+		# new elements are selected; else, select elements stored from last time in CurrentElementIDsToSelectOnRefresh.
+		# New elements can only appear if the columns were rebuilt
 		self.CurrentElements = []
-		NewlyCreatedElements = [e for e in WalkOverAllFTObjs(self) if not (e.ID in self.ExistingElementIDsOnLastRefresh)]
+		NewlyCreatedElements = [e for e in self.ElementsByID.values()
+			if not (e.ID in self.ExistingElementIDsOnLastRefresh)] if ColumnsRebuilt else []
 		if NewlyCreatedElements:
 			# set newly created elements as selected; arbitrarily set the last one in the list as most recently selected
 			for ThisEl in NewlyCreatedElements:
 				self.SetElementAsCurrent(TargetFTElement=ThisEl, UnsetPrevious=(ThisEl is NewlyCreatedElements[0]),
 					RedrawEntireFT=False, SetAsLastSelected=(ThisEl is NewlyCreatedElements[-1]))
-		else: self.CurrentElements = [e for e in WalkOverAllFTObjs(self) if e.ID in self.CurrentElementIDsToSelectOnRefresh]
-		self.ExistingElementIDsOnLastRefresh = [e.ID for e in WalkOverAllFTObjs(self)]
+		else: self.CurrentElements = [self.ElementsByID[i] for i in self.CurrentElementIDsToSelectOnRefresh
+			if i in self.ElementsByID]
+		if ColumnsRebuilt: self.ExistingElementIDsOnLastRefresh = set(self.ElementsByID)
 		# line up required control panel aspects
 		self.LineupControlPanelAspects(CurrentElements=self.CurrentElements, CurrentComponent=None)
 		# request appropriate control panel aspect
 		self.SwitchToPreferredControlPanelAspect(CurrentElements=self.CurrentElements,
 			AspectRequired=self.PreferredControlPanelAspect, ComponentEdited=self.ComponentEdited)
 
-	def RenderInDC(self, TargetDC, FullRefresh=True, BitmapMinSize=None, DrawZoomTool=True, Export=False, **Args):
+	def RenderInDC(self, TargetDC, FullRefresh=True, BitmapMinSize=None, DrawZoomTool=True, Export=False,
+			DirtyOnly=False, **Args):
 		# render all FT elements into TargetDC provided
-		# FullRefresh (bool): whether to redraw from scratch
+		# FullRefresh (bool): whether to redraw from scratch. Even then, if the layout of the FT is unchanged since the
+		#	last redraw, only the elements whose appearance has changed are redrawn in the base layer bitmap
 		# BitmapMinSize ( (X, Y) tuple of int, wx.Size, or None): Ensure bitmap has this min size
 		# DrawZoomTool (bool): whether to show the zoom tool
+		# DirtyOnly (bool): whether to blit only the regions changed since the last call (see InvalidateRect()). TargetDC
+		#	must then already show the result of the last call, e.g. it's a wx.ClientDC of the display device
 		# returns the Bitmap object associated to the TargetDC.
 
 		def DrawHeader(self, DC): # render the FT header in its own bitmap, then copy it to BaseLayerDC
@@ -6528,43 +6800,117 @@ class FTForDisplay(display_utilities.ViewportBaseClass): # object containing all
 				ThisButton.SizeXInPx = ThisButton.SizeXInCU * self.Zoom
 				ThisButton.SizeYInPx = ThisButton.SizeYInCU * self.Zoom
 
+		def LayoutKey(BufferSizeX, BufferSizeY):
+			# return hashable key (tuple) describing the position of everything drawn in the base layer bitmap, and the
+			# content of the inter-column strips. If it's unchanged since the base layer was last composed, only
+			# elements and header need redrawing
+			return (BufferSizeX, BufferSizeY, self.Zoom, self.PanX, self.PanY, self.Exporting, self.Header.SizeXInPx,
+				self.Header.SizeYInPx, tuple([(Col.PosXInPx, Col.SizeXInPx) + tuple([(El.ID, El.PosXInPx, El.PosYInPx,
+				El.SizeXInPx, El.SizeYInPx, tuple([c.ID for c in El.ConnectTo])) for El in Col.FTElements])
+				for Col in self.Columns]))
+
+		def ComposeBaseLayer(BufferSizeX, BufferSizeY):
+			# make a new base layer bitmap, and draw the header, columns and inter-column strips into it
+			# set up and draw strips containing connecting lines between columns
+			self.ConnectButtons = []
+			ICStripYOffsetInPx = int(round(self.SetupInterColumnStrips() * self.Zoom))
+			self.BaseLayerBitmap = wx.Bitmap(width=BufferSizeX, height=BufferSizeY, depth=wx.BITMAP_SCREEN_DEPTH)
+			BaseLayerDC = wx.MemoryDC(self.BaseLayerBitmap)
+			if Export:
+				BaseLayerDC.SetBackground(wx.Brush(ExportColours['GeneralBkg']))
+				BaseLayerDC.Clear()
+			# draw header in its own bitmap, then copy into BaseLayerDC
+			DrawHeader(self, BaseLayerDC)
+			# draw columns and inter-column strips in BaseLayerDC
+			for ColIndex, Column in enumerate(self.Columns):
+				# draw column
+				Column.RenderInDC(self, BaseLayerDC, 0, 0)
+				# draw inter-column strip, to the right of the column
+				BaseLayerDC.DrawBitmap(self.InterColumnStripBuffers[ColIndex], Column.PosXInPx + Column.SizeXInPx,
+					Column.PosYInPx + ICStripYOffsetInPx, useMask=False)
+			# set PosX/Y attribs of connect buttons in pixels (needed to detect mouse clicks)
+			SetConnectButtonPos()
+			self.ComposedConnectButtonKeys = [(b.ObjID, b.ColIndex, b.IsLeft) for b in self.ConnectButtons]
+			self.InvalidateRect(wx.Rect(0, 0, BufferSizeX, BufferSizeY))
+
+		def UpdateBaseLayer():
+			# redraw, in the existing base layer bitmap, the header (if its data has changed) and the elements redrawn
+			# by the render cache. Their positions and sizes are unchanged, so each new bitmap exactly covers the old one
+			BaseLayerDC = wx.MemoryDC(self.BaseLayerBitmap)
+			if self.HeaderRedrawNeeded:
+				DrawHeader(self, BaseLayerDC)
+				self.InvalidateRect(wx.Rect(self.Header.PosXInPx, self.Header.PosYInPx, self.Header.SizeXInPx,
+					self.Header.SizeYInPx))
+			ElementsRedrawn = dict([(El.ID, El) for El in self.RenderCache.ElementsRedrawn])
+			for ThisElement in ElementsRedrawn.values():
+				BaseLayerDC.DrawBitmap(ThisElement.Bitmap, ThisElement.PosXInPx, ThisElement.PosYInPx, useMask=False)
+				self.InvalidateRect(wx.Rect(ThisElement.PosXInPx, ThisElement.PosYInPx, ThisElement.SizeXInPx,
+					ThisElement.SizeYInPx))
+			# connect buttons are kept from the last composition; point them to any elements replaced since then,
+			# whether or not the render cache redrew them
+			for ThisButton in self.ConnectButtons:
+				ThisButton.HostObject = self.ElementsByID.get(ThisButton.ObjID, ThisButton.HostObject)
+			assert self.ConnectButtonsHitTestable()
+
 		def BlitIntoDC(BaseLayerBitmap, TargetDC): # transfer bitmaps into TargetDC provided by display device
-			# copy BaseLayerBitmap into a buffer, to avoid overwriting it with floating layers
+			# If DirtyOnly, only the regions invalidated since the last call, and the old and new areas of floating
+			# layers, are transferred; else, the whole bitmap
 			BaseLayerSizeX, BaseLayerSizeY = BaseLayerBitmap.GetSize()
-			Buffer = wx.Bitmap(width=BaseLayerSizeX, height=BaseLayerSizeY, depth=wx.BITMAP_SCREEN_DEPTH)
-			BaseLayerCopyDC = wx.MemoryDC(BaseLayerBitmap)
-			BufferDC = wx.MemoryDC(Buffer)
-			BufferDC.Blit(xdest=0, ydest=0, width=BaseLayerSizeX, height=BaseLayerSizeY, source=BaseLayerCopyDC,
-								 xsrc=0, ysrc=0)
+			WholeRect = wx.Rect(0, 0, BaseLayerSizeX, BaseLayerSizeY)
 			# sort overlay layers by z-coord, lowest first
 			LayersToOverlayInZOrder = utilities.SortOnValues(
 				[{'Layer': l, 'Z': l.PosZ} for l in self.FloatingLayers + [self.MyZoomWidget.FloatLayer]],
 				ResultField='Layer', SortKeyField='Z')
-			# overlay floating layers onto buffer
-			OverlayDC = wx.GCDC(BufferDC)
-			for ThisLayer in LayersToOverlayInZOrder:
-				OverlayDC.DrawBitmap(ThisLayer.Bitmap, ThisLayer.PosXInPx, ThisLayer.PosYInPx)
+			LayerRects = [wx.Rect(l.PosXInPx, l.PosYInPx, l.Bitmap.GetWidth(), l.Bitmap.GetHeight())
+				for l in LayersToOverlayInZOrder]
+			if DirtyOnly:
+				RectsToBlit = [r.Intersect(WholeRect) for r in self.DirtyRects + self.FloatLayerRectsShown + LayerRects
+					if r.Intersects(WholeRect)]
+			else: RectsToBlit = [WholeRect]
+			self.DirtyRects = []
+			self.FloatLayerRectsShown = LayerRects
+			# copy BaseLayerBitmap into a buffer, to avoid overwriting it with floating layers. The buffer is kept for
+			# next time, as only the dirty regions of it are updated
+			if (self.CompositeBuffer is None) or (self.CompositeBuffer.GetSize() != BaseLayerBitmap.GetSize()):
+				self.CompositeBuffer = wx.Bitmap(width=BaseLayerSizeX, height=BaseLayerSizeY,
+					depth=wx.BITMAP_SCREEN_DEPTH)
+			BaseLayerCopyDC = wx.MemoryDC(BaseLayerBitmap)
+			BufferDC = wx.MemoryDC(self.CompositeBuffer)
 			# Make a working bitmap for TargetDC. This seems to be needed only for MacOS, when exporting FT image
 			if not TargetDC.IsOk():
 				TargetDC.SelectObject(wx.Bitmap(width=BaseLayerSizeX, height=BaseLayerSizeY, depth=wx.BITMAP_SCREEN_DEPTH))
-			# copy entire FT into TargetDC in physical display device
-			TargetDC.Blit(xdest=0, ydest=0, width=BaseLayerBitmap.GetWidth(), height=BaseLayerBitmap.GetHeight(),
-				source=BufferDC, xsrc=0, ysrc=0)
+			for ThisRect in RectsToBlit:
+				BufferDC.Blit(xdest=ThisRect.x, ydest=ThisRect.y, width=ThisRect.width, height=ThisRect.height,
+					source=BaseLayerCopyDC, xsrc=ThisRect.x, ysrc=ThisRect.y)
+				# overlay floating layers within this region onto buffer
+				LayersInRect = [l for (l, r) in zip(LayersToOverlayInZOrder, LayerRects) if r.Intersects(ThisRect)]
+				if LayersInRect:
+					OverlayDC = wx.GCDC(BufferDC)
+					OverlayDC.SetClippingRegion(ThisRect)
+					for ThisLayer in LayersInRect:
+						OverlayDC.DrawBitmap(ThisLayer.Bitmap, ThisLayer.PosXInPx, ThisLayer.PosYInPx)
+					OverlayDC.DestroyClippingRegion()
+				# copy this region of the FT into TargetDC in physical display device
+				TargetDC.Blit(xdest=ThisRect.x, ydest=ThisRect.y, width=ThisRect.width, height=ThisRect.height,
+					source=BufferDC, xsrc=ThisRect.x, ysrc=ThisRect.y)
 
 		# main procedure for RenderInDC()
 		print('FT6477 starting RenderInDC with debug: ', Args['debug'] if 'debug' in Args else 'undefined')
 		assert isinstance(FullRefresh, bool)
 		assert isinstance(DrawZoomTool, bool)
 		assert isinstance(Export, bool)
+		assert isinstance(DirtyOnly, bool)
 		assert isinstance(BitmapMinSize, wx.Size) or (BitmapMinSize is None)
 		self.Exporting = Export
-		if FullRefresh:
+		if FullRefresh or (self.BaseLayerBitmap is None):
 			# fetch display attribs from redraw milestone, if any
 			self.UpdateAttribsFromMilestone()
 			# get each element in the FT to calculate and draw itself in own bitmap: header, columns and strips
 			self.Header.CalculateSize(self.Zoom, self.PanX, self.PanY)
+			self.RenderCache.StartPass()
 			for ThisColumn in self.Columns:
 				ThisColumn.RenderElementsInOwnBitmaps(self.Zoom)
+			self.RenderCache.EndPass()
 			self.MarkObjectsWithPos() # set Pos attribs of all FT objects (must be done after rendering them, so we can get their size)
 			# set column positions (needed for making inter-column strips)
 			for ThisColumn in self.Columns:
@@ -6573,33 +6919,21 @@ class FTForDisplay(display_utilities.ViewportBaseClass): # object containing all
 				ThisColumn.EndXInPx, ThisColumn.PosYInPx = utilities.ScreenCoords(
 					ThisColumn.PosXInCU + ThisColumn.SizeXInCU, 0,
 					Zoom=self.Zoom, PanX=self.PanX, PanY=self.PanY)
-			# set up and draw strips containing connecting lines between columns
-			ICStripYOffsetInPx = int(round(self.SetupInterColumnStrips() * self.Zoom))
-			# make an overall bitmap, ready to blit constituent bitmaps into
+			# work out size of overall bitmap, ready to blit constituent bitmaps into
 			MinBufferSizeXInPx, MinBufferSizeYInPx = self.CalculateFTScreenSize(self.InterColumnStripWidth)
-			ActualBufferSizeX = MinBufferSizeXInPx
-			ActualBufferSizeY = MinBufferSizeYInPx
+			ActualBufferSizeX = int(round(MinBufferSizeXInPx))
+			ActualBufferSizeY = int(round(MinBufferSizeYInPx))
 			if BitmapMinSize is not None:
 				# make sure buffer is big enough to reach the bottom of the screen, to accommodate the zoom tool
 				# (potential optimisation: draw zoom widget in separate bitmap and blit transparently into its place in the host panel)
 				ActualBufferSizeX = max(BitmapMinSize[0], ActualBufferSizeX)
 				ActualBufferSizeY = max(BitmapMinSize[1], ActualBufferSizeY)
-			self.BaseLayerBitmap = wx.Bitmap(width=ActualBufferSizeX, height=ActualBufferSizeY, depth=wx.BITMAP_SCREEN_DEPTH)
-			BaseLayerDC = wx.MemoryDC(self.BaseLayerBitmap)
-			if Export:
-				BaseLayerDC.SetBackground(wx.Brush(ExportColours['GeneralBkg']))
-				BaseLayerDC.Clear()
-			# draw header in its own bitmap, then copy into BaseLayerDC
-			DrawHeader(self, BaseLayerDC)
-			# draw columns and inter-column strips in BaseLayerDC
-			for ColIndex, Column in enumerate(self.Columns):
-				# draw column
-				Column.RenderInDC(self, BaseLayerDC, 0, 0)
-				# draw inter-column strip, to the right of the column
-				BaseLayerDC.DrawBitmap(self.InterColumnStripBuffers[ColIndex], Column.PosXInPx + Column.SizeXInPx,
-					Column.PosYInPx + ICStripYOffsetInPx, useMask=False)
-			# set PosX/Y attribs of connect buttons in pixels (needed to detect mouse clicks)
-			SetConnectButtonPos()
+			# if nothing has moved since the base layer was composed, only redraw the parts of it that have changed
+			NewLayoutKey = LayoutKey(ActualBufferSizeX, ActualBufferSizeY)
+			if (NewLayoutKey == self.ComposedLayoutKey) and (self.BaseLayerBitmap is not None): UpdateBaseLayer()
+			else: ComposeBaseLayer(ActualBufferSizeX, ActualBufferSizeY)
+			self.ComposedLayoutKey = NewLayoutKey
+			self.HeaderRedrawNeeded = False
 		if DrawZoomTool:
 			# draw zoom widget. First, set its position: 50% across the panel, and slightly below the top of the panel
 			HostPanelSizeX, HostPanelSizeY = self.DisplDevice.GetSize()
@@ -6610,6 +6944,30 @@ class FTForDisplay(display_utilities.ViewportBaseClass): # object containing all
 		self.Exporting = False
 		return self.BaseLayerBitmap
 
+	def ConnectButtonsHitTestable(self):
+		# return bool: whether the connect buttons match those made when the base layer was last composed, and each one
+		# is clickable and belongs to the element currently displayed. Checked after the base layer is updated without
+		# being recomposed, e.g. after applying delta redraw data that doesn't change the layout
+		Clickable = self.AllClickableObjects(VisibleOnly=False)
+		return ([(b.ObjID, b.ColIndex, b.IsLeft) for b in self.ConnectButtons] == self.ComposedConnectButtonKeys) and\
+			all([(b in Clickable) and (self.ElementsByID.get(b.ObjID, b.HostObject) is b.HostObject)
+			and hasattr(b, 'PosXInPx') for b in self.ConnectButtons])
+
+	def ResetComposition(self):
+		# discard the composed base layer's layout key, the composite buffer and the regions awaiting transfer, so that
+		# the next call to RenderInDC() composes the base layer and transfers it to the display device in full
+		self.ComposedLayoutKey = None
+		self.CompositeBuffer = None
+		self.DirtyRects = []
+		self.FloatLayerRectsShown = []
+		self.HeaderRedrawNeeded = True
+
+	def InvalidateRect(self, Rect):
+		# mark Rect (wx.Rect, in pixels relative to the display device) as needing to be transferred to the display
+		# device on the next call to RenderInDC() with DirtyOnly=True
+		assert isinstance(Rect, wx.Rect)
+		self.DirtyRects.append(Rect)
+
 	def AddBuilderButtons(self): # add builder buttons between objects in each column, and in a "new" column to the right
 		BuilderButtonOffsetInCU = 70 # X offset between builder button left edges
 		for ColNo, Col in enumerate(self.Columns):
@@ -6645,12 +7003,21 @@ class FTForDisplay(display_utilities.ViewportBaseClass): # object containing all
 				ThisCol.FTElements.append(FTBuilder(FT=self, ColNo=ExtraColNumber, ObjTypeRequested=ThisBuilderKind,
 					OffsetXInCU = BuilderButtonOffsetInCU * ThisBuilderIndex))
 
-	def PopulateConnectTo(self):
-		# populate ConnectTo attrib of all elements, using IDs from ConnectToIDs attrib
-		AllEls = [El for El in WalkOverAllFTObjs(self)] # get list of all IDs using Walk... generator
-		for ThisEl in AllEls:
+	def PopulateConnectTo(self, ElementIDs=None):
+		# populate ConnectTo attrib of elements, using IDs from ConnectToIDs attrib, looking them up in
+		# self.ElementsByID. If ElementIDs (set of str) is supplied, only the elements with those IDs have been replaced
+		# since the last call, so only they and the elements that may connect to them are updated; otherwise, all
+		# elements are updated
+		if ElementIDs is None:
+			self.ConnectFromIDs = {}
+			ElementsToUpdate = list(self.ElementsByID.values())
+		else:
+			IDsToUpdate = ElementIDs.union(*[self.ConnectFromIDs.get(i, ()) for i in ElementIDs])
+			ElementsToUpdate = [self.ElementsByID[i] for i in IDsToUpdate if i in self.ElementsByID]
+		for ThisEl in ElementsToUpdate:
 			if hasattr(ThisEl, 'ConnectToIDs'):
-				ThisEl.ConnectTo = [utilities.ObjectWithID(AllEls, TargetID=ElID) for ElID in ThisEl.ConnectToIDs]
+				ThisEl.ConnectTo = [self.ElementsByID[ElID] for ElID in ThisEl.ConnectToIDs]
+				for ElID in ThisEl.ConnectToIDs: self.ConnectFromIDs.setdefault(ElID, set()).add(ThisEl.ID)
 
 	def MarkObjectsWithPos(self): # set PosXInCU, PosYInCU, PosXInPx, PosYInPx attributes of all FT objects
 		# (object position in canvas coords relative to column, and in pixels relative to display device)
@@ -7058,7 +7425,10 @@ class FTForDisplay(display_utilities.ViewportBaseClass): # object containing all
 			assert isinstance(ConnectList, list)
 			assert len(DisconnectList) + len(ConnectList) > 0
 			print("FT3870 Disconnect, Connect: ", ','.join([str(i.ID) + '~' + str(j.ID) for i, j in DisconnectList]), '|', ','.join([str(i.ID) + '~' + str(j.ID) for i, j in ConnectList]))
-			vizop_misc.SendRequest(Socket=self.C2DSocketREQ, Command='RQ_FT_ChangeConnection',
+			# the reply may report a problem making the connections, so send the request asynchronously, and show the
+			# outcome when the reply arrives
+			vizop_misc.SendRequestAsync(Socket=self.C2DSocketREQ, Command='RQ_FT_ChangeConnection',
+				Callback=self.DisplDevice.TopLevelFrame.ShowRequestOutcome,
 				Proj=self.Proj.ID, PHAObj=self.PHAObjID, Viewport=self.ID,
 				Disconnect=','.join([str(i.ID) + '~' + str(j.ID) for i, j in DisconnectList]),
 				Connect=','.join([str(i.ID) + '~' + str(j.ID) for i, j in ConnectList]))
@@ -7388,6 +7758,7 @@ class FTForDisplay(display_utilities.ViewportBaseClass): # object containing all
 
 	def ReleaseDisplayDevice(self, DisplDevice, **Args): # wrap-up actions needed when display device is no longer showing FT
 		self.DisplDevice = None
+		self.ResetComposition() # so that the whole FT is transferred to the display device when next shown
 		# later, might need to store any unstored user inputs, and kill any active widgets. TODO unbind context menus?
 
 	def SetElementAsCurrent(self, TargetFTElement, UnsetPrevious=False, RedrawEntireFT=False, SetAsLastSelected=True,
@@ -7680,6 +8051,15 @@ def WalkOverAllFTObjs(FT):
 			yield Obj
 	return
 
+def RedrawSignature(XMLElement):
+	# return a signature (int) of XMLElement (an element record in FT redraw data) that changes if any tag, text or attrib
+	# in the record changes. Used by ElementRenderCache to find elements whose bitmaps can be reused
+	return hash(tuple([(El.tag, El.text, tuple(sorted(El.attrib.items()))) for El in XMLElement.iter()]))
+
+def RedrawColumnLayout(RedrawXMLRoot):
+	# return list of lists of element IDs (str) in each column of FT redraw data with root element RedrawXMLRoot
+	return [[El.findtext(info.IDTag) for El in ColEl] for ColEl in RedrawXMLRoot.findall(info.FTColumnTag)]
+
 def BuildFullElementList(TopEls, *ElLists):
 	# Make and return element list comprising fixed and variable elements, starting with TopEls (list of elements)
 	# ElLists is zero or more lists of elements, in order required after TopEls
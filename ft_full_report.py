@@ -4,9 +4,9 @@
 
 # library modules
 from __future__ import division # makes a/b yield exact, not truncated, result. Must be 1st import
-import os, os.path, wx, platform # wx provides basic GUI functions
+import os, os.path, wx, platform, tempfile # wx provides basic GUI functions
 
-import core_classes, project_display, vizop_misc, info, utilities, faulttree, display_utilities
+import core_classes, project_display, vizop_misc, info, utilities, faulttree, display_utilities, datacore_worker
 from project_display import EditPanelAspectItem
 from display_utilities import UIWidgetItem
 
@@ -14,6 +14,7 @@ class FTFullExportViewport(faulttree.FTForDisplay):
 	# defines a viewport that produces an export file containing a full depiction of a fault tree, and displays a
 	# dialogue to get parameters from the user to control the export (e.g. which items to include, fonts, page settings)
 	InternalName = 'FTFullExport' # unique per class, used in messaging
+	AcceptsRedrawDelta = False # PrepareFullDisplay() needs full redraw data, for export
 	HumanName = _('Fault Tree full export')
 	PreferredKbdShortcut = 'E'
 	NewPHAObjRequired = None # which datacore PHA object class this Viewport spawns on creation.
@@ -897,9 +898,12 @@ class FTFullExportViewport(faulttree.FTForDisplay):
 		ConnectorsAcrossPages,
 		ShowTexts, CannotCalculateText, CombineRRs, ExpandGates,
 		DateKind, **Args):
-		# Render the FT image in file(s)
+		# Render the FT image in file(s). The image is rendered here, as it needs wx; it's compressed and written to
+		# file by the datacore worker process, if in use (see datacore_worker.RunJobInBackground()), so that the
+		# display isn't held up meanwhile
 		# return:
-		# OK (bool) - whether export completed successfully without errors
+		# OK (bool) - whether export completed successfully without errors (so far; writing the file may still fail,
+		#	which is reported when it's finished)
 		# Problem (str) - description of any problems encountered
 		assert isinstance(FilePath, str)
 		assert FileType in core_classes.ImageFileTypesSupported
@@ -941,13 +945,24 @@ class FTFullExportViewport(faulttree.FTForDisplay):
 		
 		DC = wx.MemoryDC()
 		Bitmap = faulttree.FTForDisplay.RenderInDC(self, TargetDC=DC, FullRefresh=True, BitmapMinSize=None, DrawZoomTool=False, Export=True)
-		DC.SelectObject(Bitmap)
-		Bitmap.SaveFile(FilePath, wx.BITMAP_TYPE_PNG)
 		DC.SelectObject(wx.NullBitmap)
-		
-		print('Fault tree exported to file', FilePath)
+		# pass the image's raw RGB data to the PNG writing job in a temporary file
+		Image = Bitmap.ConvertToImage()
+		(RawFileHandle, RawFilename) = tempfile.mkstemp(suffix='.rgb')
+		with os.fdopen(RawFileHandle, 'wb') as RawFile: RawFile.write(bytes(Image.GetData()))
+		datacore_worker.RunJobInBackground('RQ_WK_WritePNG', Callback=lambda Result: self.OnExportFileWritten(
+			FilePath=FilePath, Result=Result), RawFilename=RawFilename, Width=str(Image.GetWidth()),
+			Height=str(Image.GetHeight()), FilePath=FilePath)
 		return {'OK': True, 'Problem': None}
 
+	def OnExportFileWritten(self, FilePath, Result):
+		# handle completion of the job writing export file FilePath (str). Result (dict): the job's result
+		if Result.get('JobFailed', False):
+			print('FR961 writing export file %s failed: %s' % (FilePath, Result.get('ProblemReport', '')))
+			wx.MessageBox(_("Sorry, the fault tree couldn't be exported to %s") % FilePath, _('Export fault tree'),
+				style=wx.OK)
+		else: print('Fault tree exported to file', FilePath)
+
 	def __init__(self, Proj, PHAObjID, DisplDevice, ParentWindow, Fonts, SystemFontNames, **Args):
 		# __init__ for class FTFullExportViewport
 		faulttree.FTForDisplay.__init__(self, Proj=Proj, PHAObjID=PHAObjID, DisplDevice=DisplDevice,
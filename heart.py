@@ -41,7 +41,7 @@ ProjList = {} # dictionary of currently open projects. Keys are project IDs, val
 TemplateSelectedFrom = '' # when "Select template" dialogue is opened, where it was opened from (welcome screen or main screen)
 FirstVizopTalks = ('', '') # (title, message) to show in VizopTalks when main window first built
 CurrentProject = None # Project the user is currently working on
-KeyPressHash = [] # list of tuple: (keystroke code, handling routines when those keystrokes are detected, dict of args to supply to handler)
+KeyPressHash = {} # keys are key chords (see vizop_misc.KeyChord()), values are tuple: (handling routine when the chord is pressed, dict of args to supply to handler)
 	# keystroke code can be list of codes, in required order, or list of lists of codes (if multiple keystrokes should be recognised for one handler)
 
 # utility functions
@@ -34,6 +34,31 @@ CacheFolderTail = 'vizop'
 
 # file-related constants
 RestoreFileSuffix = '_Restore' # suffix for project restore filename
+ProjectIndexFileSuffix = '.index' # suffix appended to project filename for the project's index file
+ProjectJournalFileSuffix = '.journal' # suffix appended to project filename for the journal of chunks being rewritten
+	# in place (see project_files.WriteChunksWithJournal())
+ProjectJournalMagic = b'VizopJournal1\n' # first bytes of a project journal file
+SavingFileSuffix = '_Saving' # suffix for temporary file holding a new full image of a project while it's being saved
+RecoveredFileSuffix = '_Recovered' # suffix for project file written by crash recovery (see project_recovery.py)
+SessionFolderTail = 'sessions' # folder in user's runtime files folder, containing session markers for open projects
+SessionMarkerExtension = 'session'
+CheckpointFileSuffix = '_Checkpoint' # suffix for temporary file holding a new full image of a project during checkpoint
+ProjectFileBufferSize = 1024 * 1024 # size of write buffer (bytes) used when writing project files
+ChunkSlackFraction = 0.1 # whitespace slack after each chunk of a project file, as a fraction of the chunk's size...
+ChunkSlackMinimum = 256 # ...or this number of bytes, whichever is more
+ParallelOpenMinFiles = 2 # when opening at least this many project files at once, they are parsed in worker processes
+ParallelOpenPollInterval = 0.1 # max interval (s) between progress reports while waiting for worker processes
+ProjectCompressionMagics = {'gzip': b'\x1f\x8b', 'lzma': b'\xfd7zXZ\x00'} # first bytes of compressed project files
+# compression for new project files: 'none', 'gzip' or 'lzma'. Compressed files are several times smaller, which helps
+# on slow network shares, but load more slowly from a local disk (as they must be decompressed) and are always saved
+# in full, as they have no index and can't be partly rewritten in place. lzma gives the smallest files but is slowest
+DefaultProjectCompression = 'none'
+ProjectCompressionLevels = {'gzip': 6, 'lzma': 1} # gzip compresslevel and lzma preset used when writing project files
+SnapshotFileExtension = 'vipb' # extension of project files saved in compact binary snapshot format (see
+	# project_snapshot.py). Saving a project with this extension is how the format is chosen
+SnapshotCompression = 'zlib' # compression of snapshot blocks: 'none', 'zlib' or 'lzma'
+SnapshotCompressionLevels = {'zlib': 1, 'lzma': 1} # zlib level and lzma preset used when writing snapshots
+CheckpointUpdateThreshold = 200 # number of <update> tags in a project file that triggers a background checkpoint
 DefaultImageFileType = 'png' # must be Extension attrib of an instance of core_classes.ImageFileType
 ExcelExtension = 'xlsx' # extension expected for reading/writing Excel files
 DefaultUserDirectory = '~'
@@ -109,6 +134,15 @@ ProjIDTag = 'ProjID'
 PHAModelIDTag = 'PHAModelID'
 PHAModelTypeTag = 'PHAmodelclass' #f
 PHAModelRedrawDataTag = 'PHAModelRedrawData'
+RedrawRevisionAttribName = 'Revision' # serial number of redraw data sent to a Viewport
+RedrawBaseRevisionAttribName = 'BaseRevision' # in delta redraw data: revision of the data the delta applies to
+RedrawKindAttribName = 'RedrawKind' # 'Delta' if redraw data only contains changes; absent for full redraw data
+RedrawKindDelta = 'Delta'
+ChangedElementsTag = 'ChangedElements' # in delta redraw data: records of elements added or changed
+ColumnLayoutTag = 'ColumnLayout' # in delta redraw data: IDs of elements in each column, if the layout changed
+FullRedrawNeededTag = 'FullRedrawNeeded' # in Viewport's reply to delta redraw data it couldn't apply
+RedrawChangeHistoryLength = 100 # number of PHA object revisions for which changed element IDs are kept, for
+	# making delta redraw data; Viewports last redrawn longer ago than this get full redraw data
 PHAObjTag = 'PHAObj'
 PHAElementTag = 'PHAElement'
 ElementsTag = 'Elements'
@@ -166,8 +200,19 @@ ProjectRootTag = 'VizopProject'
 UpdateTag = 'update'
 PHAModelTag = 'PHAmodel'
 DeleteTag = 'delete'
+RecoveryDataTag = 'RecoveryData' # in <update> tags; contains chunks of the project file for crash recovery
+ChunkTag = 'Chunk'
 ReinstateTag = 'reinstate'
 VizopVersionTag = 'VizopVersion'
+ProjectIndexRootTag = 'VizopProjectIndex' # root tag of project index files
+OffsetTag = 'Offset'
+LengthTag = 'Length'
+AllocatedTag = 'Allocated'
+MaxCommentIDTag = 'MaxCommentID'
+JobIDTag = 'JobID'
+SuccessTag = 'Success'
+ProblemReportTag = 'ProblemReport'
+DurationTag = 'Duration'
 
 ShortTitleTag = 'ShortTitle'
 ProjNumberTag = 'ProjNumber'
@@ -302,7 +347,59 @@ ProjInfoImagePrefix = 'ProjInfo_'
 CommandTag = 'Command'
 ControlFrameInSocketLabel = 'F2CREP' # label prefix for datacore end of control frame -> datacore socket
 ControlFrameOutSocketLabel = 'C2FREQ' # label prefix for datacore end of datacore -> control frame socket
+ViewportInSocketLabel = 'C2DREP' # label prefix for datacore end of Viewport -> datacore socket
 ViewportOutSocketLabel = 'C2VREQ' # label prefix for datacore end of datacore -> Viewport socket
+SaveReportSocketLabel = 'W2CPULL' # label prefix for datacore end of project writer thread -> datacore socket
+ViewportChannelAddress = 'inproc://vizop_viewports' # zmq address of the channel carrying all datacore <-> Viewport
+	# messages (see vizop_misc.ViewportChannel). inproc, as datacore and Viewports are in the same process
+ViewportChannelCodec = 'Binary' # codec for messages on the Viewport channel (see message_codec module). Set to
+	# 'XML' to make the messages readable for debugging
+BinaryMessageMagic = b'\x00VZ' # start of every message encoded with the binary codec
+ZeroCopyMinSize = 131072 # messages of at least this size (bytes) are sent without copying. Below this, copying
+	# is quicker than zmq's zero-copy bookkeeping
+RequestIDAttribName = 'RequestID' # correlation ID of a request, copied into its reply (see vizop_misc.SendRequest())
+AsyncReplyTimeout = 30 # max time (s) to wait for the reply to a request sent with vizop_misc.SendRequestAsync(); the
+	# request's callbacks are then called with a 'Fail' reply
+MessagePumpFollowOnTimeout = 5 # time (ms) to wait for follow-on messages after the message pump has handled any
+ViewportUpdateBudget = 20 # max time (ms) that Viewport updates are held back to coalesce them during a burst of
+	# messages (see vizop_misc.ViewportUpdateScheduler)
+BroadcastViewportUpdates = False # whether to update Viewports showing PHA objects by publishing one message per PHA
+	# object and revision (see change_broadcast module), instead of sending each Viewport its own redraw data
+ChangeBroadcastAddress = 'inproc://vizop_changes' # zmq address of the change broadcast channel in this process
+ChangeBroadcastCodec = 'XML' # codec for messages on the change broadcast channel. Not binary, as they can go to
+	# subscribers in other processes
+ViewportIDsTag = 'ViewportIDs' # in change broadcast messages: IDs of the Viewports the redraw data is for
+SendTimeAttribName = 'SendTime' # time (s since the epoch) a message was sent; stamped only while message statistics
+	# are being collected (see message_stats module)
+MessageStatsEnabled = False # whether to collect message latency and throughput statistics from startup
+DatacoreInWorkerProcess = False # whether to run headless datacore jobs, e.g. crash recovery, in a separate worker
+	# process (see datacore_worker module), so that they don't hold up the display
+DatacoreWorkerMaxRestarts = 3 # max number of times the datacore worker process is restarted after dying
+DatacoreWorkerMaxAttempts = 2 # max number of times a job is sent to the datacore worker process. A job in progress
+	# when the worker dies is resent to the restarted worker until it has been tried this many times
+DatacoreWorkerPollInterval = 100 # max time (ms) between checks by the datacore worker process that Vizop is still
+	# running, and between calls to the supervisor's WhileWaiting callback while waiting for a job to finish
+DatacoreWorkerStopTimeout = 2 # time (s) to wait for the datacore worker process to exit before killing it
+DatacoreWorkerJobTimeout = 600 # max time (s) to wait for a job in the datacore worker process to finish; the worker
+	# is then assumed to be stuck, and is restarted
+DatacoreInSeparateProcess = False # whether to run the datacore (open projects, PHA objects and the handling of
+	# requests from the control frame and Viewports) in a separate local process (see datacore_process module)
+DatacoreProcessFirstSocketNumber = 7555 # socket number of the first control frame socket made by the datacore process
+DatacoreProcessSocketNumberStride = 100 # amount added to DatacoreProcessFirstSocketNumber each time the datacore
+	# process is restarted, so that ports still held by the old process's sockets aren't reused
+DatacoreProcessChannelAddress = 'tcp://127.0.0.1:*' # zmq address of the Viewport channel's datacore end in the
+	# datacore process; * means a free port is chosen
+DatacoreProcessMaxRestarts = 3 # max number of times the datacore process is restarted after dying
+DatacoreProcessPollInterval = 100 # max time (ms) between checks by the datacore process that Vizop is still running,
+	# and between calls to the WhileWaiting callback while waiting for the datacore process
+DatacoreProcessOpenTimeout = 600 # max time (s) to wait for the datacore process to start and open projects
+DatacoreProcessStopTimeout = 30 # time (s) to wait for the datacore process to finish its saves and exit before
+	# killing it
+MaxIDAttribName = 'MaxID' # in messages from a datacore process: highest ID issued in the project (see
+	# datacore_process.DatacoreDispatcher.DatacoreStampStatus())
+UndoTextAttribName = 'NextUndo' # in messages from a datacore process: human text of the next action to undo, if any
+RedoTextAttribName = 'NextRedo' # likewise for redo
+ExportPNGCompressionLevel = 6 # zlib compression level (0..9) for PNG files written by FT export
 LocalSuffix = '_Local' # suffix for datacore sockets connecting to local control frame
 NullUnitInternalName = 'null'
 ConvertValueMarker = '_Convert' # indicates user has requested to convert value when changing unit
@@ -334,6 +431,7 @@ BottomLabel = 'Bottom'
 # NO_ commands to control frame
 NO_ShowViewport = 'NO_ShowViewport'
 NO_RedrawAfterUndo = 'NO_RedrawAfterUndo'
+RQ_RedrawAfterUndo = 'RQ_RedrawAfterUndo' # NO_RedrawAfterUndo, sent back to a datacore process in the reply
 
 # Unicode symbols
 CommandSymbol = u'\u2318' # cloverleaf symbol on Mac keyboard's Command key
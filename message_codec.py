@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+# Module: message_codec. This file is part of Vizop. Copyright xSeriCon, 2020
+
+# standard modules needed:
+import sys, time, struct, marshal
+import xml.etree.ElementTree as ElementTree
+
+# vizop modules needed:
+import info
+
+"""
+The message_codec module contains codecs for converting the XML trees exchanged between datacore, control frames and
+Viewports to and from the bytes sent over zmq sockets.
+Two codecs are provided:
+- XML: the XML text of the tree. Readable, so it's useful for debugging; also used for messages to and from remote
+	peers, which may not be the same version of Vizop
+- Binary: a typed, length-prefixed encoding, much quicker to encode and decode than XML. It starts with a fixed header
+	(info.BinaryMessageMagic, a format version byte, and the lengths of the root record and the payload), followed by
+	the marshal-encoded root record (the tag and attribs of the root element) and the marshal-encoded payload.
+	The payload holds the elements of the tree in breadth-first order, as parallel lists of tags, texts, tails and
+	parent indexes, plus a dict of attribs for elements other than the root that have any. DecodeRoot() decodes only
+	the root record, so reading a message's tag and correlation ID doesn't touch the payload.
+	As marshal data must come from a trusted source, this codec is only used on the in-process Viewport channel (see
+	vizop_misc.ViewportChannel), and DecodeMessage() and DecodeRoot() reject it unless the message is known to have
+	come from that channel
+Further codecs can be added to Codecs. DecodeMessage() identifies the codec from the start of the message, so receivers
+don't need to know which codec the sender used.
+It doesn't import wx.
+"""
+
+BinaryFormatVersion = 2
+BinaryHeader = struct.Struct('>%dsBII' % len(info.BinaryMessageMagic)) # magic, format version, root record length,
+	# payload length
+RootChunkSize = 512 # number of bytes of an XML message parsed at a time by DecodeRoot()
+
+def EncodeXML(XMLRoot):
+	# return XML tree with root element XMLRoot, encoded as XML text (bytes)
+	return ElementTree.tostring(XMLRoot, encoding='UTF-8')
+
+def DecodeXML(Message):
+	# return root element of XML tree encoded as XML text in Message (bytes)
+	return ElementTree.fromstring(Message)
+
+def EncodeBinary(XMLRoot):
+	# return XML tree with root element XMLRoot, encoded with the binary codec (bytes)
+	Elements = [XMLRoot]
+	Parents = [-1] # index in Elements of each element's parent
+	for (ThisIndex, ThisElement) in enumerate(Elements): # Elements grows as we go, giving breadth-first order
+		if len(ThisElement):
+			Elements.extend(ThisElement)
+			Parents.extend([ThisIndex] * len(ThisElement))
+	# the root's attribs go in the root record, so they aren't repeated in the payload
+	RootRecord = marshal.dumps( (XMLRoot.tag, XMLRoot.attrib) )
+	Attribs = dict([(i, e.attrib) for (i, e) in enumerate(Elements) if e.attrib and i])
+	Payload = marshal.dumps( ([e.tag for e in Elements], [e.text for e in Elements], [e.tail for e in Elements],
+		Parents, Attribs) )
+	return BinaryHeader.pack(info.BinaryMessageMagic, BinaryFormatVersion, len(RootRecord), len(Payload)) +\
+		RootRecord + Payload
+
+def UnpackBinaryHeader(Message):
+	# check the header of Message (bytes) encoded with the binary codec, and return (tag (str), attribs (dict)) from its
+	# root record, and the offset of the payload in Message (int)
+	Magic, FormatVersion, RootLength, PayloadLength = BinaryHeader.unpack_from(Message)
+	assert FormatVersion == BinaryFormatVersion, "Binary message format %d not recognised" % FormatVersion
+	assert len(Message) == BinaryHeader.size + RootLength + PayloadLength, "Binary message truncated or padded"
+	PayloadStart = BinaryHeader.size + RootLength
+	RootTag, RootAttribs = marshal.loads(memoryview(Message)[BinaryHeader.size:PayloadStart])
+	return RootTag, RootAttribs, PayloadStart
+
+def DecodeBinary(Message):
+	# return root element of XML tree encoded with the binary codec in Message (bytes)
+	RootTag, RootAttribs, PayloadStart = UnpackBinaryHeader(Message)
+	Tags, Texts, Tails, Parents, Attribs = marshal.loads(memoryview(Message)[PayloadStart:])
+	Elements = list(map(ElementTree.Element, Tags))
+	Elements[0].attrib.update(RootAttribs)
+	for (ThisIndex, ThisAttrib) in Attribs.items(): Elements[ThisIndex].attrib.update(ThisAttrib)
+	for (ThisElement, ThisText) in zip(Elements, Texts): ThisElement.text = ThisText
+	if any(Tails): # messages rarely have tails, so skip this loop if possible
+		for (ThisElement, ThisTail) in zip(Elements, Tails): ThisElement.tail = ThisTail
+	for (ThisElement, ThisParent) in zip(Elements[1:], Parents[1:]): Elements[ThisParent].append(ThisElement)
+	return Elements[0]
+
+# available codecs. Keys are codec names; values are (encoder, decoder, magic), where magic (bytes) is the start of
+# every message encoded by the codec
+Codecs = {'XML': (EncodeXML, DecodeXML, b'<'), 'Binary': (EncodeBinary, DecodeBinary, info.BinaryMessageMagic)}
+# codecs whose messages are accepted only from in-process channels, as decoding them is unsafe for untrusted data
+InprocOnlyCodecs = ['Binary']
+
+def EncodeMessage(XMLRoot, Codec='XML'):
+	# return XML tree with root element XMLRoot, encoded with codec named Codec (str; a key in Codecs) (bytes)
+	assert isinstance(XMLRoot, ElementTree.Element)
+	assert Codec in Codecs
+	return Codecs[Codec][0](XMLRoot)
+
+def CodecOfMessage(Message):
+	# return name of codec (str) used to encode Message (bytes). Any message not identified is assumed to be XML, as it
+	# may start with an XML declaration or whitespace
+	for (ThisCodec, (Encoder, Decoder, Magic)) in Codecs.items():
+		if Message.startswith(Magic): return ThisCodec
+	return 'XML'
+
+def DecodeMessage(Message, Inproc=False):
+	# return root element of XML tree encoded in Message (bytes) with any of the codecs in Codecs.
+	# Inproc (bool): whether Message came from an in-process channel. If not, messages encoded with any codec in
+	# InprocOnlyCodecs are rejected by raising ValueError
+	Codec = CodecOfMessage(Message)
+	if (Codec in InprocOnlyCodecs) and not Inproc:
+		raise ValueError('%s message received from outside the process; rejected' % Codec)
+	return Codecs[Codec][1](Message)
+
+def DecodeRoot(Message, Inproc=False):
+	# return root element of XML tree encoded in Message (bytes), with its attribs but without text or children. Quicker
+	# than DecodeMessage() for large messages, as only the start of an XML message, or the root record of a binary
+	# message, is decoded.
+	# Inproc (bool): as for DecodeMessage()
+	Codec = CodecOfMessage(Message)
+	if (Codec in InprocOnlyCodecs) and not Inproc:
+		raise ValueError('%s message received from outside the process; rejected' % Codec)
+	if Codec == 'Binary':
+		RootTag, RootAttribs, PayloadStart = UnpackBinaryHeader(Message)
+		return ElementTree.Element(RootTag, RootAttribs)
+	Parser = ElementTree.XMLPullParser(events=['start'])
+	for ChunkStart in range(0, len(Message), RootChunkSize): # feed the message in chunks until the root tag is parsed
+		Parser.feed(Message[ChunkStart:ChunkStart + RootChunkSize])
+		for (Event, ThisElement) in Parser.read_events():
+			return ElementTree.Element(ThisElement.tag, ThisElement.attrib)
+	raise ElementTree.ParseError('No root element found in message')
+
+"""[----------TESTING AREA---------- """
+
+def BenchmarkCodecs(Messages, Repeats=20):
+	# compare codecs on Messages (dict: keys are message type names (str), values are XML root elements of typical
+	# messages of each type). For each codec and message type, measure encoded size, encode and decode time, and time to
+	# transfer the message over an inproc zmq socket pair, sending with and without copying.
+	# Return dict: keys are (message type, codec name), values are dicts of Bytes (int) and times (s)
+	import zmq
+	Context = zmq.Context()
+	Sender = Context.socket(zmq.PAIR)
+	Sender.bind('inproc://codec_benchmark')
+	Receiver = Context.socket(zmq.PAIR)
+	Receiver.connect('inproc://codec_benchmark')
+	Results = {}
+	for (ThisType, ThisRoot) in Messages.items():
+		for ThisCodec in Codecs:
+			StartTime = time.perf_counter()
+			for i in range(Repeats): Message = EncodeMessage(ThisRoot, Codec=ThisCodec)
+			EncodeTime = (time.perf_counter() - StartTime) / Repeats
+			StartTime = time.perf_counter()
+			for i in range(Repeats): DecodeMessage(Message, Inproc=True)
+			DecodeTime = (time.perf_counter() - StartTime) / Repeats
+			assert EncodeXML(DecodeMessage(Message, Inproc=True)) == EncodeXML(ThisRoot) # check round trip
+			TransferTimes = {}
+			for Copy in (True, False):
+				StartTime = time.perf_counter()
+				for i in range(Repeats):
+					Sender.send(Message, copy=Copy)
+					Receiver.recv()
+				TransferTimes[Copy] = (time.perf_counter() - StartTime) / Repeats
+			Results[(ThisType, ThisCodec)] = {'Bytes': len(Message), 'Encode': EncodeTime, 'Decode': DecodeTime,
+				'TransferCopy': TransferTimes[True], 'TransferZeroCopy': TransferTimes[False]}
+	Sender.close(linger=0)
+	Receiver.close(linger=0)
+	Context.term()
+	return Results
+
+if __name__ == '__main__':
+	# usage: python message_codec.py <XML message file> [<XML message file> ...]
+	# benchmark the codecs on the messages in the files, e.g. RQ_RedrawViewport messages saved while debugging
+	Results = BenchmarkCodecs(dict([(f, ElementTree.parse(f).getroot()) for f in sys.argv[1:]]))
+	for ((ThisType, ThisCodec), ThisResult) in sorted(Results.items()):
+		print('%s %s: %d bytes, encode %.3f ms, decode %.3f ms, transfer %.3f ms (zero copy %.3f ms)' % (ThisType,
+			ThisCodec, ThisResult['Bytes'], ThisResult['Encode'] * 1e3, ThisResult['Decode'] * 1e3,
+			ThisResult['TransferCopy'] * 1e3, ThisResult['TransferZeroCopy'] * 1e3))
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# Module: message_stats. This file is part of Vizop. Copyright xSeriCon, 2020
+
+# standard modules needed:
+import sys, math, json
+
+# vizop modules needed:
+import info
+
+"""
+The message_stats module collects latency and throughput statistics for the messages exchanged between datacore,
+control frame and Viewports, to show where time goes between a user action and the redraw it causes. For each metric
+and command (the root tag of the message, or the Viewport class for redraws), a histogram of the values is kept.
+The metrics are:
+- QueueWait: time (s) from sending a message to its handler starting, found from the send time stamped on each message
+	by vizop_misc.SendMessage()
+- HandleTime: time (s) taken by the message's handler in vizop_misc.ListenToSocket(), i.e. in the dispatch tables such
+	as the PHA objects' HandleIncomingRequest()
+- MessageSize: size (bytes) of each message as encoded for sending
+- RedrawDataTime: time (s) taken by the datacore to make redraw data for a Viewport (GetFullRedrawData() or
+	GetRedrawDelta())
+- RenderTime: time (s) taken by a Viewport to set up its display from redraw data (PrepareFullDisplay())
+- IdleTime: time (s) taken by each idle event handler, e.g. the control frame's OnIdle()
+Collection is off unless Enabled is True (initially info.MessageStatsEnabled). Callers check Enabled before reading
+any timer, so that when it's off, each instrumented point costs only one attribute lookup.
+It doesn't import wx. A dump made by DumpJSON() can be summarized from the command line:
+	python message_stats.py <JSON file>
+"""
+
+Enabled = info.MessageStatsEnabled # whether statistics are being collected
+BucketsPerOctave = 4 # number of histogram buckets for each doubling of value; sets the resolution of percentiles (19%)
+# keys are metric names; values are the unit (in s or bytes) of the smallest histogram bucket for the metric
+MetricUnits = {'QueueWait': 1e-6, 'HandleTime': 1e-6, 'MessageSize': 1, 'RedrawDataTime': 1e-6, 'RenderTime': 1e-6,
+	'IdleTime': 1e-6}
+
+class Histogram(object): # distribution of the values recorded for one metric and command. Values are counted in
+	# buckets on a logarithmic scale, BucketsPerOctave per doubling of value, so each value is recorded in constant time
+	# and space
+
+	def __init__(self, Unit=1):
+		assert isinstance(Unit, (int, float))
+		object.__init__(self)
+		self.Unit = Unit
+		self.Count = 0
+		self.Total = 0.0
+		self.Min = None
+		self.Max = None
+		self.Buckets = {} # keys are bucket numbers (int), values are counts of values recorded in the bucket.
+			# Bucket b holds values above Unit * 2**((b-1) / BucketsPerOctave), up to Unit * 2**(b / BucketsPerOctave)
+
+	def Add(self, Value):
+		# record Value (int or float)
+		self.Count += 1
+		self.Total += Value
+		if (self.Min is None) or (Value < self.Min): self.Min = Value
+		if (self.Max is None) or (Value > self.Max): self.Max = Value
+		Bucket = max(0, math.ceil(math.log2(Value / self.Unit) * BucketsPerOctave)) if Value > 0 else 0
+		self.Buckets[Bucket] = self.Buckets.get(Bucket, 0) + 1
+
+	def Mean(self):
+		return self.Total / self.Count if self.Count else 0.0
+
+	def Percentile(self, Fraction):
+		# return estimate of the value (float) below which Fraction (0..1) of the recorded values lie: the upper bound
+		# of the bucket containing it, but no more than the highest value recorded
+		if not self.Count: return 0.0
+		Target = Fraction * self.Count
+		CountSoFar = 0
+		for ThisBucket in sorted(self.Buckets):
+			CountSoFar += self.Buckets[ThisBucket]
+			if CountSoFar >= Target: break
+		return min(self.BucketLimit(ThisBucket), self.Max)
+
+	def BucketLimit(self, Bucket):
+		# return upper bound (float) of values held in Bucket (int)
+		return self.Unit * 2.0 ** (Bucket / BucketsPerOctave)
+
+	def AsDict(self):
+		# return dict describing the histogram, suitable for writing as JSON
+		return {'Count': self.Count, 'Total': self.Total, 'Mean': self.Mean(), 'Min': self.Min, 'Max': self.Max,
+			'P50': self.Percentile(0.5), 'P95': self.Percentile(0.95), 'P99': self.Percentile(0.99),
+			'Buckets': dict([('%.6g' % self.BucketLimit(b), n) for (b, n) in sorted(self.Buckets.items())])}
+
+Histograms = {} # keys are (metric name, command) (both str), values are Histogram instances
+
+def Record(Metric, Command, Value):
+	# record Value (int or float) for Metric (str; a key in MetricUnits) and Command (str). Callers should check Enabled
+	# first, rather than call this when collection is off
+	ThisHistogram = Histograms.get((Metric, Command))
+	if ThisHistogram is None: ThisHistogram = Histograms[(Metric, Command)] = Histogram(Unit=MetricUnits[Metric])
+	ThisHistogram.Add(Value)
+
+def Enable(On=True):
+	# start (if On is True) or stop collecting statistics. Statistics already collected are kept
+	global Enabled
+	assert isinstance(On, bool)
+	Enabled = On
+
+def Reset():
+	# discard all statistics collected so far
+	Histograms.clear()
+
+def Summary():
+	# return list of dicts, one per metric and command, sorted by metric then command. Each dict contains Metric and
+	# Command (str), plus the items from Histogram.AsDict()
+	Rows = []
+	for ((ThisMetric, ThisCommand), ThisHistogram) in sorted(Histograms.items()):
+		ThisRow = ThisHistogram.AsDict()
+		ThisRow.update({'Metric': ThisMetric, 'Command': ThisCommand})
+		Rows.append(ThisRow)
+	return Rows
+
+def DumpJSON(Filename):
+	# write the statistics collected so far to Filename (str) as JSON. Return bool: whether the file was written
+	try:
+		with open(Filename, 'w', encoding='UTF-8') as JSONFile: json.dump(Summary(), JSONFile, indent=1)
+	except (IOError, OSError): return False
+	return True
+
+def FormatRow(Row):
+	# return human-readable one-line description (str) of Row (one of the dicts returned by Summary())
+	if Row['Metric'] == 'MessageSize':
+		return '%s %s: %d messages, mean %.0f bytes, p95 %.0f, max %.0f' % (Row['Metric'], Row['Command'],
+			Row['Count'], Row['Mean'], Row['P95'], Row['Max'])
+	return '%s %s: %d messages, mean %.3f ms, p50 %.3f, p95 %.3f, max %.3f' % (Row['Metric'], Row['Command'],
+		Row['Count'], Row['Mean'] * 1e3, Row['P50'] * 1e3, Row['P95'] * 1e3, Row['Max'] * 1e3)
+
+if __name__ == '__main__':
+	# usage: python message_stats.py <JSON file written by DumpJSON()>
+	with open(sys.argv[1], encoding='UTF-8') as JSONFile:
+		for ThisRow in json.load(JSONFile): print(FormatRow(ThisRow))
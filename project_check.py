@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+# Module: project_check. This file is part of Vizop. Copyright xSeriCon, 2020
+
+# standard modules needed:
+import os, sys, time
+import xml.etree.ElementTree as ElementTree
+
+# vizop modules needed:
+import info, project_files, project_snapshot
+
+"""
+The project_check module contains a headless integrity checker for Vizop project files. It streams
+the file once, building indexes of the IDs defined and referred to, and reports every inconsistency found, with its
+location in the file: dangling ID references (ConnectTo, LinkedFrom, RelatedConnector, ModelGate, comments, associated
+texts, numbering systems, Viewports' PHA objects), duplicate IDs, orphan comments and associated texts, broken <update>
+tags, a damaged or truncated end of file, and a stale index file.
+It can optionally write a repaired copy of the file, streaming it a second time. Both passes take time linear in the
+size of the file, so the checker is suitable for running unattended on large files.
+It doesn't import wx. Run from the command line as:
+	python project_check.py <project file> [<repaired file to write>]
+"""
+
+# tags in FT elements containing lists of comment IDs. (ShowDescriptionComments and ShowValueComments are bool flags,
+# not lists, so they aren't included)
+CommentListTags = [info.EventDescriptionCommentsTag, info.ValueCommentsTag, info.GateDescriptionCommentsTag,
+	info.ConnectorDescriptionCommentsTag]
+# keys are tags in FT elements containing lists of associated text IDs; values are the tags of those associated texts
+ATListTags = {info.ActionItemsTag: info.ActionItemTag, info.ParkingLotItemsTag: info.ParkingLotItemTag}
+
+class IntegrityProblem(object): # an inconsistency found in a project file by ProjectChecker
+
+	def __init__(self, ProblemKind, HumanDescription, Location, Fatal=False, RepairAction=''):
+		# ProblemKind (str): category of problem, e.g. 'DanglingConnectTo'
+		# Location (str): where the problem is in the file, e.g. 'PHAObj 3 > Column 2 > FTEvent 17 > ConnectTo'
+		# Fatal (bool): whether the problem is likely to prevent the project from loading
+		# RepairAction (str): what a repaired copy of the file does about the problem; '' if it can't be repaired
+		assert isinstance(ProblemKind, str)
+		assert ProblemKind # ensure it's not blank
+		assert isinstance(HumanDescription, str)
+		assert isinstance(Location, str)
+		assert isinstance(Fatal, bool)
+		assert isinstance(RepairAction, str)
+		object.__init__(self)
+		self.ProblemKind = ProblemKind
+		self.HumanDescription = HumanDescription
+		self.Location = Location
+		self.Fatal = Fatal
+		self.RepairAction = RepairAction
+
+	def __str__(self):
+		return '%s%s at %s: %s%s' % ('FATAL ' if self.Fatal else '', self.ProblemKind, self.Location,
+			self.HumanDescription, (' [repair: %s]' % self.RepairAction) if self.RepairAction else '')
+
+def SplitIDList(IDListText):
+	# return list of IDs (str) in IDListText (str or None), a comma-separated list of IDs as stored in project files
+	return (IDListText or '').replace(',', ' ').split()
+
+def UpdateIsWellFormed(UpdateElement):
+	# return bool: whether UpdateElement (an <update> tag) contains one element of update data, optionally followed by
+	# a RecoveryData element (see projects.MakeRecoveryData())
+	Children = [e.tag for e in UpdateElement]
+	return (len(Children) in [1, 2]) and (Children[0] != info.RecoveryDataTag) and \
+		(Children[1:] in [[], [info.RecoveryDataTag]])
+
+class ProjectChecker(object): # checks the consistency of one project file. Call Check(), then optionally Repair()
+
+	def __init__(self, ProjFilename):
+		assert isinstance(ProjFilename, str)
+		object.__init__(self)
+		self.ProjFilename = ProjFilename
+		self.Problems = [] # list of IntegrityProblem instances, in order found
+		self.ElementsChecked = 0 # number of top-level elements checked
+		self.Duration = 0.0 # time in s taken by Check()
+		# indexes built during Check(). Each Refs list contains (ID (str), Location (str)) tuples, resolved at the end
+		self.PHAObjIDs = set()
+		self.CommentIDs = set()
+		self.CommentRefs = []
+		self.ATIDs = dict([(ThisATTag, set()) for ThisATTag in ATListTags.values()]) # keys are AT tags
+		self.ATRefs = dict([(ThisATTag, []) for ThisATTag in ATListTags.values()])
+		self.NumberSystemIDs = set()
+		self.NumberingRefs = []
+		self.ViewportPHAObjRefs = []
+		self.DamagedAfterElement = None # if the file is damaged, the number of top-level elements before the damage
+		# top-level element numbers (1-based) of PHA objects with a duplicate ID; they are omitted from repaired copy
+		self.DuplicatePHAObjElements = set()
+		self.CommentIDsUsed = set() # populated when repairing
+
+	def AddProblem(self, ProblemKind, HumanDescription, Location, Fatal=False, RepairAction=''):
+		self.Problems.append(IntegrityProblem(ProblemKind=ProblemKind, HumanDescription=HumanDescription,
+			Location=Location, Fatal=Fatal, RepairAction=RepairAction))
+
+	def OpenStream(self):
+		# return a stream (project_files.ProjectFileStream, or project_snapshot.SnapshotReader for a snapshot file) of
+		# the whole file. The index, if any, is ignored, so that all PHA objects' sections are read
+		if project_snapshot.IsSnapshotFile(self.ProjFilename): return project_snapshot.SnapshotReader(self.ProjFilename)
+		return project_files.ProjectFileStream(self.ProjFilename)
+
+	def Check(self):
+		# stream the project file once, checking each top-level element, then resolve all ID references.
+		# Return list of IntegrityProblem instances
+		StartTime = time.perf_counter()
+		try: ProjStream = self.OpenStream()
+		except (ElementTree.ParseError, IOError, OSError, ValueError) as ThisError:
+			self.AddProblem('Unreadable', 'File can\'t be read as a Vizop project: %s' % ThisError, 'start of file',
+				Fatal=True)
+			return self.Problems
+		if ProjStream.RootAttrib(info.VizopVersionTag) not in info.UsableProjDocVersions:
+			self.AddProblem('UnusableVersion', 'Project file version %s is not usable' %
+				ProjStream.RootAttrib(info.VizopVersionTag), 'root element', Fatal=True)
+		try:
+			for ThisElement in ProjStream:
+				self.ElementsChecked += 1
+				self.CheckTopLevelElement(ThisElement, ElementNo=self.ElementsChecked)
+		except (ElementTree.ParseError, ValueError) as ThisError:
+			self.DamagedAfterElement = self.ElementsChecked
+			Position = getattr(ThisError, 'position', None)
+			self.AddProblem('Damaged', 'File is damaged or truncated: %s' % ThisError,
+				('line %d, column %d' % Position) if Position else 'after top-level element %d' % self.ElementsChecked,
+				Fatal=True, RepairAction='drop everything after top-level element %d and close the file properly' %
+				self.ElementsChecked)
+		self.ResolveReferences()
+		self.CheckIndex()
+		self.Duration = time.perf_counter() - StartTime
+		return self.Problems
+
+	def CheckTopLevelElement(self, ThisElement, ElementNo):
+		# check one top-level element, and add the IDs it defines and refers to into the indexes
+		ThisID = ThisElement.findtext(info.IDTag, default='')
+		Location = 'top-level element %d (%s %s)' % (ElementNo, ThisElement.tag, ThisID)
+		if ThisElement.tag == info.PHAObjTag:
+			if ThisID in self.PHAObjIDs:
+				self.AddProblem('DuplicatePHAObjID', 'PHA object ID %s is used more than once' % ThisID, Location,
+					RepairAction='remove this PHA object')
+				self.DuplicatePHAObjElements.add(ElementNo)
+			self.PHAObjIDs.add(ThisID)
+			self.CheckPHAObj(ThisElement, Location)
+		elif ThisElement.tag == info.CommentTag: self.CommentIDs.add(ThisID)
+		elif ThisElement.tag in self.ATIDs:
+			self.ATIDs[ThisElement.tag].add(ThisID)
+			self.NumberingRefs.append((ThisElement.findtext(info.NumberingTag), Location))
+		elif ThisElement.tag == info.NumberSystemTag: self.NumberSystemIDs.add(ThisID)
+		elif ThisElement.tag == info.ViewportTag:
+			self.ViewportPHAObjRefs.append((ThisElement.findtext(info.PHAObjTag, default=info.NoneTag), Location))
+		elif ThisElement.tag == info.UpdateTag:
+			if not UpdateIsWellFormed(ThisElement):
+				self.AddProblem('BrokenUpdate', '<%s> tag should contain the update data, optionally followed by '
+					'recovery data' % info.UpdateTag, Location, RepairAction='remove this update')
+
+	def CheckPHAObj(self, PHAObjElement, PHAObjLocation):
+		# check references between elements within a PHA object, and collect its references to project-level objects.
+		# References between elements are resolved here, as they can only point to elements in the same PHA object
+		ElementIDs = set()
+		ConnectorIDs = set()
+		GateIDs = set()
+		Refs = [] # list of (Tag, ID, Location)
+		for (ColNo, ThisColumn) in enumerate(PHAObjElement.findall(info.FTColumnTag)):
+			for ThisEl in ThisColumn:
+				ThisElID = ThisEl.findtext(info.IDTag, default='')
+				Location = '%s > %s %d > %s %s' % (PHAObjLocation, info.FTColumnTag, ColNo + 1, ThisEl.tag, ThisElID)
+				if ThisElID in ElementIDs:
+					self.AddProblem('DuplicateElementID', 'Element ID %s is used more than once in the PHA object' %
+						ThisElID, Location)
+				ElementIDs.add(ThisElID)
+				if ThisEl.tag == info.FTConnectorTag: ConnectorIDs.add(ThisElID)
+				elif ThisEl.tag == info.FTGateTag: GateIDs.add(ThisElID)
+				for ThisTag in [info.ConnectToTag, info.LinkedFromTag]:
+					Refs.extend((ThisTag, i, Location) for i in SplitIDList(ThisEl.findtext(ThisTag)))
+				ThisRelatedCX = ThisEl.findtext(info.RelatedConnectorTag, default=info.NoneTag)
+				if ThisRelatedCX != info.NoneTag: Refs.append((info.RelatedConnectorTag, ThisRelatedCX, Location))
+				for ThisTag in CommentListTags:
+					self.CommentRefs.extend((i, Location) for i in SplitIDList(ThisEl.findtext(ThisTag)))
+				for ThisListTag, ThisATTag in ATListTags.items():
+					self.ATRefs[ThisATTag].extend((i, Location) for i in SplitIDList(ThisEl.findtext(ThisListTag)))
+				if ThisEl.find(info.NumberingTag) is not None:
+					self.NumberingRefs.append((ThisEl.findtext(info.NumberingTag), Location))
+		ModelGateID = PHAObjElement.findtext(info.ModelGateTag)
+		if (ModelGateID is not None) and (ModelGateID not in GateIDs):
+			self.AddProblem('DanglingModelGate', 'Model gate %s is not a gate in the PHA object' % ModelGateID,
+				PHAObjLocation, RepairAction='remove model gate')
+		for (ThisTag, ThisID, Location) in Refs:
+			Targets = ConnectorIDs if ThisTag == info.RelatedConnectorTag else ElementIDs
+			if ThisID not in Targets:
+				self.AddProblem('Dangling' + ThisTag, '%s refers to %s, which is not in the PHA object' %
+					(ThisTag, ThisID), Location, Fatal=True,
+					RepairAction='set to None' if ThisTag == info.RelatedConnectorTag else 'remove the reference')
+
+	def ResolveReferences(self):
+		# check that all references to project-level objects point to something, and that everything defined is used
+		CommentIDsUsed = set()
+		for (ThisID, Location) in self.CommentRefs:
+			CommentIDsUsed.add(ThisID)
+			if ThisID not in self.CommentIDs:
+				self.AddProblem('DanglingComment', 'Comment %s is not in the file' % ThisID, Location,
+					RepairAction='remove the reference')
+		for ThisID in sorted(self.CommentIDs - CommentIDsUsed):
+			self.AddProblem('OrphanComment', 'Comment %s is not used by any element' % ThisID,
+				'%s %s' % (info.CommentTag, ThisID), RepairAction='remove the comment')
+		for ThisATTag, ThisATRefs in self.ATRefs.items():
+			ATIDsUsed = set()
+			for (ThisID, Location) in ThisATRefs:
+				ATIDsUsed.add(ThisID)
+				if ThisID not in self.ATIDs[ThisATTag]:
+					self.AddProblem('DanglingAssociatedText', '%s %s is not in the file' % (ThisATTag, ThisID),
+						Location, RepairAction='remove the reference')
+			# orphan ATs are still listed in the project's associated texts, so they are kept in a repaired copy
+			for ThisID in sorted(self.ATIDs[ThisATTag] - ATIDsUsed):
+				self.AddProblem('OrphanAssociatedText', '%s %s is not attached to any element' % (ThisATTag, ThisID),
+					'%s %s' % (ThisATTag, ThisID))
+		for (ThisNSID, Location) in self.NumberingRefs:
+			if ThisNSID not in self.NumberSystemIDs:
+				self.AddProblem('DanglingNumbering', 'Numbering system %s is not in the file' % ThisNSID, Location,
+					Fatal=True)
+		for (ThisPHAObjID, Location) in self.ViewportPHAObjRefs:
+			if (ThisPHAObjID != info.NoneTag) and (ThisPHAObjID not in self.PHAObjIDs):
+				self.AddProblem('DanglingViewportPHAObj', 'Viewport refers to PHA object %s, which is not in the file'
+					% ThisPHAObjID, Location, RepairAction='set to None')
+
+	def CheckIndex(self):
+		# check that any index file alongside the project file matches it
+		if os.path.isfile(project_files.IndexFilename(self.ProjFilename)) and \
+				(project_files.ReadProjectIndex(self.ProjFilename) is None):
+			self.AddProblem('StaleIndex', 'Index file does not match the project file',
+				project_files.IndexFilename(self.ProjFilename), RepairAction='not copied')
+
+	def RepairElement(self, ThisElement, ElementNo):
+		# apply repairs to ThisElement (a top-level element) in place. Return False if it should be dropped instead
+		if ThisElement.tag == info.PHAObjTag:
+			if ElementNo in self.DuplicatePHAObjElements: return False
+			ElementIDs = set()
+			ConnectorIDs = set()
+			GateIDs = set()
+			for ThisEl in ThisElement.iterfind(info.FTColumnTag + '/*'):
+				ElementIDs.add(ThisEl.findtext(info.IDTag, default=''))
+				if ThisEl.tag == info.FTConnectorTag: ConnectorIDs.add(ThisEl.findtext(info.IDTag))
+				elif ThisEl.tag == info.FTGateTag: GateIDs.add(ThisEl.findtext(info.IDTag))
+			ValidIDs = dict([(info.ConnectToTag, ElementIDs), (info.LinkedFromTag, ElementIDs)] +
+				[(ThisTag, self.CommentIDs) for ThisTag in CommentListTags] +
+				[(ThisListTag, self.ATIDs[ThisATTag]) for ThisListTag, ThisATTag in ATListTags.items()])
+			for ThisEl in ThisElement.iterfind(info.FTColumnTag + '/*'):
+				for ThisListEl in ThisEl:
+					if ThisListEl.tag in ValidIDs:
+						ThisListEl.text = ','.join(i for i in SplitIDList(ThisListEl.text)
+							if i in ValidIDs[ThisListEl.tag])
+					elif (ThisListEl.tag == info.RelatedConnectorTag) and (ThisListEl.text not in ConnectorIDs):
+						ThisListEl.text = info.NoneTag
+			ModelGateEl = ThisElement.find(info.ModelGateTag)
+			if (ModelGateEl is not None) and (ModelGateEl.text not in GateIDs): ThisElement.remove(ModelGateEl)
+		elif ThisElement.tag == info.CommentTag:
+			return ThisElement.findtext(info.IDTag, default='') in self.CommentIDsUsed
+		elif ThisElement.tag == info.ViewportTag:
+			PHAObjEl = ThisElement.find(info.PHAObjTag)
+			if (PHAObjEl is not None) and (PHAObjEl.text not in self.PHAObjIDs): PHAObjEl.text = info.NoneTag
+		elif ThisElement.tag == info.UpdateTag: return UpdateIsWellFormed(ThisElement)
+		return True
+
+	def RepairedElements(self):
+		# generator: stream the project file again, yielding each top-level element after repair, and stopping at any
+		# damage found by Check()
+		self.CommentIDsUsed = set(i for (i, Location) in self.CommentRefs)
+		ProjStream = self.OpenStream()
+		ElementNo = 0
+		try:
+			for ThisElement in ProjStream:
+				ElementNo += 1
+				if (self.DamagedAfterElement is not None) and (ElementNo > self.DamagedAfterElement): break
+				if self.RepairElement(ThisElement, ElementNo): yield ThisElement
+		except (ElementTree.ParseError, ValueError): pass # damage already reported by Check()
+		finally: ProjStream.Close()
+
+	def Repair(self, RepairedFilename, Compression=None):
+		# write a repaired copy of the project file to RepairedFilename (str). Check() must have been run first.
+		# Compression: 'none', 'gzip' or 'lzma', or None to compress the copy in the same way as the original file.
+		# If RepairedFilename has the snapshot file extension, the copy is written as a snapshot, and Compression is
+		# ignored
+		# Return WriteOK (bool)
+		assert isinstance(RepairedFilename, str)
+		assert os.path.abspath(RepairedFilename) != os.path.abspath(self.ProjFilename), "PC254 can't repair in place"
+		RootAttrib = {info.VizopVersionTag: info.VERSION}
+		if project_snapshot.IsSnapshotFilename(RepairedFilename):
+			return project_snapshot.WriteSnapshotFile(RepairedFilename, info.ProjectRootTag, RootAttrib,
+				self.RepairedElements())
+		if Compression is None: Compression = project_files.CompressionOfFile(self.ProjFilename)
+		RootBytes = ElementTree.tostring(ElementTree.Element(info.ProjectRootTag, attrib=RootAttrib),
+			encoding='UTF-8', xml_declaration=False, short_empty_elements=False)
+		RootEndTag = ('</' + info.ProjectRootTag + '>').encode('UTF-8')
+
+		def RepairedFilePieces():
+			# generator: yield the content of the repaired file as bytes, one top-level element at a time
+			yield b"<?xml version='1.0' encoding='UTF-8'?>\n" + RootBytes[:-len(RootEndTag)]
+			for ThisElement in self.RepairedElements():
+				yield ElementTree.tostring(ThisElement, encoding='UTF-8', xml_declaration=False)
+			yield RootEndTag
+
+		try:
+			with open(RepairedFilename, 'wb', buffering=info.ProjectFileBufferSize) as RepairedFile:
+				project_files.WriteProjectFileContent(RepairedFile, RepairedFilePieces(), Compression=Compression)
+		except (IOError, OSError):
+			return False
+		return True
+
+def CheckProjectFile(ProjFilename, RepairedFilename=None):
+	# check project file ProjFilename (str). If RepairedFilename (str) is supplied, also write a repaired copy.
+	# Return ProjectChecker instance, with Problems populated
+	Checker = ProjectChecker(ProjFilename)
+	Checker.Check()
+	if RepairedFilename: Checker.Repair(RepairedFilename)
+	return Checker
+
+if __name__ == '__main__':
+	# usage: python project_check.py <project file> [<repaired file to write>]
+	# exit status is 0 if no problems were found, 1 if only non-fatal problems were found, else 2
+	ThisChecker = CheckProjectFile(ProjFilename=sys.argv[1], RepairedFilename=(sys.argv[2] if len(sys.argv) > 2 else None))
+	for ThisProblem in ThisChecker.Problems: print(ThisProblem)
+	print('%d problems (%d fatal) in %d top-level elements, checked in %.2f s' % (len(ThisChecker.Problems),
+		len([p for p in ThisChecker.Problems if p.Fatal]), ThisChecker.ElementsChecked, ThisChecker.Duration))
+	sys.exit(0 if not ThisChecker.Problems else (2 if any(p.Fatal for p in ThisChecker.Problems) else 1))
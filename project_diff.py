@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+# Module: project_diff. This file is part of Vizop. Copyright xSeriCon, 2020
+
+# standard modules needed:
+import sys, re, time, hashlib
+import xml.etree.ElementTree as ElementTree
+
+# vizop modules needed:
+import info, project_files, project_check, project_snapshot
+
+"""
+The project_diff module contains code for comparing two versions of a Vizop project file, reporting which items (PHA
+objects, their elements such as FT events and gates, action items, constants, number systems and so on) were added,
+removed or modified, with field-level detail for modified items.
+Each file is streamed once. Every item gets a content hash computed from its fields and the hashes of the items inside
+it, like a Merkle tree, so an unchanged PHA object is recognised by comparing one hash, and only the items whose hashes
+differ are examined further.
+If both files have a valid index (see project_files.ReadProjectIndex()), the raw bytes of each PHA object's section are
+compared first, and sections identical in both files are not parsed at all. For files saved by Vizop with only a few
+PHA objects changed, this makes comparing even very large files quick.
+Comment IDs are renumbered every time a project is saved, so references to comments are compared by the comments' text,
+not their IDs.
+It doesn't import wx.
+"""
+
+ProjectItemLabel = 'Project' # label of the pseudo-item holding the project's top-level fields, e.g. ShortTitle
+NotItemTags = [info.NumberChunkTag, info.CommentTag] # tags that contain an ID tag but aren't items in their own right
+
+class ItemSummary(object): # compact description of one item in a project file: its content hash, fields and sub-items.
+	# Much smaller than the ElementTree element it summarises
+	__slots__ = ('Hash', 'Fields', 'Children')
+
+	def __init__(self, Hash=b'', Fields={}, Children={}):
+		object.__init__(self)
+		self.Hash = Hash # bytes
+		self.Fields = Fields # keys are field paths (str), e.g. 'Value/Unit'; values are texts (str)
+		self.Children = Children # keys are item labels (str), e.g. 'FTEvent 12'; values are ItemSummary instances
+
+class DiffItem(object): # one difference found between two project files
+
+	def __init__(self, Change='Modified', Path='', FieldChanges=[]):
+		object.__init__(self)
+		assert Change in ['Added', 'Removed', 'Modified']
+		assert isinstance(Path, str)
+		self.Change = Change
+		self.Path = Path # labels of the item and the items containing it, e.g. 'PHAObj 3 > Column 2 > FTEvent 12'
+		self.FieldChanges = FieldChanges[:] # list of (FieldPath, OldText, NewText); texts are None if field is absent
+
+	def __str__(self):
+		Lines = ['%s: %s' % (self.Change, self.Path)]
+		for FieldPath, OldText, NewText in self.FieldChanges:
+			Lines.append('    %s: %s -> %s' % (FieldPath, ShortText(OldText), ShortText(NewText)))
+		return '\n'.join(Lines)
+
+def ShortText(Text, MaxLength=60):
+	# return Text (str or None) in a form suitable for a one-line report
+	if Text is None: return '(absent)'
+	Text = ' '.join(Text.split())
+	return repr(Text if len(Text) <= MaxLength else Text[:MaxLength - 3] + '...')
+
+def ItemLabelOf(Element):
+	# return the label (str) of Element if it is an item, i.e. has an ID tag or attrib, else ''
+	if Element.tag in NotItemTags: return ''
+	ID = Element.findtext(info.IDTag) or Element.get(info.IDTag)
+	return '%s %s' % (Element.tag, ID.strip()) if ID else ''
+
+def ContainsItems(Element):
+	# return bool: whether any element inside Element is an item
+	return any(ItemLabelOf(e) for e in Element.iter() if e is not Element)
+
+def HashOf(Fields, Children):
+	# return content hash (bytes) of an item with Fields and Children (as in ItemSummary)
+	Hasher = hashlib.blake2b(digest_size=16)
+	for FieldPath in sorted(Fields):
+		Hasher.update(FieldPath.encode('UTF-8') + b'\x00' + Fields[FieldPath].encode('UTF-8') + b'\x01')
+	for ChildLabel in sorted(Children):
+		Hasher.update(ChildLabel.encode('UTF-8') + b'\x00' + Children[ChildLabel].Hash + b'\x02')
+	return Hasher.digest()
+
+def SummarizeItem(ItemElement, CommentTexts={}):
+	# return ItemSummary for ItemElement (ElementTree element). Sub-elements that are items become children; others are
+	# flattened into fields. Sub-elements without IDs that contain items, such as FT columns, are treated as groups whose
+	# items are children labelled with the group's name.
+	# CommentTexts (dict): keys are comment IDs, values are comment texts, used to resolve references to comments
+	Fields = {}
+	Children = {}
+
+	def AddFields(Element, FieldPath):
+		# add Element's text, attribs and sub-elements as fields, with paths starting with FieldPath
+		Text = (Element.text or '').strip()
+		if (Element.tag in project_check.CommentListTags) and CommentTexts:
+			Text = '|'.join(CommentTexts.get(i, i) for i in project_check.SplitIDList(Element.text))
+		if Text or not len(Element): Fields[FieldPath] = Text
+		for AttribName, AttribValue in Element.attrib.items(): Fields[FieldPath + '@' + AttribName] = AttribValue
+		AddContents(Element, FieldPath + '/', '')
+
+	def AddContents(Element, FieldPrefix, ChildPrefix):
+		# add sub-elements of Element as fields or children, with paths and labels starting with the prefixes given
+		ItemLabels = [ItemLabelOf(e) for e in Element]
+		# non-item sub-elements are named by tag, plus a serial number if the same tag occurs more than once
+		TagTotals = {} # keys are tags, values are number of non-item sub-elements with this tag
+		for ThisElement, ItemLabel in zip(Element, ItemLabels):
+			if not ItemLabel: TagTotals[ThisElement.tag] = TagTotals.get(ThisElement.tag, 0) + 1
+		TagCounts = {} # keys are tags, values are number of non-item sub-elements with this tag seen so far
+		for ThisElement, ItemLabel in zip(Element, ItemLabels):
+			if ItemLabel:
+				Children[ChildPrefix + ItemLabel] = SummarizeItem(ThisElement, CommentTexts)
+				continue
+			TagCounts[ThisElement.tag] = TagCounts.get(ThisElement.tag, 0) + 1
+			Name = ThisElement.tag if TagTotals[ThisElement.tag] == 1 else \
+				'%s %d' % (ThisElement.tag, TagCounts[ThisElement.tag])
+			if ContainsItems(ThisElement): AddContents(ThisElement, FieldPrefix + Name + '/', ChildPrefix + Name + ' > ')
+			else: AddFields(ThisElement, FieldPrefix + Name)
+
+	for AttribName, AttribValue in ItemElement.attrib.items(): Fields['@' + AttribName] = AttribValue
+	if (ItemElement.text or '').strip(): Fields[''] = ItemElement.text.strip()
+	AddContents(ItemElement, '', '')
+	return ItemSummary(Hash=HashOf(Fields, Children), Fields=Fields, Children=Children)
+
+# patterns for finding comments and references to them in raw bytes of a project file
+CommentIDPattern = re.compile(('<%s><%s>([^<]*)</%s>' % (info.CommentTag, info.IDTag, info.IDTag)).encode('UTF-8'))
+CommentListPattern = re.compile(('<(%s)>([^<]*)</\\1>' % '|'.join(project_check.CommentListTags)).encode('UTF-8'))
+
+def SectionWithoutCommentIDs(SectionBytes):
+	# return SectionBytes (bytes; raw section of a project file) with comment IDs, and references to them, replaced by
+	# serial numbers in order of appearance. Sections that differ only in comment numbering then become identical
+	SerialNumbers = {} # keys are comment IDs, values are serial numbers (both bytes)
+	for ThisMatch in CommentIDPattern.finditer(SectionBytes):
+		SerialNumbers.setdefault(ThisMatch.group(1), str(len(SerialNumbers)).encode('UTF-8'))
+
+	def RenumberList(Match):
+		return b'<%s>%s</%s>' % (Match.group(1), b','.join(SerialNumbers.get(i.strip(), i)
+			for i in Match.group(2).split(b',')), Match.group(1))
+
+	SectionBytes = CommentListPattern.sub(RenumberList, SectionBytes)
+	return CommentIDPattern.sub(lambda Match: Match.group(0).replace(b'>' + Match.group(1) + b'<',
+		b'>' + SerialNumbers[Match.group(1)] + b'<'), SectionBytes)
+
+def RawSectionDigests(ProjFilename, IndexEntries, IgnoreCommentNumbering=False):
+	# return dict: keys are PHA object IDs in IndexEntries (list of PHAObjIndexEntry), values are digests (bytes) of the
+	# raw bytes of the PHA objects' sections in ProjFilename (str), ignoring trailing whitespace (slack).
+	# IgnoreCommentNumbering (bool): whether to ignore comment numbering too. This takes several times longer
+	Digests = {}
+	with open(ProjFilename, 'rb') as ProjFile:
+		for ThisEntry in IndexEntries:
+			ProjFile.seek(ThisEntry.Offset)
+			SectionBytes = ProjFile.read(ThisEntry.Allocated).rstrip()
+			if IgnoreCommentNumbering: SectionBytes = SectionWithoutCommentIDs(SectionBytes)
+			Digests[ThisEntry.ID] = hashlib.blake2b(SectionBytes, digest_size=16).digest()
+	return Digests
+
+def UnchangedSectionIDs(OldProjFilename, OldIndex, NewProjFilename, NewIndex):
+	# return set of IDs of PHA objects whose sections are identical in OldProjFilename and NewProjFilename (str), apart
+	# from slack and comment numbering. OldIndex, NewIndex: lists of PHAObjIndexEntry for the files
+	OldDigests = RawSectionDigests(OldProjFilename, OldIndex)
+	NewDigests = RawSectionDigests(NewProjFilename, NewIndex)
+	UnchangedIDs = set(i for i in OldDigests if NewDigests.get(i) == OldDigests[i])
+	# comments are numbered through the whole file, so adding a comment changes the raw bytes of all the following
+	# sections. Check the sections that differ again, ignoring comment numbering
+	IDsToRecheck = set(i for i in OldDigests if i in NewDigests) - UnchangedIDs
+	if IDsToRecheck:
+		OldDigests = RawSectionDigests(OldProjFilename, [e for e in OldIndex if e.ID in IDsToRecheck],
+			IgnoreCommentNumbering=True)
+		NewDigests = RawSectionDigests(NewProjFilename, [e for e in NewIndex if e.ID in IDsToRecheck],
+			IgnoreCommentNumbering=True)
+		UnchangedIDs.update(i for i in OldDigests if NewDigests.get(i) == OldDigests[i])
+	return UnchangedIDs
+
+def SummarizeProjectFile(ProjFilename, Gaps=[]):
+	# stream project file ProjFilename (str), and return (Items, UpdateCount): Items is a dict whose keys are labels of
+	# top-level items, e.g. 'PHAObj 3', and values are ItemSummary instances; UpdateCount is the number of <update> tags
+	# found. Gaps (list of (Offset, Length)): byte ranges to skip, e.g. sections known to be unchanged
+	Items = {}
+	UpdateCount = 0
+	ProjectElement = ElementTree.Element(ProjectItemLabel) # collects top-level fields that aren't items
+	PendingPHAObj = None # PHA object element waiting for its comments, which follow it in the file
+	CommentTexts = {} # texts of comments following PendingPHAObj; keys are comment IDs
+
+	def FinishPHAObj():
+		# summarise PendingPHAObj, now that its comments have been read
+		Items[ItemLabelOf(PendingPHAObj)] = SummarizeItem(PendingPHAObj, CommentTexts)
+
+	if Gaps: ProjStream = project_files.ProjectFileStream(project_files.FileWithGaps(ProjFilename, Gaps),
+		CloseWhenDone=True)
+	elif project_snapshot.IsSnapshotFile(ProjFilename): ProjStream = project_snapshot.SnapshotReader(ProjFilename)
+	else: ProjStream = project_files.ProjectFileStream(ProjFilename)
+	try:
+		for ThisElement in ProjStream:
+			if ThisElement.tag == info.CommentTag:
+				if PendingPHAObj is not None:
+					CommentTexts[ThisElement.findtext(info.IDTag, '').strip()] = ThisElement.findtext(info.ContentTag, '')
+				continue
+			if PendingPHAObj is not None:
+				FinishPHAObj()
+				PendingPHAObj = None
+			if ThisElement.tag == info.UpdateTag: UpdateCount += 1
+			elif ThisElement.tag == info.PHAObjTag:
+				PendingPHAObj = ThisElement
+				CommentTexts = {}
+			elif ItemLabelOf(ThisElement): # action items appear twice in the file; the later copy replaces the first
+				Items[ItemLabelOf(ThisElement)] = SummarizeItem(ThisElement)
+			else: ProjectElement.append(ThisElement)
+		if PendingPHAObj is not None: FinishPHAObj()
+	finally:
+		ProjStream.Close()
+	Items[ProjectItemLabel] = SummarizeItem(ProjectElement)
+	return Items, UpdateCount
+
+def CompareItems(Path, OldItem, NewItem, Diffs):
+	# compare OldItem and NewItem (ItemSummary instances) at Path (str), appending DiffItem instances to Diffs (list).
+	# Items with equal hashes are skipped without examining their contents
+	if OldItem.Hash == NewItem.Hash: return
+	FieldChanges = [(f, OldItem.Fields.get(f), NewItem.Fields.get(f))
+		for f in sorted(set(OldItem.Fields) | set(NewItem.Fields)) if OldItem.Fields.get(f) != NewItem.Fields.get(f)]
+	if FieldChanges: Diffs.append(DiffItem(Change='Modified', Path=Path, FieldChanges=FieldChanges))
+	CompareItemDicts(Path + ' > ', OldItem.Children, NewItem.Children, Diffs)
+
+def CompareItemDicts(PathPrefix, OldItems, NewItems, Diffs):
+	# compare dicts of items OldItems and NewItems (keys are labels, values are ItemSummary instances), appending DiffItem
+	# instances to Diffs (list). Added and modified items are reported in NewItems' order, then removed items
+	for ThisLabel, NewItem in NewItems.items():
+		if ThisLabel in OldItems: CompareItems(PathPrefix + ThisLabel, OldItems[ThisLabel], NewItem, Diffs)
+		else: Diffs.append(DiffItem(Change='Added', Path=PathPrefix + ThisLabel))
+	for ThisLabel in OldItems:
+		if ThisLabel not in NewItems: Diffs.append(DiffItem(Change='Removed', Path=PathPrefix + ThisLabel))
+
+def DiffProjectFiles(OldProjFilename, NewProjFilename):
+	# compare project files OldProjFilename and NewProjFilename (str).
+	# Return (Diffs, Stats): Diffs is a list of DiffItem instances; Stats is a dict containing SectionsSkipped (int:
+	# number of PHA object sections identical in both files, and not parsed), OldUpdates and NewUpdates (int: number of
+	# <update> tags in each file. Updates are not applied before comparing, so if there are any, it's better to compare
+	# files made by a checkpoint or a full save), Duration (s)
+	StartTime = time.perf_counter()
+	OldGaps = []
+	NewGaps = []
+	OldIndex = project_files.ReadProjectIndex(OldProjFilename)
+	NewIndex = project_files.ReadProjectIndex(NewProjFilename)
+	if OldIndex and NewIndex:
+		# find sections that are identical in both files, and skip them
+		UnchangedIDs = UnchangedSectionIDs(OldProjFilename, OldIndex, NewProjFilename, NewIndex)
+		OldGaps = [(e.Offset, e.Allocated) for e in OldIndex if e.ID in UnchangedIDs]
+		NewGaps = [(e.Offset, e.Allocated) for e in NewIndex if e.ID in UnchangedIDs]
+	OldItems, OldUpdates = SummarizeProjectFile(OldProjFilename, Gaps=OldGaps)
+	NewItems, NewUpdates = SummarizeProjectFile(NewProjFilename, Gaps=NewGaps)
+	Diffs = []
+	CompareItemDicts('', OldItems, NewItems, Diffs)
+	return Diffs, {'SectionsSkipped': len(NewGaps), 'OldUpdates': OldUpdates, 'NewUpdates': NewUpdates,
+		'Duration': time.perf_counter() - StartTime}
+
+if __name__ == '__main__':
+	# usage: python project_diff.py <old project file> <new project file>
+	Diffs, Stats = DiffProjectFiles(sys.argv[1], sys.argv[2])
+	for ThisDiff in Diffs: print(ThisDiff)
+	print('%d differences found in %.2f s; %d unchanged PHA object sections skipped' % (len(Diffs), Stats['Duration'],
+		Stats['SectionsSkipped']))
+	if Stats['OldUpdates'] or Stats['NewUpdates']:
+		print('Warning: files contain updates not yet written into a full image (old: %d, new: %d); they were ignored' %
+			(Stats['OldUpdates'], Stats['NewUpdates']))
+	sys.exit(1 if Diffs else 0)
@@ -81,7 +81,7 @@ class ProjectInfoModelInCore(core_classes.PHAModelBaseClass):
 		if MessageReceived is None:
 			assert isinstance(MessageAsXMLTree, ElementTree.Element)
 			XMLRoot = MessageAsXMLTree
-		else: XMLRoot = ElementTree.fromstring(MessageReceived)
+		else: XMLRoot = vizop_misc.DecodeMessage(MessageReceived)
 		Proj = Args['Proj'] # get ProjectItem object to which this request belongs
 		# get the command - it's the tag of the root element
 		Command = XMLRoot.tag
@@ -710,13 +710,13 @@ def AddPHAObjsTags(Proj, XMLRoot, CurrentPHAObj=None):
 	# with an "Applicable" tag.
 	assert isinstance(Proj, projects.ProjectItem)
 	assert isinstance(XMLRoot, ElementTree.Element)
-	assert isinstance(CurrentPHAObj, core_classes.PHAModelBaseClass) or (CurrentPHAObj is None)
+	assert projects.IsPHAObj(CurrentPHAObj) or (CurrentPHAObj is None)
 	for (ThisPHAModelIndex, ThisPHAModel) in enumerate(Proj.PHAObjs):
 		PHAObjEl = ElementTree.SubElement(XMLRoot, info.PHAObjTag)
 		# set human name for grouping option to internal name of option
 		PHAObjEl.text = str(ThisPHAModel.HumanName)
 		# set tag with PHAObj class
-		PHAObjEl.set(info.PHAModelTypeTag, type(ThisPHAModel).InternalName)
+		PHAObjEl.set(info.PHAModelTypeTag, projects.PHAModelClassOf(ThisPHAModel).InternalName)
 		PHAObjEl.set(info.ApplicableAttribName, utilities.Bool2Str(ThisPHAModel is CurrentPHAObj))
 		PHAObjEl.set(info.IDTag, str(ThisPHAModel.ID)) # add PHA object ID
 
@@ -747,17 +747,20 @@ def ExtractPHAObjsTags(Proj, XMLRoot, DatacoreIsLocal):
 		for ThisPHAObjTag in XMLRoot.findall(info.PHAObjTag):
 			# get the ID
 			ThisPHAObjID = ThisPHAObjTag.get(info.IDTag)
-			# if this object is already in Shadows, transfer it to the new list
+			# if this object is already in Shadows, transfer it to the new list, updating its Applicable flag
 			if ThisPHAObjID in ExistingIDList:
-				NewPHAObjList.append(Proj.PHAObjShadows[ExistingIDList.index(ThisPHAObjID)])
-			# otherwise, create a new PHAObj shadow and append to the list
-			# find the class of the new PHAObj
-			ThisPHAObjClass = utilities.InstanceWithAttribValue(ObjList=core_classes.PHAModelMetaClass.PHAModelClasses,
-				AttribName='InternalName', TargetValue=ThisPHAObjTag.get(info.PHAModelTypeTag))
-			# make a PHAObj instance and append to PHAObj shadows list
-			NewPHAObjList.append(ThisPHAObjClass(Proj=Proj, XMLName=ThisPHAObjID,
-				HumanName='' if ThisPHAObjTag.text is None else ThisPHAObjTag.text,
-				Applicable=utilities.Bool2Str(ThisPHAObjTag.get(info.ApplicableAttribName))))
+				ExistingPHAObj = Proj.PHAObjShadows[ExistingIDList.index(ThisPHAObjID)]
+				ExistingPHAObj.Applicable = utilities.Bool2Str(ThisPHAObjTag.get(info.ApplicableAttribName))
+				NewPHAObjList.append(ExistingPHAObj)
+			else: # otherwise, create a new PHAObj shadow and append to the list
+				# find the class of the new PHAObj
+				ThisPHAObjClass = utilities.InstanceWithAttribValue(
+					ObjList=core_classes.PHAModelMetaClass.PHAModelClasses,
+					AttribName='InternalName', TargetValue=ThisPHAObjTag.get(info.PHAModelTypeTag))
+				# make a PHAObj instance with the same ID as in the datacore, and append to PHAObj shadows list
+				NewPHAObjList.append(ThisPHAObjClass(Proj=Proj, ID=ThisPHAObjID,
+					HumanName='' if ThisPHAObjTag.text is None else ThisPHAObjTag.text,
+					Applicable=utilities.Bool2Str(ThisPHAObjTag.get(info.ApplicableAttribName))))
 		# overwrite the old shadows list with the new list
 		Proj.PHAObjShadows = NewPHAObjList
 
@@ -0,0 +1,548 @@
+# -*- coding: utf-8 -*-
+# Module: project_files. This file is part of Vizop. Copyright xSeriCon, 2020
+
+# standard modules needed:
+import os, sys, io, time, gzip, lzma, tracemalloc, hashlib, struct
+import xml.etree.ElementTree as ElementTree
+
+# vizop modules needed:
+import info
+
+"""
+The project_files module contains code for handling Vizop project files at the level of their XML structure, without
+needing a datacore or a display. It doesn't import wx, so it can be used from worker processes and command-line tools.
+Project files can be compressed with gzip or lzma; compression is detected by the file's magic bytes, and files are
+compressed and decompressed as streams, so memory use doesn't depend on the file size. A compressed project file is
+written as two concatenated gzip members (or xz streams), which decompress as one: the second holds only the root end
+tag, so that updates can be appended by replacing it (see AppendToCompressedProjectFile()). Parts of a compressed file
+can't be rewritten in place, so compressed files have no index, and are always saved in full.
+"""
+
+class ProjectFileStream(object): # streams the top-level elements of a Vizop project file one at a time, so that the
+	# entire file never has to be held in memory as a single XML tree
+
+	def __init__(self, ProjFile, ProgressCallback=None, MeasureMemory=False, CloseWhenDone=False):
+		# ProjFile: a filename (str) or a file object opened in binary mode
+		# ProgressCallback: None, or callable taking one arg: the fraction of the file read so far (float, 0..1)
+		# MeasureMemory (bool): whether to track peak memory use with tracemalloc (which slows down loading)
+		# CloseWhenDone (bool): whether to close ProjFile, if a file object, when streaming is finished. A file opened
+		# from a filename is always closed
+		object.__init__(self)
+		assert isinstance(ProjFile, str) or hasattr(ProjFile, 'read')
+		assert (ProgressCallback is None) or callable(ProgressCallback)
+		assert isinstance(MeasureMemory, bool)
+		assert isinstance(CloseWhenDone, bool)
+		# whether we need to close the file when finished
+		self.OwnFile = isinstance(ProjFile, str) or CloseWhenDone
+		self.ProjFile = OpenProjectFileForReading(ProjFile) if isinstance(ProjFile, str) else ProjFile
+		# get the size of the file on disk, which is compressed if the file is. Progress is measured against this size
+		try: self.FileSize = os.fstat(self.ProjFile.fileno()).st_size
+		except (AttributeError, OSError, ValueError): self.FileSize = 0 # not a real file, e.g. an in-memory stream
+		self.ProgressCallback = ProgressCallback
+		self.MeasureMemory = MeasureMemory
+		self.Parser = ElementTree.iterparse(self.ProjFile, events=('start', 'end'))
+		self.Root = None # root element; populated with its attribs, but top-level elements are removed once processed
+		self.ElementsProcessed = 0 # number of top-level elements streamed so far
+		self.PeakMemory = None # peak memory in bytes used during streaming, if MeasureMemory
+		self.Duration = 0.0 # time in s taken to stream the file, including processing by the caller
+		self.StartTime = time.perf_counter()
+		if MeasureMemory and not tracemalloc.is_tracing(): tracemalloc.start()
+		else: self.MeasureMemory = False # memory already being traced by someone else; don't interfere
+		# read as far as the root element's start tag, so that the root attribs are available before streaming starts
+		for (Event, ThisElement) in self.Parser:
+			if Event == 'start':
+				self.Root = ThisElement
+				break
+
+	def RootAttrib(self, AttribName, Default=None):
+		# return value of AttribName (str) in the file's root element, or Default if absent or the file has no root
+		return Default if self.Root is None else self.Root.attrib.get(AttribName, Default)
+
+	def __iter__(self):
+		# yield each top-level element under the root, once it has been completely parsed.
+		# When the caller asks for the next element, the previous one is detached from the root to release its memory
+		# (unless the caller kept a reference to it).
+		Depth = 1 # we are already inside the root element
+		try:
+			for (Event, ThisElement) in self.Parser:
+				if Event == 'start': Depth += 1
+				else:
+					Depth -= 1
+					if Depth == 1: # just finished a top-level element
+						self.ElementsProcessed += 1
+						yield ThisElement
+						self.Root.remove(ThisElement)
+						if self.ProgressCallback and self.FileSize:
+							# get position in the file on disk; ProjFile.tell() would give the position in the
+							# decompressed data, if the file is compressed
+							self.ProgressCallback(min(1.0,
+								os.lseek(self.ProjFile.fileno(), 0, os.SEEK_CUR) / self.FileSize))
+		finally:
+			self.Close()
+
+	def Close(self):
+		# finish streaming: record duration and peak memory, and close the file if we opened it
+		self.Duration = time.perf_counter() - self.StartTime
+		if self.MeasureMemory and tracemalloc.is_tracing():
+			self.PeakMemory = tracemalloc.get_traced_memory()[1]
+			tracemalloc.stop()
+		if self.OwnFile and not self.ProjFile.closed: self.ProjFile.close()
+
+def CompressionOfFile(ProjFilename):
+	# return the compression (str: 'none', 'gzip' or 'lzma') of project file ProjFilename (str), judging by its magic
+	# bytes. Return 'none' if the file can't be read
+	try:
+		with open(ProjFilename, 'rb') as ProjFile:
+			FirstBytes = ProjFile.read(max(len(m) for m in info.ProjectCompressionMagics.values()))
+	except (IOError, OSError):
+		return 'none'
+	for (ThisCompression, ThisMagic) in info.ProjectCompressionMagics.items():
+		if FirstBytes.startswith(ThisMagic): return ThisCompression
+	return 'none'
+
+def OpenProjectFileForReading(ProjFilename):
+	# return a file object, in binary mode, for reading project file ProjFilename (str), decompressing it on the fly if
+	# it's compressed
+	Compression = CompressionOfFile(ProjFilename)
+	if Compression == 'gzip': return gzip.open(ProjFilename, 'rb')
+	elif Compression == 'lzma': return lzma.open(ProjFilename, 'rb')
+	else: return open(ProjFilename, 'rb')
+
+def CompressBytes(Data, Compression):
+	# return Data (bytes) compressed as a complete gzip member or xz stream, according to Compression ('gzip' or 'lzma').
+	# The result depends only on Data and Compression (no timestamp is included)
+	assert Compression in info.ProjectCompressionMagics
+	if Compression == 'gzip':
+		return gzip.compress(Data, compresslevel=info.ProjectCompressionLevels['gzip'], mtime=0)
+	else: return lzma.compress(Data, preset=info.ProjectCompressionLevels['lzma'])
+
+def CompressedRootEndTag(Compression):
+	# return the last bytes of a project file compressed with Compression ('gzip' or 'lzma'): its root end tag,
+	# compressed on its own
+	return CompressBytes(('</' + info.ProjectRootTag + '>').encode('UTF-8'), Compression)
+
+def WriteProjectFileContent(ProjFile, Pieces, Compression='none'):
+	# write Pieces (iterable of bytes: the complete content of a project file, ending with the root end tag) into
+	# ProjFile (file object open for writing in binary mode), compressed according to Compression ('none', 'gzip' or
+	# 'lzma'). The pieces are compressed as they are written, so they needn't all be in memory at once
+	assert Compression in ['none'] + list(info.ProjectCompressionMagics)
+	if Compression == 'none':
+		for ThisPiece in Pieces: ProjFile.write(ThisPiece)
+		return
+	RootEndTag = ('</' + info.ProjectRootTag + '>').encode('UTF-8')
+	if Compression == 'gzip': Compressor = gzip.GzipFile(filename='', mode='wb', fileobj=ProjFile, mtime=0,
+		compresslevel=info.ProjectCompressionLevels['gzip'])
+	else: Compressor = lzma.LZMAFile(ProjFile, mode='wb', preset=info.ProjectCompressionLevels['lzma'])
+	# hold back the last few bytes written, as the root end tag (and any whitespace after it) goes into a separate member
+	HoldBackLength = len(RootEndTag) + 256
+	HeldBack = b''
+	for ThisPiece in Pieces:
+		HeldBack += ThisPiece
+		if len(HeldBack) > HoldBackLength:
+			Compressor.write(HeldBack[:-HoldBackLength])
+			HeldBack = HeldBack[-HoldBackLength:]
+	HeldBack = HeldBack.rstrip()
+	if not HeldBack.endswith(RootEndTag): raise ValueError('Project file content does not end with root end tag')
+	Compressor.write(HeldBack[:-len(RootEndTag)])
+	Compressor.close() # finishes the first member, without closing ProjFile
+	ProjFile.write(CompressedRootEndTag(Compression))
+
+def AppendToCompressedProjectFile(ProjFile, Data, Compression):
+	# insert Data (bytes) just before the root end tag of a project file written by WriteProjectFileContent() with
+	# Compression ('gzip' or 'lzma'), and open as ProjFile (file object in binary update mode). Data is compressed as a
+	# new member, and the root end tag is put back after it.
+	# Return bool: whether the file ended as expected, so that Data could be inserted
+	EndMember = CompressedRootEndTag(Compression)
+	ProjFile.seek(0, 2)
+	if ProjFile.tell() < len(EndMember): return False
+	ProjFile.seek(-len(EndMember), 2)
+	if ProjFile.read() != EndMember: return False
+	ProjFile.seek(-len(EndMember), 2)
+	ProjFile.write(CompressBytes(Data, Compression))
+	ProjFile.write(EndMember)
+	ProjFile.truncate()
+	return True
+
+def RawBlocksOfProjectFile(ProjFilename, BlockSize=info.ProjectFileBufferSize):
+	# yield the content of project file ProjFilename (str), decompressed if necessary, in blocks of bytes
+	with OpenProjectFileForReading(ProjFilename) as ProjFile:
+		while True:
+			ThisBlock = ProjFile.read(BlockSize)
+			if not ThisBlock: return
+			yield ThisBlock
+
+def ConvertProjectFileCompression(ProjFilename, NewProjFilename, Compression):
+	# write a copy of project file ProjFilename (str) to NewProjFilename (str), compressed according to Compression
+	# ('none', 'gzip' or 'lzma'). The content is copied without parsing it. Return WriteOK (bool)
+	try:
+		with open(NewProjFilename, 'wb', buffering=info.ProjectFileBufferSize) as NewProjFile:
+			WriteProjectFileContent(NewProjFile, RawBlocksOfProjectFile(ProjFilename), Compression=Compression)
+	except (IOError, OSError, EOFError, ValueError, lzma.LZMAError):
+		return False
+	RemoveProjectIndex(NewProjFilename) # any existing index doesn't match the new file
+	return True
+
+class PHAObjIndexEntry(object): # entry in a project file's index, giving the location of one PHA object's section
+	# (its <PHAObj> tag) in the project file
+
+	def __init__(self, ID='', Kind='', HumanName='', Offset=0, Length=0, Allocated=None, ElementIDs=[],
+			MaxCommentID=0):
+		object.__init__(self)
+		assert isinstance(ID, str)
+		assert isinstance(Kind, str)
+		assert isinstance(Offset, int)
+		assert isinstance(Length, int)
+		assert (Allocated is None) or isinstance(Allocated, int)
+		assert isinstance(MaxCommentID, int)
+		self.ID = ID # ID of the PHA object
+		self.Kind = Kind # InternalName of the PHA object's class
+		self.HumanName = HumanName
+		self.Offset = Offset # byte offset of the start of the PHAObj tag in the project file
+		self.Length = Length # length in bytes of the PHAObj tag, including its end tag
+		# length in bytes of the PHA object's whole section: the PHAObj tag, the tags of its comments, and any whitespace
+		# slack after them. Older files have no comment tags or slack in the section, so it's the same as Length
+		self.Allocated = Length if Allocated is None else Allocated
+		self.ElementIDs = ElementIDs[:] # IDs of elements contained in the PHA object (list of str)
+		self.MaxCommentID = MaxCommentID # highest ID (int) of the comment tags in the section, or 0 if none
+
+class ProjectFileLayout(object): # describes the chunks of a project file as written by
+	# projects.GenerateProjectFilePieces(), so that individual chunks can later be rewritten in place. After the root
+	# start tag, the file contains: a head chunk (project information, numbering systems and other project-level
+	# objects), a section for each PHA object (its PHAObj tag followed by the tags of its comments), and a tail chunk
+	# (Viewports and associated texts). Each chunk is followed by whitespace slack, so that it can grow a little when
+	# rewritten without moving the rest of the file
+
+	def __init__(self, Filename, HeadOffset=0, HeadAllocated=0, TailOffset=0, TailAllocated=0, IndexEntries=[],
+			MaxCommentID=0, NumberingDigest=''):
+		object.__init__(self)
+		assert isinstance(Filename, str)
+		assert isinstance(IndexEntries, list)
+		self.Filename = Filename
+		self.HeadOffset = HeadOffset # byte offset of the start of the head chunk
+		self.HeadAllocated = HeadAllocated # length in bytes of the head chunk, including slack
+		self.TailOffset = TailOffset
+		self.TailAllocated = TailAllocated
+		self.IndexEntries = IndexEntries[:] # PHAObjIndexEntry instances for all PHA object sections, in file order
+		self.MaxCommentID = MaxCommentID # highest comment ID (int) in the file
+		self.NumberingDigest = NumberingDigest # digest (str) of the numbering system tags in the head chunk; PHA object
+			# sections refer to numbering systems by index, so if these change, all sections must be rewritten
+		self.FileSize = None # size and modification time of the file when last written, to detect changes by others
+		self.FileModTime = None
+
+	def RecordFileState(self):
+		# store the file's current size and modification time
+		FileStat = os.stat(self.Filename)
+		self.FileSize = FileStat.st_size
+		self.FileModTime = FileStat.st_mtime_ns
+
+	def MatchesFile(self, Filename):
+		# return bool: whether Filename (str) is the file described by this layout, and unchanged since it was written
+		try: FileStat = os.stat(Filename)
+		except OSError: return False
+		return (os.path.abspath(Filename) == os.path.abspath(self.Filename)) and (FileStat.st_size == self.FileSize) \
+			and (FileStat.st_mtime_ns == self.FileModTime)
+
+def SlackForChunk(ChunkLength):
+	# return number of bytes (int) of whitespace slack to write after a chunk of a project file of ChunkLength bytes
+	return max(info.ChunkSlackMinimum, int(ChunkLength * info.ChunkSlackFraction))
+
+def IndexFilename(ProjFilename):
+	# return the filename (str) of the index file for project file ProjFilename (str)
+	return ProjFilename + info.ProjectIndexFileSuffix
+
+def WriteProjectIndex(ProjFilename, IndexEntries):
+	# write an index file alongside ProjFilename (str), containing IndexEntries (list of PHAObjIndexEntry instances)
+	# Return WriteOK (bool)
+	assert isinstance(IndexEntries, list)
+	IndexRoot = ElementTree.Element(info.ProjectIndexRootTag, attrib={info.VizopVersionTag: info.VERSION})
+	for ThisEntry in IndexEntries:
+		ThisEntryTag = ElementTree.SubElement(IndexRoot, info.PHAObjTag, attrib={info.IDTag: ThisEntry.ID,
+			info.KindTag: ThisEntry.Kind, info.HumanNameTag: ThisEntry.HumanName or '',
+			info.OffsetTag: str(ThisEntry.Offset), info.LengthTag: str(ThisEntry.Length),
+			info.AllocatedTag: str(ThisEntry.Allocated), info.MaxCommentIDTag: str(ThisEntry.MaxCommentID)})
+		ThisEntryTag.text = ' '.join(ThisEntry.ElementIDs)
+	try:
+		ElementTree.ElementTree(IndexRoot).write(IndexFilename(ProjFilename), encoding='UTF-8', xml_declaration=True)
+	except (IOError, OSError):
+		return False
+	return True
+
+def RemoveProjectIndex(ProjFilename):
+	# delete any index file for project file ProjFilename (str), e.g. because the project file no longer matches it
+	try: os.remove(IndexFilename(ProjFilename))
+	except OSError: pass
+
+def ReadProjectIndex(ProjFilename):
+	# read the index file for project file ProjFilename (str), and check that it matches the project file.
+	# Return list of PHAObjIndexEntry instances, or None if there is no index or it doesn't match the project file
+	import project_snapshot # imported here, as project_snapshot imports this module
+	# compressed and snapshot files have no usable index
+	if (CompressionOfFile(ProjFilename) != 'none') or project_snapshot.IsSnapshotFile(ProjFilename): return None
+	try:
+		IndexRoot = ElementTree.parse(IndexFilename(ProjFilename)).getroot()
+	except (IOError, OSError, ElementTree.ParseError):
+		return None
+	if (IndexRoot.tag != info.ProjectIndexRootTag) or \
+			(IndexRoot.attrib.get(info.VizopVersionTag) not in info.UsableProjDocVersions):
+		return None
+	IndexEntries = []
+	try:
+		for ThisEntryTag in IndexRoot.findall(info.PHAObjTag):
+			IndexEntries.append(PHAObjIndexEntry(ID=ThisEntryTag.get(info.IDTag, ''),
+				Kind=ThisEntryTag.get(info.KindTag, ''), HumanName=ThisEntryTag.get(info.HumanNameTag, ''),
+				Offset=int(ThisEntryTag.get(info.OffsetTag)), Length=int(ThisEntryTag.get(info.LengthTag)),
+				Allocated=int(ThisEntryTag.get(info.AllocatedTag, ThisEntryTag.get(info.LengthTag))),
+				ElementIDs=(ThisEntryTag.text or '').split(),
+				MaxCommentID=int(ThisEntryTag.get(info.MaxCommentIDTag)))) # older indexes without it are rejected
+		# check each section is where the index says it is. This is much quicker than parsing the sections
+		with open(ProjFilename, 'rb') as ProjFile:
+			for ThisEntry in IndexEntries:
+				if not SectionMatchesIndexEntry(ProjFile, ThisEntry): return None
+	except (IOError, OSError, TypeError, ValueError):
+		return None
+	return IndexEntries
+
+def JournalFilename(ProjFilename):
+	# return the filename (str) of the journal file for project file ProjFilename (str)
+	return ProjFilename + info.ProjectJournalFileSuffix
+
+def WriteChunksWithJournal(ProjFilename, NewChunks):
+	# overwrite chunks of ProjFilename (str) in place with NewChunks (list of (Offset (int), ChunkBytes (bytes))).
+	# The chunks are first written to a journal file alongside the project file, which is removed once the project file
+	# is safely on disk. If we are interrupted while rewriting the project file, ApplyProjectJournal() completes the
+	# rewrite when the file is next opened; if interrupted while writing the journal, the project file is untouched.
+	# Raises IOError or OSError if writing fails
+	JournalRecords = b''.join(struct.pack('>QQ', Offset, len(ChunkBytes)) + ChunkBytes
+		for (Offset, ChunkBytes) in NewChunks)
+	with open(JournalFilename(ProjFilename), 'wb') as JournalFile:
+		JournalFile.write(info.ProjectJournalMagic + JournalRecords + hashlib.sha1(JournalRecords).digest())
+		JournalFile.flush()
+		os.fsync(JournalFile.fileno())
+	with open(ProjFilename, 'r+b') as ProjFile:
+		for (Offset, ChunkBytes) in NewChunks:
+			ProjFile.seek(Offset)
+			ProjFile.write(ChunkBytes)
+		ProjFile.flush()
+		os.fsync(ProjFile.fileno())
+	os.remove(JournalFilename(ProjFilename))
+
+def ApplyProjectJournal(ProjFilename):
+	# if a journal file was left alongside ProjFilename (str) by an interrupted WriteChunksWithJournal(), complete the
+	# rewrite it records, provided the journal is complete; then remove the journal.
+	# Return bool: whether any chunks were rewritten
+	try:
+		with open(JournalFilename(ProjFilename), 'rb') as JournalFile: JournalBytes = JournalFile.read()
+	except (IOError, OSError):
+		return False # no journal
+	JournalRecords = JournalBytes[len(info.ProjectJournalMagic):-20]
+	JournalComplete = JournalBytes.startswith(info.ProjectJournalMagic) and \
+		(len(JournalBytes) >= len(info.ProjectJournalMagic) + 20) and \
+		(hashlib.sha1(JournalRecords).digest() == JournalBytes[-20:])
+	if JournalComplete:
+		# rewriting the same bytes again is harmless, so we don't need to know how far the rewrite got
+		RemoveProjectIndex(ProjFilename) # the index may not have been rewritten to match
+		try:
+			with open(ProjFilename, 'r+b') as ProjFile:
+				Position = 0
+				while Position < len(JournalRecords):
+					Offset, ChunkLength = struct.unpack_from('>QQ', JournalRecords, Position)
+					Position += 16
+					ProjFile.seek(Offset)
+					ProjFile.write(JournalRecords[Position:Position + ChunkLength])
+					Position += ChunkLength
+				ProjFile.flush()
+				os.fsync(ProjFile.fileno())
+		except (IOError, OSError):
+			return False # keep the journal, so that we can try again next time
+	try: os.remove(JournalFilename(ProjFilename))
+	except OSError: pass
+	return JournalComplete
+
+def SectionMatchesIndexEntry(ProjFile, IndexEntry):
+	# return bool: whether ProjFile (file object opened in binary mode) contains the PHAObj tag described by IndexEntry
+	# (PHAObjIndexEntry instance) at the position in the index entry
+	ExpectedStart = ('<%s><%s>%s</%s>' % (info.PHAObjTag, info.IDTag, IndexEntry.ID, info.IDTag)).encode('UTF-8')
+	ExpectedEnd = ('</%s>' % info.PHAObjTag).encode('UTF-8')
+	ProjFile.seek(IndexEntry.Offset)
+	if ProjFile.read(len(ExpectedStart)) != ExpectedStart: return False
+	ProjFile.seek(IndexEntry.Offset + IndexEntry.Length - len(ExpectedEnd))
+	return ProjFile.read(len(ExpectedEnd)) == ExpectedEnd
+
+def ReadPHAObjSection(ProjFilename, IndexEntry):
+	# read the section described by IndexEntry (PHAObjIndexEntry instance) from project file ProjFilename (str): the
+	# PHAObj tag, and the tags of its comments following it. If the section isn't where the index says (e.g. the file
+	# has been rewritten since the index was read), search the file for it instead.
+	# Return list of top-level elements in the section (ElementTree.Element instances; the first is the PHAObj tag), or
+	# None if not found
+	with open(ProjFilename, 'rb') as ProjFile:
+		if SectionMatchesIndexEntry(ProjFile, IndexEntry):
+			ProjFile.seek(IndexEntry.Offset)
+			SectionBytes = ProjFile.read(IndexEntry.Allocated)
+			# wrap the section in a dummy root element, so that it can be parsed as a single XML document
+			RootTagBytes = info.ProjectRootTag.encode('UTF-8')
+			return list(ElementTree.fromstring(b'<' + RootTagBytes + b'>' + SectionBytes + b'</' + RootTagBytes + b'>'))
+	SectionElements = None
+	for ThisElement in ProjectFileStream(ProjFilename):
+		if SectionElements is None: # still looking for the PHAObj tag
+			if (ThisElement.tag == info.PHAObjTag) and (ThisElement.findtext(info.IDTag) == IndexEntry.ID):
+				SectionElements = [ThisElement]
+		elif ThisElement.tag == info.CommentTag: SectionElements.append(ThisElement)
+		else: break
+	return SectionElements
+
+class FileWithGaps(object): # read-only binary file object that reads an underlying file, skipping over given byte
+	# ranges. Used to stream a project file without reading the sections of PHA objects that will be loaded lazily
+
+	def __init__(self, Filename, Gaps):
+		# Gaps: list of (Offset, Length) tuples (both int) of byte ranges to skip
+		object.__init__(self)
+		assert isinstance(Gaps, list)
+		self.File = open(Filename, 'rb')
+		self.Gaps = sorted(Gaps)
+		self.NextGapIndex = 0 # index in self.Gaps of the next gap not yet skipped
+
+	def read(self, Size=-1):
+		# return up to Size bytes (or all remaining bytes, if Size < 0) from the underlying file, excluding gaps
+		Chunks = []
+		BytesWanted = Size
+		while BytesWanted != 0:
+			Position = self.File.tell()
+			# skip any gap starting at the current position
+			if (self.NextGapIndex < len(self.Gaps)) and (Position >= self.Gaps[self.NextGapIndex][0]):
+				GapOffset, GapLength = self.Gaps[self.NextGapIndex]
+				self.File.seek(max(Position, GapOffset + GapLength))
+				self.NextGapIndex += 1
+				continue
+			# read as far as the next gap, or until we have enough bytes
+			if self.NextGapIndex < len(self.Gaps): BytesToGap = self.Gaps[self.NextGapIndex][0] - Position
+			else: BytesToGap = -1 # no more gaps
+			if BytesWanted < 0: BytesToRead = BytesToGap
+			elif BytesToGap < 0: BytesToRead = BytesWanted
+			else: BytesToRead = min(BytesWanted, BytesToGap)
+			ThisChunk = self.File.read(BytesToRead)
+			if not ThisChunk: break # end of file
+			Chunks.append(ThisChunk)
+			if BytesWanted > 0: BytesWanted -= len(ThisChunk)
+		return b''.join(Chunks)
+
+	def tell(self): return self.File.tell()
+
+	def fileno(self): return self.File.fileno()
+
+	@property
+	def closed(self): return self.File.closed
+
+	def close(self): self.File.close()
+
+class ParsedProjectFile(object): # the content of a project file, read and checked by ParseProjectFile(), usually in a
+	# worker process. It holds the XML as bytes (decompressed, and without the sections of PHA objects to be loaded
+	# lazily) rather than as parsed elements, as bytes are passed back to the main process far faster than pickled
+	# element trees, and parsing them again there is quick. It provides the same interface as ProjectFileStream so that
+	# it can be unpacked into a project in the same way
+
+	def __init__(self, Filename):
+		object.__init__(self)
+		assert isinstance(Filename, str)
+		self.Filename = Filename
+		self.Root = None # root element, without its children; None if the file has no usable root element
+		self.Content = b'' # XML content to be streamed (bytes), or the whole file if it's a snapshot
+		self.IsSnapshot = False # whether the file is in compact binary snapshot format (see project_snapshot.py)
+		self.LazyPHAObjs = [] # list of PHAObjIndexEntry instances for PHA objects whose sections were skipped
+		self.Damaged = False # whether a problem was found after the root element, e.g. the file is truncated
+		self.ElementsProcessed = 0
+		self.PeakMemory = None
+		self.Duration = 0.0 # time in s taken to read and check the file
+
+	def RootAttrib(self, AttribName, Default=None):
+		# return value of AttribName (str) in the file's root element, or Default if absent or the file has no root
+		return Default if self.Root is None else self.Root.attrib.get(AttribName, Default)
+
+	def __iter__(self):
+		# yield each top-level element, then raise ParseError if the file is damaged, as ProjectFileStream would
+		import project_snapshot # imported here, as project_snapshot imports this module
+		if self.IsSnapshot: Elements = project_snapshot.SnapshotReader(self.Content)
+		else: Elements = ProjectFileStream(io.BytesIO(self.Content))
+		for ThisElement in Elements: yield ThisElement
+		if self.Damaged: raise ElementTree.ParseError('Project file %s is damaged' % self.Filename)
+
+	def Close(self): pass # nothing to close; provided for compatibility with ProjectFileStream
+
+def ParseProjectFile(ProjFilename, MeasureMemory=False):
+	# read the whole of project file or snapshot ProjFilename (str), skipping the sections of any PHA objects listed in
+	# its index (they are unpacked lazily after the project is opened), and check that it parses. Intended to be run in
+	# a worker process, so several files can be read at once. Return a ParsedProjectFile instance
+	import project_snapshot # imported here, as project_snapshot imports this module
+	Parsed = ParsedProjectFile(ProjFilename)
+	try:
+		Parsed.IsSnapshot = project_snapshot.IsSnapshotFile(ProjFilename)
+		Parsed.LazyPHAObjs = [] if Parsed.IsSnapshot else (ReadProjectIndex(ProjFilename) or [])
+		if Parsed.LazyPHAObjs:
+			ProjFile = FileWithGaps(ProjFilename, Gaps=[(e.Offset, e.Allocated) for e in Parsed.LazyPHAObjs])
+		elif Parsed.IsSnapshot: ProjFile = open(ProjFilename, 'rb')
+		else: ProjFile = OpenProjectFileForReading(ProjFilename)
+		try: Content = ProjFile.read()
+		finally: ProjFile.close()
+		if Parsed.IsSnapshot: ProjStream = project_snapshot.SnapshotReader(Content)
+		else: ProjStream = ProjectFileStream(io.BytesIO(Content), MeasureMemory=MeasureMemory)
+	except (ElementTree.ParseError, IOError, OSError, EOFError, ValueError, lzma.LZMAError):
+		return Parsed # no usable root element
+	if ProjStream.Root is None: return Parsed
+	Parsed.Root = ElementTree.Element(ProjStream.Root.tag, attrib=dict(ProjStream.Root.attrib))
+	# check the top-level elements only if the file is a version we can use; otherwise the caller only needs the root
+	if Parsed.RootAttrib(info.VizopVersionTag) in info.UsableProjDocVersions:
+		Parsed.Content = Content
+		try:
+			for ThisElement in ProjStream: pass
+		except (ElementTree.ParseError, ValueError):
+			Parsed.Damaged = True
+	ProjStream.Close()
+	Parsed.ElementsProcessed = ProjStream.ElementsProcessed
+	Parsed.PeakMemory = ProjStream.PeakMemory
+	Parsed.Duration = ProjStream.Duration
+	return Parsed
+
+"""[----------TESTING AREA---------- """
+
+def BenchmarkCompression(ProjFilename, Folder=None, Repeats=3):
+	# compare saving and loading times, and file sizes, of project file ProjFilename (str) written with each kind of
+	# compression into Folder (str; defaults to ProjFilename's folder). To see the effect of file size on a network
+	# share, give a folder on the share. Saving includes flushing the file to disk; loading streams every top-level
+	# element, as when opening a project. Return results as dict: keys are compressions, values are dicts containing
+	# Size (bytes), Save and Load (s)
+
+	def BestTime(Task):
+		# return shortest time (s) taken to run Task (callable) over Repeats runs
+		Times = []
+		for ThisRun in range(Repeats):
+			StartTime = time.perf_counter()
+			Task()
+			Times.append(time.perf_counter() - StartTime)
+		return min(Times)
+
+	def Save(TargetFilename, Compression):
+		with open(TargetFilename, 'wb', buffering=info.ProjectFileBufferSize) as TargetFile:
+			WriteProjectFileContent(TargetFile, Content, Compression=Compression)
+			TargetFile.flush()
+			os.fsync(TargetFile.fileno())
+
+	Content = list(RawBlocksOfProjectFile(ProjFilename)) # read once, so that only writing is timed
+	Results = {}
+	for ThisCompression in ['none'] + list(info.ProjectCompressionMagics):
+		TargetFilename = os.path.join(Folder or os.path.dirname(os.path.abspath(ProjFilename)),
+			'benchmark_%s_%s' % (ThisCompression, os.path.basename(ProjFilename)))
+		Results[ThisCompression] = {'Save': BestTime(lambda: Save(TargetFilename, ThisCompression)),
+			'Load': BestTime(lambda: list(ProjectFileStream(TargetFilename))),
+			'Size': os.path.getsize(TargetFilename)}
+		os.remove(TargetFilename)
+	return Results
+
+if __name__ == '__main__':
+	# usage: python project_files.py benchmark <project file> [<folder to write test files in>]
+	#     or python project_files.py convert <project file> <new project file> none|gzip|lzma
+	if sys.argv[1] == 'benchmark':
+		for (ThisCompression, ThisResult) in BenchmarkCompression(ProjFilename=sys.argv[2],
+				Folder=(sys.argv[3] if len(sys.argv) > 3 else None)).items():
+			print('%-5s size %12d bytes, save %7.2f s, load %7.2f s' % (ThisCompression, ThisResult['Size'],
+				ThisResult['Save'], ThisResult['Load']))
+	elif sys.argv[1] == 'convert':
+		print(ConvertProjectFileCompression(sys.argv[2], sys.argv[3], Compression=sys.argv[4]))
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+# Module: project_recovery. This file is part of Vizop. Copyright xSeriCon, 2020
+
+# standard modules needed:
+import os, sys, time, hashlib
+from itertools import chain
+import xml.etree.ElementTree as ElementTree
+
+# vizop modules needed:
+import info, project_files, project_check, project_snapshot
+
+"""
+The project_recovery module contains code for recovering projects after Vizop was shut down uncleanly, e.g. by a crash.
+While a project is being saved on the fly, a session marker file for it is kept in the user's session folder; it is
+removed when the project is closed normally. Any marker still present at startup shows that the project's session
+ended uncleanly.
+Recovery replays the <update> tags appended to the project file since its last full image. Each update carries, in its
+RecoveryData tag, the new content of the part of the project file changed by one edit (see projects.MakeRecoveryData()):
+either a single element of a PHA object, with its comments, or a whole chunk of the file (see
+projects.GenerateProjectXMLChunks()). Replay streams the file once, keeping the latest version of each chunk and
+patching changed elements into it, then writes a new full image, so it takes time linear in the size of the file.
+Updates written by earlier versions of Vizop carry no recovery data, and are counted as not replayable.
+It doesn't import wx.
+"""
+
+def SessionMarkerFilename(SessionFolder, ProjFilename):
+	# return full path of the session marker file for project file ProjFilename (str) in SessionFolder (str)
+	return os.path.join(SessionFolder, hashlib.sha1(os.path.abspath(ProjFilename).encode('UTF-8')).hexdigest() +
+		'.' + info.SessionMarkerExtension)
+
+def StartSession(SessionFolder, ProjFilename):
+	# write a session marker for project file ProjFilename (str) into SessionFolder (str), creating the folder if
+	# needed. The marker contains the project file's full path and the process ID of this Vizop instance.
+	# Return bool: whether the marker was written
+	try:
+		os.makedirs(SessionFolder, exist_ok=True)
+		with open(SessionMarkerFilename(SessionFolder, ProjFilename), 'w', encoding='UTF-8') as MarkerFile:
+			MarkerFile.write('%d\n%s\n' % (os.getpid(), os.path.abspath(ProjFilename)))
+	except (IOError, OSError):
+		return False
+	return True
+
+def EndSession(SessionFolder, ProjFilename):
+	# remove the session marker for project file ProjFilename (str) from SessionFolder (str), if any
+	try: os.remove(SessionMarkerFilename(SessionFolder, ProjFilename))
+	except OSError: pass
+
+def ProcessIsRunning(ProcessID):
+	# return bool: whether a process with ProcessID (int) is running. Only checked on POSIX systems; elsewhere, assume not
+	if os.name != 'posix': return False
+	try: os.kill(ProcessID, 0) # signal 0 checks the process exists, without affecting it
+	except ProcessLookupError: return False
+	except PermissionError: return True # exists, but belongs to another user
+	except OSError: return False
+	return True
+
+def UncleanSessions(SessionFolder):
+	# return list of full paths (str) of project files whose sessions ended uncleanly, judging by the session markers in
+	# SessionFolder (str). Markers belonging to Vizop instances still running are ignored
+	ProjFilenames = []
+	try: MarkerFilenames = [f for f in os.listdir(SessionFolder) if f.endswith('.' + info.SessionMarkerExtension)]
+	except OSError: return []
+	for ThisMarkerFilename in MarkerFilenames:
+		try:
+			with open(os.path.join(SessionFolder, ThisMarkerFilename), encoding='UTF-8') as MarkerFile:
+				ProcessID, ProjFilename = MarkerFile.read().splitlines()[:2]
+		except (IOError, OSError, ValueError): continue # unreadable marker; ignore it
+		if ProcessID.isdigit() and ProcessIsRunning(int(ProcessID)): continue # session still in progress
+		ProjFilenames.append(ProjFilename)
+	return ProjFilenames
+
+def RecoveredFilename(ProjFilename):
+	# return filename (str) for the project recovered from ProjFilename (str): "_Recovered" inserted before the extension
+	FilenameHead, FilenameExt = os.path.splitext(ProjFilename)
+	return FilenameHead + info.RecoveredFileSuffix + FilenameExt
+
+def RenumberComments(ChunkElements, NextCommentID):
+	# give the comments in ChunkElements (list of top-level elements in a PHA object's chunk) new IDs starting from
+	# NextCommentID (int), and update references to them. Needed because chunks from different updates were numbered
+	# independently. Return the next comment ID not yet used (int)
+	NewIDs = {} # keys are old comment IDs, values are new ones
+	for ThisElement in ChunkElements:
+		if ThisElement.tag == info.CommentTag:
+			IDElement = ThisElement.find(info.IDTag)
+			NewIDs[IDElement.text] = str(NextCommentID)
+			IDElement.text = str(NextCommentID)
+			NextCommentID += 1
+	for ThisElement in ChunkElements:
+		if ThisElement.tag == info.PHAObjTag:
+			for ThisListTag in project_check.CommentListTags:
+				for ThisListElement in ThisElement.iter(ThisListTag):
+					ThisListElement.text = ','.join(NewIDs.get(i, i) for i in
+						project_check.SplitIDList(ThisListElement.text))
+	return NextCommentID
+
+def ReplaceElementInChunk(ChunkElements, ElementID, NewElements):
+	# in ChunkElements (list of top-level elements in a PHA object's chunk, starting with its PHAObj tag), replace the
+	# element with ID = ElementID (str) by the first of NewElements (list of elements); the rest are the tags of its
+	# comments, which replace those of the old element.
+	# Return bool: whether the element was found
+	for ThisParent in ChunkElements[0].iter():
+		for (ThisIndex, ThisChild) in enumerate(ThisParent):
+			if (ThisChild.tag == NewElements[0].tag) and (ThisChild.findtext(info.IDTag) == ElementID):
+				OldCommentIDs = set(i for ThisListTag in project_check.CommentListTags
+					for ThisListElement in ThisChild.iter(ThisListTag)
+					for i in project_check.SplitIDList(ThisListElement.text))
+				ThisParent[ThisIndex] = NewElements[0]
+				ChunkElements[1:] = [e for e in ChunkElements[1:] if not ((e.tag == info.CommentTag) and
+					(e.findtext(info.IDTag) in OldCommentIDs))] + NewElements[1:]
+				return True
+	return False
+
+def ReplayUpdates(ProjFilename, RecoveredProjFilename, ProgressCallback=None):
+	# replay the updates in project file ProjFilename (str) onto its last full image, and write the result to
+	# RecoveredProjFilename (str) as a new full image.
+	# ProgressCallback: None, or callable taking one arg: the fraction of the file read so far (float, 0..1)
+	# Return dict of stats: UpdatesFound, UpdatesReplayed, UpdatesNotReplayable (int), Damaged (bool; whether the file
+	# was damaged at the end, e.g. by an update interrupted partway through; the damaged part is ignored), Duration (s),
+	# WriteOK (bool), ProblemReport (str)
+	StartTime = time.perf_counter()
+	Stats = {'UpdatesFound': 0, 'UpdatesReplayed': 0, 'UpdatesNotReplayable': 0, 'Damaged': False, 'WriteOK': False,
+		'ProblemReport': ''}
+	Head = [] # top-level elements in the head chunk
+	PHAObjChunks = {} # keys are PHA object IDs, values are lists of top-level elements; kept in file order
+	Tail = []
+	RootAttrib = {info.VizopVersionTag: info.VERSION} # replaced by the file's own root attribs, if readable
+	try:
+		if project_snapshot.IsSnapshotFile(ProjFilename):
+			ProjStream = project_snapshot.SnapshotReader(ProjFilename, ProgressCallback=ProgressCallback)
+		else: ProjStream = project_files.ProjectFileStream(ProjFilename, ProgressCallback=ProgressCallback)
+		if ProjStream.Root is None: raise ValueError('No root element')
+		RootAttrib = dict(ProjStream.Root.attrib)
+		CurrentChunk = Head # which chunk the image elements currently being read belong to
+		for ThisElement in ProjStream:
+			if ThisElement.tag == info.UpdateTag:
+				Stats['UpdatesFound'] += 1
+				RecoveryData = ThisElement.find(info.RecoveryDataTag)
+				if RecoveryData is None:
+					Stats['UpdatesNotReplayable'] += 1
+					continue
+				Replayable = True
+				for ThisChunk in RecoveryData.findall(info.ChunkTag):
+					ChunkKind = ThisChunk.get(info.KindTag)
+					if ChunkKind == 'Head': Head = list(ThisChunk)
+					elif ChunkKind == 'Tail': Tail = list(ThisChunk)
+					elif ChunkKind == 'Element':
+						Replayable = (ThisChunk.get(info.IDTag) in PHAObjChunks) and \
+							ReplaceElementInChunk(PHAObjChunks[ThisChunk.get(info.IDTag)],
+							ThisChunk.get(info.ComponentHostIDTag), list(ThisChunk))
+					elif ThisChunk.get(info.DeleteTag): PHAObjChunks.pop(ThisChunk.get(info.IDTag), None)
+					else: PHAObjChunks[ThisChunk.get(info.IDTag)] = list(ThisChunk)
+				Stats['UpdatesReplayed' if Replayable else 'UpdatesNotReplayable'] += 1
+			# elements of the image: the head runs up to the first PHA object. Each PHA object's chunk continues
+			# with its comments, and the tail starts at the first other element after the PHA objects
+			elif ThisElement.tag == info.PHAObjTag:
+				CurrentChunk = PHAObjChunks[ThisElement.findtext(info.IDTag)] = [ThisElement]
+			elif (ThisElement.tag == info.CommentTag) and (CurrentChunk is not Head) and (CurrentChunk is not Tail):
+				CurrentChunk.append(ThisElement)
+			elif (ThisElement.tag == info.ViewportTag) or (PHAObjChunks and (CurrentChunk is not Tail)):
+				CurrentChunk = Tail
+				Tail.append(ThisElement)
+			else: CurrentChunk.append(ThisElement)
+	except (ElementTree.ParseError, ValueError):
+		Stats['Damaged'] = True # keep what was read before the damage
+	except (IOError, OSError):
+		Stats['ProblemReport'] = "Can'tReadProjectFile"
+		Stats['Duration'] = time.perf_counter() - StartTime
+		return Stats
+	# write the new full image. Comments are renumbered, as chunks from different updates were numbered independently
+	NextCommentID = 1
+	for ThisChunk in PHAObjChunks.values(): NextCommentID = RenumberComments(ThisChunk, NextCommentID)
+	RootBytes = ElementTree.tostring(ElementTree.Element(info.ProjectRootTag, attrib=RootAttrib), encoding='UTF-8',
+		xml_declaration=False, short_empty_elements=False)
+	RootEndTag = ('</' + info.ProjectRootTag + '>').encode('UTF-8')
+
+	def RecoveredFilePieces():
+		# yield the content of the recovered file in pieces (bytes)
+		yield b"<?xml version='1.0' encoding='UTF-8'?>\n" + RootBytes[:-len(RootEndTag)]
+		for ThisChunk in [Head] + list(PHAObjChunks.values()) + [Tail]:
+			for ThisElement in ThisChunk:
+				ThisElement.tail = None
+				yield ElementTree.tostring(ThisElement, encoding='UTF-8', xml_declaration=False)
+		yield RootEndTag
+
+	try:
+		# the recovered file is in the same format as the original
+		if project_snapshot.IsSnapshotFile(ProjFilename):
+			for ThisElement in chain(Head, *PHAObjChunks.values(), Tail): ThisElement.tail = None
+			if not project_snapshot.WriteSnapshotFile(RecoveredProjFilename, info.ProjectRootTag, RootAttrib,
+					chain(Head, *PHAObjChunks.values(), Tail)):
+				raise IOError('Unable to write %s' % RecoveredProjFilename)
+		else:
+			with open(RecoveredProjFilename, 'wb', buffering=info.ProjectFileBufferSize) as RecoveredFile:
+				project_files.WriteProjectFileContent(RecoveredFile, RecoveredFilePieces(),
+					Compression=project_files.CompressionOfFile(ProjFilename))
+		Stats['WriteOK'] = True
+	except (IOError, OSError):
+		Stats['ProblemReport'] = "Can'tWriteRecoveredFile"
+	Stats['Duration'] = time.perf_counter() - StartTime
+	return Stats
+
+if __name__ == '__main__':
+	# usage: python project_recovery.py <project file> [<recovered project file>]
+	print(ReplayUpdates(ProjFilename=sys.argv[1],
+		RecoveredProjFilename=(sys.argv[2] if len(sys.argv) > 2 else RecoveredFilename(sys.argv[1]))))
@@ -0,0 +1,392 @@
+# -*- coding: utf-8 -*-
+# Module: project_snapshot. This file is part of Vizop. Copyright xSeriCon, 2020
+
+# standard modules needed:
+import os, sys, re, gc, struct, zlib, lzma, time, collections, contextlib
+from array import array
+from itertools import chain, repeat, islice, compress, accumulate
+from operator import attrgetter, itemgetter, methodcaller, eq, not_
+import xml.etree.ElementTree as ElementTree
+from xml.sax.saxutils import escape
+
+# vizop modules needed:
+import info, project_files
+
+"""
+The project_snapshot module contains code for Vizop's compact binary project snapshot format, an alternative on-disk
+format to XML project files. It's opt-in: a project is saved as a snapshot if its filename has the extension
+info.SnapshotFileExtension, and snapshots are recognised by their magic bytes when opened. A snapshot holds exactly the
+same XML element tree as the corresponding project file, so conversion in either direction is lossless. Compared to XML:
+- tag names, attrib names and all texts are stored once each, in a string table;
+- texts that are numbers are stored in typed numeric arrays (int64 or float64), provided they convert back to exactly
+	the same string;
+- the tree structure is stored as arrays of child and attrib counts, in breadth-first order;
+- each block is compressed with zlib or lzma.
+The elements are encoded and decoded a whole tree level or column at a time, using map() and itertools, so that the
+work per element is done in C rather than in a Python loop. That's what makes snapshots quicker than XML to save and
+load; see BenchmarkSnapshot().
+Snapshot file layout: magic bytes, a header (format version, compression code), then one or more blocks, each a
+length-prefixed compressed payload. The first block holds the root element and the project's full image; each further
+block holds top-level elements appended later, such as <update> tags saved on the fly (see AppendToSnapshotFile()).
+If appending a block is interrupted, the blocks before it are still readable, as with an XML project file.
+Block payload: a fixed header of counts (BlockHeader), then the int, float, ref, child count and attrib count arrays as
+little-endian bytes, then the string table as UTF-8 strings separated by NUL (which XML text can't contain). Refs are
+indices in the value table (string table, then ints, then floats): first the tags, then the texts, then (if any element
+has one) the tails of all elements, then the attrib names and values. Only struct, array and the decompressors are
+used to read a block, so a damaged or hostile file can't do anything worse than fail to load.
+It doesn't import wx.
+"""
+
+SnapshotMagic = b'VizopSnp' # first bytes of every snapshot file
+SnapshotFormatVersion = 2
+HeaderFormat = '<BB' # format version, compression code
+BlockLengthFormat = '<Q' # length of each compressed block
+# counts at the start of a block payload: top elements, elements, attribs, strings, ints, floats, whether None is the
+# first string (0 or 1), whether tails are stored (0 or 1), and length of the string table in bytes
+BlockHeader = struct.Struct('<QQQQQQBBQ')
+CompressionCodes = {'none': 0, 'zlib': 1, 'lzma': 2}
+# texts that may be stored as numbers: ints with up to 18 digits (so they fit in int64) and no leading zeros, and floats
+# in the forms given by repr(). Floats are only stored as numbers if repr() gives back the same text
+IntPattern = re.compile(r'(0|-?[1-9][0-9]{0,17})\Z').match
+FloatPattern = re.compile(r'-?([0-9]+\.[0-9]+(e[-+][0-9]+)?|[0-9]+e[-+][0-9]+|inf)\Z|nan\Z').match
+Consume = collections.deque(maxlen=0).extend # runs an iterator to exhaustion, discarding the results
+
+def IsSnapshotFile(Filename):
+	# return bool: whether Filename (str) is a project snapshot file, judging by its magic bytes
+	try:
+		with open(Filename, 'rb') as SnapshotFile: return SnapshotFile.read(len(SnapshotMagic)) == SnapshotMagic
+	except (IOError, OSError):
+		return False
+
+def IsSnapshotFilename(Filename):
+	# return bool: whether Filename (str) has the extension of snapshot files, so that it should be written as one
+	return Filename.lower().endswith('.' + info.SnapshotFileExtension)
+
+def ArrayBytes(ThisArray):
+	# return content of ThisArray (array) as little-endian bytes
+	if sys.byteorder != 'little': ThisArray.byteswap()
+	return ThisArray.tobytes()
+
+def ArrayFromBytes(TypeCode, ArrayAsBytes):
+	# return array of type TypeCode (str) from little-endian bytes ArrayAsBytes
+	ThisArray = array(TypeCode)
+	ThisArray.frombytes(ArrayAsBytes)
+	if sys.byteorder != 'little': ThisArray.byteswap()
+	return ThisArray
+
+def Compress(Payload, Compression):
+	# return Payload (bytes) compressed according to Compression (str; a key in CompressionCodes)
+	if Compression == 'zlib': return zlib.compress(Payload, info.SnapshotCompressionLevels['zlib'])
+	elif Compression == 'lzma': return lzma.compress(Payload, preset=info.SnapshotCompressionLevels['lzma'])
+	return Payload
+
+def ValueTable(Values):
+	# return the value table for Values (list of str or None): (string table (list), ints (array), floats (array), and
+	# all of these as a list of str in table order). Each distinct value is stored once; a value is stored as a number
+	# only if it converts back to exactly the same string
+	# the values are sorted into families with map() and compress(), rather than one at a time, for speed
+	Distinct = dict.fromkeys(Values) # distinct values, in order of first appearance
+	Strings = [None] if Distinct.pop(None, 0) is None else []
+	Distinct = list(Distinct)
+	IsInt = list(map(IntPattern, Distinct))
+	IntTexts = list(compress(Distinct, IsInt))
+	NotInts = list(compress(Distinct, map(not_, IsInt)))
+	FloatCandidates = list(compress(NotInts, map(FloatPattern, NotInts)))
+	FloatValues = list(map(float, FloatCandidates))
+	IsExactFloat = list(map(eq, map(repr, FloatValues), FloatCandidates))
+	FloatTexts = list(compress(FloatCandidates, IsExactFloat))
+	ExactFloatTexts = set(FloatTexts)
+	Strings += [v for v in NotInts if v not in ExactFloatTexts]
+	return Strings, array('q', map(int, IntTexts)), array('d', compress(FloatValues, IsExactFloat)), \
+		Strings + IntTexts + FloatTexts
+
+@contextlib.contextmanager
+def GarbageCollectionPaused():
+	# context manager: suspend the cyclic garbage collector, if it's running. Encoding or decoding a block makes
+	# hundreds of thousands of objects that can't form reference cycles; without this, the collector scans them
+	# repeatedly, taking about as long as the encoding itself
+	WasEnabled = gc.isenabled()
+	gc.disable()
+	try: yield
+	finally:
+		if WasEnabled: gc.enable()
+
+def EncodeBlock(TopElements, Compression):
+	# return a snapshot block (bytes, including its length prefix) holding TopElements (list of ElementTree.Element),
+	# including all their descendants, compressed according to Compression (str; a key in CompressionCodes)
+	with GarbageCollectionPaused():
+		# list all elements in breadth-first order, one tree level at a time
+		Elements = list(TopElements)
+		ThisLevel = Elements
+		while ThisLevel:
+			ThisLevel = list(chain.from_iterable(ThisLevel))
+			Elements.extend(ThisLevel)
+		AttribItems = list(map(methodcaller('items'), Elements))
+		AttribPairs = list(chain.from_iterable(AttribItems))
+		Tails = list(map(attrgetter('tail'), Elements))
+		HasTails = int(any(Tails)) # project files rarely have tails, so they are stored only if needed
+		Values = list(map(attrgetter('tag'), Elements)) + list(map(attrgetter('text'), Elements)) + \
+			(Tails if HasTails else []) + list(map(itemgetter(0), AttribPairs)) + list(map(itemgetter(1), AttribPairs))
+		Strings, Ints, Floats, Table = ValueTable(Values)
+		Refs = array('I', map(dict(zip(Table, range(len(Table)))).__getitem__, Values))
+		HasNone = int(bool(Strings) and (Strings[0] is None))
+		StringBytes = '\0'.join(Strings[HasNone:]).encode('UTF-8')
+		# a text containing NUL would split in the string table; XML can't hold NUL either
+		if StringBytes.count(b'\0') != max(0, len(Strings) - HasNone - 1):
+			raise ValueError("Text containing NUL can't be stored in a snapshot")
+		Payload = b''.join([BlockHeader.pack(len(TopElements), len(Elements), len(AttribPairs),
+			len(Strings) - HasNone, len(Ints), len(Floats), HasNone, HasTails, len(StringBytes)), ArrayBytes(Ints),
+			ArrayBytes(Floats), ArrayBytes(Refs), ArrayBytes(array('I', map(len, Elements))),
+			ArrayBytes(array('I', map(len, AttribItems))), StringBytes])
+	Block = Compress(Payload, Compression)
+	return struct.pack(BlockLengthFormat, len(Block)) + Block
+
+def DecodeBlock(Block, CompressionCode):
+	# return list of top elements (ElementTree.Element) decoded from Block (bytes, without its length prefix)
+	# compressed according to CompressionCode (int; a value in CompressionCodes).
+	# Raise ValueError if it can't be decoded
+	Decompressors = {0: lambda p: p, 1: zlib.decompress, 2: lzma.decompress}
+	try:
+		with GarbageCollectionPaused():
+			Payload = memoryview(Decompressors[CompressionCode](Block))
+			(TopCount, ElementCount, AttribCount, StringCount, IntCount, FloatCount, HasNone, HasTails,
+				StringByteCount) = BlockHeader.unpack_from(Payload)
+			# find the arrays and string table in the payload
+			ArrayLengths = [('q', IntCount), ('d', FloatCount), ('I', (2 + HasTails) * ElementCount + 2 * AttribCount),
+				('I', ElementCount), ('I', ElementCount)]
+			ArrayEnds = list(accumulate([BlockHeader.size] + [array(t).itemsize * n for (t, n) in ArrayLengths]))
+			if ArrayEnds[-1] + StringByteCount != len(Payload): raise ValueError('Snapshot block has wrong length')
+			Ints, Floats, Refs, ChildCounts, AttribCounts = [ArrayFromBytes(t, Payload[s:e])
+				for ((t, n), s, e) in zip(ArrayLengths, ArrayEnds, ArrayEnds[1:])]
+			Strings = [None] * HasNone + (str(Payload[ArrayEnds[-1]:], 'UTF-8').split('\0') if StringCount else [])
+			if (len(Strings) != StringCount + HasNone) or (sum(AttribCounts) != AttribCount) or \
+					(sum(ChildCounts) + TopCount != ElementCount):
+				raise ValueError('Snapshot block counts are inconsistent')
+			# numbers convert back to the same str as originally stored; checked by ValueTable()
+			Table = Strings + list(map(str, Ints)) + list(map(repr, Floats))
+			Values = list(map(Table.__getitem__, Refs))
+			Elements = list(map(ElementTree.Element, Values[:ElementCount]))
+			Consume(map(setattr, Elements, repeat('text'), Values[ElementCount:2 * ElementCount]))
+			if HasTails: Consume(map(setattr, Elements, repeat('tail'), Values[2 * ElementCount:3 * ElementCount]))
+			AttribStart = (2 + HasTails) * ElementCount
+			Consume(map(ElementTree.Element.set, chain.from_iterable(map(repeat, Elements, AttribCounts)),
+				Values[AttribStart:AttribStart + AttribCount], Values[AttribStart + AttribCount:]))
+			# in breadth-first order, the children of all elements follow the top elements, in their parents' order
+			Consume(map(ElementTree.Element.append, chain.from_iterable(map(repeat, Elements, ChildCounts)),
+				islice(Elements, TopCount, None)))
+	except (KeyError, IndexError, TypeError, UnicodeDecodeError, struct.error, zlib.error, lzma.LZMAError, EOFError):
+		raise ValueError('Snapshot block is damaged')
+	return Elements[:TopCount]
+
+def SnapshotHeader(Compression):
+	# return the bytes at the start of a snapshot file whose blocks are compressed with Compression (str)
+	return SnapshotMagic + struct.pack(HeaderFormat, SnapshotFormatVersion, CompressionCodes[Compression])
+
+def WriteSnapshotContent(SnapshotFile, RootTag, RootAttrib, Elements, RootText=None,
+		Compression=info.SnapshotCompression):
+	# write a snapshot into SnapshotFile (file object open for writing in binary mode), with a root element with RootTag
+	# (str), RootAttrib (dict) and RootText (str or None), and top-level elements from Elements (iterable of
+	# ElementTree.Element). Compression (str): a key in CompressionCodes
+	assert Compression in CompressionCodes
+	Root = ElementTree.Element(RootTag, attrib=RootAttrib)
+	Root.text = RootText
+	Root.extend(Elements)
+	SnapshotFile.write(SnapshotHeader(Compression))
+	SnapshotFile.write(EncodeBlock([Root], Compression))
+
+def WriteSnapshotFile(SnapshotFilename, RootTag, RootAttrib, Elements, RootText=None,
+		Compression=info.SnapshotCompression):
+	# write a snapshot file SnapshotFilename (str); args as for WriteSnapshotContent(). Return WriteOK (bool)
+	try:
+		with open(SnapshotFilename, 'wb', buffering=info.ProjectFileBufferSize) as SnapshotFile:
+			WriteSnapshotContent(SnapshotFile, RootTag, RootAttrib, Elements, RootText=RootText,
+				Compression=Compression)
+	except (IOError, OSError):
+		return False
+	return True
+
+def AppendToSnapshotFile(SnapshotFile, Elements):
+	# append Elements (list of ElementTree.Element) as top-level elements, after all those already in the snapshot open
+	# as SnapshotFile (file object in binary update mode). They are written as a new block, compressed in the same way
+	# as the existing blocks. Return bool: whether the file is a usable snapshot, so that Elements could be appended
+	SnapshotFile.seek(0)
+	Header = SnapshotFile.read(len(SnapshotMagic) + struct.calcsize(HeaderFormat))
+	if not Header.startswith(SnapshotMagic): return False
+	FormatVersion, CompressionCode = struct.unpack(HeaderFormat, Header[len(SnapshotMagic):])
+	Compressions = dict([(c, n) for (n, c) in CompressionCodes.items()])
+	if (FormatVersion != SnapshotFormatVersion) or (CompressionCode not in Compressions): return False
+	SnapshotFile.seek(0, 2)
+	SnapshotFile.write(EncodeBlock(Elements, Compressions[CompressionCode]))
+	return True
+
+class SnapshotReader(object): # decodes a snapshot, yielding its top-level elements one at a time. Provides the same
+	# interface as project_files.ProjectFileStream, so it can be passed to ProjectItem.UnpackXMLToProject()
+
+	def __init__(self, Snapshot, ProgressCallback=None):
+		# Snapshot: filename (str) or the content of a snapshot file (bytes)
+		# ProgressCallback: None, or callable taking one arg: the fraction of the top-level elements read so far (float)
+		# Raises ValueError if Snapshot isn't a usable snapshot
+		object.__init__(self)
+		assert (ProgressCallback is None) or callable(ProgressCallback)
+		self.StartTime = time.perf_counter()
+		if isinstance(Snapshot, str):
+			with open(Snapshot, 'rb') as SnapshotFile: Snapshot = SnapshotFile.read()
+		assert isinstance(Snapshot, bytes)
+		if not Snapshot.startswith(SnapshotMagic): raise ValueError('Not a Vizop snapshot')
+		HeaderEnd = len(SnapshotMagic) + struct.calcsize(HeaderFormat)
+		FormatVersion, self.CompressionCode = struct.unpack(HeaderFormat, Snapshot[len(SnapshotMagic):HeaderEnd])
+		if FormatVersion != SnapshotFormatVersion: raise ValueError('Unusable snapshot format version')
+		self.Snapshot = Snapshot
+		self.BlockStart = HeaderEnd # where the next block starts in Snapshot
+		self.ProgressCallback = ProgressCallback
+		# the first block holds the root element, with the project's full image as its children
+		try: FirstBlock = self.NextBlock()
+		except ElementTree.ParseError: FirstBlock = None
+		if (FirstBlock is None) or (len(FirstBlock) != 1): raise ValueError('Snapshot is damaged')
+		self.FirstElements = list(FirstBlock[0])
+		self.Root = ElementTree.Element(FirstBlock[0].tag, attrib=FirstBlock[0].attrib)
+		self.Root.text = FirstBlock[0].text
+		self.RootTag = self.Root.tag
+		self.ElementsProcessed = 0
+		self.Duration = 0.0
+		self.PeakMemory = None # not measured for snapshots
+
+	def NextBlock(self):
+		# return list of top elements in the next block, or None if there are no more blocks.
+		# Raise ElementTree.ParseError if the block is truncated or damaged
+		if self.BlockStart >= len(self.Snapshot): return None
+		LengthEnd = self.BlockStart + struct.calcsize(BlockLengthFormat)
+		if LengthEnd > len(self.Snapshot): raise ElementTree.ParseError('Snapshot is truncated')
+		(BlockLength,) = struct.unpack(BlockLengthFormat, self.Snapshot[self.BlockStart:LengthEnd])
+		if LengthEnd + BlockLength > len(self.Snapshot): raise ElementTree.ParseError('Snapshot is truncated')
+		self.BlockStart = LengthEnd + BlockLength
+		try: return DecodeBlock(self.Snapshot[LengthEnd:self.BlockStart], self.CompressionCode)
+		except ValueError as ThisError: raise ElementTree.ParseError(str(ThisError))
+
+	def RootAttrib(self, AttribName, Default=None):
+		# return value of AttribName (str) in the snapshot's root element, or Default if absent
+		return self.Root.attrib.get(AttribName, Default)
+
+	def __iter__(self):
+		# yield each top-level element under the root: first the full image, then any elements appended later
+		try:
+			ThisBlock = self.FirstElements
+			self.FirstElements = None # release memory as we go
+			while ThisBlock is not None:
+				for ThisElement in ThisBlock:
+					self.ElementsProcessed += 1
+					yield ThisElement
+				if self.ProgressCallback: self.ProgressCallback(min(1.0, self.BlockStart / len(self.Snapshot)))
+				ThisBlock = self.NextBlock()
+		finally:
+			self.Close()
+
+	def Close(self):
+		self.Duration = time.perf_counter() - self.StartTime
+
+def ConvertXMLFileToSnapshot(XMLFilename, SnapshotFilename, Compression=info.SnapshotCompression):
+	# convert Vizop project file XMLFilename (str; optionally compressed) to a snapshot file SnapshotFilename (str).
+	# Return WriteOK (bool)
+	XMLStream = project_files.ProjectFileStream(XMLFilename)
+	RootTag, RootAttrib = XMLStream.Root.tag, dict(XMLStream.Root.attrib)
+	# the root text is only complete once the first top-level element has been read
+	Elements = list(XMLStream)
+	return WriteSnapshotFile(SnapshotFilename, RootTag, RootAttrib, Elements, RootText=XMLStream.Root.text,
+		Compression=Compression)
+
+def ConvertSnapshotToXMLFile(SnapshotFilename, XMLFilename, Compression='none'):
+	# convert snapshot file SnapshotFilename (str) to a Vizop project file XMLFilename (str), compressed according to
+	# Compression ('none', 'gzip' or 'lzma'). The XML is written one top-level element at a time, exactly as ElementTree
+	# would write the whole tree. Return WriteOK (bool)
+	Reader = SnapshotReader(SnapshotFilename)
+	RootBytes = ElementTree.tostring(ElementTree.Element(Reader.RootTag, attrib=Reader.Root.attrib),
+		encoding='UTF-8', xml_declaration=False, short_empty_elements=False)
+	RootEndTag = ('</' + Reader.RootTag + '>').encode('UTF-8')
+
+	def XMLFilePieces():
+		# generator: yield the content of the XML file as bytes, one top-level element at a time
+		yield b"<?xml version='1.0' encoding='UTF-8'?>\n" + RootBytes[:-len(RootEndTag)]
+		if Reader.Root.text: yield escape(Reader.Root.text).encode('UTF-8')
+		for ThisElement in Reader: yield ElementTree.tostring(ThisElement, encoding='UTF-8', xml_declaration=False)
+		yield RootEndTag
+
+	try:
+		with open(XMLFilename, 'wb', buffering=info.ProjectFileBufferSize) as XMLFile:
+			project_files.WriteProjectFileContent(XMLFile, XMLFilePieces(), Compression=Compression)
+	except (IOError, OSError, ElementTree.ParseError):
+		return False
+	project_files.RemoveProjectIndex(XMLFilename) # any existing index doesn't match the new file
+	return True
+
+"""[----------TESTING AREA---------- """
+
+def BenchmarkSnapshot(XMLFilename, Compression=info.SnapshotCompression, Repeats=3):
+	# compare saving and loading times, and file sizes, of XML project file XMLFilename (str) and an equivalent snapshot
+	# compressed with Compression (str). Saving includes flushing the file to disk, and starts from the element tree
+	# already in memory, as when saving a project. XML is written as projects.SerializeProjectXMLChunk() does; loading
+	# streams every top-level element, as when opening a project. Checks that conversion in both directions is lossless.
+	# Return results as dict: Size, XMLSize (bytes), Save, XMLSave, Load, XMLLoad (s), Lossless (bool)
+	SnapshotFilename = XMLFilename + '_bench.' + info.SnapshotFileExtension
+	XMLCopyFilename = XMLFilename + '_bench.' + 'vip'
+
+	def BestTime(Task):
+		# return shortest time (s) taken to run Task (callable) over Repeats runs
+		Times = []
+		for ThisRun in range(Repeats):
+			StartTime = time.perf_counter()
+			Task()
+			Times.append(time.perf_counter() - StartTime)
+		return min(Times)
+
+	def SaveXML():
+		with open(XMLCopyFilename, 'wb', buffering=info.ProjectFileBufferSize) as XMLFile:
+			XMLFile.write(b"<?xml version='1.0' encoding='UTF-8'?>\n" + RootBytes[:-len(RootEndTag)])
+			for ThisElement in Elements:
+				XMLFile.write(ElementTree.tostring(ThisElement, encoding='UTF-8', xml_declaration=False))
+			XMLFile.write(RootEndTag)
+			XMLFile.flush()
+			os.fsync(XMLFile.fileno())
+
+	def SaveSnapshot():
+		with open(SnapshotFilename, 'wb', buffering=info.ProjectFileBufferSize) as SnapshotFile:
+			WriteSnapshotContent(SnapshotFile, RootTag, RootAttrib, Elements, RootText=RootText,
+				Compression=Compression)
+			SnapshotFile.flush()
+			os.fsync(SnapshotFile.fileno())
+
+	XMLStream = project_files.ProjectFileStream(XMLFilename)
+	RootTag, RootAttrib = XMLStream.Root.tag, dict(XMLStream.Root.attrib)
+	Elements = list(XMLStream)
+	RootText = XMLStream.Root.text
+	RootBytes = ElementTree.tostring(ElementTree.Element(RootTag, attrib=RootAttrib), encoding='UTF-8',
+		xml_declaration=False, short_empty_elements=False)
+	RootEndTag = ('</' + RootTag + '>').encode('UTF-8')
+	Results = {'XMLSave': BestTime(SaveXML), 'Save': BestTime(SaveSnapshot),
+		'XMLLoad': BestTime(lambda: list(project_files.ProjectFileStream(XMLCopyFilename))),
+		'Load': BestTime(lambda: list(SnapshotReader(SnapshotFilename))),
+		'XMLSize': os.path.getsize(XMLCopyFilename), 'Size': os.path.getsize(SnapshotFilename)}
+	# check round trip: XML -> snapshot -> XML gives the same bytes
+	ConvertXMLFileToSnapshot(XMLCopyFilename, SnapshotFilename, Compression=Compression)
+	ConvertSnapshotToXMLFile(SnapshotFilename, XMLCopyFilename + '2')
+	with open(XMLCopyFilename, 'rb') as XMLFile: OriginalXML = XMLFile.read()
+	with open(XMLCopyFilename + '2', 'rb') as XMLFile: Results['Lossless'] = (XMLFile.read() == OriginalXML)
+	for ThisFilename in (SnapshotFilename, XMLCopyFilename, XMLCopyFilename + '2'): os.remove(ThisFilename)
+	return Results
+
+if __name__ == '__main__':
+	# usage: python project_snapshot.py benchmark <project file> [zlib|lzma|none]
+	#     or python project_snapshot.py tosnapshot <project file> <snapshot file> [zlib|lzma|none]
+	#     or python project_snapshot.py toxml <snapshot file> <project file> [none|gzip|lzma]
+	if sys.argv[1] == 'benchmark':
+		ThisResult = BenchmarkSnapshot(sys.argv[2], Compression=(sys.argv[3] if len(sys.argv) > 3 else
+			info.SnapshotCompression))
+		print('XML      size %12d bytes, save %7.3f s, load %7.3f s' % (ThisResult['XMLSize'], ThisResult['XMLSave'],
+			ThisResult['XMLLoad']))
+		print('snapshot size %12d bytes, save %7.3f s, load %7.3f s, lossless: %s' % (ThisResult['Size'],
+			ThisResult['Save'], ThisResult['Load'], ThisResult['Lossless']))
+	elif sys.argv[1] == 'tosnapshot':
+		print(ConvertXMLFileToSnapshot(sys.argv[2], sys.argv[3],
+			Compression=(sys.argv[4] if len(sys.argv) > 4 else info.SnapshotCompression)))
+	elif sys.argv[1] == 'toxml':
+		print(ConvertSnapshotToXMLFile(sys.argv[2], sys.argv[3],
+			Compression=(sys.argv[4] if len(sys.argv) > 4 else 'none')))
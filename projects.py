@@ -2,14 +2,15 @@
 # Module: projects. This file is part of Vizop. Copyright xSeriCon, 2020
 
 # standard modules needed:
-import os, shutil, datetime, string, copy, wx
+import os, shutil, datetime, string, copy, threading, queue, time, hashlib, concurrent.futures, traceback, wx
 import os.path
 import xml.etree.ElementTree as ElementTree
 from platform import system
 
 # vizop modules needed:
 # from vizop_misc import IsReadableFile, IsWritableLocation, select_file_from_all, MakeXMLMessage, SocketWithName
-import settings, core_classes, info, faulttree, utilities, display_utilities, undo, vizop_misc
+import settings, core_classes, info, faulttree, utilities, display_utilities, undo, vizop_misc, project_files
+import project_recovery, message_stats, project_snapshot
 
 """
 The projects module contains functions for handling entire Vizop projects, including project files.
@@ -63,6 +64,160 @@ class ProjectFontItem(object): # virtual fonts for use with texts in PHA objects
 
 DefaultProjectFontItem = ProjectFontItem(_('<System default>'), '')
 
+class AssociatedTextHash(dict): # used while unpacking a project file: dict of comments, action items or parking lot
+	# items, with keys = IDs (str) and values = AssociatedTextItem instances.
+	# Looking up an ID that hasn't been unpacked yet returns a placeholder AT, which is populated when its tag is
+	# reached later in the file. This allows the file to be unpacked in a single pass.
+
+	def __init__(self, Proj):
+		dict.__init__(self)
+		self.Proj = Proj
+		self.Unpacked = set() # IDs of ATs whose own tags have been unpacked
+
+	def __missing__(self, ID):
+		NewAT = core_classes.AssociatedTextItem(Proj=self.Proj)
+		NewAT.ID = ID
+		self[ID] = NewAT
+		return NewAT
+
+class PHAObjProxy(object): # lightweight stand-in in ProjectItem.PHAObjs for a PHA object that hasn't been unpacked
+	# from the project file yet. The PHA object is unpacked on first access to any of its attribs (other than ID,
+	# HumanName, Viewports and Applicable), e.g. by a Viewport or a calculation. When it's unpacked, it replaces the
+	# proxy in the datacore's lists (see ProjectItem.UnpackXMLToProject()); the proxy forwards all attrib access to it for
+	# any holder still referring to the proxy, e.g. ProjectItem.PHAObjShadows.
+	# The proxy isn't an instance of the PHA object's class; use PHAModelClassOf() and IsPHAObj() to check its class
+	ProxyAttribNames = ('PHAModelClass', 'IndexEntry', 'Loader', 'RealPHAObj')
+	LocalAttribNames = ('Viewports', 'Applicable') # attribs held by the proxy until the PHA object is unpacked
+
+	def __init__(self, PHAModelClass, IndexEntry, Loader):
+		# PHAModelClass: class of the PHA object
+		# IndexEntry: project_files.PHAObjIndexEntry instance giving the PHA object's section in the project file
+		# Loader: callable taking the proxy as arg; unpacks and returns the real PHA object
+		assert issubclass(PHAModelClass, core_classes.PHAModelBaseClass)
+		assert callable(Loader)
+		object.__init__(self)
+		object.__setattr__(self, 'PHAModelClass', PHAModelClass)
+		object.__setattr__(self, 'IndexEntry', IndexEntry)
+		object.__setattr__(self, 'Loader', Loader)
+		object.__setattr__(self, 'RealPHAObj', None)
+		object.__setattr__(self, 'Viewports', []) # Viewport shadows created before the PHA object is unpacked
+
+	def Materialize(self):
+		# unpack the real PHA object, if not already done, and return it
+		if self.RealPHAObj is None: object.__setattr__(self, 'RealPHAObj', self.Loader(self))
+		return self.RealPHAObj
+
+	def HandOverLocalAttribs(self, PHAObj):
+		# give the attribs held by the proxy to PHAObj (the unpacked PHA object), so that from now on the proxy forwards
+		# access to them
+		for AttribName in PHAObjProxy.LocalAttribNames:
+			if AttribName not in self.__dict__: continue
+			if AttribName == 'Viewports': PHAObj.Viewports.extend(self.Viewports)
+			else: setattr(PHAObj, AttribName, self.__dict__[AttribName])
+			object.__delattr__(self, AttribName)
+
+	def __getattr__(self, AttribName): # called only for attribs not found in the proxy itself
+		if AttribName in PHAObjProxy.ProxyAttribNames: raise AttributeError(AttribName)
+		# ID and HumanName are available from the index, so no need to unpack the PHA object for them
+		if (self.RealPHAObj is None) and (AttribName in ('ID', 'HumanName')):
+			return getattr(self.IndexEntry, AttribName)
+		return getattr(self.Materialize(), AttribName)
+
+	def __setattr__(self, AttribName, NewValue):
+		if (self.RealPHAObj is None) and (AttribName in PHAObjProxy.LocalAttribNames):
+			object.__setattr__(self, AttribName, NewValue)
+		else: setattr(self.Materialize(), AttribName, NewValue)
+
+def PHAModelClassOf(PHAObj):
+	# return the class of PHAObj (a PHA object, or a PHAObjProxy standing in for one) without unpacking it
+	return PHAObj.PHAModelClass if isinstance(PHAObj, PHAObjProxy) else type(PHAObj)
+
+def IsPHAObj(PHAObj, PHAModelClass=core_classes.PHAModelBaseClass):
+	# return bool: whether PHAObj is an instance of PHAModelClass (a PHA model class), or a PHAObjProxy standing in for one
+	return issubclass(PHAModelClassOf(PHAObj), PHAModelClass)
+
+def IsUnpacked(PHAObj):
+	# return bool: whether PHAObj is a PHA object, or a PHAObjProxy whose PHA object has already been unpacked
+	return not (isinstance(PHAObj, PHAObjProxy) and (PHAObj.RealPHAObj is None))
+
+def LoadedPHAObj(PHAObj):
+	# return the PHA object represented by PHAObj (a PHA object, a PHAObjProxy or None), unpacking it if necessary
+	return PHAObj.Materialize() if isinstance(PHAObj, PHAObjProxy) else PHAObj
+
+class LazyElementHash(dict): # dict of all elements in a project, with keys = element IDs, values = elements.
+	# Looking up the ID of an element in a PHA object that hasn't been unpacked yet unpacks the PHA object
+
+	def __init__(self, ElementOwners):
+		# ElementOwners (dict): keys = element IDs, values = PHAObjProxy instances of PHA objects containing the elements
+		dict.__init__(self)
+		self.ElementOwners = ElementOwners
+
+	def __missing__(self, ElementID):
+		Owner = self.ElementOwners.pop(ElementID, None)
+		if Owner is None: raise KeyError(ElementID)
+		Owner.Materialize() # unpacking the PHA object adds its elements to this hash
+		return dict.__getitem__(self, ElementID)
+
+class ProjectSaveQueue(object): # runs all writes to a project's files on a background thread, one at a time, in the
+	# order requested, so that the datacore never waits for disk I/O. Each job is given data that has already been
+	# serialized (or otherwise detached from the live project), so that the project can keep changing while it runs.
+	# The outcome of each job is reported back to the datacore as an RP_SaveComplete message on a PUSH/PULL socket pair;
+	# the datacore handles it in HandleSaveReport()
+
+	def __init__(self, Proj):
+		object.__init__(self)
+		self.Proj = Proj
+		self.Jobs = queue.Queue() # items are (JobID (int), Kind (str), Task (callable))
+		self.LastJobID = 0
+		self.FailureHandlers = {} # keys are job IDs; values are callables to run on the datacore thread if the job fails
+		self.SuccessHandlers = {} # keys are job IDs; values are callables to run on the datacore thread if the job succeeds
+		self.WriterThread = None # started when the first job is submitted
+		self.ReportSocketNo = None # socket number of the datacore's PULL socket for reports from the writer thread
+
+	def Submit(self, Kind, Task, OnFailure=None, OnSuccess=None):
+		# add a job to the queue. Kind (str): what the job does, for reporting. Task: callable taking no args, run on the
+		# writer thread, returning (Success (bool), ProblemReport (str)). OnFailure, OnSuccess: None, or callables taking
+		# no args, run on the datacore thread if the job fails or succeeds respectively. Return the job's ID (int)
+		assert isinstance(Kind, str)
+		assert callable(Task)
+		assert (OnFailure is None) or callable(OnFailure)
+		assert (OnSuccess is None) or callable(OnSuccess)
+		if self.WriterThread is None: # first job; set up the report socket and start the writer thread
+			ReportSocket, ReportSocketObj, self.ReportSocketNo = vizop_misc.SetupNewSocket(SocketType='PULL',
+				SocketLabel=info.SaveReportSocketLabel + '_' + self.Proj.ID, BelongsToDatacore=True)
+			self.WriterThread = threading.Thread(target=self.RunJobs, daemon=True, name='ProjectWriter_' + self.Proj.ID)
+			self.WriterThread.start()
+		self.LastJobID += 1
+		if OnFailure: self.FailureHandlers[self.LastJobID] = OnFailure
+		if OnSuccess: self.SuccessHandlers[self.LastJobID] = OnSuccess
+		self.Jobs.put((self.LastJobID, Kind, Task))
+		return self.LastJobID
+
+	def RunJobs(self):
+		# runs on the writer thread: do each job in turn, and report its outcome to the datacore
+		ReportSocket = vizop_misc.SetupThreadSocket(SocketNo=self.ReportSocketNo)
+		while True:
+			JobID, Kind, Task = self.Jobs.get()
+			StartTime = time.perf_counter()
+			try:
+				# any exception in a job is reported as a failure, so that the writer thread keeps running and the
+				# datacore can recover (e.g. by trying a full save)
+				try: Success, ProblemReport = Task()
+				except Exception: Success, ProblemReport = False, traceback.format_exc()
+				ReportSocket.send(ElementTree.tostring(vizop_misc.MakeXMLMessage(RootName='RP_SaveComplete',
+					RootText=Kind, Elements={info.ProjIDTag: self.Proj.ID, info.JobIDTag: str(JobID),
+					info.SuccessTag: utilities.Bool2Str(Success), info.ProblemReportTag: ProblemReport,
+					info.DurationTag: str(time.perf_counter() - StartTime)}), encoding='UTF-8'))
+			finally: self.Jobs.task_done() # so that WaitUntilIdle() can't hang
+
+	def IsIdle(self):
+		# return bool: whether all submitted jobs are finished
+		return self.Jobs.unfinished_tasks == 0
+
+	def WaitUntilIdle(self):
+		# block until all submitted jobs are finished, e.g. before closing the project
+		self.Jobs.join()
+
 class ProjectItem(object): # class of PHA project instances
 	# below: attrib lists containing project-level objects with numbering
 	ListsOfObjsWithNumbering = ['ActionItems', 'ParkingLot']
@@ -122,6 +277,32 @@ class ProjectItem(object): # class of PHA project instances
 		self.SandboxStatus = 'SandboxInactive' # str; whether sandbox is active
 		self.OutputFilename = '' # str; full pathname of last file last used to save project in this Vizop instance.
 			# If we are saving on fly, this contains the pathname of the project file to update
+		self.OutputFileMade = False # bool; whether the output file for saving on fly has been written yet
+		self.UpdatesSinceCheckpoint = 0 # int; number of <update> tags appended to the output file since the last full image
+		self.CheckpointStats = [] # list of dict; metrics of each checkpoint run, oldest first (see WriteCheckpoint())
+		self.SaveQueue = ProjectSaveQueue(Proj=self) # runs all writes to the project's files on a background thread
+		self.SaveReports = [] # list of dict; outcome of each job run by SaveQueue, oldest first (see HandleSaveReport())
+		self.PHAObjSections = {} # where to find the sections of PHA objects not yet unpacked from the project file: keys
+			# are PHA object IDs, values are (filename (str), project_files.PHAObjIndexEntry instance). Updated by the
+			# writer thread when a save moves the sections
+		self.SectionsLock = threading.Lock() # held by the datacore while it reads a section listed in PHAObjSections,
+			# and by the writer thread while it swaps a new project file into place and updates PHAObjSections to match.
+			# Each holds it only briefly, so the datacore never waits for a whole save to finish
+		self.FileNumberingSystems = [] # NumberingItem instances: the numbering systems in the project file, in file
+			# order; needed while any PHA objects are not yet unpacked
+		self.SavedLayout = None # project_files.ProjectFileLayout instance describing the project file last written in
+			# full, used to rewrite only the changed sections of the file on the next save; None if not available
+		self.Compression = info.DefaultProjectCompression # str; compression used when writing the project's files:
+			# 'none', 'gzip' or 'lzma'. Set to the compression of the project file the project was opened from
+		# for crash recovery, each <update> tag carries the changed part of one PHA object in the project file (see
+		# MakeRecoveryData()). The following describe the full image that the updates are replayed onto, and are reset
+		# whenever a full image of the project is written (see ResetRecoveryData())
+		self.RecoveryNumberingSystems = [] # NumberingItem instances: the numbering systems in the image, in file order
+		self.RecoveryPHAObjIDs = set() # IDs (str) of PHA objects in the image
+		self.RecoveryMaxCommentID = 0 # highest comment ID (int) in the image and the updates so far
+		self.SerializedNumberingSystems = [] # NumberingItem instances: the numbering systems written by the latest run
+			# of GenerateProjectXMLChunks(), in file order
+		self.SerializedMaxCommentID = 0 # highest comment ID (int) written by the latest run of GenerateProjectXMLChunks()
 		self.FTFullExportFilename = '' # str; last used full pathname for exporting full FT, including any extension
 		self.FTFullExportFileType = '' # str; must be '' or the Extension attrib of an instance of core_classes.ImageFileType
 		self.FTFullExportZoom = 1.0 # float; last zoom level used for exporting FT
@@ -328,6 +509,38 @@ class ProjectItem(object): # class of PHA project instances
 
 	def ConvertProjectToXML(self):
 		# convert project to XML. Return an ElementTree object containing all elements of the XML tree
+		MyXMLRoot = ElementTree.Element(info.ProjectRootTag, attrib={info.VizopVersionTag: info.VERSION})
+		MyXMLRoot.extend(self.GenerateProjectXMLElements())
+		return ElementTree.ElementTree(element=MyXMLRoot)
+
+	def GenerateProjectXMLElements(self):
+		# generator: convert project to XML, yielding each top-level element of the XML tree in turn, in file order.
+		# Elements are made one chunk at a time (see GenerateProjectXMLChunks()), so the caller can write them out and
+		# discard them without the whole tree ever being held in memory
+		for (ChunkKind, PHAObjID, ChunkElements) in self.GenerateProjectXMLChunks():
+			yield from ChunkElements
+
+	def GenerateProjectXMLChunks(self, PHAObjIDsToSkip=(), MaxCommentIDSoFar=0, CopySections=False):
+		# generator: convert project to XML in chunks, which are independently replaceable parts of the project file.
+		# Yields (ChunkKind, PHAObjID, ChunkElements) for each chunk in file order, where ChunkKind (str) is:
+		#	'Head': project information, numbering systems and simple structured objects;
+		#	'PHAObj': a PHA object's tag followed by the tags of the comments it contains;
+		#	'Tail': Viewports and associated texts
+		# PHAObjID (str) is the PHA object's ID for 'PHAObj' chunks, else None; ChunkElements is a list of top-level
+		# elements (ElementTree.Element instances), which the generator keeps no reference to.
+		# PHAObjIDsToSkip (container of str): IDs of PHA objects to omit, e.g. because they haven't changed since the
+		# last save. Their data isn't processed at all
+		# MaxCommentIDSoFar (int): comments are given IDs above this number, and above the IDs of comments in the
+		# sections of any PHA objects not yet unpacked
+		# CopySections (bool): if True, PHA objects not yet unpacked are left in the project file; instead of their
+		# chunks, a ('Section', PHAObjID, None) tuple is yielded for each, and the caller should copy the section from the
+		# file (see PHAObjSectionPiece). If False, they are unpacked first
+
+		def DetachElements(XMLRoot):
+			# generator: remove each child element from XMLRoot, and yield it
+			for ThisElement in list(XMLRoot):
+				XMLRoot.remove(ThisElement)
+				yield ThisElement
 
 		def MakeStructuredElement(StartEl, SubElTag, DataObj, SubElements):
 			# make a subelement of StartEl (XML element) with tag = SubElTag (str).
@@ -375,15 +588,15 @@ class ProjectItem(object): # class of PHA project instances
 
 		def AddNumberingSystemTags(XMLRoot):
 			# build a list of all unique numbering systems used in the project, and write numbering systems to XMLRoot
-			AllNumberingSystems = GetAllNumberingSystems(Proj=self)
+			AllNumberingSystems, AllNumberingSystemUsers = GetAllNumberingSystems(Proj=self)
+			self.SerializedNumberingSystems = [ThisNS.Copy() for ThisNS in AllNumberingSystems]
 			# write a tag for each NS
-			for ThisNSIndex, ThisNSElementList in enumerate(AllNumberingSystems):
+			for ThisNSIndex, ThisNS in enumerate(AllNumberingSystems):
 				ThisNSElement = ElementTree.SubElement(XMLRoot, info.NumberSystemTag)
 				# store an 'ID' for the NS = its index in AllNumberingSystems
 				ThisIDTag = ElementTree.SubElement(ThisNSElement, info.IDTag)
 				ThisIDTag.text = str(ThisNSIndex)
 				# store tags for other NS-level attribs
-				ThisNS = ThisNSElementList[0].Numbering # pick the NS from one of the elements in the list
 				AddAttribsInSubelements(StartEl=ThisNSElement, DataObj=ThisNS,
 					SubElements={info.ShowInDisplayTag: 'ShowInDisplay', info.ShowInOutputTag: 'ShowInOutput'})
 				# store Chunk subelements for this NS
@@ -408,7 +621,7 @@ class ProjectItem(object): # class of PHA project instances
 							info.StartSequenceAtTag: 'StartSequenceAt', info.GapBeforeTag: 'GapBefore',
 							info.IncludeInNumberingTag: 'IncludeInNumbering', info.NoValueTag: 'NoValue',
 							info.SkipToTag: 'SkipTo'})
-			return AllNumberingSystems
+			return AllNumberingSystemUsers
 
 		def AddSimpleStructuredObjectTags(XMLRoot, NumberingSystemHash):
 			# add tags for simple cases of structured objects: process units, risk receptors, constants, action items,
@@ -487,26 +700,6 @@ class ProjectItem(object): # class of PHA project instances
 				for ThisValue in utilities.Flatten(ThisMatrix.Values):
 					AddValueElement(StartEl=ThisMatrixTag, ValueTag=info.EntryTag, ValueObj=ThisValue)
 
-		def AddPHAObjTags(XMLRoot, NumberingSystemHash):
-			# add tags for each PHA object in the project. Return comment hash (dict):
-			# Keys are comment IDs (str), values are comment texts (str)
-			CommentHash = {}
-			MaxCommentIDSoFar = 0
-			for ThisPHAObj in self.PHAObjs:
-				ThisPHAObjTag = ElementTree.SubElement(XMLRoot, info.PHAObjTag)
-#				ThisKindTag = ElementTree.SubElement(ThisPHAObjTag, info.KindTag)
-#				ThisKindTag.text = type(ThisPHAObj).InternalName
-				ThisIDTag = ElementTree.SubElement(ThisPHAObjTag, info.IDTag)
-				ThisIDTag.text = ThisPHAObj.ID
-				# no need to add Kind tag here - it's done in individual PHA models' StoreAllDataInXML()
-				# ask the PHA object to add all of its own data in ThisPHAObjTag, and return all comments found
-				ThisCommentHash, MaxCommentIDSoFar = ThisPHAObj.StoreAllDataInXML(StartTag=ThisPHAObjTag,
-					NumberingSystemHash=NumberingSystemHash, MaxCommentIDSoFar=MaxCommentIDSoFar)
-				assert isinstance(ThisCommentHash, dict)
-				assert isinstance(MaxCommentIDSoFar, int)
-				CommentHash.update(ThisCommentHash)
-			return CommentHash
-
 		def AddViewportTags(XMLRoot):
 			# add tags for each Viewport in the project
 			for ThisViewport in self.AllViewportShadows: # not sure if we also need to look at self.ViewportsWithoutPHAObjs
@@ -542,39 +735,52 @@ class ProjectItem(object): # class of PHA project instances
 					ThisNumberingTag = ElementTree.SubElement(ThisATTag, info.NumberingTag)
 					ThisNumberingTag.text = NumberingSystemHash[ThisAT]
 
-		# start of main procedure for ConvertProjectToXML()
-		# First, create XML tree containing root XML element
-		MyXMLRoot = ElementTree.Element(info.ProjectRootTag, attrib={info.VizopVersionTag: info.VERSION})
-		MyXMLTree = ElementTree.ElementTree(element=MyXMLRoot)
+		# start of main procedure for GenerateProjectXMLChunks()
+		# unpack any PHA objects needed, so that their numbering systems are included in the head chunk
+		if not CopySections:
+			for ThisPHAObj in self.PHAObjs[:]:
+				if ThisPHAObj.ID not in PHAObjIDsToSkip: LoadedPHAObj(ThisPHAObj)
+		MaxCommentIDSoFar = max([MaxCommentIDSoFar] + [p.IndexEntry.MaxCommentID for p in self.PHAObjs
+			if not IsUnpacked(p)])
+		# Elements are made in a scratch root element, and detached from it as they are yielded
+		ScratchRoot = ElementTree.Element(info.ProjectRootTag)
 		# add project information tags, including team members
-		AddProjectInformationTags(XMLRoot=MyXMLRoot)
+		AddProjectInformationTags(XMLRoot=ScratchRoot)
 		# add numbering system tags, and obtain a list of lists of similarly-numbered objects in the entire project)
-		NumberingSystems = AddNumberingSystemTags(XMLRoot=MyXMLRoot)
+		NumberingSystems = AddNumberingSystemTags(XMLRoot=ScratchRoot)
 		# make a numbering system hash for all numbered objects in the project:
 		# keys are objects, values are numbering system indices (stored as str, so they can go as-is into XML)
 		NumberingSystemHash = {}
 		for ThisIndex, ThisObjList in enumerate(NumberingSystems):
 			NumberingSystemHash.update(dict([(ThisObj, str(ThisIndex)) for ThisObj in ThisObjList]))
 		# add structured object tags for simple objects
-		AddSimpleStructuredObjectTags(XMLRoot=MyXMLRoot, NumberingSystemHash=NumberingSystemHash)
-		# add tags for each PHA object
-		CommentHash = AddPHAObjTags(XMLRoot=MyXMLRoot, NumberingSystemHash=NumberingSystemHash)
-		# add Viewport tags
-		AddViewportTags(XMLRoot=MyXMLRoot)
-		# add comment tags
-		for (ThisCommentID, ThisCommentText) in CommentHash.items():
-			ThisCommentTag = ElementTree.SubElement(MyXMLRoot, info.CommentTag)
-			ThisCommentIDTag = ElementTree.SubElement(ThisCommentTag, info.IDTag)
-			ThisCommentIDTag.text = ThisCommentID
-			ThisCommentContentTag = ElementTree.SubElement(ThisCommentTag, info.ContentTag)
-			ThisCommentContentTag.text = LegalString(InStr=ThisCommentText, Strip=True, FilterForbiddenChar=False)
-		# add action item and parking lot tags
-		AddAssociatedTextTags(XMLRoot=MyXMLRoot, NumberingSystemHash=NumberingSystemHash)
-		return MyXMLTree
-
-	def UnpackXMLToProject(self, MyXMLRoot):
+		AddSimpleStructuredObjectTags(XMLRoot=ScratchRoot, NumberingSystemHash=NumberingSystemHash)
+		yield ('Head', None, list(DetachElements(ScratchRoot)))
+		# add tags for each PHA object, one at a time, each followed by tags for its comments
+		for ThisPHAObj in self.PHAObjs:
+			if ThisPHAObj.ID in PHAObjIDsToSkip: continue
+			if not IsUnpacked(ThisPHAObj):
+				yield ('Section', ThisPHAObj.ID, None)
+				continue
+			ChunkElements, MaxCommentIDSoFar = MakePHAObjChunkElements(ThisPHAObj,
+				NumberingSystemHash=NumberingSystemHash, MaxCommentIDSoFar=MaxCommentIDSoFar)
+			yield ('PHAObj', ThisPHAObj.ID, ChunkElements)
+		self.SerializedMaxCommentID = MaxCommentIDSoFar
+		# add Viewport tags, then action item and parking lot tags
+		AddViewportTags(XMLRoot=ScratchRoot)
+		AddAssociatedTextTags(XMLRoot=ScratchRoot, NumberingSystemHash=NumberingSystemHash)
+		yield ('Tail', None, list(DetachElements(ScratchRoot)))
+
+	def UnpackXMLToProject(self, MyXMLRoot=None, XMLElements=None, LazyPHAObjs=[], ProjFilename=''):
 		# fetch data from XML tree starting at MyXMLRoot (ElementTree.Element instance) and load it into project,
-		# overwriting existing data
+		# overwriting existing data.
+		# Alternatively, XMLElements can be supplied instead of MyXMLRoot: an iterable yielding the top-level elements
+		# of the project file in file order, such as a project_files.ProjectFileStream instance. This allows large
+		# project files to be loaded without holding the whole XML tree in memory.
+		# LazyPHAObjs (list of project_files.PHAObjIndexEntry instances): PHA objects that are not in the XML supplied,
+		# but are to be unpacked from project file ProjFilename (str) only when first accessed. They are represented in
+		# self.PHAObjs by PHAObjProxy instances until then
+		# Return ProblemReports (list of ProblemReportItem instances)
 
 		def FetchAttribFromXML(XMLRoot, Tag, DestinationObj, AttribName, TypeConverter=str,
 			DefaultIfNoTag='', DefaultIfTagEmpty=''):
@@ -674,9 +880,10 @@ class ProjectItem(object): # class of PHA project instances
 			CommentHash = {}
 			ProblemReports = []
 			for ThisCommentTag in XMLRoot.findall(info.CommentTag):
-				NewComment = core_classes.AssociatedTextItem(Proj=self)
-				# fetch comment ID and content
+				# fetch comment ID, and get the comment object (if it was already referred to by an element unpacked
+				# earlier, this populates the existing placeholder object)
 				ThisCommentID = ThisCommentTag.findtext(info.IDTag)
+				NewComment = Comments[ThisCommentID]
 				FetchAttribFromXML(XMLRoot=ThisCommentTag, Tag=info.ContentTag, DestinationObj=NewComment,
 					AttribName='Content')
 				# add comment to hash
@@ -688,17 +895,19 @@ class ProjectItem(object): # class of PHA project instances
 			# fetch all associated texts (action items and parking lot items) from XMLRoot, and return them in a hash:
 			# keys are AT IDs, values are AT objects
 			# also return ProblemReports (list of ProblemReportItem instances)
+			# ATs are added to the project's lists of ATs, which must be cleared before unpacking starts.
+			# An AT whose ID has been seen before (the project file can contain more than one tag for the same AT) is
+			# repopulated rather than duplicated
 			assert isinstance(XMLRoot, ElementTree.Element)
 			assert isinstance(NumberingSystems, list)
-			self.ActionItems = [] # clear project's lists of ATs
-			self.ParkingLot = []
 			MyActionItems = {} # used for hash to attach ATs to host objects later
 			MyParkingLotItems = {}
 			ProblemReports = []
-			for ThisATKindTag, ThisATHash, ProjLevelList in [(info.ActionItemTag, MyActionItems, self.ActionItems),
-				(info.ParkingLotItemTag, MyParkingLotItems, self.ParkingLot)]:
+			for ThisATKindTag, ThisATHash, ProjLevelList, AllATsHash in [
+				(info.ActionItemTag, MyActionItems, self.ActionItems, ActionItems),
+				(info.ParkingLotItemTag, MyParkingLotItems, self.ParkingLot, ParkingLotItems)]:
 				for ThisATInstanceTag in XMLRoot.findall(ThisATKindTag):
-					NewAT = core_classes.AssociatedTextItem(Proj=self)
+					NewAT = AllATsHash[ThisATInstanceTag.findtext(info.IDTag)]
 					# fetch AT attribs
 					FetchAttribFromXML(XMLRoot=ThisATInstanceTag, Tag=info.IDTag, DestinationObj=NewAT,
 						AttribName='ID')
@@ -715,18 +924,20 @@ class ProjectItem(object): # class of PHA project instances
 					NewAT.Numbering = copy.copy(NumberingSystems[int(ThisATInstanceTag.findtext(info.NumberingTag))])
 					# add AT to hash. TODO confirm IDs are unique and nonblank
 					ThisATHash[NewAT.ID] = NewAT
-					# add AT to project's list
-					ProjLevelList.append(NewAT)
+					# add AT to project's list, if not already there
+					if NewAT.ID not in AllATsHash.Unpacked:
+						ProjLevelList.append(NewAT)
+						AllATsHash.Unpacked.add(NewAT.ID)
 			return MyActionItems, MyParkingLotItems, ProblemReports
 
 		def FetchSimpleStructuredObjectTags(XMLRoot, NumberingSystems):
 			# unpack structured object data from XMLRoot into project for objects:
-			# process units, risk receptors, constants, and risk matrices
+			# process units, risk receptors, constants, and risk matrices.
+			# The objects are appended to the project's lists, which must be cleared before unpacking starts.
 			# return ProblemReports (list of ProblemReportItem instances) and ParentNumValueInstances (list)
 			# first, unpack process units
 			ProblemReports = []
 			ParentNumValueInstances = []
-			self.ProcessUnits = []
 			for ThisProcessUnitTag in XMLRoot.findall(info.ProcessUnitTag):
 				PUID = ThisProcessUnitTag.findtext(info.IDTag)
 				# TODO ensure ID is unique and nonblank
@@ -736,7 +947,6 @@ class ProjectItem(object): # class of PHA project instances
 				self.ProcessUnits.append(ProcessUnit(Proj=self, ID=PUID, UnitNumber=PUUnitNumber, ShortName=PUShortName,
 					LongName=PULongName))
 			# unpack risk receptors
-			self.RiskReceptors = []
 			for ThisRRTag in XMLRoot.findall(info.RiskReceptorTag):
 				RRID = ThisRRTag.findtext(info.IDTag)
 				# TODO ensure ID is unique and nonblank
@@ -744,7 +954,6 @@ class ProjectItem(object): # class of PHA project instances
 				RRHumanName = ThisRRTag.findtext(info.HumanNameTag)
 				self.RiskReceptors.append(core_classes.RiskReceptorItem(ID=RRID, XMLName=RRXMLName, HumanName=RRHumanName))
 			# unpack Constants
-			self.Constants = []
 			for ThisConstantTag in XMLRoot.findall(info.ConstantTag):
 				# make new constant, applying ID and HumanName attribs from XML tag
 				NewConstant = core_classes.ConstantItem(**ThisConstantTag.attrib)
@@ -754,7 +963,6 @@ class ProjectItem(object): # class of PHA project instances
 				ProblemReports.extend(NewProblemReports)
 				ParentNumValueInstances.extend(NewParentNumValueInstances)
 			# add risk matrices
-			self.RiskMatrices = []
 			for ThisMatrixTag in XMLRoot.findall(info.RiskMatrixTag):
 				NewMatrix = core_classes.LookupTableItem(ID=ThisMatrixTag.findtext(info.IDTag))
 				self.RiskMatrices.append(NewMatrix)
@@ -857,13 +1065,15 @@ class ProjectItem(object): # class of PHA project instances
 				# PostProcessDoNewViewport()
 			return ProblemReports
 
-		def ReconnectElementLinks(ElementHash):
+		def ReconnectElementLinks(ElementHash, ElementsToReconnect=None):
 			# restore all links between elements. Link targets are unpacked as element ID lists during unpacking.
 			# These ID lists need to be replaced with the actual element objects, which could be in any PHA object in the
 			# project.
 			# ElementHash is a dict with keys = element IDs, values = elements for all elements across the project
+			# ElementsToReconnect (dict with same structure as ElementHash, or None): elements whose links should be
+			# restored. If None, restore links for all elements in ElementHash
 			assert isinstance(ElementHash, dict)
-			for ThisElID, ThisEl in ElementHash.items():
+			for ThisElID, ThisEl in list((ElementHash if ElementsToReconnect is None else ElementsToReconnect).items()):
 				if getattr(ThisEl, 'ConnectToID', None) is not None:
 					ThisEl.ConnectTo = [ElementHash[i] for i in ThisEl.ConnectToID.replace(',', ' ').split()]
 					del ThisEl.ConnectToID # remove for memory conservation and to avoid it becoming out of date
@@ -903,36 +1113,114 @@ class ProjectItem(object): # class of PHA project instances
 				del ThisPNC.SourceID
 			return ProblemReports
 
+		def LoadPHAObjFromFile(Proxy):
+			# unpack the PHA object represented by Proxy (PHAObjProxy instance) from its section of the project file, put
+			# it in place of Proxy in the datacore's lists, and reconnect its links. Return the new PHA object
+			# The section may be moved by a save in progress, so the lock stops the file being swapped between finding
+			# where the section is and reading it. Saves still being written don't hold up the read
+			with self.SectionsLock:
+				SectionFilename, SectionIndexEntry = self.PHAObjSections[Proxy.IndexEntry.ID]
+				SectionElements = project_files.ReadPHAObjSection(SectionFilename, SectionIndexEntry)
+			assert SectionElements is not None, "PR984 PHA object %s not found in project file" % Proxy.IndexEntry.ID
+			Holder = ElementTree.Element(info.ProjectRootTag)
+			Holder.extend(SectionElements)
+			# fetch the PHA object's comments first, so that they're available when the PHA object is unpacked
+			FetchCommentTags(XMLRoot=Holder)
+			NewProblemReports, NewParentNumValueInstances, NewElementHash = FetchPHAObjTags(XMLRoot=Holder,
+				NumberingSystems=NumberingSystems, Comments=Comments,
+				ActionItems=ActionItems, ParkingLotItems=ParkingLotItems)
+			# FetchPHAObjTags() appended the new PHA object to the project's lists; move it to where the proxy was
+			NewPHAObj = self.PHAObjs.pop()
+			self.PHAObjShadows.pop()
+			self.ReplacePHAObjProxy(Proxy, NewPHAObj)
+			del self.PHAObjSections[Proxy.IndexEntry.ID]
+			# make the proxy point to the new PHA object before reconnecting links, in case another PHA object unpacked
+			# during reconnection links back to this one
+			object.__setattr__(Proxy, 'RealPHAObj', NewPHAObj)
+			Proxy.HandOverLocalAttribs(NewPHAObj)
+			ElementHash.update(NewElementHash)
+			ReconnectElementLinks(ElementHash, ElementsToReconnect=NewElementHash)
+			NewProblemReports.extend(ReconnectNumberLinks(NewParentNumValueInstances, ElementHash))
+			if NewProblemReports: print('PR1004 problems found while unpacking PHA object %s: ' % NewPHAObj.ID,
+				NewProblemReports)
+			return NewPHAObj
+
 		# start of main procedure for UnpackXMLToProject()
-		# each chunk of data can return problems found as ProblemReportItem instances
+		# The project's data is unpacked one top-level element at a time, in file order, so that the project file can be
+		# streamed. Each element is put into a holder element so that the Fetch...() functions above can find it.
+		# Each chunk of data can return problems found as ProblemReportItem instances
+		assert (MyXMLRoot is None) != (XMLElements is None) # exactly one of them must be supplied
+		ProblemReports = []
 		ParentNumValueInstances = [] # instances of objects needing referenced object IDs to be replaced with actual
 		#	objects after objects are fetched
-		# fetch project information
-		ProblemReports = UnpackProjectInformation(XMLRoot=MyXMLRoot)
-		# build a list of unique numbering systems
-		NumberingSystems, NewProblemReports, ParentNumberChunks = FetchNumberingSystemTags(XMLRoot=MyXMLRoot)
-		ProblemReports.extend(NewProblemReports)
-		# fetch comments (as dict with keys = comment IDs, values = comment objects)
-		Comments, NewProblemReports = FetchCommentTags(XMLRoot=MyXMLRoot)
-		ProblemReports.extend(NewProblemReports)
-		# fetch action items and parking lot items
-		ActionItems, ParkingLotItems, NewProblemReports = FetchAssociatedTexts(XMLRoot=MyXMLRoot,
-			NumberingSystems=NumberingSystems)
-		ProblemReports.extend(NewProblemReports)
-		# fetch structured object tags for simple objects
-		ProblemReports, NewParentNumValueInstances = FetchSimpleStructuredObjectTags(XMLRoot=MyXMLRoot,
-			NumberingSystems=NumberingSystems)
-		ProblemReports.extend(NewProblemReports)
-		ParentNumValueInstances.extend(NewParentNumValueInstances)
-		# fetch data for each PHA object
-		NewProblemReports, NewParentNumValueInstances, ElementHash = FetchPHAObjTags(XMLRoot=MyXMLRoot,
-			NumberingSystems=NumberingSystems, Comments=Comments,
-			ActionItems=ActionItems, ParkingLotItems=ParkingLotItems)
-		ProblemReports.extend(NewProblemReports)
-		ParentNumValueInstances.extend(NewParentNumValueInstances)
-		# fetch Viewport data
-		NewProblemReports = FetchViewportData(XMLRoot=MyXMLRoot)
-		ProblemReports.extend(NewProblemReports)
+		NumberingSystems = [] # list of unique numbering systems
+		ParentNumberChunks = []
+		# hashes of comments, action items and parking lot items, with keys = IDs, values = AT objects. As comment tags
+		# follow the PHA objects that use them in the project file, the hashes make placeholder objects on demand
+		Comments = AssociatedTextHash(Proj=self)
+		ActionItems = AssociatedTextHash(Proj=self)
+		ParkingLotItems = AssociatedTextHash(Proj=self)
+		# make a proxy for each PHA object to be unpacked lazily. ElementOwners records which PHA object contains each
+		# element, so that links to elements in PHA objects not yet unpacked can be resolved on demand
+		ElementOwners = {}
+		for ThisIndexEntry in LazyPHAObjs:
+			ThisProxy = PHAObjProxy(PHAModelClass=utilities.InstanceWithAttribValue(
+				ObjList=core_classes.PHAModelMetaClass.PHAModelClasses, AttribName='InternalName',
+				TargetValue=ThisIndexEntry.Kind, NotFoundValue=None), IndexEntry=ThisIndexEntry,
+				Loader=LoadPHAObjFromFile)
+			self.PHAObjs.append(ThisProxy)
+			self.PHAObjShadows.append(ThisProxy)
+			self.PHAObjSections[ThisIndexEntry.ID] = (ProjFilename, ThisIndexEntry)
+			ElementOwners.update(dict.fromkeys(ThisIndexEntry.ElementIDs, ThisProxy))
+		# hash of all elements across the project (keys = element IDs), built up as each PHA object is unpacked
+		ElementHash = LazyElementHash(ElementOwners)
+		# clear the project's lists of objects that are populated during unpacking
+		self.ProcessUnits = []
+		self.RiskReceptors = []
+		self.Constants = []
+		self.RiskMatrices = []
+		self.ActionItems = []
+		self.ParkingLot = []
+		# project information tags are collected and unpacked together, when the first tag of any other kind is reached
+		ProjInfoTags = (info.ShortTitleTag, info.ProjNumberTag, info.DescriptionTag, info.EditNumberTag, info.MaxIDTag,
+			info.TeamMembersTag)
+		ProjInfoHolder = ElementTree.Element(info.ProjectRootTag)
+		ProjInfoUnpacked = False
+		for ThisElement in (XMLElements if MyXMLRoot is None else list(MyXMLRoot)):
+			ThisTag = ThisElement.tag
+			if (ThisTag in ProjInfoTags) and not ProjInfoUnpacked:
+				ProjInfoHolder.append(ThisElement)
+				continue
+			if not ProjInfoUnpacked: # fetch project information
+				ProblemReports.extend(UnpackProjectInformation(XMLRoot=ProjInfoHolder))
+				ProjInfoUnpacked = True
+			Holder = ElementTree.Element(info.ProjectRootTag)
+			Holder.append(ThisElement)
+			if ThisTag == info.NumberSystemTag: # add to list of unique numbering systems
+				NewNumberingSystems, NewProblemReports, NewParentNumberChunks = FetchNumberingSystemTags(XMLRoot=Holder)
+				NumberingSystems.extend(NewNumberingSystems)
+				ParentNumberChunks.extend(NewParentNumberChunks)
+			elif ThisTag == info.CommentTag:
+				NewComments, NewProblemReports = FetchCommentTags(XMLRoot=Holder)
+			elif ThisTag in (info.ActionItemTag, info.ParkingLotItemTag):
+				NewActionItems, NewParkingLotItems, NewProblemReports = FetchAssociatedTexts(XMLRoot=Holder,
+					NumberingSystems=NumberingSystems)
+			elif ThisTag in (info.ProcessUnitTag, info.RiskReceptorTag, info.ConstantTag, info.RiskMatrixTag):
+				# fetch structured object tags for simple objects
+				NewProblemReports, NewParentNumValueInstances = FetchSimpleStructuredObjectTags(XMLRoot=Holder,
+					NumberingSystems=NumberingSystems)
+				ParentNumValueInstances.extend(NewParentNumValueInstances)
+			elif ThisTag == info.PHAObjTag: # fetch data for the PHA object
+				NewProblemReports, NewParentNumValueInstances, NewElementHash = FetchPHAObjTags(XMLRoot=Holder,
+					NumberingSystems=NumberingSystems, Comments=Comments,
+					ActionItems=ActionItems, ParkingLotItems=ParkingLotItems)
+				ParentNumValueInstances.extend(NewParentNumValueInstances)
+				ElementHash.update(NewElementHash)
+			elif ThisTag == info.ViewportTag: # fetch Viewport data
+				NewProblemReports = FetchViewportData(XMLRoot=Holder)
+			else: NewProblemReports = [] # ignore any other tags, e.g. updates saved on the fly
+			ProblemReports.extend(NewProblemReports)
+		if not ProjInfoUnpacked: ProblemReports.extend(UnpackProjectInformation(XMLRoot=ProjInfoHolder))
 		# restore all kinds of links between elements (except for links between numbers within elements)
 		ReconnectElementLinks(ElementHash)
 		# reconnect ParentNumberChunkItem number chunks in all objects to their respective parent objects
@@ -941,6 +1229,9 @@ class ProjectItem(object): # class of PHA project instances
 		# reconnect parent number chunks to their respective parent objects
 		NewProblemReports = ReconnectParentNumberChunks(ParentNumberChunks, ElementHash)
 		ProblemReports.extend(NewProblemReports)
+		# PHA object sections not unpacked yet refer to numbering systems by their index in the file, so keep a copy of
+		# the file's numbering systems, to be written first whenever the project is saved (see GetAllNumberingSystems())
+		if LazyPHAObjs: self.FileNumberingSystems = [ThisNS.Copy() for ThisNS in NumberingSystems]
 		return ProblemReports
 
 	def CreatePHAObj(self, PHAModelClass, **NewPHAObjArgs):
@@ -952,6 +1243,27 @@ class ProjectItem(object): # class of PHA project instances
 		self.PHAObjShadows.append(NewPHAObj) # put the same object in the shadows list, for local display devices to access
 		return NewPHAObj
 
+	def ReplacePHAObjProxy(self, Proxy, NewPHAObj):
+		# put NewPHAObj (a PHA object just unpacked) in place of Proxy (PHAObjProxy instance) in the datacore's lists and
+		# in the Viewport shadows and sockets referring to it. ProjectItem.PHAObjShadows keeps the proxy, as client-side
+		# code uses the shadows as dict keys; the proxy forwards all access to NewPHAObj
+		for (ThisIndex, ThisPHAObj) in enumerate(self.PHAObjs):
+			if ThisPHAObj is Proxy: self.PHAObjs[ThisIndex] = NewPHAObj
+		for ThisViewport in self.AllViewportShadows:
+			if getattr(ThisViewport, 'PHAObj', None) is Proxy: ThisViewport.PHAObj = NewPHAObj
+			if getattr(ThisViewport, 'DatacoreHandler', None) is Proxy: ThisViewport.DatacoreHandler = NewPHAObj
+		for ThisSocketObj in vizop_misc.SocketRegister:
+			if ThisSocketObj.PHAObj is Proxy: ThisSocketObj.PHAObj = NewPHAObj
+
+	def MarkPHAObjsChanged(self, ViewportID=None):
+		# mark PHA objects as changed, so that they will be written at the next save. If ViewportID (str or None) is the
+		# ID of a Viewport belonging to a PHA object, only that PHA object is marked; otherwise, all PHA objects are
+		# marked, except those not yet unpacked from the project file (which can't have changed)
+		ViewportPHAObjIDs = [v.PHAObjID for v in self.AllViewportShadows if v.ID == ViewportID]
+		for ThisPHAObj in self.PHAObjs:
+			if not IsUnpacked(ThisPHAObj): continue
+			if (not ViewportPHAObjIDs) or (ThisPHAObj.ID in ViewportPHAObjIDs): ThisPHAObj.MarkChanged()
+
 	def MakeAssocTextLookupTable(self, ATKind):
 		# make and return dictionary with keys = ATs, values = list of PHA elements containing the AT
 		# We assume the element's attrib containing the AT is named the same as AssocTextKind; if not,
@@ -1013,7 +1325,7 @@ def GetProjectFilenamesToOpen(parent_frame):
 
 	file_list = vizop_misc.select_file_from_all(message=_('Select Vizop project file(s) to open'),
 							  default_path=working_dir,
-							  wildcard='.'.join(['*', proj_file_ext]),
+							  wildcard=';'.join(['*.' + proj_file_ext, '*.' + info.SnapshotFileExtension]),
 							  read_only=False, allow_multi_files=True,
 							  parent_frame=parent_frame)
 	if file_list:
@@ -1032,48 +1344,126 @@ XMLTreeSkeleton = """<?xml version="1.0" encoding="iso-8859-1"?>
 </vizop_project>
 """ % CurrentProjDocType
 
-def OpenProjectFiles(ProjectFilesToOpen, UsingTemplates=False, SaveOnFly=True, ProjectFilesToCreate=[]):
+def OpenProjectFiles(ProjectFilesToOpen, UsingTemplates=False, SaveOnFly=True, ProjectFilesToCreate=[],
+	ProgressCallback=None, MeasureMemory=False):
 	# attempt to open project files in ProjectFilesToOpen (list). All files must already be checked as existent and readable.
 	# UsingTemplates (bool): whether ProjectFilesToOpen contains templates rather than actual project files
 	# SaveOnFly (bool): whether to create an output file for appending changes on-the-fly
 	# If UsingTemplates and SaveOnFly, we need full pathnames in ProjectFilesToCreate for the output files.
+	# ProgressCallback: None, or callable taking args (FileIndex (int), FractionRead (float, 0..1)); called as each
+	# project file is streamed in. If several files are opened at once, they may be read in parallel in worker processes
+	# (see ParseProjectFilesInParallel()), and ProgressCallback is called at least every info.ParallelOpenPollInterval
+	# while waiting for them, so that the caller can keep the display responsive
+	# MeasureMemory (bool): whether to measure peak memory use during loading (slows down loading)
 	# return OpenProjects (list of Project instances), SuccessReport (list (1 item per project file in ProjectFilesToOpen) of dict:
-	# {OpenedOK: bool, ProblemReport: str (human readable), and other items with file stats (eg number of nodes)}
+	# {OpenedOK: bool, ProblemReport: str (human readable), and other items with file stats: LoadTime (s),
+	# PeakMemory (bytes, or None if not measured), ElementsProcessed (number of top-level XML elements)}
 	# first, integrity check of the args
 	if UsingTemplates:
 		assert (len(ProjectFilesToOpen) == len(ProjectFilesToCreate)), "PR117 need file names to create project files"
+	assert (ProgressCallback is None) or callable(ProgressCallback)
 	ProjectsOpened = []
 	SuccessReport = []
+	# complete any rewrite of a project file that was interrupted, e.g. by a crash during an incremental save
+	for ProjFileName in ProjectFilesToOpen: project_files.ApplyProjectJournal(ProjFileName)
+	# if opening several files, and there are enough CPUs to read several at once, read and check them all in parallel
+	# first; the projects are then built from the content read. With fewer CPUs, it's quicker to stream them in serially
+	if min(len(ProjectFilesToOpen), os.cpu_count() or 1) >= info.ParallelOpenMinFiles:
+		ParsedFiles = ParseProjectFilesInParallel(ProjectFilesToOpen, ProgressCallback=ProgressCallback,
+			MeasureMemory=MeasureMemory)
+	else: ParsedFiles = {}
 	for (ProjIndex, ProjFileName) in enumerate(ProjectFilesToOpen):
-		ProjDocTree = ElementTree.parse(ProjFileName) # open file, convert into parsed tree
-		XMLRoot = ProjDocTree.getroot()
-		# check if doc type is usable; if so, extract it into a new project
-		FileVersion = XMLRoot.attrib.get(info.VizopVersionTag, None)
+		# if the file has a valid index, the PHA objects' sections are skipped, and the PHA objects are unpacked lazily.
+		# Files in the compact binary snapshot format have no index
+		IsSnapshot = project_snapshot.IsSnapshotFile(ProjFileName)
+		if ProjIndex in ParsedFiles: LazyPHAObjs = ParsedFiles[ProjIndex].LazyPHAObjs
+		elif IsSnapshot: LazyPHAObjs = []
+		else: LazyPHAObjs = project_files.ReadProjectIndex(ProjFileName) or []
+		# open file for streaming; only the root element is read at this stage
+		try:
+			if ProjIndex in ParsedFiles: ProjStream = ParsedFiles[ProjIndex]
+			elif IsSnapshot: ProjStream = project_snapshot.SnapshotReader(ProjFileName,
+				ProgressCallback=None if ProgressCallback is None else \
+				lambda Fraction, FileIndex=ProjIndex: ProgressCallback(FileIndex, Fraction))
+			else: ProjStream = project_files.ProjectFileStream(project_files.FileWithGaps(ProjFileName,
+				Gaps=[(e.Offset, e.Allocated) for e in LazyPHAObjs]) if LazyPHAObjs else ProjFileName,
+				MeasureMemory=MeasureMemory, CloseWhenDone=True,
+				ProgressCallback=None if ProgressCallback is None else \
+				lambda Fraction, FileIndex=ProjIndex: ProgressCallback(FileIndex, Fraction))
+			# check if doc type is usable; if so, extract it into a new project
+			FileVersion = ProjStream.RootAttrib(info.VizopVersionTag)
+		except (ElementTree.ParseError, IOError, OSError, ValueError):
+			ProjStream = None
+			FileVersion = None
 		if FileVersion is not None: # Root element contains a VizopVersion attrib
 			if FileVersion in info.UsableProjDocVersions:
 				NewProj = CreateProject()
-				ProblemReports = NewProj.UnpackXMLToProject(MyXMLRoot=XMLRoot)
-				OpenedOK = not any(r.Fatal for r in ProblemReports)
+				NewProj.Compression = project_files.CompressionOfFile(ProjFileName)
+				try:
+					ProblemReports = NewProj.UnpackXMLToProject(XMLElements=ProjStream, LazyPHAObjs=LazyPHAObjs,
+						ProjFilename=ProjFileName)
+					OpenedOK = not any(r.Fatal for r in ProblemReports)
+					ProblemReportText = ''
+				except ElementTree.ParseError: # file is damaged partway through
+					OpenedOK = False
+					ProblemReportText = _('Project file is damaged')
 #				OpenedOK, ProblemReport = PopulateProjectFromFile(NewProj, XMLRoot) # %%%
 				# if we succeeded in extracting the project file or template, and if saving on the fly, create the output file
 				# Any problem report will be appended to the report from file opening (above)
 				if OpenedOK and SaveOnFly:
-					OutputFileOK, ProblemReport = SaveEntireProject(NewProj, ProjectFilesToCreate[ProjIndex],
-						ProblemReport, Close=False)
+					OutputFileOK, ProblemReportText = SaveEntireProject(NewProj, ProjectFilesToCreate[ProjIndex],
+						ProblemReportText, Close=False)
 					NewProj.SaveOnFly = OutputFileOK
+					NewProj.OutputFilename = ProjectFilesToCreate[ProjIndex]
+					NewProj.OutputFileMade = OutputFileOK
+					if OutputFileOK: StartRecoverySession(NewProj)
 				else:
 					OutputFileOK = True # dummy value if no output file needed
-				SuccessReport.append( {'OpenedOK': OpenedOK, 'OutputFileOK': OutputFileOK, 'ProblemReport': ''} )
+				SuccessReport.append( {'OpenedOK': OpenedOK, 'OutputFileOK': OutputFileOK,
+					'ProblemReport': ProblemReportText, 'LoadTime': ProjStream.Duration,
+					'PeakMemory': ProjStream.PeakMemory, 'ElementsProcessed': ProjStream.ElementsProcessed} )
+				print('PR1062 opened project file %s in %f s, peak memory: %s' % (ProjFileName, ProjStream.Duration,
+					ProjStream.PeakMemory))
 				if OpenedOK:
 					ProjectsOpened.append(NewProj)
 			else: # proj doc file version is not usable by this version of Vizop
+				ProjStream.Close()
 				ProblemReportText = {True: _('Unusable template file type %s'), False: _('Unusable project file type %s')}[UsingTemplates]
-				SuccessReport.append( {'OpenedOK': False, 'ProblemReport': ProblemReportText % DocType(ProjDocTreeTop)} )
+				SuccessReport.append( {'OpenedOK': False, 'ProblemReport': ProblemReportText % FileVersion} )
 		else: # proj doc file doesn't seem to be a Vizop file
+			if ProjStream: ProjStream.Close()
 			SuccessReport.append( {'OpenedOK': False, 'ProblemReport': _("Doesn't seem to be a Vizop file")})
 	# TODO make use of ProblemReports (list of ProblemReportItem instances)
 	return ProjectsOpened, SuccessReport
 
+def ParseProjectFilesInParallel(ProjectFilesToOpen, ProgressCallback=None, MeasureMemory=False):
+	# read and check all the files in ProjectFilesToOpen (list of str) in a pool of worker processes, using
+	# project_files.ParseProjectFile(). Meanwhile, call ProgressCallback (if supplied) with args (FileIndex (int),
+	# FractionRead (float, 0..1)) as each file is finished, and at least every info.ParallelOpenPollInterval
+	# Return dict with keys = indices in ProjectFilesToOpen, values = project_files.ParsedProjectFile instances.
+	# If worker processes can't be used, return an empty dict; the files will be streamed in one at a time instead
+	ParsedFiles = {}
+	try:
+		with concurrent.futures.ProcessPoolExecutor(max_workers=min(len(ProjectFilesToOpen),
+				os.cpu_count() or 1)) as Pool: # files beyond the number of CPUs wait for a free worker
+			FileIndexOfJob = dict([(Pool.submit(project_files.ParseProjectFile, ThisFilename, MeasureMemory), ThisIndex)
+				for (ThisIndex, ThisFilename) in enumerate(ProjectFilesToOpen)])
+			JobsWaiting = set(FileIndexOfJob.keys())
+			while JobsWaiting:
+				JobsDone, JobsWaiting = concurrent.futures.wait(JobsWaiting, timeout=info.ParallelOpenPollInterval,
+					return_when=concurrent.futures.FIRST_COMPLETED)
+				for ThisJob in JobsDone:
+					ParsedFiles[FileIndexOfJob[ThisJob]] = ThisJob.result()
+					if ProgressCallback: ProgressCallback(FileIndexOfJob[ThisJob], 1.0)
+				# if nothing finished this time, report no progress on a waiting file, so that the caller gets control
+				if ProgressCallback and JobsWaiting and not JobsDone:
+					ProgressCallback(min(FileIndexOfJob[j] for j in JobsWaiting), 0.0)
+	except (OSError, concurrent.futures.process.BrokenProcessPool) as ThisError:
+		print('PR1503 unable to parse project files in parallel, opening them one at a time: ', ThisError)
+		return {}
+	print('PR1504 read %d project files in parallel' % len(ParsedFiles))
+	return ParsedFiles
+
 def CreateProjects(TemplateFiles, SaveOnFly, FilesToCreate):
 	# Attempt to open template files in TemplateFiles (list) and make new projects from them.
 	# All template files must already be checked as existent and readable.
@@ -1101,11 +1491,12 @@ def CreateProject():
 # 	ProblemReport = '' # this is just dummy code for now
 # 	return OpenedOK, ProblemReport
 
-def SaveEntireProject(Proj: ProjectItem, OutputFilename, ProblemReport='', Close=False):
+def SaveEntireProject(Proj: ProjectItem, OutputFilename, ProblemReport='', Close=False, Incremental=True):
 	# Create a new file with OutputFilename (full path).
 	# Write the entire data from Proj into it.
 	# Append any problems to input arg ProblemReport.
 	# If Close, close the file after writing.
+	# If Incremental and Proj was last saved in full to the same file, only the changed parts of the file are rewritten.
 	# Return: WriteOK (bool) - whether file written successfully;
 	#         ProblemReport (str) - human readable description of any problem encountered.
 	assert type(Proj) == ProjectItem
@@ -1124,31 +1515,346 @@ def SaveEntireProject(Proj: ProjectItem, OutputFilename, ProblemReport='', Close
 	if vizop_misc.IsWritableLocation(os.path.dirname(OutputFilename)):
 #		ProjFile = open(OutputFilename, 'w') # create the file
 		# write all the data into the file
-		WriteOK, WriteReport = WriteEntireProjectToFile(Proj, OutputFilename, Close=Close)
+		WriteOK, WriteReport = WriteEntireProjectToFile(Proj, OutputFilename, Close=Close, Incremental=Incremental)
 		Report = AddToReport(Report, WriteReport)
 	else:
 		WriteOK = False
 		Report = AddToReport(Report, _('Unable to write project file at %s') % os.path.dirname(OutputFilename) )
 	return WriteOK, Report
 
-def WriteEntireProjectToFile(Proj, ProjFilename, Close):
+def WriteEntireProjectToFile(Proj, ProjFilename, Close, Incremental=True):
 	# write all data for Proj (ProjectItem) into ProjFilename (str), already confirmed as writable.
 	# Close the file if Close (bool)
-	# Return: WriteOK (bool) - whether data written successfully;
+	# Incremental (bool): if True, and Proj was last written in full to ProjFilename, only the chunks of the file that
+	# have changed are rewritten (see WriteChangedChunksToFile())
+	# A snapshot of the data is taken now; it's serialized and written, chunk by chunk, by Proj's writer thread, and the
+	# outcome of writing is reported later, in HandleSaveReport()
+	# Return: WriteOK (bool) - whether data serialized and queued for writing successfully;
 	#         ProblemReport (str) - human readable description of any problem encountered.
-	# Make the XML tree, starting with the Document node.
 	# TODO make this into a method of class ProjectItem
 	assert type(Proj) == ProjectItem
 	assert type(ProjFilename) == str
 	assert isinstance(Close, bool)
-#	ProjFile = open(ProjFilename, 'w') # create the file
-	XMLRoot = Proj.ConvertProjectToXML()
+	assert isinstance(Incremental, bool)
+	if Incremental and WriteChangedChunksToFile(Proj, ProjFilename): return True, ''
 	print('PR708 writing XML to file')
-	XMLRoot.write(ProjFilename, encoding="UTF-8", xml_declaration=True)
+	# note which PHA objects are being written, and their current revisions
+	RevisionsWritten = [(ThisPHAObj, ThisPHAObj.Revision) for ThisPHAObj in Proj.PHAObjs if IsUnpacked(ThisPHAObj)]
+	Snapshot = SnapshotProjectChunks(Proj, ProjFilename) # detached from the live project data
+	Layout = project_files.ProjectFileLayout(Filename=ProjFilename) # filled in by the writer thread
+	# the project's state is now recorded as saved; if writing fails, HandleSaveReport() will undo this. The layout
+	# isn't usable for incremental saves until the file is written
+	for (ThisPHAObj, ThisRevision) in RevisionsWritten: ThisPHAObj.SavedRevision = ThisRevision
+	Proj.SavedLayout = None
+	ResetRecoveryData(Proj)
+	if project_snapshot.IsSnapshotFilename(ProjFilename): # compact binary format; it has no layout for incremental saves
+		Proj.SaveQueue.Submit(Kind='FullSave', Task=lambda: WriteProjectSnapshotToFile(ProjFilename=ProjFilename,
+			Snapshot=Snapshot, TempFileSuffix=info.SavingFileSuffix))
+	else:
+		Proj.SaveQueue.Submit(Kind='FullSave', Task=lambda: WriteProjectBytesToFile(ProjFilename=ProjFilename,
+			Snapshot=Snapshot, Layout=Layout, Compression=Proj.Compression, Proj=Proj),
+			OnSuccess=lambda: setattr(Proj, 'SavedLayout', Layout))
 	ProblemReport = ''
-#	if Close: ProjFile.close()
 	return True, ProblemReport
 
+def WriteProjectBytesToFile(ProjFilename, Snapshot, Layout, Compression, Proj):
+	# runs on the writer thread. Serialize Snapshot (list returned by SnapshotProjectChunks()) of Proj (ProjectItem) as
+	# the entire content of ProjFilename (str), compressed according to Compression ('none', 'gzip' or 'lzma'). Chunks
+	# are written as they are serialized, so the whole file is never held in memory. The content goes into a
+	# temporary file first, which replaces ProjFilename once it's safely on disk. Then, if the file isn't compressed,
+	# write an index of the PHA objects in the file, to allow them to be loaded lazily when the file is opened, and
+	# point Proj.PHAObjSections to the new location of any sections copied from the old file.
+	# Layout (project_files.ProjectFileLayout) is filled in to describe the file as written
+	# Return Success (bool), ProblemReport (str)
+	# remove any old index first, so that it can't be mistaken for an index of the new file
+	project_files.RemoveProjectIndex(ProjFilename)
+	SectionsCopied = []
+	FilenameHead, FilenameExt = os.path.splitext(ProjFilename) # split off file extension
+	SavingFilePath = FilenameHead + info.SavingFileSuffix + FilenameExt
+	try:
+		with open(SavingFilePath, 'wb', buffering=info.ProjectFileBufferSize) as ProjFile:
+			project_files.WriteProjectFileContent(ProjFile,
+				ReadSectionPieces(GenerateProjectFilePieces(Proj, Snapshot, Layout, SectionsCopied)),
+				Compression=Compression)
+			ProjFile.flush()
+			os.fsync(ProjFile.fileno())
+		# swap the new file into place, and point to the copied sections in it, while the datacore isn't reading any
+		# section from the old file
+		with Proj.SectionsLock:
+			os.replace(SavingFilePath, ProjFilename)
+			if SectionsCopied and (Compression == 'none'):
+				MoveCopiedSections(Proj, ProjFilename, Layout.IndexEntries, SectionsCopied)
+	except (IOError, OSError):
+		try: os.remove(SavingFilePath)
+		except OSError: pass
+		return False, _('Unable to write project file %s') % ProjFilename
+	Layout.RecordFileState()
+	if Compression == 'none': project_files.WriteProjectIndex(ProjFilename, Layout.IndexEntries)
+	return True, ''
+
+def WriteProjectSnapshotToFile(ProjFilename, Snapshot, TempFileSuffix):
+	# runs on the writer thread. Write Snapshot (list returned by SnapshotProjectChunks()) as the entire content of
+	# ProjFilename (str) in the compact binary snapshot format (see project_snapshot.py). The content goes into a
+	# temporary file, named with TempFileSuffix (str), which replaces ProjFilename once it's safely on disk.
+	# The snapshot contains no copied sections, as they can't be found in a snapshot file afterwards
+	# Return Success (bool), ProblemReport (str)
+	project_files.RemoveProjectIndex(ProjFilename) # in case an indexed XML file had the same name
+	FilenameHead, FilenameExt = os.path.splitext(ProjFilename) # split off file extension
+	TempFilePath = FilenameHead + TempFileSuffix + FilenameExt
+	Elements = [ThisElement for (ChunkKind, PHAObjID, ChunkElements, IndexEntry) in Snapshot
+		for ThisElement in ChunkElements]
+	try:
+		with open(TempFilePath, 'wb', buffering=info.ProjectFileBufferSize) as ProjFile:
+			project_snapshot.WriteSnapshotContent(ProjFile, info.ProjectRootTag, {info.VizopVersionTag: info.VERSION},
+				Elements)
+			ProjFile.flush()
+			os.fsync(ProjFile.fileno())
+		os.replace(TempFilePath, ProjFilename)
+	except (IOError, OSError):
+		try: os.remove(TempFilePath)
+		except OSError: pass
+		return False, _('Unable to write project file %s') % ProjFilename
+	return True, ''
+
+def SerializeProjectXMLChunk(ChunkElements):
+	# return the bytes (bytes) of the top-level elements in ChunkElements (list of ElementTree.Element) as written into
+	# a project file, and the number of bytes in the first element (int)
+	ElementsAsBytes = [ElementTree.tostring(ThisElement, encoding='UTF-8', xml_declaration=False)
+		for ThisElement in ChunkElements]
+	return b''.join(ElementsAsBytes), len(ElementsAsBytes[0]) if ElementsAsBytes else 0
+
+def NumberingDigestOfChunk(ChunkElements):
+	# return digest (str) of the numbering system tags in ChunkElements (list of ElementTree.Element)
+	return hashlib.sha1(b''.join(ElementTree.tostring(ThisElement, encoding='UTF-8', xml_declaration=False)
+		for ThisElement in ChunkElements if ThisElement.tag == info.NumberSystemTag)).hexdigest()
+
+def MakePHAObjIndexEntry(Proj, PHAObjID, Offset, Length, Allocated, MaxCommentID=0):
+	# return a project_files.PHAObjIndexEntry for the PHA object in Proj with ID = PHAObjID (str), whose section of the
+	# project file is at Offset with PHAObj tag length Length and total length Allocated, and in which the highest
+	# comment ID is MaxCommentID (all int; lengths in bytes)
+	ThisPHAObj = LoadedPHAObj(utilities.ObjectWithID(Objects=Proj.PHAObjs, TargetID=PHAObjID))
+	return project_files.PHAObjIndexEntry(ID=ThisPHAObj.ID, Kind=PHAModelClassOf(ThisPHAObj).InternalName,
+		HumanName=ThisPHAObj.HumanName, Offset=Offset, Length=Length, Allocated=Allocated,
+		ElementIDs=[ThisEl.ID for ThisEl in ThisPHAObj.WalkOverAllElements()] \
+		if hasattr(ThisPHAObj, 'WalkOverAllElements') else [], MaxCommentID=MaxCommentID)
+
+def MaxCommentIDInChunk(ChunkElements, MaxCommentIDSoFar=0):
+	# return the highest comment ID (int) in ChunkElements (list of ElementTree.Element), or MaxCommentIDSoFar if higher
+	return max([MaxCommentIDSoFar] + [utilities.str2int(ThisElement.findtext(info.IDTag))
+		for ThisElement in ChunkElements if ThisElement.tag == info.CommentTag])
+
+def CommentElements(CommentHash):
+	# return list of Comment XML elements for the comments in CommentHash (dict: keys are comment IDs (str), values are
+	# comment texts (str)), as returned by StoreAllDataInXML() methods
+	CommentTags = []
+	for (ThisCommentID, ThisCommentText) in CommentHash.items():
+		ThisCommentTag = ElementTree.Element(info.CommentTag)
+		ThisCommentIDTag = ElementTree.SubElement(ThisCommentTag, info.IDTag)
+		ThisCommentIDTag.text = ThisCommentID
+		ThisCommentContentTag = ElementTree.SubElement(ThisCommentTag, info.ContentTag)
+		ThisCommentContentTag.text = LegalString(InStr=ThisCommentText, Strip=True, FilterForbiddenChar=False)
+		CommentTags.append(ThisCommentTag)
+	return CommentTags
+
+def MakePHAObjChunkElements(PHAObj, NumberingSystemHash, MaxCommentIDSoFar):
+	# return the top-level XML elements of the chunk of a project file for PHAObj (a PHA object): its PHAObj tag,
+	# followed by tags for its comments. Comments are given IDs above MaxCommentIDSoFar (int)
+	# NumberingSystemHash (dict): keys are numbered objects, values are numbering system indices (str)
+	# Also returns the highest comment ID used so far (int)
+	ThisPHAObjTag = ElementTree.Element(info.PHAObjTag)
+	ThisIDTag = ElementTree.SubElement(ThisPHAObjTag, info.IDTag)
+	ThisIDTag.text = PHAObj.ID
+	# no need to add Kind tag here - it's done in individual PHA models' StoreAllDataInXML()
+	# ask the PHA object to add all of its own data in ThisPHAObjTag, and return all comments found
+	ThisCommentHash, MaxCommentIDSoFar = PHAObj.StoreAllDataInXML(StartTag=ThisPHAObjTag,
+		NumberingSystemHash=NumberingSystemHash, MaxCommentIDSoFar=MaxCommentIDSoFar)
+	assert isinstance(ThisCommentHash, dict)
+	assert isinstance(MaxCommentIDSoFar, int)
+	return [ThisPHAObjTag] + CommentElements(ThisCommentHash), MaxCommentIDSoFar
+
+class PHAObjSectionPiece(object): # stands in, among the pieces of a project file to be written, for the section of a
+	# PHA object that hasn't been unpacked. The section is copied unchanged from the file it's in (found from
+	# Proj.PHAObjSections) when the piece is written, on the writer thread, so the PHA object is never unpacked
+
+	def __init__(self, Proj, PHAObjID):
+		object.__init__(self)
+		self.Proj = Proj
+		self.PHAObjID = PHAObjID
+
+	def Read(self):
+		# return the section's bytes (bytes), including its slack. Raise IOError if it isn't where expected
+		SectionFilename, SectionIndexEntry = self.Proj.PHAObjSections[self.PHAObjID]
+		with open(SectionFilename, 'rb') as SectionFile:
+			if not project_files.SectionMatchesIndexEntry(SectionFile, SectionIndexEntry):
+				raise IOError('PHA object section %s not found in %s' % (self.PHAObjID, SectionFilename))
+			SectionFile.seek(SectionIndexEntry.Offset)
+			return SectionFile.read(SectionIndexEntry.Allocated)
+
+def MoveCopiedSections(Proj, ProjFilename, IndexEntries, SectionsCopied):
+	# runs on the writer thread, after ProjFilename (str) has been written with the index entries IndexEntries (list of
+	# PHAObjIndexEntry). Point Proj.PHAObjSections to the sections of PHA objects with IDs in SectionsCopied (list of str)
+	# in ProjFilename. The dict is replaced rather than changed, as the datacore may be reading it
+	NewSections = dict(Proj.PHAObjSections)
+	NewSections.update(dict([(e.ID, (ProjFilename, e)) for e in IndexEntries if e.ID in SectionsCopied]))
+	Proj.PHAObjSections = NewSections
+
+def SnapshotProjectChunks(Proj, ProjFilename):
+	# take a snapshot of all data for Proj (ProjectItem), to be written as project file ProjFilename (str) later,
+	# possibly on another thread. Runs on the datacore thread. PHA objects not yet unpacked are left in the file they're
+	# in, unless the new file is to be compressed or in the binary snapshot format (as their sections can't then be
+	# found in it afterwards).
+	# Return list of (ChunkKind, PHAObjID, ChunkElements, IndexEntry) for each chunk in file order, as yielded by
+	# Proj.GenerateProjectXMLChunks(), where IndexEntry is a project_files.PHAObjIndexEntry for a PHA object's chunk
+	# (with its position in the file not yet set), and None for other chunks
+	assert type(Proj) == ProjectItem
+	Chunks = []
+	CopySections = (Proj.Compression == 'none') and not project_snapshot.IsSnapshotFilename(ProjFilename)
+	for (ChunkKind, PHAObjID, ChunkElements) in Proj.GenerateProjectXMLChunks(CopySections=CopySections):
+		if ChunkKind == 'Section':
+			IndexEntry = utilities.ObjectWithID(Objects=Proj.PHAObjs, TargetID=PHAObjID).IndexEntry
+		elif ChunkKind == 'PHAObj': IndexEntry = MakePHAObjIndexEntry(Proj, PHAObjID, Offset=0, Length=0, Allocated=0)
+		else: IndexEntry = None
+		Chunks.append((ChunkKind, PHAObjID, ChunkElements, IndexEntry))
+	return Chunks
+
+def GenerateProjectFilePieces(Proj, Chunks, Layout, SectionsCopied):
+	# generator: serialize Chunks (list returned by SnapshotProjectChunks()) as the content of a project file for
+	# Proj (ProjectItem). Each chunk is followed by whitespace slack, so that it can be rewritten in place later if it
+	# grows a little. Yields the file content in pieces: bytes, or a PHAObjSectionPiece for each section to be copied
+	# unchanged from the file it's in. Doesn't touch the live project data, so it can run on the writer thread.
+	# As it goes, fills in Layout (project_files.ProjectFileLayout) to describe the chunks (its Filename is not set),
+	# and appends to SectionsCopied (list) the IDs of PHA objects whose sections are copied. Each chunk is dropped from
+	# Chunks once serialized, so that memory is released as the file is written
+	# get the root element's start and end tags by serializing an empty root element
+	RootBytes = ElementTree.tostring(ElementTree.Element(info.ProjectRootTag,
+		attrib={info.VizopVersionTag: info.VERSION}), encoding='UTF-8', xml_declaration=False,
+		short_empty_elements=False)
+	RootEndTag = ('</' + info.ProjectRootTag + '>').encode('UTF-8')
+	FirstPiece = b"<?xml version='1.0' encoding='UTF-8'?>\n" + RootBytes[:-len(RootEndTag)]
+	yield FirstPiece
+	FileSizeSoFar = len(FirstPiece)
+	for ChunkIndex in range(len(Chunks)):
+		(ChunkKind, PHAObjID, ChunkElements, IndexEntry) = Chunks[ChunkIndex]
+		Chunks[ChunkIndex] = None
+		ChunkStart = FileSizeSoFar
+		if ChunkKind == 'Section': # the section is copied whole, with its slack
+			NewIndexEntry = copy.copy(IndexEntry)
+			NewIndexEntry.Offset = ChunkStart
+			Layout.IndexEntries.append(NewIndexEntry)
+			Layout.MaxCommentID = max(Layout.MaxCommentID, NewIndexEntry.MaxCommentID)
+			SectionsCopied.append(PHAObjID)
+			FileSizeSoFar += NewIndexEntry.Allocated
+			yield PHAObjSectionPiece(Proj, PHAObjID)
+			continue
+		ChunkBytes, FirstElementLength = SerializeProjectXMLChunk(ChunkElements)
+		ChunkBytes += b' ' * project_files.SlackForChunk(len(ChunkBytes))
+		Allocated = len(ChunkBytes)
+		FileSizeSoFar += Allocated
+		# record the position of each chunk; for PHA objects, also record the IDs of the elements they contain
+		if ChunkKind == 'Head':
+			Layout.HeadOffset, Layout.HeadAllocated = ChunkStart, Allocated
+			Layout.NumberingDigest = NumberingDigestOfChunk(ChunkElements)
+		elif ChunkKind == 'PHAObj':
+			NewIndexEntry = copy.copy(IndexEntry)
+			NewIndexEntry.Offset, NewIndexEntry.Length = ChunkStart, FirstElementLength
+			NewIndexEntry.Allocated = Allocated
+			NewIndexEntry.MaxCommentID = MaxCommentIDInChunk(ChunkElements)
+			Layout.IndexEntries.append(NewIndexEntry)
+			Layout.MaxCommentID = max(Layout.MaxCommentID, NewIndexEntry.MaxCommentID)
+		else: Layout.TailOffset, Layout.TailAllocated = ChunkStart, Allocated
+		yield ChunkBytes
+	yield RootEndTag
+
+def ReadSectionPieces(Pieces):
+	# generator: yield each item in Pieces (iterable of bytes and PHAObjSectionPiece instances) as bytes, reading the
+	# sections to be copied. Runs on the writer thread
+	for ThisPiece in Pieces:
+		yield ThisPiece.Read() if isinstance(ThisPiece, PHAObjSectionPiece) else ThisPiece
+
+def WriteChangedChunksToFile(Proj, ProjFilename):
+	# save Proj (ProjectItem) by rewriting in place only those chunks of ProjFilename (str) that have changed: the
+	# sections of PHA objects changed since they were last saved, and the head and tail chunks (which are small).
+	# This is possible only if Proj was last written in full to ProjFilename, the set of PHA objects is the same,
+	# numbering systems haven't changed, and each changed chunk still fits in its space in the file. The writer thread
+	# also checks that the file hasn't been changed by anything else; if it has, a full save is done instead.
+	# Return bool: whether the changed chunks were queued for writing. If False, a full save is needed
+	assert type(Proj) == ProjectItem
+	# compressed and snapshot files can't be partly rewritten in place
+	if (Proj.Compression != 'none') or project_snapshot.IsSnapshotFilename(ProjFilename): return False
+	Layout = Proj.SavedLayout
+	if (Layout is None) or (os.path.abspath(ProjFilename) != os.path.abspath(Layout.Filename)): return False
+	if [e.ID for e in Layout.IndexEntries] != [p.ID for p in Proj.PHAObjs]: return False
+	# find PHA objects that haven't changed. Those not yet unpacked from the project file can't have changed
+	UnchangedIDs = set(p.ID for p in Proj.PHAObjs if (not IsUnpacked(p)) or not p.NeedsSaving())
+	EntriesByID = dict([(e.ID, e) for e in Layout.IndexEntries])
+	RevisionsWritten = [(p, p.Revision) for p in Proj.PHAObjs if p.ID not in UnchangedIDs]
+	# serialize all changed chunks before changing the layout, so that we can give up without side effects
+	NewChunks = [] # list of (Offset (int), ChunkBytes (bytes, padded to the chunk's allocated length))
+	NewIndexEntries = {} # keys are PHA object IDs, values are new PHAObjIndexEntry instances
+	MaxCommentID = Layout.MaxCommentID
+	for (ChunkKind, PHAObjID, ChunkElements) in Proj.GenerateProjectXMLChunks(PHAObjIDsToSkip=UnchangedIDs,
+			MaxCommentIDSoFar=Layout.MaxCommentID):
+		ChunkBytes, FirstElementLength = SerializeProjectXMLChunk(ChunkElements)
+		if ChunkKind == 'Head':
+			if NumberingDigestOfChunk(ChunkElements) != Layout.NumberingDigest: return False
+			Offset, Allocated = Layout.HeadOffset, Layout.HeadAllocated
+		elif ChunkKind == 'PHAObj':
+			Offset, Allocated = EntriesByID[PHAObjID].Offset, EntriesByID[PHAObjID].Allocated
+			NewIndexEntries[PHAObjID] = MakePHAObjIndexEntry(Proj, PHAObjID, Offset=Offset,
+				Length=FirstElementLength, Allocated=Allocated, MaxCommentID=MaxCommentIDInChunk(ChunkElements))
+			MaxCommentID = max(MaxCommentID, NewIndexEntries[PHAObjID].MaxCommentID)
+		else: Offset, Allocated = Layout.TailOffset, Layout.TailAllocated
+		if len(ChunkBytes) > Allocated: return False # chunk has outgrown its space
+		NewChunks.append((Offset, ChunkBytes + b' ' * (Allocated - len(ChunkBytes))))
+	print('PR1375 rewriting %d of %d PHA object sections in place' % (len(NewIndexEntries), len(Layout.IndexEntries)))
+	# the project's state is now recorded as saved; if writing fails, HandleSaveReport() will undo this
+	Layout.IndexEntries = [NewIndexEntries.get(e.ID, e) for e in Layout.IndexEntries]
+	Layout.MaxCommentID = MaxCommentID
+	for (ThisPHAObj, ThisRevision) in RevisionsWritten: ThisPHAObj.SavedRevision = ThisRevision
+	ResetRecoveryData(Proj)
+	# if writing fails, e.g. because the file has been changed since it was last written, try a full save instead
+	Proj.SaveQueue.Submit(Kind='IncrementalSave', Task=lambda: WriteChunksInPlace(ProjFilename=ProjFilename,
+		Layout=Layout, NewChunks=NewChunks, IndexEntries=Layout.IndexEntries[:]),
+		OnFailure=lambda: SaveEntireProject(Proj, ProjFilename, Close=True, Incremental=False))
+	return True
+
+def WriteChunksInPlace(ProjFilename, Layout, NewChunks, IndexEntries):
+	# runs on the writer thread. Overwrite chunks of ProjFilename (str) with NewChunks (list of (Offset (int),
+	# ChunkBytes (bytes))), provided the file is unchanged since it was last written as described in Layout
+	# (project_files.ProjectFileLayout). Then rewrite the file's index from IndexEntries (list of PHAObjIndexEntry)
+	# The chunks are journalled first, so that an interrupted rewrite can be completed when the file is next opened
+	# Return Success (bool), ProblemReport (str)
+	if not Layout.MatchesFile(ProjFilename): return False, "ProjectFileChangedSinceLastSave"
+	project_files.RemoveProjectIndex(ProjFilename) # in case we are interrupted while writing
+	try:
+		project_files.WriteChunksWithJournal(ProjFilename, NewChunks)
+	except (IOError, OSError):
+		Layout.FileSize = None # the file may be partly rewritten, so it no longer matches the layout
+		return False, _('Unable to write project file %s') % ProjFilename
+	Layout.RecordFileState()
+	project_files.WriteProjectIndex(ProjFilename, IndexEntries)
+	return True, ''
+
+def HandleSaveReport(Proj, SaveReport):
+	# handle SaveReport (RP_SaveComplete XML message root element), reporting the outcome of a job run by Proj's writer
+	# thread. Runs on the datacore thread. The report is stored in Proj.SaveReports. If the job failed, the project file
+	# can't be relied on to match the project's saved state, so all PHA objects are marked as needing a full save
+	assert isinstance(Proj, ProjectItem)
+	JobID = int(SaveReport.findtext(info.JobIDTag))
+	Success = utilities.str_to_bool(SaveReport.findtext(info.SuccessTag))
+	Proj.SaveReports.append({'JobID': JobID, 'Kind': SaveReport.text, 'Success': Success,
+		'ProblemReport': SaveReport.findtext(info.ProblemReportTag) or '',
+		'Duration': float(SaveReport.findtext(info.DurationTag))})
+	OnFailure = Proj.SaveQueue.FailureHandlers.pop(JobID, None)
+	OnSuccess = Proj.SaveQueue.SuccessHandlers.pop(JobID, None)
+	if Success and OnSuccess: OnSuccess()
+	if not Success:
+		print('PR1446 %s failed: %s' % (SaveReport.text, Proj.SaveReports[-1]['ProblemReport']))
+		Proj.SavedLayout = None
+		for ThisPHAObj in Proj.PHAObjs:
+			if IsUnpacked(ThisPHAObj): ThisPHAObj.SavedRevision = None
+		if OnFailure: OnFailure()
+
 def SetupDefaultTolRiskModel(Proj):
 	# probably now redundant; we're not using default model any more
 	# set up a default tolerable risk model (severity categories) in project instance Proj
@@ -1203,81 +1909,242 @@ def SaveOnFly(Proj, UpdateData=None):
 			# check whether the project has ever been saved
 			if Proj.OutputFileMade:
 				# try to save changes and return any problem report to datacore
-				return SaveChangesToProj(Proj, UpdateData=UpdateData)
+				Success, ProblemReport = SaveChangesToProj(Proj, UpdateData=UpdateData)
+				# if the update history in the file is getting long, fold it into a new full image in the background
+				if Success and (Proj.UpdatesSinceCheckpoint >= info.CheckpointUpdateThreshold):
+					StartCheckpoint(Proj)
+				return Success, ProblemReport
 			else: # try to save entire project
 				Success, ProblemReport = SaveEntireProject(Proj, Proj.OutputFilename, Close=True)
 				Proj.OutputFileMade = Success
+				if Success: StartRecoverySession(Proj)
 				# return any problem report to datacore
 				return Success, ProblemReport
 
 def SaveChangesToProj(Proj, UpdateData=None, Task='Update'):
-	# write updates to project file
+	# write updates to project file. The update is queued for Proj's writer thread, which reports the outcome later.
+	# If the change can't be recorded as an update to a single PHA object (see MakeRecoveryData()), a checkpoint is
+	# started instead, writing a new full image of the project
 	# UpdateData (XML tree): data specifying the update to be saved
 	# Task (str): what type of action to save. Currently only 'Update' implemented
 	# return Success (bool), ProblemReport (str) = '' if all is well
 	assert isinstance(Proj, ProjectItem)
 	assert isinstance(UpdateData, ElementTree.Element)
 	assert Task == 'Update'
-	Success = True; ProblemReport = ''
-	# Step 1. Check that we can still access project's file for writing
-	Success = vizop_misc.IsReadableFile(Proj.OutputFilename) and vizop_misc.IsWritableLocation(os.path.dirname(Proj.OutputFilename))
-	if not Success: ProblemReport = "Can'tAccessProjectFileLocation"
-	if Success:
-		# Step 2. Copy the project file. First, make a file path with "_Restore" inserted before file extension
-		FilenameHead, FilenameExt = os.path.splitext(Proj.OutputFilename) # split off file extension
-		WorkingFilePath = FilenameHead + info.RestoreFileSuffix + FilenameExt
-		try:
-			shutil.copy2(Proj.OutputFilename, WorkingFilePath) # copy the file with metadata
-		except IOError:
-			Success = False; ProblemReport = "Can'tMakeWorkingFile"
-	if Success:
-		# Step 3. Open the working copy file
-		TagToFind = '</' + info.ProjectRootTag + '>'
-		try:
-			ProjFile = open(WorkingFilePath, 'r+') # open file in update mode
-			# Step 4. Remove and keep tail of working file
-			# find existing final tag </vizop_project>, assuming it's within the final 50 chars of the file
-			ProjFile.seek(-50, 2) # go to 50 chars before the end of the file
+	RecoveryData = MakeRecoveryData(Proj, UpdateData)
+	if RecoveryData is None: return (StartCheckpoint(Proj) is not None), ''
+	# make an <update> tag containing the update data and data for crash recovery, and convert it to bytes
+	UpdateElement = ElementTree.Element(info.UpdateTag)
+	UpdateElement.append(UpdateData)
+	UpdateElement.append(RecoveryData)
+	UpdateBytes = ElementTree.tostring(UpdateElement)
+	Proj.UpdatesSinceCheckpoint += 1
+	Proj.SavedLayout = None # the file will no longer match the layout of its last full save
+	Proj.SaveQueue.Submit(Kind='Update', Task=lambda: WriteUpdateToProjFile(Proj.OutputFilename, UpdateBytes,
+		Compression=Proj.Compression))
+	return True, ''
+
+def MakeRecoveryData(Proj, UpdateData):
+	# return a RecoveryData XML element for an update to Proj (ProjectItem), so that the update can be replayed onto the
+	# project file's full image by project_recovery.ReplayUpdates() after a crash. UpdateData (XML element) names the
+	# changed PHA object in its ID tag, and optionally the changed element in its ComponentHostID tag.
+	# The RecoveryData contains a single Chunk tag: if the element can be serialized on its own, an 'Element' chunk
+	# with the element's tag and the tags of its comments; otherwise, a 'PHAObj' chunk with the whole PHA object.
+	# Return None if the change isn't confined to a PHA object in the full image, or uses a numbering system not in
+	# the image: in that case, only a new full image can record it
+	assert isinstance(Proj, ProjectItem)
+	assert isinstance(UpdateData, ElementTree.Element)
+	if UpdateData.tag != info.FTTag: return None # e.g. new PHA object, Viewport or associated text
+	ThisPHAObjID = UpdateData.findtext(info.IDTag)
+	if ThisPHAObjID not in Proj.RecoveryPHAObjIDs: return None
+	ThisPHAObj = LoadedPHAObj(utilities.ObjectWithID(Objects=Proj.PHAObjs, TargetID=ThisPHAObjID))
+	# numbered objects are stored with the index of their numbering system in the image's head chunk
+	NumberingSystemHash = {}
+	for ThisObj in ThisPHAObj.GetAllObjsWithNumberSystems():
+		NSIndices = [i for (i, ThisNS) in enumerate(Proj.RecoveryNumberingSystems) if ThisObj.Numbering == ThisNS]
+		if not NSIndices: return None
+		NumberingSystemHash[ThisObj] = str(NSIndices[0])
+	RecoveryElement = ElementTree.Element(info.RecoveryDataTag)
+	ElementID = UpdateData.findtext(info.ComponentHostIDTag)
+	Hits = [e for e in getattr(ThisPHAObj, 'WalkOverAllElements', lambda: [])() if e.ID == ElementID] \
+		if ElementID else []
+	if Hits and (ElementID != ThisPHAObjID):
+		Holder = ElementTree.Element(info.ProjectRootTag)
+		CommentHash, Proj.RecoveryMaxCommentID = Hits[0].StoreAllDataInXML(Holder, NumberingSystemHash,
+			Proj.RecoveryMaxCommentID)
+		ChunkElement = ElementTree.SubElement(RecoveryElement, info.ChunkTag,
+			attrib={info.KindTag: 'Element', info.IDTag: ThisPHAObjID, info.ComponentHostIDTag: ElementID})
+		ChunkElement.extend(list(Holder) + CommentElements(CommentHash))
+	else: # the change isn't confined to one element, e.g. elements added or connected
+		ChunkElements, Proj.RecoveryMaxCommentID = MakePHAObjChunkElements(ThisPHAObj,
+			NumberingSystemHash=NumberingSystemHash, MaxCommentIDSoFar=Proj.RecoveryMaxCommentID)
+		ChunkElement = ElementTree.SubElement(RecoveryElement, info.ChunkTag,
+			attrib={info.KindTag: 'PHAObj', info.IDTag: ThisPHAObjID})
+		ChunkElement.extend(ChunkElements)
+	return RecoveryElement
+
+def ResetRecoveryData(Proj):
+	# called when a full image of Proj (ProjectItem) has just been serialized by Proj.GenerateProjectXMLChunks(). Since
+	# updates are replayed onto the full image, record what the next updates need to know about it
+	Proj.RecoveryNumberingSystems = Proj.SerializedNumberingSystems[:]
+	Proj.RecoveryPHAObjIDs = set(p.ID for p in Proj.PHAObjs)
+	Proj.RecoveryMaxCommentID = Proj.SerializedMaxCommentID
+
+def StartRecoverySession(Proj):
+	# mark Proj (ProjectItem) as being saved on the fly to its output file, so that after an unclean shutdown, Vizop
+	# can offer to recover it at startup (see startup_vizop.OfferCrashRecovery())
+	project_recovery.StartSession(SessionFolder(), Proj.OutputFilename)
+
+def EndRecoverySession(Proj):
+	# remove the marker written by StartRecoverySession(), once all of Proj's saves are finished
+	if Proj.OutputFileMade: project_recovery.EndSession(SessionFolder(), Proj.OutputFilename)
+
+def SessionFolder():
+	# return full path (str) of the folder containing session markers for projects being saved on the fly
+	return os.path.join(vizop_misc.get_usr_runtime_files_dir(), info.SessionFolderTail)
+
+def WriteUpdateToProjFile(ProjFilename, UpdateBytes, Compression='none'):
+	# runs on the writer thread. Insert UpdateBytes (bytes; a complete <update> tag) into project file ProjFilename (str)
+	# in place, just before the final root tag. If we are interrupted while writing, the file is left without its final
+	# tag; project_recovery.ReplayUpdates() then ignores the incomplete update and recovers the rest.
+	# Compression (str): the compression of the project file, 'none', 'gzip' or 'lzma'
+	# return Success (bool), ProblemReport (str) = '' if all is well
+	# Check that we can still access project's file for writing
+	if not (vizop_misc.IsReadableFile(ProjFilename) and vizop_misc.IsWritableLocation(os.path.dirname(ProjFilename))):
+		return False, "Can'tAccessProjectFileLocation"
+	return AppendUpdatesToProjFile(ProjFilename, [UpdateBytes], Compression=Compression)
+
+def AppendUpdatesToProjFile(ProjFilename, Updates, Compression='none'):
+	# insert Updates (list of bytes, each a complete <update> tag) just before the final root tag of the project file
+	# ProjFilename (str; full path), keeping anything that comes after the final tag
+	# Compression (str): the compression of the project file, 'none', 'gzip' or 'lzma'
+	# return Success (bool), ProblemReport (str) = '' if all is well
+	assert isinstance(ProjFilename, str)
+	assert isinstance(Updates, list)
+	TagToFind = ('</' + info.ProjectRootTag + '>').encode('UTF-8')
+	try:
+		if project_snapshot.IsSnapshotFilename(ProjFilename): # the updates are appended as a new block
+			UpdateElements = [ElementTree.fromstring(ThisUpdate) for ThisUpdate in Updates]
+			with open(ProjFilename, 'r+b') as ProjFile:
+				if not project_snapshot.AppendToSnapshotFile(ProjFile, UpdateElements):
+					return False, "ProjectFileInvalid"
+				ProjFile.flush()
+				os.fsync(ProjFile.fileno())
+			return True, ''
+		if Compression != 'none': # the final tag is compressed separately, so the updates can be inserted in front of it
+			with open(ProjFilename, 'r+b') as ProjFile:
+				if not project_files.AppendToCompressedProjectFile(ProjFile, b''.join(Updates), Compression):
+					return False, "ProjectFileInvalid"
+				ProjFile.flush()
+				os.fsync(ProjFile.fileno())
+			return True, ''
+		with open(ProjFilename, 'r+b') as ProjFile: # open file in binary update mode, so that we can seek from the end
+			# find existing final tag, assuming it's within the final 50 bytes of the file
+			ProjFile.seek(0, 2)
+			TailStart = max(0, ProjFile.tell() - 50)
+			ProjFile.seek(TailStart)
 			Tail = ProjFile.read() # get file content from seek position to end
-			if TagToFind not in Tail:
-				Success = False; ProblemReport = "ProjectFileInvalid"
-		except IOError: # problem with file access
-			Success = False; ProblemReport = "Can'tReadWorkingFile"
-	if Success:
-		if Task == 'Update': # create an <Update> tag
-			# create an XML element for the SIF
-			UpdateElement = ElementTree.Element(tag=info.UpdateTag)
-			# Step 5. put the update data into the Update element, and write it to file
-			UpdateElement.append(UpdateData)
-			try:
-				ProjFile.seek(Tail.rindex(TagToFind) - len(Tail), 2) # go to start of tail in file
-				# convert XML to string, and write into file
-				ProjFile.write(ElementTree.tostring(UpdateElement))
-				# Step 6. Add final tag (to ensure file is valid XML) + anything originally after it in the project file
-#				ProjFile.write('</' + info.ProjectRootTag + '>') # old version, wrote only the tag itself
-				ProjFile.write(Tail.rindex(TagToFind))
-				# Step 7. Close working file
-				ProjFile.close()
-			except IOError:
-				Success = False; ProblemReport = "Can'tWriteWorkingFile"
-	if Success:
-		# Step 8: delete the original project file, and Step 9: Rename working file to project file
-		try:
-			os.replace(WorkingFilePath, Proj.OutputFilename)
-		except (IOError, OSError):
-			Success = False; ProblemReport = "Can'tOverwriteProjectFile"
+			if TagToFind not in Tail: return False, "ProjectFileInvalid"
+			# go to start of final tag, write the updates, then put back the final tag and anything after it
+			ProjFile.seek(TailStart + Tail.rindex(TagToFind))
+			for ThisUpdate in Updates: ProjFile.write(ThisUpdate)
+			ProjFile.write(Tail[Tail.rindex(TagToFind):])
+			ProjFile.truncate()
+			ProjFile.flush()
+			os.fsync(ProjFile.fileno())
+	except (IOError, OSError): # problem with file access
+		return False, "Can'tWriteWorkingFile"
+	return True, ''
+
+def StartCheckpoint(Proj):
+	# fold the <update> history in Proj's output file into a new full image of the project, written by Proj's writer
+	# thread. The datacore is held up only while a snapshot of the project's chunks is taken (see
+	# SnapshotProjectChunks()); PHA objects not yet unpacked aren't unpacked for it, as their sections are copied from
+	# the file. Serializing the snapshot, writing it and swapping it into place all happen on the writer thread, so the
+	# user can keep editing. Updates saved on fly meanwhile are queued behind the checkpoint, so they are appended to the
+	# new image.
+	# Return the checkpoint's job ID (int), or None if no checkpoint was started
+	assert isinstance(Proj, ProjectItem)
+	if not Proj.OutputFileMade: return None
+	SnapshotStartTime = time.perf_counter()
+	Snapshot = SnapshotProjectChunks(Proj, Proj.OutputFilename) # detached from the live project data
+	Stats = {'StartTime': datetime.datetime.now(), 'UpdatesFolded': Proj.UpdatesSinceCheckpoint,
+		'SnapshotPause': time.perf_counter() - SnapshotStartTime}
+	Proj.UpdatesSinceCheckpoint = 0
+	Proj.SavedLayout = None # the new image won't have the layout of the last full save
+	ResetRecoveryData(Proj)
+	return Proj.SaveQueue.Submit(Kind='Checkpoint', Task=lambda: WriteCheckpoint(Proj, Proj.OutputFilename, Snapshot,
+		Stats, Compression=Proj.Compression))
+
+def WriteCheckpoint(Proj, ProjFilename, Snapshot, Stats, Compression='none'):
+	# runs on the writer thread. Serialize Snapshot (list returned by SnapshotProjectChunks()) as a new full image of
+	# Proj into a temporary file, compressed according to Compression ('none', 'gzip' or 'lzma'), then atomically
+	# replace Proj's output file ProjFilename (str) with it. If the file isn't compressed, write its index too.
+	# Stats (dict): metrics for this checkpoint, already containing StartTime, UpdatesFolded and SnapshotPause (in s).
+	# Adds: Duration (s), OldSize and NewSize (bytes), Success (bool) and ProblemReport (str); then appends Stats to
+	# Proj.CheckpointStats. If ProjFilename is in the binary snapshot format, the new image is written in that format
+	# Return Success (bool), ProblemReport (str)
+	assert isinstance(Proj, ProjectItem)
+	assert isinstance(Snapshot, list)
+	WriteStartTime = time.perf_counter()
+	try: Stats['OldSize'] = os.path.getsize(ProjFilename)
+	except OSError: Stats['OldSize'] = 0
+	if project_snapshot.IsSnapshotFilename(ProjFilename):
+		Success, ProblemReport = WriteProjectSnapshotToFile(ProjFilename, Snapshot,
+			TempFileSuffix=info.CheckpointFileSuffix)
+		return FinishCheckpoint(Proj, ProjFilename, Stats, WriteStartTime, Success,
+			ProblemReport='' if Success else "Can'tWriteCheckpointFile")
+	FilenameHead, FilenameExt = os.path.splitext(ProjFilename) # split off file extension
+	CheckpointFilePath = FilenameHead + info.CheckpointFileSuffix + FilenameExt
+	Layout = project_files.ProjectFileLayout(Filename=ProjFilename)
+	SectionsCopied = []
+	Success = True; ProblemReport = ''
+	try:
+		with open(CheckpointFilePath, 'wb', buffering=info.ProjectFileBufferSize) as CheckpointFile:
+			# the chunks are serialized as they are written, so the whole file is never held in memory
+			project_files.WriteProjectFileContent(CheckpointFile,
+				ReadSectionPieces(GenerateProjectFilePieces(Proj, Snapshot, Layout, SectionsCopied)),
+				Compression=Compression)
+			CheckpointFile.flush()
+			os.fsync(CheckpointFile.fileno()) # make sure the new image is on disk before it replaces the old one
+		project_files.RemoveProjectIndex(ProjFilename) # the index no longer matches the file
+		# swap the new image into place, and point to the copied sections in it, while the datacore isn't reading any
+		# section from the old file
+		with Proj.SectionsLock:
+			os.replace(CheckpointFilePath, ProjFilename)
+			if SectionsCopied and (Compression == 'none'):
+				MoveCopiedSections(Proj, ProjFilename, Layout.IndexEntries, SectionsCopied)
+	except (IOError, OSError):
+		Success = False; ProblemReport = "Can'tWriteCheckpointFile"
+		try: os.remove(CheckpointFilePath) # tidy up; the original output file is untouched
+		except OSError: pass
+	if Success and (Compression == 'none'): project_files.WriteProjectIndex(ProjFilename, Layout.IndexEntries)
+	return FinishCheckpoint(Proj, ProjFilename, Stats, WriteStartTime, Success, ProblemReport)
+
+def FinishCheckpoint(Proj, ProjFilename, Stats, WriteStartTime, Success, ProblemReport):
+	# runs on the writer thread. Complete the Stats (dict) of a checkpoint of Proj into ProjFilename (str) started at
+	# WriteStartTime (from time.perf_counter()), and append them to Proj.CheckpointStats
+	# Return Success (bool), ProblemReport (str)
+	try: Stats['NewSize'] = os.path.getsize(ProjFilename)
+	except OSError: Stats['NewSize'] = 0
+	Stats.update({'Duration': time.perf_counter() - WriteStartTime, 'Success': Success, 'ProblemReport': ProblemReport})
+	Proj.CheckpointStats.append(Stats)
+	print('PR1275 checkpoint finished: ', Stats)
 	return Success, ProblemReport
 
 def GetAllNumberingSystems(Proj):
-	# returns list of lists. Each inner list represents one unique numbering system in the entire project.
-	# Each inner list contains all project objects using that numbering system.
+	# returns NumSystems, a list of all unique numbering systems (NumberingItem instances) in the entire project, and
+	# a list of lists. Each inner list contains all project objects using the numbering system at the same index.
 	# Example: NumberSystem1 is used by Gate1 and Gate2; Numbersystem2 is used by FTEvent1 and FTEvent2.
-	# The returned list will be: [ [Gate1, Gate2] , [FTEvent1, FTEvent2] ]
+	# The returned lists will be: [NumberSystem1, NumberSystem2], [ [Gate1, Gate2] , [FTEvent1, FTEvent2] ]
+	# PHA objects not yet unpacked are skipped, as their sections of the project file refer to numbering systems by
+	# index in the file: the file's numbering systems are therefore listed first, in their original order
 	assert isinstance(Proj, ProjectItem)
-	NumSystems = [] # a list of all unique number systems found
-	NumSystemsUsageLists = [] # list of lists of PHA objects, for return
+	if all(IsUnpacked(p) for p in Proj.PHAObjs): NumSystems = [] # a list of all unique number systems found
+	else: NumSystems = Proj.FileNumberingSystems[:]
+	NumSystemsUsageLists = [[] for ThisNumSystem in NumSystems] # list of lists of PHA objects, for return
 	# iterate over all PHA objects that contain number systems, plus the project itself (to capture e.g. action items)
-	for ThisPHAObj in [Proj] + Proj.PHAObjs:
+	for ThisPHAObj in [Proj] + [p for p in Proj.PHAObjs if IsUnpacked(p)]:
 		for ThisElement in ThisPHAObj.GetAllObjsWithNumberSystems():
 			ThisNumSystem = ThisElement.Numbering
 			# check for a matching number system in NumSystems (can't just use 'in' as they are different objects,
@@ -1291,7 +2158,7 @@ def GetAllNumberingSystems(Proj):
 			if not MatchFound: # no match; add it as a new numbering system
 				NumSystems.append(ThisElement.Numbering)
 				NumSystemsUsageLists.append( [ThisElement] )
-	return NumSystemsUsageLists
+	return NumSystems, NumSystemsUsageLists
 
 def AddAttribsInSubelements(StartEl, DataObj, SubElements):
 	# add subelements to StartEl, whose text is the attrib value in DataObj specified in SubElements
@@ -1486,15 +2353,19 @@ def MakeXMLMessageForDrawViewport(Proj, MessageHead, PHAObj, Viewport, ViewportI
 	# PHAObj: PHAObj to which Viewport belongs, or None if Viewport doesn't have an associated PHAObj
 	# MilestoneID: ID of any milestone in Proj.MilestonesForUndo that should be applied when Viewport is drawn, or None
 	assert isinstance(MessageHead, str)
+	PHAObj = LoadedPHAObj(PHAObj)
 	assert isinstance(PHAObj, core_classes.PHAModelBaseClass) or (PHAObj is None)
 	assert isinstance(Viewport, ViewportShadow)
 	assert isinstance(ViewportID, str)
 	assert isinstance(MilestoneID, str) or (MilestoneID is None)
 	# fetch full redraw data for Viewport from PHA object, or from the Viewport itself if it doesn't have a PHAObj
+	if message_stats.Enabled: StartTime = time.perf_counter()
 	if PHAObj is None:
 		RedrawXMLData = Viewport.MyClass.GetFullRedrawData(Proj=Proj, Viewport=Viewport)
 	else:
 		RedrawXMLData = PHAObj.GetFullRedrawData(Viewport=Viewport, ViewportClass=Viewport.MyClass)
+	if message_stats.Enabled:
+		message_stats.Record('RedrawDataTime', Viewport.MyClass.InternalName, time.perf_counter() - StartTime)
 	# put ID of PHA object, followed by full redraw data, into XML element
 	Reply = vizop_misc.MakeXMLMessage(RootName=MessageHead, RootText=ViewportID,
 		Elements={info.IDTag: getattr(PHAObj, 'ID', '')})
@@ -1637,7 +2508,8 @@ class ViewportShadow(object): # defines objects that represent Viewports in the
 			 HumanName='', XMLRoot=None, DisplDeviceID=None):
 		# ID (str) is the same as the ID of the corresponding "real" Viewport
 		# MyClass (ViewportClasses instance): class of actual Viewport shadowed by this one
-		# D2CSocketNumber and C2DSocketNumber (2 x int): socket numbers assigned in display_utilities.CreateViewport
+		# D2CSocketNumber and C2DSocketNumber (2 x int): route numbers on the Viewport channel, assigned in
+		# display_utilities.CreateViewport
 		# PHAObj: PHA object owning the real Viewport (if any) or None (if Viewport is not owned by a PHA object)
 		# HumanName: HumanName assigned to the real Viewport
 		assert isinstance(Proj, ProjectItem)
@@ -1661,13 +2533,18 @@ class ViewportShadow(object): # defines objects that represent Viewports in the
 			self.RedrawData = MyClass.GetClassAttribsOnInit(XMLRoot=XMLRoot)
 			print('CF3823 grabbed attribs on viewport init: ', MyClass.GetClassAttribsOnInit(XMLRoot=XMLRoot))
 		self.IsOnDisplay = False # whether the Viewport shadow is currently displayed on any display device
+		self.RedrawBase = None # for Viewport classes accepting delta redraw data: (redraw revision, column layout, PHA
+			# object's Revision, external dependencies) of the redraw data last sent to the Viewport, set by the PHA
+			# object's GetFullRedrawData()
 		# set up sockets using socket numbers provided
 		self.C2DSocketREP, self.C2DSocketREPObj, C2DSocketNumberReturned = vizop_misc.SetupNewSocket(SocketType='REP',
-			SocketLabel='C2DREP_' + self.ID,
-			PHAObj=PHAObj, Viewport=self, SocketNo=C2DSocketNumber, BelongsToDatacore=True, AddToRegister=True)
+			SocketLabel=info.ViewportInSocketLabel + '_' + self.ID,
+			PHAObj=PHAObj, Viewport=self, SocketNo=C2DSocketNumber, BelongsToDatacore=True, AddToRegister=True,
+			Multiplexed=True)
 		self.D2CSocketREQ, self.D2CSocketREQObj, D2CSocketNumberReturned = vizop_misc.SetupNewSocket(SocketType='REQ',
 			SocketLabel=info.ViewportOutSocketLabel + '_' + self.ID,
-			PHAObj=PHAObj, Viewport=self, SocketNo=D2CSocketNumber, BelongsToDatacore=True, AddToRegister=True)
+			PHAObj=PHAObj, Viewport=self, SocketNo=D2CSocketNumber, BelongsToDatacore=True, AddToRegister=True,
+			Multiplexed=True)
 		# put the new viewport shadow into the project's list
 		Proj.AllViewportShadows.append(self)
 
@@ -12,9 +12,9 @@ from vizop_misc import get_sys_runtime_files_dir
 gettext.install(info.PROG_SHORT_NAME, os.path.join(get_sys_runtime_files_dir(),'locale'))
 
 # vizop modules required
-import art, undo, projects
-from vizop_misc import RegisterKeyPressHandler, ClearKeyPressRegister, IsReadableFile, IsWritableLocation,\
-	OnAboutRequest, GetFilenameForSave, EnsureFilenameHasExtension
+import art, undo, projects, project_recovery, datacore_worker
+from vizop_misc import RegisterKeyPressHandler, ClearKeyPressRegister, KeyPressHandlerForEvent, IsReadableFile,\
+	IsWritableLocation, OnAboutRequest, GetFilenameForSave, EnsureFilenameHasExtension, zmqContext
 from settings import SettingsManager
 
 # other modules required
@@ -22,8 +22,16 @@ from settings import SettingsManager
 from getpass import getuser # gets currently logged in username (Unix, Windows only)
 from platform import system # gets name of OS; see Beazley p329
 
-KeyPressHash = [] # list of tuples: (keystroke code, handling routines when those keystrokes are detected,
-# dict of args to supply to handler)
+KeyPressHash = {} # keys are key chords (see vizop_misc.KeyChord()), values are tuples: (handling routine when the
+# chord is pressed, dict of args to supply to handler)
+
+def HandleShortcutKey(Event):
+	# invoke the handler registered in KeyPressHash for the key pressed in Event (wx.KeyEvent from EVT_CHAR_HOOK), if any
+	HandlerAndArgs = KeyPressHandlerForEvent(KeyPressHash, Event)
+	if HandlerAndArgs is None: Event.Skip() # not a shortcut; let the key be handled normally
+	else:
+		(Handler, Args) = HandlerAndArgs
+		Handler(**Args)
 
 def InitializeVizop():
 	"""Runs all the initialisation tasks needed for Vizop startup.
@@ -54,6 +62,46 @@ def InitializeVizop():
 	#will query a built-in provider rather than ours
 #	wx.ArtProvider.Insert(art.ArtProvider())
 	wx.ArtProvider.PushBack(art.ArtProvider())
+	# if any project wasn't closed cleanly last time, offer to recover it
+	OfferCrashRecovery()
+
+def OfferCrashRecovery():
+	# find any projects whose sessions ended uncleanly (e.g. Vizop crashed while they were being saved on the fly), and
+	# offer to recover each one by replaying the updates saved on the fly onto its last full image. The recovered
+	# project is written to a new file alongside the original, which is left untouched, and added to the recent
+	# projects list
+	sm = SettingsManager()
+	for ThisProjFilename in project_recovery.UncleanSessions(projects.SessionFolder()):
+		if not IsReadableFile(ThisProjFilename): # file has gone; nothing to recover
+			project_recovery.EndSession(projects.SessionFolder(), ThisProjFilename)
+			continue
+		DialogueBox = wx.MessageDialog(None, _('Vizop was not shut down properly while project %s was open.\n'
+			'Do you want to recover the changes saved since it was last saved in full?') % ThisProjFilename,
+			_('Recover project'), style=wx.YES_NO | wx.ICON_QUESTION)
+		if DialogueBox.ShowModal() == wx.ID_YES:
+			RecoveredProjFilename = project_recovery.RecoveredFilename(ThisProjFilename)
+			wx.BeginBusyCursor()
+			# replay in the datacore worker process, if enabled, so that the display keeps repainting meanwhile
+			Stats = datacore_worker.RunJob('RQ_WK_ReplayUpdates', WhileWaiting=wx.Yield, Context=zmqContext,
+				ProjFilename=ThisProjFilename, RecoveredProjFilename=RecoveredProjFilename)
+			wx.EndBusyCursor()
+			print('SV93 crash recovery stats: ', Stats)
+			if Stats.get('WriteOK', False): # WriteOK is absent if the job failed
+				Message = _('Recovered %d edits in %.1f s. The recovered project is saved as %s') % \
+					(Stats['UpdatesReplayed'], Stats['Duration'], RecoveredProjFilename)
+				if Stats['UpdatesNotReplayable']:
+					Message += '\n' + _('%d edits could not be recovered') % Stats['UpdatesNotReplayable']
+				if Stats['Damaged']:
+					Message += '\n' + _('The end of the project file was damaged, and has been ignored')
+				# add the recovered project to the recent projects list, so that the user can open it easily
+				try: RecentProjList = sm.get_config('RecentProjectsList')
+				except KeyError: RecentProjList = []
+				sm.set_value('RecentProjectsList', RecentProjList + [RecoveredProjFilename])
+			else:
+				Message = _("Sorry, the project couldn't be recovered")
+			wx.MessageBox(Message, _('Recover project'), style=wx.OK)
+		DialogueBox.Destroy()
+		project_recovery.EndSession(projects.SessionFolder(), ThisProjFilename)
 
 
 def GetAvailProjTemplates():
@@ -147,7 +195,7 @@ class NoProjectOpenFrame(wx.Frame):
 		self.sizer1.Add(panel3, 1, wx.EXPAND)
 		self.sizer1.SetItemMinSize(1, (300, 400))
 
-		self.Bind(wx.EVT_IDLE, self.OnIdle)
+		self.Bind(wx.EVT_CHAR_HOOK, HandleShortcutKey) # handle keystrokes for shortcuts
 		# Lay out sizers
 		self.SetMinSize((600,400))
 		self.SetSizer(self.sizer1) # assigns sizer1 to fill Welcome frame
@@ -156,33 +204,6 @@ class NoProjectOpenFrame(wx.Frame):
 		self.Show(True)
 
 
-	def OnIdle(self, Event): # during idle time, handle keystrokes for shortcuts. This procedure is repeated in module datacore
-		global KeyPressHash
-		# initialise storage object used to remember keys pressed last time, for chord detection in correct order
-		if not hasattr(self, 'PrevChordKeys'): self.PrevChordKeys = []
-		KeysDownThisTime = [] # prepare list of key codes that are 'hit' and match any keys in KeyPressHash
-		KeyPressIndexHit = None # which item (index in KeyPressHash) is to be invoked
-		for (HashIndex, (KeyStroke, Handler, Args)) in enumerate(KeyPressHash): # check each keystroke registered in KeyPressHash
-			if type(KeyStroke) is int:
-				if wx.GetKeyState(KeyStroke):
-					KeysDownThisTime.append(KeyStroke)
-					if not (KeyStroke in self.PrevChordKeys):
-						KeyPressIndexHit = HashIndex # KeyStroke has been detected this time, but not last time
-			elif type(KeyStroke) is list: # key chord handling
-				ChordFulfilled = True
-				for k in KeyStroke: # check each key in KeyStroke
-					if wx.GetKeyState(k): KeysDownThisTime.append(k)
-					else: ChordFulfilled = False
-				# check that (1) all keys in KeyStroke are pressed, AND
-				# (2) not all of them were pressed last time (i.e. >=1 of them is newly pressed)
-				if ChordFulfilled and not set(KeyStroke).issubset(set(self.PrevChordKeys)):
-					KeyPressIndexHit = HashIndex # invoke handler if keystroke detected
-		self.PrevChordKeys = KeysDownThisTime # store currently-pressed keys for comparison next time
-		# Must do the line above BEFORE invoking Handler - else KeyStrokes newly defined in Handler may falsely activate
-		if (KeyPressIndexHit is not None):
-			(KeyStroke, Handler, Args) = KeyPressHash[KeyPressIndexHit]
-			Handler(**Args) # invoke handler
-	
 	def WrapUpAfterOpeningProjects(self, ProjFiles, TemplateFiles, RequestToQuit=False, SaveOnFly=True):
 		# after successful opening of project file(s) from welcome frame, perform tidying up
 		# ProjFiles is list of paths of valid project files to be opened or created (str)
@@ -204,7 +225,7 @@ class NoProjectOpenFrame(wx.Frame):
 
 	def DisableKeypresses(self): # temporarily suppress all keypress handlers, to avoid inadvertent behaviour
 		global KeyPressHash
-		self.OldKPR = KeyPressHash[:]
+		self.OldKPR = KeyPressHash.copy()
 		KeyPressHash = ClearKeyPressRegister(KeyPressHash) # to avoid inadvertent behaviour from key presses
 
 
@@ -439,6 +460,7 @@ class SelectTemplateDialogue(wx.Dialog):
 			if RegisterKey: KeyPressHash = RegisterKeyPressHandler(KeyPressHash, Key, ButtonHandler)
 		self.sizer2.Add(panel3)
 		self.sizer2.SetItemMinSize(2, (600,80))
+		self.Bind(wx.EVT_CHAR_HOOK, HandleShortcutKey) # handle keystrokes for shortcuts while the dialogue is shown
 
 		# Lay out sizers
 		self.SetSizer(self.sizer2) # assigns sizer2 to fill dialogue box
@@ -448,7 +470,7 @@ class SelectTemplateDialogue(wx.Dialog):
 
 	def DisableKeypresses(self): # temporarily suppress all keypress handlers, to avoid inadvertent behaviour
 		global KeyPressHash
-		self.OldKPR = KeyPressHash[:]
+		self.OldKPR = KeyPressHash.copy()
 		KeyPressHash = ClearKeyPressRegister(KeyPressHash) # to avoid inadvertent behaviour from key presses
 
 
@@ -158,6 +158,8 @@ def HandleUndoRequest(Proj, SocketFromDatacoreName=None, StoreRedoRecord=True, C
 					SocketFromDatacoreName=SocketFromDatacoreName, ChainWaiting=ChainPaused)
 				if ReturnArgs is None: ReturnArgs = {}
 				UndoneCount += 1
+				# mark the affected PHA object as changed, so that it's included in the next save
+				Proj.MarkPHAObjsChanged(ViewportID=getattr(ThisRec, 'ViewportID', None))
 				# restore project's Edit number
 				if hasattr(ThisRec, 'EditNumber'):
 					Proj.EditNumber = ThisRec.EditNumber
@@ -248,6 +250,7 @@ def HandleRedoRequest(Proj, RedoingSandbox=False, SocketFromDatacoreName=None, R
 				if ReturnArgs is None: ReturnArgs = {}
 				assert isinstance(ReturnArgs, dict)
 				RedoneCount += 1
+				Proj.MarkPHAObjsChanged(ViewportID=getattr(ThisRec, 'ViewportID', None))
 				if len(Proj.RedoList) != RedoListLen:
 					print("UN220 DEBUG MESSAGE: looks like 'Redoing' flag wasn't set in call to AddToUndoList in Redo handler")
 				# update Success flag
@@ -9,12 +9,12 @@ from __future__ import division  # makes a/b yield exact, not truncated, result.
 import wx # provides basic GUI functions
 from wx.lib.mixins.inspection import InspectableApp # InspectableApp for debugging
 # import gettext  # used to translate messages to the user into the local language
-import os, threading
+import os, threading, multiprocessing
 import xml.etree.ElementTree as ElementTree  # XML handling
 
 # other vizop modules required here
 import startup_vizop, settings, projects, controlframe, core_classes, display_utilities, utilities, info, vizop_misc,\
-	faulttree, alarmrat
+	faulttree, alarmrat, datacore_process
 # must import all modules containing class definitions of subclasses of ViewportBaseClass, such as faulttree,
 # even though they don't appear to be referenced in this module. This is to ensure the subclasses get catalogued
 
@@ -242,10 +242,10 @@ def RunCommsThread(): # redundant. Now handled by controlframe's OnIdle()
 	# start polling loop. TODO use vizop_misc.ListenToSockets()
 	KeepLooping = True
 	while KeepLooping:
-		SocketsWaiting = dict(vizop_misc.RegisterSocket.Poller.poll(timeout=500)) # waits indefinitely for sockets if no timeout set
-#		SocketsWaiting = dict(vizop_misc.RegisterSocket.Poller.poll()) # waits indefinitely for sockets if no timeout set
+		SocketsWaiting = dict(vizop_misc.SocketRegister.Poller.poll(timeout=500)) # waits indefinitely for sockets if no timeout set
+#		SocketsWaiting = dict(vizop_misc.SocketRegister.Poller.poll()) # waits indefinitely for sockets if no timeout set
 		if SocketsWaiting:
-			ThisSocketLabel = [s.SocketLabel for s in vizop_misc.RegisterSocket.Register
+			ThisSocketLabel = [s.SocketLabel for s in vizop_misc.SocketRegister
 				if s.Socket in SocketsWaiting]
 		else: ThisSocketLabel = 'No sockets waiting'
 		print("VZ665 SocketsWaiting: ", ThisSocketLabel)
@@ -259,7 +259,7 @@ def RunCommsThread(): # redundant. Now handled by controlframe's OnIdle()
 			# dump any incoming reply for now (may use later)
 			Dump = ControlFrameOutwardSocket.recv()
 		# any incoming message from Viewports? (using getattr() in case CurrentProject is not yet assigned) # %%%
-		ViewportSocketsSendingMessages = [s for s in vizop_misc.RegisterSocket.Register
+		ViewportSocketsSendingMessages = [s for s in vizop_misc.SocketRegister
 			if s.Socket in SocketsWaiting if s.BelongsToDatacore if s.Viewport is not None]
 		print("VZ676 Viewports sending messages: ", ViewportSocketsSendingMessages)
 		# send the message to the corresponding PHA model object
@@ -280,63 +280,102 @@ def LaunchCommsThread(): # redundant
 	CommsThread.setDaemon(daemonic=True)  # to prevent comms thread from blocking Vizop termination
 	CommsThread.start()
 
-# main program
-CheckRuntimeEnvironment()
-app = InspectableApp(0) # make the wx app. Use Ctrl + Alt + I to inspect things. Need this before InitializeVizop()
-StartupProblems = startup_vizop.InitializeVizop() # do some setting up and find any fatal environment problems
-if StartupProblems:
-	print("Unable to run ", info.PROG_SHORT_NAME, ". The following problems were reported:\n", StartupProblems, sep='')
-	exit()
-#setup gettext for translating messages
-# first, find the path in which vizop is running
-# set up the translator. _('foo') means 'get the translation of foo into the language defined in locale'
-# We don't need this here because gettext is set up in module startup_vizop
-# setup_script_path = os.path.dirname(os.path.abspath(sys.argv[0]))
-# t = gettext.translation('setup', os.path.join(setup_script_path, 'locale'), fallback=True)
-# _ = t.gettext
-
-ColourScheme = MakeColourSchemes()  # set up default colour scheme
-OpenProjects = []  # open project objects, in order of opening
-CurrentProject = None # which project is being edited in control frame
-# LaunchCommsThread()  # start thread for handling communication with Viewports
-# set up 2 sockets for communication with local ControlFrame: frame to core (Inward) and core to frame (Outward)
-ControlFrameInwardSocket, CFInSktObj, InwardSocketNumber = vizop_misc.SetupNewSocket(SocketType='REP',
-	SocketLabel=info.ControlFrameInSocketLabel + info.LocalSuffix, BelongsToDatacore=True)
-ControlFrameOutwardSocket, CFOutSktObj, OutwardSocketNumber = vizop_misc.SetupNewSocket(SocketType='REQ',
-	SocketLabel=info.ControlFrameOutSocketLabel + info.LocalSuffix, BelongsToDatacore=True)
-
-# vizop's primary display shows either a welcome frame or a control frame, depending on whether any project is open
-RequestedToQuit = False  # whether user has requested to terminate vizop
-while not RequestedToQuit:
-	if OpenProjects:  # any projects open? if so, display CurrentProject's control frame
-		# TODO need to assign unique ID to controlframe. Maybe from its socket number?
-		ControlFrame = controlframe.ControlFrame(Projects=OpenProjects, ID="1", FirstProject=CurrentProject,
-			ColScheme=ColourScheme, zmqContext=vizop_misc.zmqContext, DatacoreIsLocal=True)
-		app.MainLoop()  # allow ControlFrame's event handlers to control program flow until ControlFrame is destroyed
-		# we assume that ControlFrame will close all projects by itself
-		# get ControlFrame's exit data
-		RequestedToQuit = controlframe.ControlFrameData.Data.get('RequestToQuit', False)
-	else: # no projects open: launch welcome screen
-		WelcomeFrame = startup_vizop.NoProjectOpenFrame(parent=None, ID=-1, title=_("Vizop: Let's get started"),
-			ColourScheme=ColourScheme)
-		app.MainLoop()  # allow WelcomeFrame's event handlers to control program flow until WelcomeFrame is destroyed
-		# get WelcomeFrame's exit data
-		ProjectFilesToOpen = startup_vizop.NoProjectOpenFrameData.Data.get('ProjectFilesToOpen', [])
-		ProjectsToCreateFromTemplates = startup_vizop.NoProjectOpenFrameData.Data.get('TemplateFilesToSpawnFrom', [])
-		RequestedToQuit = startup_vizop.NoProjectOpenFrameData.Data.get('RequestToQuit', True)
-		SaveOnFly = startup_vizop.NoProjectOpenFrameData.Data.get('SaveOnFly', True)
-		if ProjectFilesToOpen:
-			# handle any project open or create requests
-			if ProjectsToCreateFromTemplates:  # any new projects to create?
-				NewlyOpenedProjects, SuccessReport = \
-					projects.CreateProjects(ProjectsToCreateFromTemplates, SaveOnFly, ProjectFilesToOpen)
-			else: # opening existing projects; temporarily setting SaveOnFly to False
-				NewlyOpenedProjects, SuccessReport = projects.OpenProjectFiles(ProjectFilesToOpen, SaveOnFly=False)
-			# TODO: give user feedback based on SuccessReport
-			OpenProjects += NewlyOpenedProjects
-			# set CurrentProject
-			if OpenProjects:
-				CurrentProject = OpenProjects[0]
-			else:
-				CurrentProject = None
-				# do any pre-exit tidying up here; should close xml context
\ No newline at end of file
+# main program. Guarded, so that worker processes started by Vizop (see projects.ParseProjectFilesInParallel())
+# can import this module without starting another instance of Vizop
+if __name__ == '__main__':
+	multiprocessing.freeze_support() # needed for worker processes when Vizop is run as a frozen executable
+	CheckRuntimeEnvironment()
+	app = InspectableApp(0) # make the wx app. Use Ctrl + Alt + I to inspect things. Need this before InitializeVizop()
+	StartupProblems = startup_vizop.InitializeVizop() # do some setting up and find any fatal environment problems
+	if StartupProblems:
+		print("Unable to run ", info.PROG_SHORT_NAME, ". The following problems were reported:\n", StartupProblems, sep='')
+		exit()
+	#setup gettext for translating messages
+	# first, find the path in which vizop is running
+	# set up the translator. _('foo') means 'get the translation of foo into the language defined in locale'
+	# We don't need this here because gettext is set up in module startup_vizop
+	# setup_script_path = os.path.dirname(os.path.abspath(sys.argv[0]))
+	# t = gettext.translation('setup', os.path.join(setup_script_path, 'locale'), fallback=True)
+	# _ = t.gettext
+
+	ColourScheme = MakeColourSchemes()  # set up default colour scheme
+	OpenProjects = []  # open project objects, in order of opening
+	CurrentProject = None # which project is being edited in control frame
+	# LaunchCommsThread()  # start thread for handling communication with Viewports
+	TheDatacoreProcess = None # if the datacore runs in a separate process, its handle (see module datacore_process)
+	if not info.DatacoreInSeparateProcess:
+		# set up 2 sockets for communication with local ControlFrame: frame to core (Inward) and core to frame (Outward)
+		ControlFrameInwardSocket, CFInSktObj, InwardSocketNumber = vizop_misc.SetupNewSocket(SocketType='REP',
+			SocketLabel=info.ControlFrameInSocketLabel + info.LocalSuffix, BelongsToDatacore=True)
+		ControlFrameOutwardSocket, CFOutSktObj, OutwardSocketNumber = vizop_misc.SetupNewSocket(SocketType='REQ',
+			SocketLabel=info.ControlFrameOutSocketLabel + info.LocalSuffix, BelongsToDatacore=True)
+		# set up the datacore end of the channel for communication with all Viewports (the Viewports' end connects to it)
+		vizop_misc.ViewportChannelFor(BelongsToDatacore=True)
+
+	# vizop's primary display shows either a welcome frame or a control frame, depending on whether any project is open
+	RequestedToQuit = False  # whether user has requested to terminate vizop
+	while not RequestedToQuit:
+		if OpenProjects:  # any projects open? if so, display CurrentProject's control frame
+			# TODO need to assign unique ID to controlframe. Maybe from its socket number?
+			ControlFrame = controlframe.ControlFrame(Projects=OpenProjects, ID="1", FirstProject=CurrentProject,
+				ColScheme=ColourScheme, zmqContext=vizop_misc.zmqContext,
+				DatacoreIsLocal=TheDatacoreProcess is None, DatacoreProcess=TheDatacoreProcess)
+			app.MainLoop()  # allow ControlFrame's event handlers to control program flow until ControlFrame is destroyed
+			# we assume that ControlFrame will close all projects by itself
+			if TheDatacoreProcess and not TheDatacoreProcess.IsRunning(): # it was stopped when ControlFrame closed
+				OpenProjects = []
+				TheDatacoreProcess = None
+			# get ControlFrame's exit data
+			RequestedToQuit = controlframe.ControlFrameData.Data.get('RequestToQuit', False)
+		else: # no projects open: launch welcome screen
+			WelcomeFrame = startup_vizop.NoProjectOpenFrame(parent=None, ID=-1, title=_("Vizop: Let's get started"),
+				ColourScheme=ColourScheme)
+			app.MainLoop()  # allow WelcomeFrame's event handlers to control program flow until WelcomeFrame is destroyed
+			# get WelcomeFrame's exit data
+			ProjectFilesToOpen = startup_vizop.NoProjectOpenFrameData.Data.get('ProjectFilesToOpen', [])
+			ProjectsToCreateFromTemplates = startup_vizop.NoProjectOpenFrameData.Data.get('TemplateFilesToSpawnFrom', [])
+			RequestedToQuit = startup_vizop.NoProjectOpenFrameData.Data.get('RequestToQuit', True)
+			SaveOnFly = startup_vizop.NoProjectOpenFrameData.Data.get('SaveOnFly', True)
+			if ProjectFilesToOpen and info.DatacoreInSeparateProcess:
+				# open the projects in a datacore process, and copies of them here for display
+				TheDatacoreProcess = datacore_process.DatacoreProcess(Context=vizop_misc.zmqContext)
+				OpenProgressDialog = wx.ProgressDialog(title=_('Vizop: opening projects'),
+					message=_('Reading project files...'), maximum=100 * len(ProjectFilesToOpen),
+					style=wx.PD_APP_MODAL | wx.PD_AUTO_HIDE)
+				NewlyOpenedProjects, SuccessReport = datacore_process.OpenProjectsInDatacoreProcess(TheDatacoreProcess,
+					ProjectFiles=ProjectsToCreateFromTemplates or ProjectFilesToOpen,
+					UsingTemplates=bool(ProjectsToCreateFromTemplates),
+					SaveOnFly=SaveOnFly if ProjectsToCreateFromTemplates else False,
+					FilesToCreate=ProjectFilesToOpen if ProjectsToCreateFromTemplates else [], ControlFrameID="1",
+					ProgressCallback=lambda FileIndex, Fraction: OpenProgressDialog.Update(
+					min(100 * FileIndex + int(100 * Fraction), 100 * len(ProjectFilesToOpen) - 1)),
+					WhileWaiting=wx.YieldIfNeeded)
+				OpenProgressDialog.Destroy()
+				if not NewlyOpenedProjects: # the datacore process couldn't open them; don't leave it running
+					TheDatacoreProcess.Stop()
+					TheDatacoreProcess = None
+				# TODO: give user feedback based on SuccessReport
+				OpenProjects += NewlyOpenedProjects
+				CurrentProject = OpenProjects[0] if OpenProjects else None
+			elif ProjectFilesToOpen:
+				# handle any project open or create requests
+				if ProjectsToCreateFromTemplates:  # any new projects to create?
+					NewlyOpenedProjects, SuccessReport = \
+						projects.CreateProjects(ProjectsToCreateFromTemplates, SaveOnFly, ProjectFilesToOpen)
+				else: # opening existing projects; temporarily setting SaveOnFly to False
+					# show progress while the files are read; each file takes up an equal part of the progress bar
+					OpenProgressDialog = wx.ProgressDialog(title=_('Vizop: opening projects'),
+						message=_('Reading project files...'), maximum=100 * len(ProjectFilesToOpen),
+						style=wx.PD_APP_MODAL | wx.PD_AUTO_HIDE)
+					NewlyOpenedProjects, SuccessReport = projects.OpenProjectFiles(ProjectFilesToOpen, SaveOnFly=False,
+						ProgressCallback=lambda FileIndex, Fraction: OpenProgressDialog.Update(
+						min(100 * FileIndex + int(100 * Fraction), 100 * len(ProjectFilesToOpen) - 1)))
+					OpenProgressDialog.Destroy()
+				# TODO: give user feedback based on SuccessReport
+				OpenProjects += NewlyOpenedProjects
+				# set CurrentProject
+				if OpenProjects:
+					CurrentProject = OpenProjects[0]
+				else:
+					CurrentProject = None
+					# do any pre-exit tidying up here; should close xml context
\ No newline at end of file
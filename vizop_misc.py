@@ -1,11 +1,11 @@
 # -*- coding: utf-8 -*-
 # This file is part of Vizop. Copyright xSeriCon, 2019
-import os, os.path, re, sys, wx, wx.adv, zmq
+import os, os.path, re, sys, time, collections, itertools, uuid, wx, wx.adv, zmq
 import xml.etree.ElementTree as ElementTree
 
 # Vizop modules needed:
 from settings import SettingsManager
-import info, core_classes
+import info, core_classes, message_codec, message_stats, change_broadcast
 
 """
 The vizop_misc module contains miscellaneous functions used throughout Vizop, including communications socket handling
@@ -36,29 +36,61 @@ def ColourFrac(Col1, Col2, Col2Frac=0.0): # returns colour (tuple) that is a fra
 	# e.g. ColourFrac( (0,0,0), (100,100,100), 0.75 ) returns (75,75,75)
 	return tuple(map(lambda c1, c2: c1 + (c2-c1)*Col2Frac, Col1, Col2))
 
+# keys are key codes of modifier keys that can appear in chords registered with RegisterKeyPressHandler(), values are
+# the corresponding modifier flags returned by wx.KeyEvent.GetModifiers()
+ModifierKeyFlags = {wx.WXK_CONTROL: wx.MOD_CONTROL, wx.WXK_SHIFT: wx.MOD_SHIFT, wx.WXK_ALT: wx.MOD_ALT,
+	wx.WXK_RAW_CONTROL: wx.MOD_RAW_CONTROL}
+
+def KeyChord(KeyCode):
+	# return hashable key (tuple) in keypress table for KeyCode (int, or list of int for a chord such as
+	# [wx.WXK_CONTROL, ord('z')]): (modifier flags (int), key code of the last non-modifier key (int), tuple of key codes
+	# of any other non-modifier keys that must be held down). Letters are converted to upper case, as in key events
+	KeyCodes = KeyCode if isinstance(KeyCode, list) else [KeyCode]
+	assert KeyCodes and all(isinstance(k, int) for k in KeyCodes)
+	Modifiers = 0
+	OtherKeys = []
+	for ThisKeyCode in KeyCodes:
+		if ThisKeyCode in ModifierKeyFlags: Modifiers |= ModifierKeyFlags[ThisKeyCode]
+		else: OtherKeys.append(ord(chr(ThisKeyCode).upper()) if ord('a') <= ThisKeyCode <= ord('z') else ThisKeyCode)
+	if not OtherKeys: # chord consists only of modifiers; treat the last one as the main key
+		return (Modifiers & ~ModifierKeyFlags[KeyCodes[-1]], KeyCodes[-1], ())
+	return (Modifiers, OtherKeys[-1], tuple(OtherKeys[:-1]))
+
 def RegisterKeyPressHandler(KeyPressHash, KeyCode, Handler, Args={}):
 	# put the Handler for keypress KeyCode (int or list) into keypress table KeyPressHash.
 	# Return updated KeyPressHash
-	# KeyCode can also be a list of key codes; Handler will be invoked if all the keys are pressed simultaneously in correct order
+	# KeyCode can also be a list of key codes; Handler will be invoked when the last non-modifier key in the list is
+	# pressed while all the other keys are held down
 	# If KeyCode is already in the table, the previous Handler is overwritten
 	# Args is dict of arguments and values needed by Handler
-	# KeyPressHash is list of tuples, rather than dict, because dict doesn't allow lists as keys
-	ExistingKeyCodes = [k for (k, h, a) in KeyPressHash]
-	if KeyCode in ExistingKeyCodes: # if KeyCode already registered, replace it
-		KeyPressHash[ExistingKeyCodes.index(KeyCode)] = (KeyCode, Handler, Args.copy())
-	else: # KeyCode not registered: add new item to KeyPressHash
-		KeyPressHash.append( (KeyCode, Handler, Args.copy()) )
+	# KeyPressHash is dict: keys are chords as returned by KeyChord(), values are (Handler, Args)
+	KeyPressHash[KeyChord(KeyCode)] = (Handler, Args.copy())
 	return KeyPressHash
 
 def UnregisterKeyPressHandler(KeyPressHash, KeyCode):
 	# remove keypress KeyCode (int or list) from keypress table KeyPressHash, if found. Return updated KeyPressHash table
-	ExistingKeyCodes = [k for (k, h, a) in KeyPressHash]
-	if KeyCode in ExistingKeyCodes: # is KeyCode in keypress hash table?
-		KeyPressHash.pop(ExistingKeyCodes.index(KeyCode)) # remove the entry from hash table
+	KeyPressHash.pop(KeyChord(KeyCode), None)
 	return KeyPressHash
 
 def ClearKeyPressRegister(KeyPressHash): # clear all existing keypress handler records
-	return []
+	return {}
+
+def KeyPressHandlerForEvent(KeyPressHash, Event):
+	# find the handler in keypress table KeyPressHash for the key pressed in Event (wx.KeyEvent, from EVT_CHAR_HOOK).
+	# Return (Handler, Args) or None if the key pressed isn't a registered shortcut.
+	# Keys without modifiers aren't treated as shortcuts while a text entry widget has focus, so that typing isn't
+	# intercepted
+	Modifiers = Event.GetModifiers()
+	if not (Modifiers & ~wx.MOD_SHIFT) and isinstance(wx.Window.FindFocus(), (wx.TextCtrl, wx.ComboBox)):
+		return None
+	KeyCode = Event.GetKeyCode()
+	HandlerAndArgs = KeyPressHash.get((Modifiers, KeyCode, ()))
+	if HandlerAndArgs is None: # look for chords needing other keys held down; these are rare
+		for ((ThisModifiers, ThisKeyCode, OtherKeys), ThisHandlerAndArgs) in KeyPressHash.items():
+			if (ThisModifiers, ThisKeyCode) == (Modifiers, KeyCode) and OtherKeys and \
+					all(wx.GetKeyState(k) for k in OtherKeys):
+				HandlerAndArgs = ThisHandlerAndArgs
+	return HandlerAndArgs
 
 def IsReadableFile(filename):
 	"""
@@ -179,15 +211,27 @@ def EnsureFilenameHasExtension(Filename='', Extension='', Separator='.'):
 	if not (Filename[-len(TargetExtension):] == TargetExtension): Filename += TargetExtension
 	return Filename
 
-def SendRequest(Socket=None, Command='RQ_Null', FetchReply=False, XMLRoot=None, **Args):
+RequestIDPrefix = uuid.uuid4().hex[:8] + '-' # start of correlation IDs of requests sent by this Vizop instance, so
+	# that they don't clash with those from a remote datacore or display
+RequestSerials = itertools.count(1)
+
+def NewRequestID():
+	# return a new correlation ID (str) for a request, unique among requests sent by any Vizop instance
+	return RequestIDPrefix + str(next(RequestSerials))
+
+def SendRequest(Socket=None, Command='RQ_Null', FetchReply=False, XMLRoot=None, RequestID=None, **Args):
 	# make an XML request string and send it to datacore.
 	# This is the primary means of communication between controlframe and datacore.
 	# Socket (a zmq socket instance): socket to use for sending message (required)
 	# Command (str): the basic command string, usually beginning with RQ_. Ignored if XMLRoot is supplied
 	# FetchReply (bool): If True, SendRequest will wait for reply to command and return reply received
 	# XMLRoot (XML tree): if supplied, this is sent as the body of the command. If None, take from Args
+	# RequestID (str or None): correlation ID to send with the request, or None to use a new one. The ID is put in the
+	#	root element's RequestIDAttribName attrib, and ListenToSocket() copies it into the reply, so that the reply can
+	#	be matched to the request even when several requests are in flight (see SendRequestAsync())
 	# Args (dict): keywords are data attrib names (str), values are data values (str, or list of str).
 	# 	No compulsory Args. Ignored if XMLRoot supplied
+	# Return the reply (bytes) if FetchReply is True, else the correlation ID (str)
 	if __debug__ == 1: # skip the following checking code if running in Optimized mode
 		assert Socket is not None
 		assert type(Command) is str, "VM1142 SendRequest: oops: requested Command is not a string"
@@ -216,32 +260,138 @@ def SendRequest(Socket=None, Command='RQ_Null', FetchReply=False, XMLRoot=None,
 				NewElement.text = ThisValue # Can't put this into preceding line as text= arg; it creates a separate attrib in XML tag
 	else: # use XMLRoot supplied
 		RootElement = XMLRoot
-	# convert the XML tree to a string
-	XMLString = ElementTree.tostring(RootElement, encoding='UTF-8')
-	# submit the string via zmq
+	# encode the XML tree and submit it via zmq
 #	# next line is for debugging only
-#	ThisSocketNo, ThisSocketLabel =  [(s.SocketNo, s.SocketLabel) for s in RegisterSocket.Register if s.Socket == Socket][0]
+#	ThisSocketNo, ThisSocketLabel =  [(s.SocketNo, s.SocketLabel) for s in SocketRegister if s.Socket == Socket][0]
 #	print('VM209 sending request on socket: ', ThisSocketNo, ThisSocketLabel)
-	Socket.send(XMLString, copy=True)
-	if FetchReply: # this path not currently used?
-		ReplyReceived = None
-		while ReplyReceived is None:
-			ReplyReceived = ListenToSocket(Socket=Socket, Wait=True, SendReply2=False)
-		return ReplyReceived
-	else: return None # don't wait, exit
+	if RequestID is None: RequestID = NewRequestID()
+	RootElement.set(info.RequestIDAttribName, RequestID)
+	SendMessage(Socket, RootElement)
+	if FetchReply: return WaitForReply(Socket=Socket, RequestID=RequestID)
+	else: return RequestID # don't wait, exit
 
 def SendReply(Socket=None, Reply=None):
 	# send reply on Socket (a REP-type socket). Reply is an XML tree object
 	assert Socket is not None
 	assert Reply is not None
-	Socket.send(ElementTree.tostring(Reply, encoding='UTF-8'))
+	SendMessage(Socket, Reply)
+
+def SendMessage(Socket, XMLRoot):
+	# encode XML tree with root element XMLRoot using the codec for Socket (a zmq socket or ChannelEndpoint), and send it
+	# on Socket. Large messages are sent without copying. While message statistics are being collected, the message
+	# is stamped with the time it's sent, and its size is recorded
+	if message_stats.Enabled: XMLRoot.set(info.SendTimeAttribName, repr(time.time()))
+	Message = message_codec.EncodeMessage(XMLRoot, Codec=getattr(Socket, 'Codec', 'XML'))
+	if message_stats.Enabled: message_stats.Record('MessageSize', XMLRoot.tag, len(Message))
+	Socket.send(Message, copy=(len(Message) < info.ZeroCopyMinSize))
 
-def FetchReply(Socket=None):
-	# get reply from socket. Needs to be called after a SendRequest message has been processed, because
-	# REQ/REP sockets must be used in a send() - recv() sequence. Currently not used.
-	Reply = SocketToUse.recv() # get reply message
-	print("VM1247 FetchReply: received reply from DataCore: '%s'" % Reply)
-	return Reply
+def ReceiveMessage(Socket):
+	# return the next message (bytes) received on Socket (a zmq socket or ChannelEndpoint), waiting for one if needed.
+	# Messages in a codec accepted only on in-process channels (see message_codec.InprocOnlyCodecs) are rejected unless
+	# they came from the Viewport channel within this process; None is returned instead
+	Message = Socket.recv()
+	if (message_codec.CodecOfMessage(Message) in message_codec.InprocOnlyCodecs) and \
+			not (isinstance(Socket, ChannelEndpoint) and Socket.Channel.Inproc):
+		print('VM1251 rejected %s message received on a socket outside the in-process Viewport channel' %
+			message_codec.CodecOfMessage(Message))
+		return None
+	return Message
+
+def DecodeMessage(MessageReceived):
+	# return root element of a new XML tree decoded from MessageReceived (bytes), as received on any socket by
+	# ReceiveMessage() (so any message in an in-process-only codec is known to have come from the Viewport channel)
+	return message_codec.DecodeMessage(MessageReceived, Inproc=True)
+
+def DecodeMessageRoot(MessageReceived):
+	# return root element (with attribs, but no text or children) of message MessageReceived (bytes), as for
+	# DecodeMessage(). Used to read the tag and correlation ID without decoding the whole message
+	return message_codec.DecodeRoot(MessageReceived, Inproc=True)
+
+def WaitForReply(Socket=None, RequestID=None):
+	# wait for a reply on Socket (a zmq socket or ChannelEndpoint), and return it (bytes). Needs to be called after a
+	# request has been sent on Socket. The GUI is blocked until the reply arrives, so consider SendRequestAsync() instead.
+	# (This replaces FetchReply(), which referred to an undefined socket, and couldn't be reached from SendRequest()
+	# as its arg FetchReply hid it)
+	# RequestID (str or None): correlation ID of the request. If supplied, replies to other requests arriving first are
+	#	passed to their futures (see ResolveReply()); any other messages are discarded
+	assert Socket is not None
+	while True:
+		Reply = ReceiveMessage(Socket) # get reply message
+		if Reply is None: continue # rejected
+		if RequestID is None: return Reply
+		if DecodeMessageRoot(Reply).get(info.RequestIDAttribName) == RequestID: return Reply
+		ReplyXML = DecodeMessage(Reply)
+		if not ResolveReply(ReplyXML):
+			print("VM1247 WaitForReply: discarded unexpected message while waiting for reply: '%s'" % ReplyXML.tag)
+
+class ReplyFuture(object): # the reply to a request sent with SendRequestAsync(), which may not have arrived yet
+
+	def __init__(self, RequestID, Callback=None, Timeout=info.AsyncReplyTimeout):
+		# RequestID (str): correlation ID of the request
+		# Callback (callable or None): called with arg ReplyXML (XML root element of the reply) when the reply arrives
+		# Timeout (int or float): time (s) after sending when the reply is given up; see ExpirePendingReplies()
+		object.__init__(self)
+		assert isinstance(RequestID, str)
+		self.RequestID = RequestID
+		self.Reply = None # root element of the reply XML tree, when received
+		self.Callbacks = [] if Callback is None else [Callback]
+		self.SendTime = time.perf_counter() # when the request was sent (s)
+		self.Deadline = self.SendTime + Timeout # time (s) after which the reply is given up
+
+	def Done(self): # return bool: whether the reply has arrived
+		return self.Reply is not None
+
+	def AddCallback(self, Callback):
+		# arrange for Callback to be called with arg ReplyXML when the reply arrives; call it now if it has already arrived
+		if self.Done(): Callback(ReplyXML=self.Reply)
+		else: self.Callbacks.append(Callback)
+
+	def SetReply(self, ReplyXML):
+		# store reply ReplyXML (XML root element) and call the callbacks
+		self.Reply = ReplyXML
+		for ThisCallback in self.Callbacks: ThisCallback(ReplyXML=ReplyXML)
+		self.Callbacks = []
+
+PendingReplies = {} # requests sent with SendRequestAsync() awaiting reply: keys are correlation IDs (str), values are
+	# ReplyFuture instances
+ExpiredRequestIDs = collections.deque(maxlen=100) # correlation IDs of the most recent requests given up by
+	# ExpirePendingReplies(), so that any late replies to them can be recognised and discarded
+
+def SendRequestAsync(Socket=None, Command='RQ_Null', XMLRoot=None, Callback=None, **Args):
+	# send a request as for SendRequest(), without waiting for the reply. Several requests can be in flight on the same
+	# socket, e.g. to prefetch data for several PHA models; the datacore handles them in turn. The reply is routed to
+	# the returned ReplyFuture by whichever message handler receives it, via ResolveReply()
+	# Only Viewport sockets (ChannelEndpoint instances) allow several requests in flight; zmq REQ sockets still need
+	# each reply to be received before the next request is sent
+	# Callback (callable or None): called with arg ReplyXML when the reply arrives
+	ThisFuture = ReplyFuture(RequestID=NewRequestID(), Callback=Callback)
+	PendingReplies[ThisFuture.RequestID] = ThisFuture
+	SendRequest(Socket=Socket, Command=Command, XMLRoot=XMLRoot, RequestID=ThisFuture.RequestID, **Args)
+	return ThisFuture
+
+def ResolveReply(ReplyXML):
+	# if ReplyXML (XML root element) is the reply to a request sent with SendRequestAsync(), pass it to the request's
+	# future and return True; else return False
+	ThisRequestID = ReplyXML.get(info.RequestIDAttribName)
+	ThisFuture = PendingReplies.pop(ThisRequestID, None)
+	if ThisFuture is None:
+		if (ThisRequestID is None) or (ThisRequestID not in ExpiredRequestIDs): return False
+		print("VM1262 discarded reply arriving after its request was given up: '%s'" % ReplyXML.tag)
+		ExpiredRequestIDs.remove(ThisRequestID)
+		return True
+	ThisFuture.SetReply(ReplyXML)
+	return True
+
+def ExpirePendingReplies():
+	# give up waiting for replies to requests sent with SendRequestAsync() that are past their deadline, e.g. because
+	# the datacore or the Viewport's socket has gone away. Their callbacks are called with a 'Fail' reply, so that the
+	# requester isn't left waiting. Called by MessagePump on each cycle
+	if not PendingReplies: return
+	Now = time.perf_counter()
+	for ThisFuture in [f for f in PendingReplies.values() if f.Deadline < Now]:
+		del PendingReplies[ThisFuture.RequestID]
+		ExpiredRequestIDs.append(ThisFuture.RequestID)
+		ThisFuture.SetReply(MakeXMLMessage(RootName='Fail', RootText='ReplyTimedOut'))
 
 class SocketInRegister(object):
 	# items are zmq sockets with associated data needed by other modules
@@ -258,8 +408,263 @@ class SocketInRegister(object):
 		self.PHAObj = PHAObj # PHA object to which Viewport belongs
 		self.BelongsToDatacore = BelongsToDatacore # whether socket is at datacore side of the pair
 
-# if we decide to write a routine to get the SocketInRegister corresponding to a given zmq Socket, get code from
-# RunCommsThread() in datacore
+class ViewportChannel(object): # a single zmq connection carrying messages between datacore and all Viewports in a
+	# Vizop instance, instead of a REQ/REP socket pair per Viewport on its own TCP port. The datacore end is a ROUTER
+	# socket, and each Vizop instance's display end is a DEALER socket. Each pair of "sockets" that used to connect a
+	# Viewport with its shadow is now a pair of ChannelEndpoint instances, one at each end, sharing a route number.
+	# Message frames are [route, message] at the display end, and [peer identity, route, message] at the datacore end.
+	# Messages arriving for a route with no endpoint (e.g. a reply to a Viewport already destroyed) are discarded.
+	# There is at most 1 instance for each end in a Vizop instance; get it with ViewportChannelFor()
+
+	def __init__(self, BelongsToDatacore, Address=info.ViewportChannelAddress):
+		# BelongsToDatacore (bool): whether this is the datacore end of the channel
+		# Address (str): zmq address to bind (datacore end) or connect to (display end). At the datacore end, a TCP
+		#	address ending in ':*' is bound to a free port; the address actually bound is then in self.Address
+		object.__init__(self)
+		assert isinstance(BelongsToDatacore, bool)
+		assert isinstance(Address, str)
+		self.BelongsToDatacore = BelongsToDatacore
+		self.Socket = zmqContext.socket(zmq.ROUTER if BelongsToDatacore else zmq.DEALER)
+		if BelongsToDatacore and Address.endswith(':*'):
+			Address = '%s:%d' % (Address[:-2], self.Socket.bind_to_random_port(Address[:-2]))
+		elif BelongsToDatacore: self.Socket.bind(Address)
+		else: self.Socket.connect(Address)
+		self.Address = Address
+		self.SetCodec()
+		self.Endpoints = {} # keys are routes (bytes), values are ChannelEndpoint instances
+		self.EndpointsWaiting = set() # ChannelEndpoint instances with messages in their inbox
+		self.PeerOfRoute = {} # datacore end only: keys are routes, values are identities (bytes) of the display end
+			# owning the route, learnt from the first message received on the route
+		self.Stats = {'Sent': 0, 'Received': 0, 'Discarded': 0}
+		SocketRegister.Poller.register(self.Socket, zmq.POLLIN)
+
+	def SetCodec(self):
+		# set the codec for messages sent on this channel: info.ViewportChannelCodec, unless it's accepted only
+		# in-process (see message_codec.InprocOnlyCodecs) and the channel goes to another process, e.g. a datacore process
+		self.Inproc = self.Address.startswith('inproc://')
+		self.Codec = info.ViewportChannelCodec if self.Inproc or \
+			(info.ViewportChannelCodec not in message_codec.InprocOnlyCodecs) else 'XML'
+
+	def Reconnect(self, Address):
+		# display end only: connect to the datacore end at Address (str) instead of the current one, e.g. after the
+		# datacore process was restarted, and announce the routes of any endpoints still open
+		assert not self.BelongsToDatacore
+		assert isinstance(Address, str)
+		self.Socket.disconnect(self.Address)
+		self.Address = Address
+		self.Socket.connect(Address)
+		self.SetCodec()
+		for ThisRoute in self.Endpoints: self.Socket.send_multipart([ThisRoute, b''])
+
+	def AddEndpoint(self, Route):
+		# make and return a new ChannelEndpoint for Route (int). At the display end, announce the route to the datacore end
+		# with an empty message, so that the datacore end knows where to send messages on this route
+		assert isinstance(Route, int)
+		NewEndpoint = ChannelEndpoint(Channel=self, Route=str(Route).encode('ascii'))
+		self.Endpoints[NewEndpoint.Route] = NewEndpoint
+		if not self.BelongsToDatacore: self.Socket.send_multipart([NewEndpoint.Route, b''])
+		return NewEndpoint
+
+	def RemoveEndpoint(self, Endpoint):
+		# remove Endpoint (ChannelEndpoint instance) from this channel, discarding any messages in its inbox
+		if self.Endpoints.get(Endpoint.Route) is Endpoint: del self.Endpoints[Endpoint.Route]
+		self.EndpointsWaiting.discard(Endpoint)
+		self.PeerOfRoute.pop(Endpoint.Route, None)
+
+	def Send(self, Endpoint, Message):
+		# send Message (bytes) from Endpoint (ChannelEndpoint instance) to the endpoint at the other end of its route
+		if self.BelongsToDatacore:
+			if Endpoint.Route not in self.PeerOfRoute: self.Drain() # route announcement may not have been read yet
+			Peer = self.PeerOfRoute.get(Endpoint.Route)
+			if Peer is None:
+				print("VM1265 Oops: no Viewport connected on route %s; message discarded" % Endpoint.Route.decode('ascii'))
+				self.Stats['Discarded'] += 1
+				return
+			self.Socket.send_multipart([Peer, Endpoint.Route, Message], copy=True)
+		else: self.Socket.send_multipart([Endpoint.Route, Message], copy=True)
+		self.Stats['Sent'] += 1
+
+	def Drain(self):
+		# read all messages waiting on the channel's socket into the inboxes of their endpoints, without waiting
+		while True:
+			try: Frames = self.Socket.recv_multipart(flags=zmq.NOBLOCK)
+			except zmq.Again: return
+			if self.BelongsToDatacore:
+				Peer, Route, Message = Frames
+				self.PeerOfRoute.setdefault(Route, Peer)
+				if not Message: continue # route announcement
+			else: Route, Message = Frames
+			self.Stats['Received'] += 1
+			ThisEndpoint = self.Endpoints.get(Route)
+			if ThisEndpoint is None: self.Stats['Discarded'] += 1
+			else:
+				ThisEndpoint.Inbox.append(Message)
+				self.EndpointsWaiting.add(ThisEndpoint)
+
+class ChannelEndpoint(object): # one end of a Viewport's virtual socket pair, carried on a ViewportChannel. It stands
+	# in for the zmq socket it replaces, supporting send(), recv() and close() as used elsewhere in Vizop
+
+	def __init__(self, Channel, Route):
+		object.__init__(self)
+		assert isinstance(Channel, ViewportChannel)
+		assert isinstance(Route, bytes)
+		self.Channel = Channel
+		self.Route = Route
+		self.Inbox = collections.deque() # messages (bytes) received and not yet read
+		self.closed = False # named as in zmq sockets
+
+	@property
+	def Codec(self): return self.Channel.Codec # name of codec for encoding messages sent (see message_codec module)
+
+	def send(self, Message, copy=True):
+		assert not self.closed
+		self.Channel.Send(self, Message)
+
+	def recv(self):
+		# return the oldest message received (bytes), waiting for one if none is available yet
+		assert not self.closed
+		while not self.Inbox:
+			self.Channel.Drain()
+			if not self.Inbox: self.Channel.Socket.poll(timeout=1)
+		Message = self.Inbox.popleft()
+		if not self.Inbox: self.Channel.EndpointsWaiting.discard(self)
+		return Message
+
+	def close(self, linger=0):
+		if not self.closed:
+			self.Channel.RemoveEndpoint(self)
+			self.closed = True
+
+ViewportChannels = {} # keys are True for the datacore end, False for the display end; values are ViewportChannel instances
+
+def ViewportChannelFor(BelongsToDatacore, Address=None):
+	# return the ViewportChannel for the datacore end (if BelongsToDatacore is True) or display end, making it if needed
+	# Address (str or None): address for the channel, if not info.ViewportChannelAddress, e.g. when the datacore is in
+	# another process (see datacore_process module). If the display end is already connected elsewhere, it's reconnected
+	assert isinstance(BelongsToDatacore, bool)
+	assert isinstance(Address, str) or (Address is None)
+	if BelongsToDatacore not in ViewportChannels:
+		ViewportChannels[BelongsToDatacore] = ViewportChannel(BelongsToDatacore=BelongsToDatacore,
+			Address=Address or info.ViewportChannelAddress)
+	elif (Address is not None) and not BelongsToDatacore and (ViewportChannels[False].Address != Address):
+		ViewportChannels[False].Reconnect(Address)
+	return ViewportChannels[BelongsToDatacore]
+
+ChangeBroadcastEnds = {} # keys are True for the datacore end, False for the display end; values are
+	# change_broadcast.ChangePublisher and ChangeSubscriber instances respectively
+
+def ChangeBroadcastEnd(BelongsToDatacore, Address=None):
+	# return the ChangePublisher (if BelongsToDatacore is True) or ChangeSubscriber of the change broadcast channel in
+	# this Vizop instance, making it if needed. The subscriber is polled with the sockets in the register
+	# Address (str or None): display end only: ExternalAddress of a publisher in another process (see datacore_process
+	# module) to subscribe to, instead of the publisher in this process. If the subscriber exists already but is
+	# subscribed elsewhere, a new subscriber is made
+	assert isinstance(BelongsToDatacore, bool)
+	assert (Address is None) or ((not BelongsToDatacore) and isinstance(Address, str))
+	OldSubscriber = ChangeBroadcastEnds.get(False)
+	if (Address is not None) and (OldSubscriber is not None) and (OldSubscriber.Address != Address):
+		# the publisher has moved, e.g. the datacore process was restarted
+		SocketRegister.Poller.unregister(OldSubscriber.Socket)
+		OldSubscriber.close()
+		del ChangeBroadcastEnds[False]
+		SocketRegister.ChangeCount += 1 # so that the message pump's handler for the old subscriber is dropped
+	if BelongsToDatacore not in ChangeBroadcastEnds:
+		if BelongsToDatacore: ChangeBroadcastEnds[True] = change_broadcast.ChangePublisher(Context=zmqContext)
+		else:
+			if Address is None:
+				ChangeBroadcastEnd(BelongsToDatacore=True) # the publisher must be bound before connecting to inproc
+			ChangeBroadcastEnds[False] = change_broadcast.ChangeSubscriber(Context=zmqContext,
+				Address=Address or info.ChangeBroadcastAddress)
+			SocketRegister.Poller.register(ChangeBroadcastEnds[False].Socket, zmq.POLLIN)
+	return ChangeBroadcastEnds[BelongsToDatacore]
+
+class SocketRegistry(object): # Vizop's register of zmq sockets (SocketInRegister instances), with indexes for
+	# finding sockets by label, by socket number, by Viewport, and by direction and suffix without scanning the register.
+	# Socket labels are of the form <direction>_<suffix>, e.g. C2DREP_12; the direction is the part before the first '_'.
+	# There is only 1 instance, SocketRegister, for the whole of Vizop
+
+	def __init__(self):
+		object.__init__(self)
+		self.Sockets = [] # SocketInRegister instances, in the order registered
+		self.ByLabel = {} # keys are socket labels, values are lists of SocketInRegister instances
+		self.BySocketNo = {} # keys are socket numbers (int), values are lists of SocketInRegister instances
+		self.ByViewport = {} # keys are Viewports (actual Viewports or Viewport shadows), values are lists of
+			# SocketInRegister instances
+		self.ByDirection = {} # keys are directions (str), values are lists of SocketInRegister instances
+		self.ByDirectionAndSuffix = {} # keys are (direction, suffix) tuples of str, values are SocketInRegister instances
+		self.Poller = zmq.Poller() # for checking all sockets in the register, and any registered with zmq only
+		self.ChangeCount = 0 # incremented whenever sockets are added or removed, so that users of the register can
+			# tell when to rebuild anything they derived from it
+
+	def __iter__(self):
+		return iter(self.Sockets)
+
+	def __len__(self):
+		return len(self.Sockets)
+
+	def Add(self, SocketObj):
+		# add SocketObj (SocketInRegister instance) to the register, and register its socket with the poller
+		assert isinstance(SocketObj, SocketInRegister)
+		self.Sockets.append(SocketObj)
+		self.ByLabel.setdefault(SocketObj.SocketLabel, []).append(SocketObj)
+		self.BySocketNo.setdefault(SocketObj.SocketNo, []).append(SocketObj)
+		if SocketObj.Viewport is not None: self.ByViewport.setdefault(SocketObj.Viewport, []).append(SocketObj)
+		self.ByDirection.setdefault(DirectionAndSuffix(SocketObj.SocketLabel)[0], []).append(SocketObj)
+		self.ByDirectionAndSuffix[DirectionAndSuffix(SocketObj.SocketLabel)] = SocketObj
+		# channel endpoints aren't polled themselves; their channel's socket is polled instead
+		if not isinstance(SocketObj.Socket, ChannelEndpoint): self.Poller.register(SocketObj.Socket, zmq.POLLIN)
+		self.ChangeCount += 1
+
+	def Unregister(self, SocketObj, Close=True):
+		# remove SocketObj (SocketInRegister instance) from the register and the poller.
+		# Close (bool): whether to close its socket too, discarding any unsent messages
+		assert isinstance(SocketObj, SocketInRegister)
+		assert isinstance(Close, bool)
+		if SocketObj not in self.ByLabel.get(SocketObj.SocketLabel, []): return # not in the register
+		self.Sockets.remove(SocketObj)
+		for (ThisIndex, ThisKey) in [(self.ByLabel, SocketObj.SocketLabel), (self.BySocketNo, SocketObj.SocketNo),
+				(self.ByViewport, SocketObj.Viewport), (self.ByDirection, DirectionAndSuffix(SocketObj.SocketLabel)[0])]:
+			if SocketObj in ThisIndex.get(ThisKey, []):
+				ThisIndex[ThisKey].remove(SocketObj)
+				if not ThisIndex[ThisKey]: del ThisIndex[ThisKey]
+		if self.ByDirectionAndSuffix.get(DirectionAndSuffix(SocketObj.SocketLabel)) is SocketObj:
+			del self.ByDirectionAndSuffix[DirectionAndSuffix(SocketObj.SocketLabel)]
+		if not isinstance(SocketObj.Socket, ChannelEndpoint):
+			try: self.Poller.unregister(SocketObj.Socket)
+			except KeyError: pass # wasn't registered with the poller
+		if Close: SocketObj.Socket.close(linger=0)
+		self.ChangeCount += 1
+
+	def UnregisterViewport(self, Viewport, Close=True):
+		# remove all sockets belonging to Viewport (actual Viewport or Viewport shadow) from the register, as in Unregister()
+		for ThisSocketObj in self.ByViewport.get(Viewport, [])[:]: self.Unregister(ThisSocketObj, Close=Close)
+
+	def WithLabel(self, TargetLabel):
+		# return list of SocketInRegister instances with SocketLabel == TargetLabel (str)
+		return self.ByLabel.get(TargetLabel, [])
+
+	def WithSocketNo(self, TargetSocketNo):
+		# return list of SocketInRegister instances with SocketNo == TargetSocketNo (int), in the order registered
+		return self.BySocketNo.get(TargetSocketNo, [])
+
+	def WithDirection(self, Direction):
+		# return list of SocketInRegister instances whose label has direction Direction (str), in the order registered
+		return self.ByDirection.get(Direction, [])
+
+	def WithDirectionAndSuffix(self, Direction, Suffix):
+		# return SocketInRegister instance whose label has direction Direction and suffix Suffix (both str), or None
+		return self.ByDirectionAndSuffix.get( (Direction, Suffix), None)
+
+	def ForViewport(self, Viewport):
+		# return list of SocketInRegister instances belonging to Viewport (actual Viewport or Viewport shadow)
+		return self.ByViewport.get(Viewport, [])
+
+def DirectionAndSuffix(SocketLabel):
+	# return (direction, suffix) parts of SocketLabel (str), split at the first '_'. Suffix is '' if there is no '_'
+	Direction, Underscore, Suffix = SocketLabel.partition('_')
+	return Direction, Suffix
+
+SocketRegister = SocketRegistry()
 
 def GetNewSocketNumber():
 	# return next available zmq socket number as str
@@ -272,6 +677,12 @@ def GetNewSocketNumber():
 		GetNewSocketNumber.LastSocketNumber = FirstSocketNumber
 	return GetNewSocketNumber.LastSocketNumber
 
+def GetNewRouteNumber():
+	# return next available route number (int) for a pair of ChannelEndpoints. Unlike socket numbers, route numbers
+	# don't use up TCP ports, so there is no upper limit
+	GetNewRouteNumber.LastRouteNumber = getattr(GetNewRouteNumber, 'LastRouteNumber', 0) + 1
+	return GetNewRouteNumber.LastRouteNumber
+
 def RegisterSocket(NewSocket, SocketNo, SocketLabel, Viewport=None, PHAObj=None, BelongsToDatacore=True,
 		AddToVizopRegister=True):
 	# add NewSocket (a zmq socket instance) to socket register. Create and return its instance of SocketInRegister
@@ -279,27 +690,24 @@ def RegisterSocket(NewSocket, SocketNo, SocketLabel, Viewport=None, PHAObj=None,
 	# if AddToVizopRegister is False, don't add to the internal Vizop Register - only register it with zmq
 	# (The Vizop register only contains sockets belonging to datacore)
 	assert isinstance(AddToVizopRegister, bool)
-	# check if the socket register exists; if not, create it
-	if not hasattr(RegisterSocket, 'Register'):
-		RegisterSocket.Register = []
-		# set up poller to check all current sockets in turn
-		RegisterSocket.Poller = zmq.Poller()
 	if AddToVizopRegister:
 		ThisSocketObj = SocketInRegister(NewSocket, SocketNo, SocketLabel, Viewport=Viewport, PHAObj=PHAObj,
 			BelongsToDatacore=BelongsToDatacore)
-		RegisterSocket.Register.append(ThisSocketObj)
+		SocketRegister.Add(ThisSocketObj)
 	else: # find socket in existing items in Vizop register
-		ThisSocketObj = [s for s in RegisterSocket.Register if s.SocketNo == SocketNo][0]
-	RegisterSocket.Poller.register(ThisSocketObj.Socket, zmq.POLLIN)
+		ThisSocketObj = SocketRegister.WithSocketNo(SocketNo)[0]
+		SocketRegister.Poller.register(ThisSocketObj.Socket, zmq.POLLIN)
 	return ThisSocketObj
 
 def SetupNewSocket(SocketType='REQ', SocketLabel='', Viewport=None, PHAObj=None, SocketNo=None,
-		BelongsToDatacore=False, AddToRegister=True):
+		BelongsToDatacore=False, AddToRegister=True, Multiplexed=False):
 	# Make a new zmq socket of type REQ (a 'request' half of a request/reply pair) or REP (a 'reply' half)
 	# SocketNo (int): the socket number of the matching other half of the pair, already created, or
 	# None if we should fetch a new socket number
 	# BelongsToDatacore (bool): whether the socket is the datacore end of the pair
 	# AddToRegister (bool): whether to add the socket to the Vizop register
+	# Multiplexed (bool): if True, make a ChannelEndpoint on the ViewportChannel instead of a zmq socket. SocketNo is then
+	# a route number (from GetNewRouteNumber()), and SocketType only describes the endpoint's role
 	# Return the new socket, its corresponding SocketInRegister instance, and its socket number (int)
 	# PHAObj currently gets assigned in DoNewViewportCommand() in module controlframe, because it may be available only
 	# after a new PHA object has been created.
@@ -309,6 +717,12 @@ def SetupNewSocket(SocketType='REQ', SocketLabel='', Viewport=None, PHAObj=None,
 	assert isinstance(BelongsToDatacore, bool)
 	assert isinstance(AddToRegister, bool)
 	global zmqContext
+	if Multiplexed:
+		ThisRouteNo = GetNewRouteNumber() if SocketNo is None else SocketNo
+		NewEndpoint = ViewportChannelFor(BelongsToDatacore=BelongsToDatacore).AddEndpoint(Route=ThisRouteNo)
+		NewSocketObj = RegisterSocket(NewEndpoint, ThisRouteNo, SocketLabel.strip(), Viewport=Viewport, PHAObj=PHAObj,
+			BelongsToDatacore=BelongsToDatacore, AddToVizopRegister=AddToRegister)
+		return NewEndpoint, NewSocketObj, ThisRouteNo
 	# fetch socket number if required
 	if SocketNo is None: ThisSocketNo = GetNewSocketNumber()
 	else: ThisSocketNo = SocketNo
@@ -321,38 +735,195 @@ def SetupNewSocket(SocketType='REQ', SocketLabel='', Viewport=None, PHAObj=None,
 		BelongsToDatacore=BelongsToDatacore, AddToVizopRegister=AddToRegister)
 	return NewSocket, NewSocketObj, ThisSocketNo
 
+def SetupThreadSocket(SocketNo):
+	# make a zmq PUSH socket connected to the PULL socket with number SocketNo (int), already made by SetupNewSocket().
+	# This is for sending messages from a background thread; zmq sockets must be used only on the thread that made them,
+	# so the socket isn't put in the Vizop register or the poller. Return the new socket
+	assert isinstance(SocketNo, int)
+	NewSocket = zmqContext.socket(zmq.PUSH)
+	NewSocket.connect("tcp://127.0.0.1:" + str(SocketNo))
+	return NewSocket
+
 def SocketWithName(TargetName): # return socket (SocketInRegister instance) in socket register with SocketLabel == TargetName.
 	# raises error if socket not found
-	Hits = [s for s in RegisterSocket.Register if s.SocketLabel == TargetName]
+	Hits = SocketRegister.WithLabel(TargetName)
 	assert len(Hits) == 1
 	return Hits[0]
 
-def ListenToSocket(Socket, Handler=None, SendReply2=True, **Args):
+def PollSockets(Timeout=0):
+	# poll all sockets in the register once, waiting up to Timeout (int; ms) for any message. Messages waiting on
+	# ViewportChannels are sorted into their endpoints' inboxes.
+	# Return dict whose keys are the sockets (zmq sockets or ChannelEndpoint instances) with messages waiting
+	if any(c.EndpointsWaiting for c in ViewportChannels.values()): Timeout = 0 # don't wait if messages already waiting
+	SocketsWaiting = dict(SocketRegister.Poller.poll(timeout=Timeout))
+	for ThisChannel in ViewportChannels.values():
+		if ThisChannel.Socket in SocketsWaiting: ThisChannel.Drain()
+		SocketsWaiting.update(dict.fromkeys(ThisChannel.EndpointsWaiting, zmq.POLLIN))
+	# the change subscriber is listed instead of its zmq socket, as it strips the topic from the messages it receives
+	Subscriber = ChangeBroadcastEnds.get(False)
+	if (Subscriber is not None) and (Subscriber.Socket in SocketsWaiting): SocketsWaiting[Subscriber] = zmq.POLLIN
+	return SocketsWaiting
+
+def ListenToSocket(Socket, Handler=None, SendReply2=True, SocketsWaiting=None, **Args):
 	# check if any message received on Socket (a zmq socket), call Handler (a callable or None) to handle it,
 	# get reply back from handler, and (if SendReply2 (bool) is True) send reply on Socket
 	# Handler: callable taking arg MessageReceived (XML string)
+	# SocketsWaiting (dict or None): result of a poll already done, e.g. by MessagePump; if None, poll now
 	# return any message was received on Socket (str or None)
 	assert isinstance(SendReply2, bool)
-	SocketsWaiting = dict(RegisterSocket.Poller.poll(timeout=1))
+	if SocketsWaiting is None: SocketsWaiting = PollSockets(Timeout=1)
 	MessageReceived = None
 #	if SocketsWaiting: print("VM285 a socket has a waiting message in ListenToSockets: ",\
-#			[(s.SocketNo, s.SocketLabel) for s in RegisterSocket.Register if s.Socket in SocketsWaiting])
+#			[(s.SocketNo, s.SocketLabel) for s in SocketRegister if s.Socket in SocketsWaiting])
 	# any incoming message from Socket?
 	if Socket in SocketsWaiting:
-#		print("VM264 processing socket in ListenToSockets: ", [(s.SocketNo, s.SocketLabel) for s in RegisterSocket.Register if s.Socket == Socket],
+#		print("VM264 processing socket in ListenToSockets: ", [(s.SocketNo, s.SocketLabel) for s in SocketRegister if s.Socket == Socket],
 #			'Sending reply: ', SendReply2, 'Origin code:', Args.get('OriginCode', 0))
-		MessageReceived = Socket.recv()
+		MessageReceived = ReceiveMessage(Socket)
+		if MessageReceived is None: # rejected; tell the sender, if it's waiting for a reply
+			if SendReply2: SendMessage(Socket, MakeXMLMessage(RootName='Fail', RootText='CodecNotAccepted'))
+			return None
 		if Args.get('Debug', False): print("VM305 message received: ", MessageReceived)
+		# only the root is decoded here (without touching the payload of a binary message); the handler decodes the
+		# whole message
+		MessageXML = DecodeMessageRoot(MessageReceived)
+		Measuring = message_stats.Enabled # whether to record time waiting in queue and handling time
+		if Measuring:
+			if MessageXML.get(info.SendTimeAttribName):
+				message_stats.Record('QueueWait', MessageXML.tag,
+					time.time() - float(MessageXML.get(info.SendTimeAttribName)))
+			HandleStartTime = time.perf_counter()
 		if Handler: # any handler supplied?
 			# handle the message and collect an XML tree containing the response to send back to origin
 			ReplyXML = Handler(MessageReceived=MessageReceived, **Args)
 			assert ReplyXML is not None, Handler.__name__
 		else: ReplyXML = MakeXMLMessage('Null', 'Null')
+		if Measuring: message_stats.Record('HandleTime', MessageXML.tag, time.perf_counter() - HandleStartTime)
 #		if SendReply2 and (ReplyXML.tag is not 'OK'): # send reply if required; don't send 'OK' as it's just an acknowledgement
-		if SendReply2: # send reply if required
-			Socket.send(ElementTree.tostring(ReplyXML, encoding='UTF-8')) # use SendReply() instead?
+		if SendReply2: # send reply if required, with the request's correlation ID, if any
+			RequestID = MessageXML.get(info.RequestIDAttribName)
+			if RequestID is not None: ReplyXML.set(info.RequestIDAttribName, RequestID)
+			SendMessage(Socket, ReplyXML)
 	return MessageReceived
 
+class SocketHandler(object): # entry in a MessagePump's table, defining how messages arriving on a socket are handled
+
+	def __init__(self, Socket, Handler=None, SendReply2=True, Args={}):
+		# Handler, SendReply2, Args: as for ListenToSocket()
+		object.__init__(self)
+		assert isinstance(SendReply2, bool)
+		assert isinstance(Args, dict)
+		self.Socket = Socket
+		self.Handler = Handler
+		self.SendReply2 = SendReply2
+		self.Args = Args
+
+class MessagePump(object): # polls all sockets in the register once per cycle, and dispatches any waiting messages via
+	# a table of handlers. This replaces calling ListenToSocket() for each socket in turn, which polled all the sockets
+	# (and waited up to 1 ms) once per call
+
+	def __init__(self):
+		object.__init__(self)
+		self.Handlers = {} # keys are zmq sockets, values are SocketHandler instances. Messages waiting on several
+			# sockets are dispatched in the order the handlers were set
+		# performance counters: number of cycles run, and of those that handled any message; time spent polling and
+		# handling (s); number of messages handled
+		self.Stats = {'Cycles': 0, 'BusyCycles': 0, 'PollTime': 0.0, 'HandleTime': 0.0, 'MessagesHandled': 0}
+
+	def SetHandler(self, Socket, Handler=None, SendReply2=True, **Args):
+		# set handler for messages arriving on Socket (a zmq socket). Args are passed to Handler, as in ListenToSocket()
+		self.Handlers[Socket] = SocketHandler(Socket, Handler=Handler, SendReply2=SendReply2, Args=Args)
+
+	def ClearHandlers(self):
+		self.Handlers = {}
+
+	def Pump(self, Timeout=0):
+		# poll all sockets in the register once, waiting up to Timeout (int; ms) for any message, then dispatch messages
+		# on sockets in the handler table. Messages on other sockets are left waiting.
+		# Return list of (Socket, MessageReceived (bytes)) for each message handled, in order of handling
+		StartTime = time.perf_counter()
+		ExpirePendingReplies()
+		SocketsWaiting = PollSockets(Timeout=Timeout)
+		PollEndTime = time.perf_counter()
+		self.Stats['Cycles'] += 1
+		self.Stats['PollTime'] += PollEndTime - StartTime
+		MessagesHandled = []
+		if SocketsWaiting:
+			for ThisHandler in [h for (s, h) in self.Handlers.items() if s in SocketsWaiting]:
+				# skip sockets closed by handlers earlier in this cycle, e.g. when a Viewport was destroyed
+				if ThisHandler.Socket.closed: continue
+				while True:
+					MessageReceived = ListenToSocket(ThisHandler.Socket, Handler=ThisHandler.Handler,
+						SendReply2=ThisHandler.SendReply2, SocketsWaiting=SocketsWaiting, **ThisHandler.Args)
+					if MessageReceived is not None: MessagesHandled.append( (ThisHandler.Socket, MessageReceived) )
+					# a channel endpoint may hold several messages, e.g. pipelined requests from a Viewport; handle them all
+					if ThisHandler.Socket.closed or not getattr(ThisHandler.Socket, 'Inbox', None): break
+			if MessagesHandled:
+				self.Stats['BusyCycles'] += 1
+				self.Stats['MessagesHandled'] += len(MessagesHandled)
+				self.Stats['HandleTime'] += time.perf_counter() - PollEndTime
+		return MessagesHandled
+
+class ViewportUpdateScheduler(object): # coalesces requests to update Viewports after changes to data in datacore.
+	# Viewport shadows are marked as stale when a change is made; each stale Viewport is redrawn once when the burst of
+	# messages causing the changes is over, or when the oldest request has waited for the frame budget, whichever is
+	# sooner. This avoids redrawing every Viewport after each message, when only the last state matters
+
+	def __init__(self, Budget=info.ViewportUpdateBudget):
+		# Budget (int): max time (ms) to hold back updates while messages are still arriving
+		object.__init__(self)
+		self.Budget = Budget
+		self.Stale = collections.OrderedDict() # keys are Viewport shadows needing update, values are display attribs
+			# XML element to send with the redraw data, or None
+		self.FirstRequestTime = None # time (s) when the oldest pending request was made, or None if none pending
+		# performance counters: number of Viewport updates requested, performed individually and performed by
+		# broadcast, and number of flushes
+		self.Stats = {'Requested': 0, 'Performed': 0, 'Broadcast': 0, 'Flushes': 0}
+
+	def __len__(self): return len(self.Stale)
+
+	def MarkStale(self, Viewport, DisplayAttribTag=None):
+		# request update of Viewport (a ViewportShadow). DisplayAttribTag (XML element or None): display attribs to send
+		# with the redraw data. If the Viewport is already stale, any display attribs previously requested are kept
+		# unless replaced by DisplayAttribTag
+		if self.FirstRequestTime is None: self.FirstRequestTime = time.perf_counter()
+		if (DisplayAttribTag is not None) or (Viewport not in self.Stale): self.Stale[Viewport] = DisplayAttribTag
+		self.Stats['Requested'] += 1
+
+	def Discard(self, Viewport):
+		# withdraw any pending update of Viewport, e.g. because it has just been sent full redraw data by other means
+		self.Stale.pop(Viewport, None)
+		if not self.Stale: self.FirstRequestTime = None
+
+	def Due(self, Quiet=True):
+		# return bool: whether pending updates should be performed now. Quiet (bool): whether the current burst of
+		# messages is over
+		return bool(self.Stale) and \
+			(Quiet or ((time.perf_counter() - self.FirstRequestTime) * 1e3 >= self.Budget))
+
+	def Flush(self, Redraw, Broadcast=None):
+		# perform all pending updates, by calling Redraw (callable taking a Viewport shadow and arg DisplayAttribTag) for
+		# each stale Viewport that's still on display. Return number of Viewports redrawn (int)
+		# Broadcast: None, or callable taking a list of Viewport shadows, which updates as many of them as it can
+		#	together (see controlframe.DatacoreBroadcastViewportUpdates()), and returns a list of the rest. Only Viewports
+		#	with no display attribs to send are passed to it
+		Stale = self.Stale
+		self.Stale = collections.OrderedDict()
+		self.FirstRequestTime = None
+		OnDisplay = [(v, d) for (v, d) in Stale.items() if v.IsOnDisplay]
+		if Broadcast:
+			ToBroadcast = [v for (v, d) in OnDisplay if d is None]
+			NotBroadcast = set(Broadcast(ToBroadcast))
+			self.Stats['Broadcast'] += len(ToBroadcast) - len(NotBroadcast)
+			OnDisplay = [(v, d) for (v, d) in OnDisplay if (d is not None) or (v in NotBroadcast)]
+		Redrawn = 0
+		for (ThisViewport, ThisDisplayAttribTag) in OnDisplay:
+			Redraw(ThisViewport, DisplayAttribTag=ThisDisplayAttribTag)
+			Redrawn += 1
+		self.Stats['Performed'] += Redrawn
+		self.Stats['Flushes'] += 1
+		return Redrawn
+
 def MakeXMLMessage(RootName='Message', RootText='', **Args):
 	# returns root element of a new XML tree with root element=RootName (str) and its content = RootText (str)
 	# Args can include (optional) Elements (dict) with keys = tags, values = text
@@ -449,3 +1020,104 @@ def StoreValueInUserConfig(ConfigName, Value):
 	ce.set_config(ConfigName, Value)
 	ce.apply_changes() # save config changes in SettingsManager
 
+
+"""[----------TESTING AREA---------- """
+
+def BenchmarkMessagePump(Viewports=20, Cycles=200):
+	# compare the old way of checking for messages (calling ListenToSocket() for each socket) with MessagePump, using a
+	# socket layout like the control frame's with Viewports (int) Viewports open. Measures idle cycle time and CPU time
+	# with no messages waiting, and latency of a request from a Viewport until its reply is received.
+	# Return results as dict: keys are 'Old' and 'New', values are dicts of times (s)
+	# make a control frame socket pair, and a pair of socket pairs per Viewport (as in projects.ViewportShadow)
+	CFInSocket, CFInSocketObj, CFSocketNo = SetupNewSocket(SocketType='REP', SocketLabel='BenchF2CREP',
+		BelongsToDatacore=True)
+	CFOutSocket = SetupNewSocket(SocketType='REQ', SocketLabel='BenchF2CREQ', SocketNo=CFSocketNo)[0]
+	DatacoreSockets = [CFInSocket] # all sockets checked in each cycle
+	RequestPairs = [] # list of (Viewport end REQ socket, datacore end REP socket)
+	for ThisViewportIndex in range(Viewports):
+		DatacoreREPSocket, DatacoreREPSocketObj, SocketNo = SetupNewSocket(SocketType='REP',
+			SocketLabel='BenchC2DREP_%d' % ThisViewportIndex, BelongsToDatacore=True)
+		ViewportREQSocket = SetupNewSocket(SocketType='REQ', SocketLabel='BenchC2DREQ_%d' % ThisViewportIndex,
+			SocketNo=SocketNo)[0]
+		DatacoreREQSocket, DatacoreREQSocketObj, SocketNo = SetupNewSocket(SocketType='REQ',
+			SocketLabel='BenchC2VREQ_%d' % ThisViewportIndex, BelongsToDatacore=True)
+		SetupNewSocket(SocketType='REP', SocketLabel='BenchC2VREP_%d' % ThisViewportIndex, SocketNo=SocketNo)
+		DatacoreSockets += [DatacoreREPSocket, DatacoreREQSocket]
+		RequestPairs.append( (ViewportREQSocket, DatacoreREPSocket) )
+	Handler = lambda MessageReceived, **Args: MakeXMLMessage('OK', 'OK')
+	Pump = MessagePump()
+	for ThisSocket in DatacoreSockets: Pump.SetHandler(ThisSocket, Handler=Handler, SendReply2=True)
+
+	def OldCycle():
+		return [m for m in [ListenToSocket(s, Handler=Handler, SendReply2=True) for s in DatacoreSockets] if m]
+
+	def NewCycle():
+		return Pump.Pump(Timeout=0)
+
+	Results = {}
+	for (ThisScheme, Cycle) in [('Old', OldCycle), ('New', NewCycle)]:
+		# idle cycles, with no messages waiting
+		StartTime = time.perf_counter()
+		StartCPUTime = time.process_time()
+		for ThisCycle in range(Cycles): Cycle()
+		Results[ThisScheme] = {'IdleCycle': (time.perf_counter() - StartTime) / Cycles,
+			'IdleCycleCPU': (time.process_time() - StartCPUTime) / Cycles}
+		# latency: send a request from each Viewport in turn, and run cycles until it has been handled and replied to
+		Latencies = []
+		for (ViewportREQSocket, DatacoreREPSocket) in RequestPairs:
+			StartTime = time.perf_counter()
+			ViewportREQSocket.send(b'<RQ_Null/>')
+			while not Cycle(): pass
+			ViewportREQSocket.recv()
+			Latencies.append(time.perf_counter() - StartTime)
+		Results[ThisScheme]['MeanLatency'] = sum(Latencies) / len(Latencies)
+		Results[ThisScheme]['MaxLatency'] = max(Latencies)
+	return Results
+
+def StressTestViewportChannel(Viewports=10000, SampleInterval=1000):
+	# open and close Viewports (int) Viewports in turn, as in a long session, passing a request and reply each way between
+	# each Viewport and its shadow over the ViewportChannel. Every SampleInterval (int) Viewports, sample the resources
+	# in use. Return list of dicts, one per sample, with keys: Viewports (number opened so far), Sockets (number in
+	# register), Routes (number of routes known to the datacore end), FileDescriptors (number open by this process, or
+	# None if unknown), Time (s since start)
+
+	class StressViewport(object): pass # stands in for a Viewport and its shadow
+
+	def RoundTrip(FromSocket, ToSocket):
+		# send a request from FromSocket to ToSocket, reply to it, and collect the reply
+		FromSocket.send(b'<RQ_Null/>')
+		while ListenToSocket(ToSocket, Handler=lambda MessageReceived, **Args: MakeXMLMessage('OK', 'OK')) is None: pass
+		while ListenToSocket(FromSocket, SendReply2=False) is None: pass
+
+	def FileDescriptorCount():
+		try: return len(os.listdir('/proc/self/fd'))
+		except OSError: return None
+
+	DatacoreChannel = ViewportChannelFor(BelongsToDatacore=True)
+	ViewportChannelFor(BelongsToDatacore=False)
+	Samples = []
+	StartTime = time.perf_counter()
+	for ThisViewportIndex in range(1, Viewports + 1):
+		# make sockets as in display_utilities.CreateViewport() and projects.ViewportShadow
+		ThisViewport = StressViewport()
+		ThisShadow = StressViewport()
+		D2CSocketNo = GetNewRouteNumber()
+		C2DSocketNo = GetNewRouteNumber()
+		C2DSocketREQ = SetupNewSocket(SocketType='REQ', SocketLabel='C2DREQ_Stress', Viewport=ThisViewport,
+			SocketNo=C2DSocketNo, Multiplexed=True)[0]
+		D2CSocketREP = SetupNewSocket(SocketType='REP', SocketLabel='D2CREP_Stress', Viewport=ThisViewport,
+			SocketNo=D2CSocketNo, Multiplexed=True)[0]
+		C2DSocketREP = SetupNewSocket(SocketType='REP', SocketLabel=info.ViewportInSocketLabel + '_Stress',
+			Viewport=ThisShadow, SocketNo=C2DSocketNo, BelongsToDatacore=True, Multiplexed=True)[0]
+		D2CSocketREQ = SetupNewSocket(SocketType='REQ', SocketLabel=info.ViewportOutSocketLabel + '_Stress',
+			Viewport=ThisShadow, SocketNo=D2CSocketNo, BelongsToDatacore=True, Multiplexed=True)[0]
+		RoundTrip(C2DSocketREQ, C2DSocketREP)
+		RoundTrip(D2CSocketREQ, D2CSocketREP)
+		# close the Viewport, as in DatacoreSetViewportAsNotInUse() and ControlFrame.DestroyClientViewport()
+		SocketRegister.UnregisterViewport(ThisShadow)
+		SocketRegister.UnregisterViewport(ThisViewport)
+		if ThisViewportIndex % SampleInterval == 0:
+			Samples.append({'Viewports': ThisViewportIndex, 'Sockets': len(SocketRegister),
+				'Routes': len(DatacoreChannel.Endpoints) + len(DatacoreChannel.PeerOfRoute),
+				'FileDescriptors': FileDescriptorCount(), 'Time': time.perf_counter() - StartTime})
+	return Samples